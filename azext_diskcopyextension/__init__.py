@@ -1,7 +1,50 @@
 from azure.cli.core import AzCommandsLoader
-from azure.cli.core.commands.parameters import get_enum_type
-from ._help import helps
-from ._validators import validate_copy_vhd_to_disk
+
+# az loads this module for every command in the storage, disk and vm groups, so it only imports what is needed to
+# build the command table. Help, arguments, validators and custom.py load once one of these commands is resolved.
+COMMANDS = [
+    ('storage blob', 'copy-to-vhd', 'copy_vhd_to_vhd'),
+    ('storage blob', 'copy-to-disk', 'copy_vhd_to_disk'),
+    ('storage blob', 'copy-batch', 'copy_vhd_to_disk_batch'),
+    ('disk', 'copy-to-vhd', 'copy_disk_to_vhd'),
+    ('disk', 'copy-to-disk', 'copy_disk_to_disk'),
+    ('disk', 'copy-batch', 'copy_disk_to_disk_batch'),
+    ('vm', 'copy-disks', 'copy_vm_disks'),
+    ('disk copy', 'cleanup', 'cleanup_temp_resources'),
+    ('disk copy', 'prune-temp-storage', 'prune_temp_storage_accounts'),
+    ('disk copy', 'status', 'show_copy_operation_status'),
+    ('disk copy', 'wait', 'wait_for_copy_operation'),
+]
+COMMAND_NAMES = ['{0} {1}'.format(group, name) for group, name, _ in COMMANDS]
+
+
+def validate_copy_vhd_to_disk(namespace):
+    from ._validators import validate_copy_vhd_to_disk as validate
+    validate(namespace)
+
+
+VALIDATORS = {
+    'storage blob copy-to-disk': validate_copy_vhd_to_disk,
+}
+
+
+def needs_help(args):
+    """Whether this command line asks for help on one of the extension's commands, or a group that lists them.
+
+    Without args, the whole command table is being loaded, for example to build the command index.
+    """
+    if not args:
+        return True
+    if '-h' not in args and '--help' not in args:
+        return False
+    words = []
+    for arg in args:
+        if arg.startswith('-'):
+            break
+        words.append(arg)
+    command = ' '.join(words)
+    return any(name == command or name.startswith(command + ' ') for name in COMMAND_NAMES)
+
 
 class DiskCopyCommandsLoader(AzCommandsLoader):
 
@@ -12,48 +55,18 @@ class DiskCopyCommandsLoader(AzCommandsLoader):
                                                      custom_command_type=diskcopy_custom)
 
     def load_command_table(self, args):
-        with self.command_group('storage blob') as g:
-            g.custom_command('copy-to-vhd', 'copy_vhd_to_vhd')
-            g.custom_command('copy-to-disk', 'copy_vhd_to_disk', validator=validate_copy_vhd_to_disk)
-        with self.command_group('disk') as g:
-            g.custom_command('copy-to-vhd', 'copy_disk_to_vhd')
-            g.custom_command('copy-to-disk', 'copy_disk_to_disk')
+        if needs_help(args):
+            from . import _help  # pylint: disable=unused-variable
+        for group, name, operation in COMMANDS:
+            with self.command_group(group) as g:
+                g.custom_command(name, operation, validator=VALIDATORS.get('{0} {1}'.format(group, name)))
         return self.command_table
 
     def load_arguments(self, command):
-        with self.argument_context('storage blob copy-to-vhd') as c:
-            c.argument('source_vhd_uri', options_list=['--source-uri', '-u'])
-        with self.argument_context('storage blob copy-to-vhd', arg_group='Destination VHD') as c:
-            c.argument('target_storage_account_name', options_list=['--account-name'])
-            c.argument('target_storage_container_name', options_list=['--destination-container', '-c'])
-            c.argument('target_vhd_name', options_list=['--destination-blob', '-b'])
-        
-        with self.argument_context('storage blob copy-to-disk') as c:
-            c.argument('source_vhd_uri', options_list=['--source-uri', '-u'])
-        with self.argument_context('storage blob copy-to-disk', arg_group='Temporary Storage Account') as c:
-            c.argument('temp_storage_account_name', options_list=['--temp-storage-account'])
-        with self.argument_context('storage blob copy-to-disk', arg_group='Destination Disk') as c:
-            c.argument('target_resource_group_name', options_list=['--resource-group', '-g'])
-            c.argument('target_disk_name', options_list=['--disk-name', '-n'])
-            c.argument('target_disk_sku', options_list=['--sku'], arg_type=get_enum_type(['Premium_LRS', 'Standard_LRS']))
-
-        with self.argument_context('disk copy-to-vhd') as c:
-            c.argument('source_resource_group_name', options_list=['--source-resource-group', '-g'])
-            c.argument('source_disk_name', options_list=['--source-disk-name', '-n'])
-        with self.argument_context('disk copy-to-vhd', arg_group='Destination VHD') as c:
-            c.argument('target_storage_account_name', options_list=['--account-name'])
-            c.argument('target_storage_container_name', options_list=['--destination-container', '-c'])
-            c.argument('target_vhd_name', options_list=['--destination-blob', '-b'])
-
-        with self.argument_context('disk copy-to-disk') as c:
-            c.argument('source_resource_group_name', options_list=['--source-resource-group', '-g'])
-            c.argument('source_disk_name', options_list=['--source-disk-name', '-n'])
-        with self.argument_context('disk copy-to-disk', arg_group='Temporary Storage Account') as c:
-            c.argument('temp_storage_account_name', options_list=['--temp-storage-account'])
-        with self.argument_context('disk copy-to-disk', arg_group='Destination Disk') as c:
-            c.argument('target_resource_group_name', options_list=['--target-resource-group'])
-            c.argument('target_disk_name', options_list=['--target-disk-name'])
-            c.argument('target_disk_sku', options_list=['--sku'], arg_type=get_enum_type(['Premium_LRS', 'Standard_LRS']))
+        if command not in COMMAND_NAMES:
+            return
+        from ._params import load_arguments
+        load_arguments(self, command)
 
 
 COMMAND_LOADER_CLS = DiskCopyCommandsLoader
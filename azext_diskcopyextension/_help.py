@@ -19,6 +19,46 @@ helps['storage blob copy-to-vhd'] = """
         - name: --destination-blob -b
           type: string
           short-summary: Name for the new disk
+        - name: --copy-engine
+          type: string
+          short-summary: >
+            (Optional) How blob data is copied. 'async' (default) starts a server-side copy of the whole blob.
+            'page-ranges' copies only the allocated pages of the source, in parallel, which is much faster for sparse disks.
+        - name: --resume
+          type: string
+          short-summary: >
+            (Optional) Id of an interrupted copy operation to continue. Steps that already completed, including a
+            running server-side copy, are not repeated. Arguments that aren't given are taken from the original command.
+        - name: --no-wait
+          type: bool
+          short-summary: >
+            (Optional) Return the copy operation's status once the server-side copy has started, instead of waiting
+            for it. Use `az disk copy status` or `az disk copy wait` to finish it. Not supported for copies that move
+            data from the az process ('page-ranges', 'direct' and incremental copies).
+        - name: --verify
+          type: bool
+          short-summary: >
+            (Optional) Once the data is copied, hash the source and the copy in 64 MiB ranges, in parallel and reading only
+            allocated pages, and fail if any range differs.
+        - name: --repair
+          type: bool
+          short-summary: (Optional) With --verify, copy the ranges that differ again and check them once more.
+        - name: --verify-manifest
+          type: string
+          short-summary: (Optional) With --verify, record the hash of every range of the copy in this JSON file.
+        - name: --progress-format
+          type: string
+          short-summary: >
+            (Optional) How copy progress is reported on stderr. 'text' (default) draws a progress bar with throughput
+            and ETA on a terminal. 'json' writes a JSON line per update and a final summary with per-phase timings. 'none' reports nothing.
+        - name: --trace-file
+          type: string
+          short-summary: >
+            (Optional) Write a trace of the command to this file: a span for every az call (with keys and SAS tokens
+            redacted, and process startup split from the remote call) and for every step of the copy.
+        - name: --trace-format
+          type: string
+          short-summary: (Optional) Format of --trace-file. 'chrome' (default) is the trace-event format of chrome://tracing and Perfetto. 'otlp' is OpenTelemetry JSON.
     examples:
         - name: Copy an unmanaged disk to an unmanaged disk
           text: >
@@ -46,7 +86,48 @@ helps['storage blob copy-to-disk'] = """
           short-summary: (Optional) Underlying storage SKU for the new disk. Uses the SKU of the source storage account if not provided.
         - name: --temp-storage-account
           type: string
-          short-summary: (Optional) Temporary storage account to be used for cross-region copies. Created dynamically if not provided.
+          short-summary: (Optional) Temporary storage account to be used for cross-region copies. A pooled temp account in the target resource group is used (or created) if not provided.
+        - name: --results-file
+          type: string
+          short-summary: (Optional) File to write the source blob URI and new disk resource id to, as a JSON line.
+        - name: --resume
+          type: string
+          short-summary: >
+            (Optional) Id of an interrupted copy operation to continue. Steps that already completed, including a
+            running server-side copy, are not repeated. Arguments that aren't given are taken from the original command.
+        - name: --no-wait
+          type: bool
+          short-summary: >
+            (Optional) Return the copy operation's status once the server-side copy has started, instead of waiting
+            for it. Use `az disk copy status` or `az disk copy wait` to finish it. Not supported for copies that move
+            data from the az process ('page-ranges', 'direct' and incremental copies).
+        - name: --verify
+          type: bool
+          short-summary: >
+            (Optional) Once the data is copied, hash the source and the copy in 64 MiB ranges, in parallel and reading only
+            allocated pages, and fail if any range differs. Across regions, the temporary blob is checked before the disk
+            is created from it. A disk that Azure creates in the source region is not checked.
+        - name: --repair
+          type: bool
+          short-summary: (Optional) With --verify, copy the ranges that differ again and check them once more.
+        - name: --verify-manifest
+          type: string
+          short-summary: >
+            (Optional) With --verify, record the hash of every range of each copy in this JSON file. A later incremental
+            copy into the same disk with the same file only hashes the ranges it changed.
+        - name: --progress-format
+          type: string
+          short-summary: >
+            (Optional) How copy progress is reported on stderr. 'text' (default) draws a progress bar with throughput
+            and ETA on a terminal. 'json' writes a JSON line per update and a final summary with per-phase timings. 'none' reports nothing.
+        - name: --trace-file
+          type: string
+          short-summary: >
+            (Optional) Write a trace of the command to this file: a span for every az call (with keys and SAS tokens
+            redacted, and process startup split from the remote call) and for every step of the copy.
+        - name: --trace-format
+          type: string
+          short-summary: (Optional) Format of --trace-file. 'chrome' (default) is the trace-event format of chrome://tracing and Perfetto. 'otlp' is OpenTelemetry JSON.
     examples:
         - name: Copy an unmanaged disk to a Managed Disk
           text: >
@@ -72,6 +153,17 @@ helps['disk copy-to-disk'] = """
         - name: --target-resource-group
           type: string
           short-summary: Name of resource group for the new disk
+        - name: --target-resource-groups
+          type: string
+          short-summary: >
+            Copy to several resource groups instead of --target-resource-group, for example one per DR region. The
+            source is snapshotted once, each target region gets a single copy of it that every resource group in the
+            region creates its disk from, and the regions are copied concurrently.
+        - name: --chain
+          type: bool
+          short-summary: >
+            (Optional) With --target-resource-groups, seed each region from the region listed before it instead of
+            from the source, so the data leaves the source region once. List nearby regions next to each other.
         - name: --target-disk-name
           type: string
           short-summary: Name for the new disk.  Uses the name of the source disk if not provided.
@@ -80,7 +172,76 @@ helps['disk copy-to-disk'] = """
           short-summary: (Optional) Underlying storage SKU for the new disk. Uses the SKU of the source disk if not provided.
         - name: --temp-storage-account
           type: string
-          short-summary: (Optional) Temporary storage account to be used for cross-region copies. Created dynamically if not provided.
+          short-summary: (Optional) Temporary storage account to be used for cross-region copies. A pooled temp account in the target resource group is used (or created) if not provided.
+        - name: --results-file
+          type: string
+          short-summary: (Optional) File to write the source and new disk resource ids to, as a JSON line.
+        - name: --strategy
+          type: string
+          short-summary: >
+            (Optional) How cross-region copies move data. 'blob' (default) copies the snapshot into a temporary
+            storage account and creates the disk from that blob. 'direct' creates an empty disk for upload and
+            copies the snapshot's populated pages straight into it, without a temporary storage account.
+        - name: --copy-engine
+          type: string
+          short-summary: >
+            (Optional) How blob data is copied. 'async' (default) starts a server-side copy of the whole blob.
+            'page-ranges' copies only the allocated pages of the source, in parallel, which is much faster for sparse disks.
+        - name: --incremental
+          type: bool
+          short-summary: >
+            (Optional) Copy by snapshot differences. The first run creates the target disk for upload and copies
+            the source in full. Each later pass takes a new incremental snapshot and copies only the pages that
+            changed since the last one, until a pass copies less than --delta-threshold-mb.
+        - name: --delta-threshold-mb
+          type: int
+          short-summary: (Optional) Stop making passes once a pass copies less than this many MB. Defaults to 512.
+        - name: --max-passes
+          type: int
+          short-summary: (Optional) Maximum number of incremental passes per run. Defaults to 3.
+        - name: --no-finalize
+          type: bool
+          short-summary: >
+            (Optional) Leave the target disk open for upload after an incremental copy, so a later run with
+            --incremental can copy the changes made since. Omit it on the final run, once writes to the source have stopped.
+        - name: --resume
+          type: string
+          short-summary: >
+            (Optional) Id of an interrupted copy operation to continue. Steps that already completed, including a
+            running server-side copy, are not repeated. Arguments that aren't given are taken from the original command.
+        - name: --no-wait
+          type: bool
+          short-summary: >
+            (Optional) Return the copy operation's status once the server-side copy has started, instead of waiting
+            for it. Use `az disk copy status` or `az disk copy wait` to finish it. Not supported for copies that move
+            data from the az process ('page-ranges', 'direct' and incremental copies).
+        - name: --verify
+          type: bool
+          short-summary: >
+            (Optional) Once the data is copied, hash the source and the copy in 64 MiB ranges, in parallel and reading only
+            allocated pages, and fail if any range differs. Across regions, the temporary blob is checked before the disk
+            is created from it. A disk that Azure creates in the source region is not checked.
+        - name: --repair
+          type: bool
+          short-summary: (Optional) With --verify, copy the ranges that differ again and check them once more.
+        - name: --verify-manifest
+          type: string
+          short-summary: >
+            (Optional) With --verify, record the hash of every range of each copy in this JSON file. A later incremental
+            copy into the same disk with the same file only hashes the ranges it changed.
+        - name: --progress-format
+          type: string
+          short-summary: >
+            (Optional) How copy progress is reported on stderr. 'text' (default) draws a progress bar with throughput
+            and ETA on a terminal. 'json' writes a JSON line per update and a final summary with per-phase timings. 'none' reports nothing.
+        - name: --trace-file
+          type: string
+          short-summary: >
+            (Optional) Write a trace of the command to this file: a span for every az call (with keys and SAS tokens
+            redacted, and process startup split from the remote call) and for every step of the copy.
+        - name: --trace-format
+          type: string
+          short-summary: (Optional) Format of --trace-file. 'chrome' (default) is the trace-event format of chrome://tracing and Perfetto. 'otlp' is OpenTelemetry JSON.
     examples:
         - name: Copy a Managed Disk to a Managed Disk
           text: >
@@ -88,6 +249,23 @@ helps['disk copy-to-disk'] = """
         - name: Copy a Managed Disk to a Managed Disk across regions with a specified temporary storage account
           text: >
             az disk copy-to-disk -n mydisk -g my-source-rg --target-resource-group my-remote-rg --temp-storage diskcopytemp123
+        - name: Copy a Managed Disk across regions directly, without a temporary storage account
+          text: >
+            az disk copy-to-disk -n mydisk -g my-source-rg --target-resource-group my-remote-rg --strategy direct
+        - name: Sync a Managed Disk to another region ahead of a migration, then cut over after stopping the app
+          text: >
+            az disk copy-to-disk -n mydisk -g my-source-rg --target-resource-group my-remote-rg --incremental --no-finalize
+
+            az disk copy-to-disk -n mydisk -g my-source-rg --target-resource-group my-remote-rg --incremental
+        - name: Replicate a Managed Disk to three DR regions from one snapshot, seeding each region from the one before
+          text: >
+            az disk copy-to-disk -n mydisk -g my-source-rg --target-resource-groups dr-westus dr-westus2 dr-westeurope --chain
+        - name: Copy a Managed Disk across regions, and check the copy against the source before creating the disk
+          text: >
+            az disk copy-to-disk -n mydisk -g my-source-rg --target-resource-group my-remote-rg --verify --repair
+        - name: Continue a copy that was interrupted
+          text: >
+            az disk copy-to-disk -n mydisk -g my-source-rg --target-resource-group my-remote-rg --resume 3f2a9c1b7d4e
 """
 
 helps['disk copy-to-vhd'] = """
@@ -112,8 +290,372 @@ helps['disk copy-to-vhd'] = """
         - name: --destination-blob -b
           type: string
           short-summary: Name for the new disk
+        - name: --copy-engine
+          type: string
+          short-summary: >
+            (Optional) How blob data is copied. 'async' (default) starts a server-side copy of the whole blob.
+            'page-ranges' copies only the allocated pages of the source, in parallel, which is much faster for sparse disks.
+        - name: --resume
+          type: string
+          short-summary: >
+            (Optional) Id of an interrupted copy operation to continue. Steps that already completed, including a
+            running server-side copy, are not repeated. Arguments that aren't given are taken from the original command.
+        - name: --no-wait
+          type: bool
+          short-summary: >
+            (Optional) Return the copy operation's status once the server-side copy has started, instead of waiting
+            for it. Use `az disk copy status` or `az disk copy wait` to finish it. Not supported for copies that move
+            data from the az process ('page-ranges', 'direct' and incremental copies).
+        - name: --verify
+          type: bool
+          short-summary: >
+            (Optional) Once the data is copied, hash the source and the copy in 64 MiB ranges, in parallel and reading only
+            allocated pages, and fail if any range differs.
+        - name: --repair
+          type: bool
+          short-summary: (Optional) With --verify, copy the ranges that differ again and check them once more.
+        - name: --verify-manifest
+          type: string
+          short-summary: (Optional) With --verify, record the hash of every range of the copy in this JSON file.
+        - name: --progress-format
+          type: string
+          short-summary: >
+            (Optional) How copy progress is reported on stderr. 'text' (default) draws a progress bar with throughput
+            and ETA on a terminal. 'json' writes a JSON line per update and a final summary with per-phase timings. 'none' reports nothing.
+        - name: --trace-file
+          type: string
+          short-summary: >
+            (Optional) Write a trace of the command to this file: a span for every az call (with keys and SAS tokens
+            redacted, and process startup split from the remote call) and for every step of the copy.
+        - name: --trace-format
+          type: string
+          short-summary: (Optional) Format of --trace-file. 'chrome' (default) is the trace-event format of chrome://tracing and Perfetto. 'otlp' is OpenTelemetry JSON.
     examples:
         - name: Copy a Managed Disk to an unmanaged disk
           text: >
             az disk copy-to-vhd -n mydisk -g my-source-rg --account-name mystorage -c disks -b mydisk.vhd
-"""
\ No newline at end of file
+"""
+
+helps['storage blob copy-batch'] = """
+    type: command
+    short-summary: Copy many VHD blobs to Managed Disks concurrently
+    long-summary: >
+        Runs a copy-to-disk for every entry in a manifest. Copies run in parallel and a failed copy
+        doesn't stop the others. The manifest is a JSON array or a CSV file with the columns
+        source_uri, target_resource_group, target_disk_name, sku and temp_storage_account.
+        Only source_uri is required.
+    parameters:
+        - name: --manifest
+          type: string
+          short-summary: JSON or CSV file listing the blobs to copy
+        - name: --resource-group -g
+          type: string
+          short-summary: (Optional) Resource group for the new disks when a manifest entry doesn't specify one
+        - name: --sku
+          type: string
+          short-summary: (Optional) Underlying storage SKU for the new disks. Uses the SKU of the source storage account if not provided.
+        - name: --temp-storage-account
+          type: string
+          short-summary: (Optional) Temporary storage account to be used for cross-region copies. A pooled temp account in the target resource group is used (or created) if not provided.
+        - name: --max-workers
+          type: int
+          short-summary: (Optional) Number of copies to run at the same time. Defaults to 4.
+        - name: --order
+          type: string
+          short-summary: >
+            (Optional) Order to start the copies in. 'manifest' (default) keeps the order of the manifest. 'largest-first'
+            starts the copies expected to take longest first, which shortens the batch as a whole. 'shortest-first' gets
+            the most copies done soonest. Copies are ranked by size and by the throughput observed so far on their route.
+        - name: --max-copies-per-account
+          type: int
+          short-summary: (Optional) Maximum number of blob copies reading from or writing to one storage account at the same time.
+        - name: --max-account-throughput-mb
+          type: float
+          short-summary: >
+            (Optional) Maximum combined throughput of the blob copies of one storage account, in MB/s. A copy waits to start
+            while the throughput measured on its accounts, plus what it is expected to add, is over the limit.
+        - name: --results-file
+          type: string
+          short-summary: (Optional) File to write one JSON line per finished copy to, as each copy completes.
+        - name: --progress-format
+          type: string
+          short-summary: >
+            (Optional) How copy progress is reported on stderr. 'text' (default) draws a progress bar with throughput
+            and ETA on a terminal. 'json' writes a JSON line per update and a final summary with per-phase timings. 'none' reports nothing.
+        - name: --trace-file
+          type: string
+          short-summary: >
+            (Optional) Write a trace of the command to this file: a span for every az call (with keys and SAS tokens
+            redacted, and process startup split from the remote call) and for every step of the copy.
+        - name: --trace-format
+          type: string
+          short-summary: (Optional) Format of --trace-file. 'chrome' (default) is the trace-event format of chrome://tracing and Perfetto. 'otlp' is OpenTelemetry JSON.
+    examples:
+        - name: Copy the VHDs listed in a manifest, 8 at a time
+          text: >
+            az storage blob copy-batch --manifest vhds.csv -g my-remote-rg --max-workers 8 --results-file results.jsonl
+"""
+
+helps['disk copy-batch'] = """
+    type: command
+    short-summary: Copy many Managed Disks concurrently
+    long-summary: >
+        Runs a copy-to-disk for every disk in a manifest, or for every disk in a resource group. Copies run in parallel
+        and a failed copy doesn't stop the others. The manifest is a JSON array or a CSV file with the columns
+        source_disk_id (or source_resource_group and source_disk_name), target_resource_group, target_disk_name,
+        sku and temp_storage_account.
+    parameters:
+        - name: --manifest
+          type: string
+          short-summary: JSON or CSV file listing the disks to copy
+        - name: --source-resource-group -g
+          type: string
+          short-summary: Copy every disk in this resource group. Use instead of --manifest.
+        - name: --target-resource-group
+          type: string
+          short-summary: Resource group for the new disks when a manifest entry doesn't specify one
+        - name: --sku
+          type: string
+          short-summary: (Optional) Underlying storage SKU for the new disks. Uses the SKU of each source disk if not provided.
+        - name: --temp-storage-account
+          type: string
+          short-summary: (Optional) Temporary storage account to be used for cross-region copies. A pooled temp account in the target resource group is used (or created) if not provided.
+        - name: --max-workers
+          type: int
+          short-summary: (Optional) Number of copies to run at the same time. Defaults to 4.
+        - name: --order
+          type: string
+          short-summary: >
+            (Optional) Order to start the copies in. 'manifest' (default) keeps the order of the manifest. 'largest-first'
+            starts the copies expected to take longest first, which shortens the batch as a whole. 'shortest-first' gets
+            the most copies done soonest. Copies are ranked by size and by the throughput observed so far on their route.
+        - name: --max-copies-per-account
+          type: int
+          short-summary: (Optional) Maximum number of blob copies reading from or writing to one storage account at the same time.
+        - name: --max-account-throughput-mb
+          type: float
+          short-summary: >
+            (Optional) Maximum combined throughput of the blob copies of one storage account, in MB/s. A copy waits to start
+            while the throughput measured on its accounts, plus what it is expected to add, is over the limit.
+        - name: --results-file
+          type: string
+          short-summary: (Optional) File to write one JSON line per finished copy to, as each copy completes.
+        - name: --strategy
+          type: string
+          short-summary: >
+            (Optional) How cross-region copies move data. 'blob' (default) copies the snapshot into a temporary
+            storage account and creates the disk from that blob. 'direct' creates an empty disk for upload and
+            copies the snapshot's populated pages straight into it, without a temporary storage account.
+        - name: --copy-engine
+          type: string
+          short-summary: >
+            (Optional) How blob data is copied. 'async' (default) starts a server-side copy of the whole blob.
+            'page-ranges' copies only the allocated pages of the source, in parallel, which is much faster for sparse disks.
+        - name: --progress-format
+          type: string
+          short-summary: >
+            (Optional) How copy progress is reported on stderr. 'text' (default) draws a progress bar with throughput
+            and ETA on a terminal. 'json' writes a JSON line per update and a final summary with per-phase timings. 'none' reports nothing.
+        - name: --trace-file
+          type: string
+          short-summary: >
+            (Optional) Write a trace of the command to this file: a span for every az call (with keys and SAS tokens
+            redacted, and process startup split from the remote call) and for every step of the copy.
+        - name: --trace-format
+          type: string
+          short-summary: (Optional) Format of --trace-file. 'chrome' (default) is the trace-event format of chrome://tracing and Perfetto. 'otlp' is OpenTelemetry JSON.
+    examples:
+        - name: Copy every disk in a resource group to another region
+          text: >
+            az disk copy-batch -g my-source-rg --target-resource-group my-remote-rg --max-workers 8 --results-file results.jsonl
+        - name: Copy the disks listed in a manifest
+          text: >
+            az disk copy-batch --manifest disks.json --target-resource-group my-remote-rg
+        - name: Copy the largest disks first, with at most 4 copies per storage account
+          text: >
+            az disk copy-batch -g my-source-rg --target-resource-group my-remote-rg --max-workers 16 --order largest-first --max-copies-per-account 4
+"""
+
+helps['vm copy-disks'] = """
+    type: command
+    short-summary: Copy all of a Virtual Machine's disks from snapshots taken at the same time
+    long-summary: >
+        Snapshots the OS disk and every data disk of a VM at once, so the copies are as close to crash-consistent
+        as separate snapshots allow, then copies them concurrently to the target resource group, in the same region or
+        across regions. The output is a manifest of the new disks, with each data disk's LUN and caching, for recreating the VM.
+    parameters:
+        - name: --name -n
+          type: string
+          short-summary: Name of the VM
+        - name: --resource-group -g
+          type: string
+          short-summary: Name of resource group of the VM
+        - name: --target-resource-group
+          type: string
+          short-summary: Name of resource group for the new disks
+        - name: --target-disk-name-prefix
+          type: string
+          short-summary: (Optional) Prefix for the names of the new disks, which otherwise have the names of the source disks
+        - name: --sku
+          type: string
+          short-summary: (Optional) Underlying storage SKU for the new disks. Uses the SKU of each source disk if not provided.
+        - name: --temp-storage-account
+          type: string
+          short-summary: (Optional) Temporary storage account to be used for cross-region copies. A pooled temp account in the target resource group is used (or created) if not provided.
+        - name: --manifest-file
+          type: string
+          short-summary: (Optional) File to write the manifest of the new disks to, as JSON
+        - name: --copy-engine
+          type: string
+          short-summary: >
+            (Optional) How blob data is copied across regions. 'async' (default) starts a server-side copy of each disk.
+            'page-ranges' copies only the allocated pages, in parallel.
+        - name: --resume
+          type: string
+          short-summary: (Optional) Id of an interrupted copy operation to continue
+        - name: --no-wait
+          type: bool
+          short-summary: >
+            (Optional) Return the copy operation's status once the server-side copies have started. Use `az disk copy wait`
+            to finish it and get the manifest.
+        - name: --verify
+          type: bool
+          short-summary: (Optional) Check each cross-region copy against its snapshot, range by range, before its disk is created
+        - name: --repair
+          type: bool
+          short-summary: (Optional) With --verify, copy the ranges that differ again
+        - name: --verify-manifest
+          type: string
+          short-summary: (Optional) With --verify, record the hash of every range of each copy in this JSON file
+        - name: --progress-format
+          type: string
+          short-summary: (Optional) How copy progress is reported on stderr. 'text' (default), 'json' or 'none'.
+        - name: --trace-file
+          type: string
+          short-summary: (Optional) Write a trace of the command's az calls and copy steps to this file
+        - name: --trace-format
+          type: string
+          short-summary: (Optional) Format of --trace-file. 'chrome' (default) or 'otlp'.
+    examples:
+        - name: Copy a VM's disks to another region, then recreate the VM from them
+          text: >
+            az vm copy-disks -n myvm -g my-source-rg --target-resource-group my-remote-rg --manifest-file myvm.json
+
+            az vm create -n myvm -g my-remote-rg --attach-os-disk $(jq -r .osDisk.id myvm.json) --os-type $(jq -r .osType myvm.json) --size $(jq -r .vmSize myvm.json)
+
+            jq -r '.dataDisks[] | "\\(.id) \\(.lun) \\(.caching)"' myvm.json | while read id lun caching; do az vm disk attach -g my-remote-rg --vm-name myvm --name $id --lun $lun --caching $caching; done
+"""
+
+helps['disk copy'] = """
+    type: group
+    short-summary: Manage disk copies and the resources they use
+"""
+
+helps['disk copy cleanup'] = """
+    type: command
+    short-summary: Delete temporary resources left behind by failed copies
+    long-summary: >
+        A copy that fails removes its temporary snapshots, SAS grants and storage containers itself. This finds the
+        ones it couldn't remove, or that were left by a copy whose process was killed, by their disk-copy-temp tag, and
+        deletes them in parallel. Resources of copy operations journaled on this machine that can still be resumed,
+        and resources younger than --min-age-hours, are kept. So are snapshots with an active SAS and containers with a
+        copy in progress, unless --force is given.
+    parameters:
+        - name: --resource-group -g
+          type: string
+          short-summary: (Optional) Only clean up resources in this resource group
+        - name: --min-age-hours
+          type: float
+          short-summary: (Optional) How old a resource must be before it is deleted, so copies running elsewhere are left alone. Defaults to 1.
+        - name: --dry-run
+          type: bool
+          short-summary: (Optional) List the resources that would be deleted without deleting them
+        - name: --force
+          type: bool
+          short-summary: (Optional) Also delete snapshots that are still being read and containers with a copy in progress, which stops those copies
+    examples:
+        - name: List the temporary resources left behind in a resource group
+          text: >
+            az disk copy cleanup -g myResourceGroup --dry-run
+"""
+
+helps['disk copy prune-temp-storage'] = """
+    type: command
+    short-summary: Delete idle temporary storage accounts
+    long-summary: >
+        Cross-region copies share pooled temporary storage accounts, tagged disk-copy-pool, instead of creating
+        one per copy. This deletes pooled accounts that haven't been used for --idle-hours and have no copy in progress.
+    parameters:
+        - name: --resource-group -g
+          type: string
+          short-summary: (Optional) Only prune accounts in this resource group
+        - name: --idle-hours
+          type: float
+          short-summary: (Optional) How long an account must be unused before it is deleted. Defaults to 24.
+        - name: --dry-run
+          type: bool
+          short-summary: (Optional) List the accounts that would be deleted without deleting them
+    examples:
+        - name: Delete temp storage accounts that have been idle for a week
+          text: >
+            az disk copy prune-temp-storage --idle-hours 168
+"""
+
+helps['disk copy status'] = """
+    type: command
+    short-summary: Show the status of copy operations
+    long-summary: >
+        Without --id, lists the copy operations journaled on this machine, without calling Azure.
+        With --id, checks the server-side copy of a running operation once. If it has completed, the
+        remaining steps (creating the disk, revoking access, cleaning up) are run before returning.
+    parameters:
+        - name: --id
+          type: string
+          short-summary: (Optional) Id of the copy operation to check
+        - name: --trace-file
+          type: string
+          short-summary: >
+            (Optional) Write a trace of the command to this file: a span for every az call (with keys and SAS tokens
+            redacted, and process startup split from the remote call) and for every step of the copy.
+        - name: --trace-format
+          type: string
+          short-summary: (Optional) Format of --trace-file. 'chrome' (default) is the trace-event format of chrome://tracing and Perfetto. 'otlp' is OpenTelemetry JSON.
+    examples:
+        - name: List copy operations
+          text: >
+            az disk copy status -o table
+        - name: Check on a copy started with --no-wait, and finish it if the copy is done
+          text: >
+            az disk copy status --id 3f2a9c1b7d4e
+"""
+
+helps['disk copy wait'] = """
+    type: command
+    short-summary: Wait for a copy operation to finish
+    long-summary: >
+        Waits for the server-side copy of an operation started with --no-wait, or continues an interrupted
+        operation, then runs the remaining steps and returns the new disk or blob.
+    parameters:
+        - name: --id
+          type: string
+          short-summary: Id of the copy operation
+        - name: --progress-format
+          type: string
+          short-summary: >
+            (Optional) How copy progress is reported on stderr. 'text' (default) draws a progress bar with throughput
+            and ETA on a terminal. 'json' writes a JSON line per update and a final summary with per-phase timings. 'none' reports nothing.
+        - name: --trace-file
+          type: string
+          short-summary: >
+            (Optional) Write a trace of the command to this file: a span for every az call (with keys and SAS tokens
+            redacted, and process startup split from the remote call) and for every step of the copy.
+        - name: --trace-format
+          type: string
+          short-summary: (Optional) Format of --trace-file. 'chrome' (default) is the trace-event format of chrome://tracing and Perfetto. 'otlp' is OpenTelemetry JSON.
+    examples:
+        - name: Start a copy in the background and wait for it later
+          text: >
+            az disk copy-to-disk -n mydisk -g my-source-rg --target-resource-group my-remote-rg --no-wait --query id -o tsv
+
+            az disk copy wait --id 3f2a9c1b7d4e
+"""
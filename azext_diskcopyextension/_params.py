@@ -0,0 +1,116 @@
+from azure.cli.core.commands.parameters import get_enum_type
+
+
+def load_arguments(self, _):
+    for scope in ['storage blob copy-to-disk', 'disk copy-to-disk', 'storage blob copy-batch', 'disk copy-batch']:
+        with self.argument_context(scope) as c:
+            c.argument('results_file', options_list=['--results-file'])
+
+    for scope in ['disk copy-to-disk', 'disk copy-batch']:
+        with self.argument_context(scope) as c:
+            c.argument('strategy', options_list=['--strategy'], arg_type=get_enum_type(['blob', 'direct']))
+
+    for scope in ['storage blob copy-to-vhd', 'disk copy-to-vhd', 'disk copy-to-disk', 'disk copy-batch', 'vm copy-disks']:
+        with self.argument_context(scope) as c:
+            c.argument('copy_engine', options_list=['--copy-engine'], arg_type=get_enum_type(['async', 'page-ranges']))
+
+    for scope in ['storage blob copy-to-vhd', 'storage blob copy-to-disk', 'disk copy-to-vhd', 'disk copy-to-disk', 'vm copy-disks']:
+        with self.argument_context(scope) as c:
+            c.argument('resume', options_list=['--resume'])
+            c.argument('no_wait', options_list=['--no-wait'], action='store_true')
+        with self.argument_context(scope, arg_group='Verification') as c:
+            c.argument('verify', options_list=['--verify'], action='store_true')
+            c.argument('repair', options_list=['--repair'], action='store_true')
+            c.argument('verify_manifest', options_list=['--verify-manifest'])
+
+    for scope in ['storage blob copy-to-vhd', 'storage blob copy-to-disk', 'disk copy-to-vhd', 'disk copy-to-disk',
+                  'storage blob copy-batch', 'disk copy-batch', 'disk copy wait', 'vm copy-disks']:
+        with self.argument_context(scope) as c:
+            c.argument('progress_format', options_list=['--progress-format'], arg_type=get_enum_type(['text', 'json', 'none']))
+
+    for scope in ['storage blob copy-to-vhd', 'storage blob copy-to-disk', 'disk copy-to-vhd', 'disk copy-to-disk',
+                  'storage blob copy-batch', 'disk copy-batch', 'disk copy status', 'disk copy wait', 'vm copy-disks']:
+        with self.argument_context(scope, arg_group='Tracing') as c:
+            c.argument('trace_file', options_list=['--trace-file'])
+            c.argument('trace_format', options_list=['--trace-format'], arg_type=get_enum_type(['chrome', 'otlp']))
+
+    for scope in ['storage blob copy-batch', 'disk copy-batch']:
+        with self.argument_context(scope) as c:
+            c.argument('manifest_file', options_list=['--manifest'])
+            c.argument('max_workers', options_list=['--max-workers'], type=int)
+            c.argument('target_disk_sku', options_list=['--sku'], arg_type=get_enum_type(['Premium_LRS', 'Standard_LRS']))
+            c.argument('temp_storage_account_name', options_list=['--temp-storage-account'])
+        with self.argument_context(scope, arg_group='Scheduling') as c:
+            c.argument('order', options_list=['--order'], arg_type=get_enum_type(['manifest', 'largest-first', 'shortest-first']))
+            c.argument('max_copies_per_account', options_list=['--max-copies-per-account'], type=int)
+            c.argument('max_account_throughput_mb', options_list=['--max-account-throughput-mb'], type=float)
+    with self.argument_context('storage blob copy-batch') as c:
+        c.argument('target_resource_group_name', options_list=['--resource-group', '-g'])
+    with self.argument_context('disk copy-batch') as c:
+        c.argument('source_resource_group_name', options_list=['--source-resource-group', '-g'])
+        c.argument('target_resource_group_name', options_list=['--target-resource-group'])
+
+    with self.argument_context('disk copy prune-temp-storage') as c:
+        c.argument('resource_group_name', options_list=['--resource-group', '-g'])
+        c.argument('idle_hours', options_list=['--idle-hours'], type=float)
+        c.argument('dry_run', options_list=['--dry-run'], action='store_true')
+    with self.argument_context('disk copy cleanup') as c:
+        c.argument('resource_group_name', options_list=['--resource-group', '-g'])
+        c.argument('min_age_hours', options_list=['--min-age-hours'], type=float)
+        c.argument('dry_run', options_list=['--dry-run'], action='store_true')
+        c.argument('force', options_list=['--force'], action='store_true')
+    for scope in ['disk copy status', 'disk copy wait']:
+        with self.argument_context(scope) as c:
+            c.argument('operation_id', options_list=['--id'])
+
+    with self.argument_context('storage blob copy-to-vhd') as c:
+        c.argument('source_vhd_uri', options_list=['--source-uri', '-u'])
+    with self.argument_context('storage blob copy-to-vhd', arg_group='Destination VHD') as c:
+        c.argument('target_storage_account_name', options_list=['--account-name'])
+        c.argument('target_storage_container_name', options_list=['--destination-container', '-c'])
+        c.argument('target_vhd_name', options_list=['--destination-blob', '-b'])
+    
+    with self.argument_context('storage blob copy-to-disk') as c:
+        c.argument('source_vhd_uri', options_list=['--source-uri', '-u'])
+    with self.argument_context('storage blob copy-to-disk', arg_group='Temporary Storage Account') as c:
+        c.argument('temp_storage_account_name', options_list=['--temp-storage-account'])
+    with self.argument_context('storage blob copy-to-disk', arg_group='Destination Disk') as c:
+        c.argument('target_resource_group_name', options_list=['--resource-group', '-g'])
+        c.argument('target_disk_name', options_list=['--disk-name', '-n'])
+        c.argument('target_disk_sku', options_list=['--sku'], arg_type=get_enum_type(['Premium_LRS', 'Standard_LRS']))
+
+    with self.argument_context('disk copy-to-vhd') as c:
+        c.argument('source_resource_group_name', options_list=['--source-resource-group', '-g'])
+        c.argument('source_disk_name', options_list=['--source-disk-name', '-n'])
+    with self.argument_context('disk copy-to-vhd', arg_group='Destination VHD') as c:
+        c.argument('target_storage_account_name', options_list=['--account-name'])
+        c.argument('target_storage_container_name', options_list=['--destination-container', '-c'])
+        c.argument('target_vhd_name', options_list=['--destination-blob', '-b'])
+
+    with self.argument_context('disk copy-to-disk') as c:
+        c.argument('source_resource_group_name', options_list=['--source-resource-group', '-g'])
+        c.argument('source_disk_name', options_list=['--source-disk-name', '-n'])
+    with self.argument_context('disk copy-to-disk', arg_group='Temporary Storage Account') as c:
+        c.argument('temp_storage_account_name', options_list=['--temp-storage-account'])
+    with self.argument_context('disk copy-to-disk', arg_group='Incremental Copy') as c:
+        c.argument('incremental', options_list=['--incremental'], action='store_true')
+        c.argument('delta_threshold_mb', options_list=['--delta-threshold-mb'], type=int)
+        c.argument('max_passes', options_list=['--max-passes'], type=int)
+        c.argument('no_finalize', options_list=['--no-finalize'], action='store_true')
+    with self.argument_context('disk copy-to-disk', arg_group='Destination Disk') as c:
+        c.argument('target_resource_group_name', options_list=['--target-resource-group'])
+        c.argument('target_resource_group_names', options_list=['--target-resource-groups'], nargs='+')
+        c.argument('chain', options_list=['--chain'], action='store_true')
+        c.argument('target_disk_name', options_list=['--target-disk-name'])
+        c.argument('target_disk_sku', options_list=['--sku'], arg_type=get_enum_type(['Premium_LRS', 'Standard_LRS']))
+
+    with self.argument_context('vm copy-disks') as c:
+        c.argument('resource_group_name', options_list=['--resource-group', '-g'])
+        c.argument('vm_name', options_list=['--name', '-n'])
+        c.argument('manifest_file', options_list=['--manifest-file'])
+    with self.argument_context('vm copy-disks', arg_group='Temporary Storage Account') as c:
+        c.argument('temp_storage_account_name', options_list=['--temp-storage-account'])
+    with self.argument_context('vm copy-disks', arg_group='Destination Disks') as c:
+        c.argument('target_resource_group_name', options_list=['--target-resource-group'])
+        c.argument('target_disk_name_prefix', options_list=['--target-disk-name-prefix'])
+        c.argument('target_disk_sku', options_list=['--sku'], arg_type=get_enum_type(['Premium_LRS', 'Standard_LRS']))
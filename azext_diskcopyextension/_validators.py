@@ -1,5 +1,5 @@
-from knack.util import CLIError
-
-def validate_copy_vhd_to_disk():
-  #TODO: move up-front validation code here
-  pass
\ No newline at end of file
+def validate_copy_vhd_to_disk(namespace):
+  # custom.py is loaded to run the command anyway
+  from .custom import copy_verifier, target_disk_name_for_blob
+  copy_verifier(namespace.verify, namespace.repair, namespace.verify_manifest)
+  namespace.target_disk_name = target_disk_name_for_blob(namespace.source_vhd_uri, namespace.target_disk_name)
\ No newline at end of file
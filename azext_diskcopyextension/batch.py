@@ -0,0 +1,148 @@
+import csv
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .pipeline import cancelled_by
+from .scheduler import ORDER_LARGEST_FIRST, ORDER_MANIFEST
+from .tracing import current_span, span
+
+logger = get_logger(__name__)
+
+def load_manifest(manifest_file):
+  """Read a list of copy entries from a JSON array or a CSV file with a header row."""
+  try:
+    with open(manifest_file) as f:
+      if manifest_file.lower().endswith('.csv'):
+        entries = [dict((k.strip(), v.strip()) for k, v in row.items() if k and v) for row in csv.DictReader(f)]
+      else:
+        entries = json.load(f)
+  except (IOError, OSError, ValueError) as ex:
+    raise CLIError('Unable to read manifest {0}: {1}'.format(manifest_file, ex))
+
+  if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+    raise CLIError('Manifest {0} must contain a list of copy entries'.format(manifest_file))
+  return entries
+
+class ResultsWriter(object):
+  """Appends one JSON line per finished copy, so partial batches still leave a usable results file."""
+
+  def __init__(self, results_file=None):
+    self.results_file = results_file
+    self._lock = threading.Lock()
+    if results_file:
+      open(results_file, 'w').close()
+
+  def write(self, result):
+    if not self.results_file:
+      return
+    with self._lock:
+      with open(self.results_file, 'a') as f:
+        f.write(json.dumps(result) + '\n')
+
+class CopyJob(object):
+  """A single copy in a batch. `run` performs the copy and returns the new resource.
+
+  `measure` returns the bytes the copy moves between regions and its (source region, target region) route, which
+  rank the job when the batch isn't run in manifest order. It's only called then.
+  """
+
+  def __init__(self, source, target, run, measure=None):
+    self.source = source
+    self.target = target
+    self.run = run
+    self.measure = measure
+    self.size = None
+    self.route = (None, None)
+
+def measure_jobs(jobs, max_workers):
+  def _measure(job):
+    try:
+      job.size, job.route = job.measure()
+    except Exception as ex:  # pylint: disable=broad-except
+      # the copy reports the problem itself, the job just isn't ranked by its size
+      logger.debug('Unable to size %s: %s', job.source, ex)
+
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    list(executor.map(_measure, [job for job in jobs if job.measure is not None]))
+
+def run_batch(jobs, max_workers=4, results_file=None, order=ORDER_MANIFEST, estimate=None):
+  """Run the jobs, `max_workers` at a time, and return a result per job in the order they finished.
+
+  With an `order` other than manifest, each worker takes the pending job with the largest (or smallest)
+  `estimate(size, route)` seconds, re-estimated every time from the copy throughput observed so far. Running the
+  longest copies first keeps one long copy from starting last and running alone, which shortens the whole batch.
+  Running the shortest first finishes the most copies soonest.
+  """
+  if max_workers < 1:
+    raise CLIError('--max-workers must be at least 1')
+
+  writer = ResultsWriter(results_file)
+  results = []
+  batch_span = current_span()
+  pending = list(jobs)
+  lock = threading.Lock()
+  cancelled = threading.Event()
+  estimate = estimate or (lambda size, route: size)
+  if order != ORDER_MANIFEST:
+    measure_jobs(jobs, max_workers)
+
+  def _run(job):
+    start = time.time()
+    result = {'source': job.source, 'target': job.target}
+    try:
+      with span(job.source, 'job', parent=batch_span, target=job.target):
+        resource = job.run()
+      result['status'] = 'succeeded'
+      result['target'] = (resource or {}).get('id') or job.target
+    except Exception as ex:  # pylint: disable=broad-except
+      logger.error('Copy of %s failed: %s', job.source, ex)
+      result['status'] = 'failed'
+      result['error'] = str(ex)
+    result['durationSeconds'] = round(time.time() - start, 1)
+    return result
+
+  def _next_job():
+    with lock:
+      if not pending or cancelled.is_set():
+        return None
+      job = pending[0]
+      if order != ORDER_MANIFEST:
+        rank = max if order == ORDER_LARGEST_FIRST else min
+        job = rank(pending, key=lambda job: estimate(job.size or 0, job.route))
+      pending.remove(job)
+      return job
+
+  def _work():
+    with cancelled_by(cancelled):
+      job = _next_job()
+      while job is not None:
+        result = _run(job)
+        writer.write(result)
+        with lock:
+          results.append(result)
+        job = _next_job()
+
+  logger.info('Copying %d items with %d workers', len(jobs), max_workers)
+  executor = ThreadPoolExecutor(max_workers=max_workers)
+  workers = [executor.submit(_work) for _ in range(min(max_workers, len(jobs)))]
+  try:
+    for future in workers:
+      future.result()
+  except KeyboardInterrupt:
+    # The copies in flight stop waiting and are left to resume from their journals, and no more jobs are taken
+    cancelled.set()
+    for future in workers:
+      future.cancel()
+    executor.shutdown(wait=False)
+    raise
+  executor.shutdown()
+
+  failed = [result for result in results if result['status'] == 'failed']
+  if failed:
+    logger.warning('%d of %d copies failed', len(failed), len(results))
+  return results
@@ -0,0 +1,348 @@
+import base64
+import datetime
+import email.utils
+import hashlib
+import hmac
+import os
+import threading
+import xml.etree.ElementTree as ElementTree
+
+try:
+  from urllib.parse import quote, unquote, urlparse
+except ImportError:
+  from urllib import quote, unquote
+  from urlparse import urlparse
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .retry import classify_error, parse_retry_after, retry_policy
+from .tracing import span
+
+logger = get_logger(__name__)
+
+BLOB_CLIENT_ENV = 'AZURE_DISKCOPY_BLOB_CLIENT'
+BLOB_ENDPOINT_ENV = 'AZURE_DISKCOPY_BLOB_ENDPOINT'
+BLOB_CLIENT_REST = 'rest'
+BLOB_CLIENT_CLI = 'cli'
+STORAGE_API_VERSION = '2019-12-12'
+DEFAULT_ENDPOINT = 'https://{account}.blob.core.windows.net'
+# Copies wait on blobs from one monitor thread, but page-range copies and batches hit an account from many threads
+POOL_MAXSIZE = 32
+
+def use_rest_client():
+  """Whether blob operations go through the pooled REST client rather than one `az storage` call each."""
+  value = os.environ.get(BLOB_CLIENT_ENV, BLOB_CLIENT_REST).lower()
+  if value not in (BLOB_CLIENT_REST, BLOB_CLIENT_CLI):
+    raise CLIError('Unknown blob client {0}. Expected one of: {1}, {2}'.format(value, BLOB_CLIENT_CLI, BLOB_CLIENT_REST))
+  return value == BLOB_CLIENT_REST
+
+def account_endpoint(account_name):
+  # The override points every account at one local emulator, path style: http://127.0.0.1:10000/{account}
+  return os.environ.get(BLOB_ENDPOINT_ENV, DEFAULT_ENDPOINT).rstrip('/').format(account=account_name)
+
+def new_session(pool_maxsize=POOL_MAXSIZE):
+  """An HTTP session that keeps up to `pool_maxsize` connections per host alive, for the blob REST clients."""
+  # requests ships with azure-cli
+  import requests
+  session = requests.Session()
+  adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+  session.mount('https://', adapter)
+  session.mount('http://', adapter)
+  return session
+
+def with_query(url, query):
+  return '{0}{1}{2}'.format(url, '&' if '?' in url else '?', query)
+
+def send_request(session, method, url, headers, expected=(200, 201), idempotent=True, stream=False):
+  """Send a storage REST request, retrying throttled and transient failures like an az call. Returns the response.
+
+  With `stream`, the body of a successful response is left unread for the caller to iterate.
+  """
+  attempt = 0
+  while True:
+    try:
+      response = session.request(method, url, headers=headers() if callable(headers) else headers, stream=stream)
+      failure = None if response.status_code in expected else 'Status code: {0} {1}'.format(
+        response.status_code, response.headers.get('x-ms-error-code', ''))
+    except IOError as ex:
+      # requests' connection errors and timeouts
+      response, failure = None, 'ConnectionError: {0}'.format(ex)
+    if failure is None or not retry_policy.should_retry(classify_error(failure), attempt, idempotent):
+      break
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    delay = retry_policy.delay(attempt, parse_retry_after('Retry-After: {0}'.format(retry_after)) if retry_after else None)
+    attempt += 1
+    logger.debug('%s %s failed (%s), retrying in %.1fs', method, url.split('?')[0], failure, delay)
+    retry_policy.sleep(delay)
+
+  if response is None:
+    raise CLIError('{0} {1} failed: {2}'.format(method, url.split('?')[0], failure))
+  if response.status_code not in expected:
+    raise CLIError('{0} {1} failed with {2} {3}: {4}'.format(
+      method, url.split('?')[0], response.status_code, response.headers.get('x-ms-error-code', ''), response.text[:500]))
+  return response
+
+def iso_time(http_date):
+  """Convert an HTTP date header into the ISO 8601 form `az storage` prints."""
+  if not http_date:
+    return None
+  timestamp = email.utils.mktime_tz(email.utils.parsedate_tz(http_date))
+  return datetime.datetime.utcfromtimestamp(timestamp).isoformat() + '+00:00'
+
+def _copy_properties(get):
+  """The `properties.copy` of a blob, from a lookup of copy headers or listing elements by their name without `x-ms-copy-`."""
+  if not get('id'):
+    return None
+  return {
+    'id': get('id'),
+    'source': get('source'),
+    'status': get('status'),
+    'progress': get('progress'),
+    'statusDescription': get('status-description'),
+    'completionTime': iso_time(get('completion-time')),
+  }
+
+class StorageAccountClient(object):
+  """Blob service REST client for one storage account, authorized with the account key or a SAS token.
+
+  Requests share one pooled HTTP session, so successive calls reuse connections instead of starting an az
+  process and a TLS handshake each. Results are shaped like the output of the `az storage` command they
+  replace, so callers work with either.
+  """
+
+  def __init__(self, account_name, account_key=None, sas_token=None, endpoint=None):
+    if not account_key and not sas_token:
+      raise CLIError('Storage account {0} needs a key or a SAS token'.format(account_name))
+    self.account_name = account_name
+    self.account_key = account_key
+    self.sas_token = sas_token.lstrip('?') if sas_token else None
+    self.endpoint = endpoint or account_endpoint(account_name)
+    self._session = None
+    self._session_lock = threading.Lock()
+
+  @property
+  def session(self):
+    if self._session is None:
+      with self._session_lock:
+        if self._session is None:
+          self._session = new_session()
+    return self._session
+
+  def close(self):
+    if self._session is not None:
+      self._session.close()
+      self._session = None
+
+  def url(self, container=None, blob=None):
+    url = self.endpoint
+    if container:
+      url += '/' + quote(container, safe='')
+    if blob:
+      url += '/' + quote(blob, safe='/')
+    return url
+
+  def blob_url(self, container, blob):
+    return self.url(container, blob)
+
+  # Authorization
+
+  def _canonicalized_resource(self, url):
+    parsed = urlparse(url)
+    resource = '/{0}{1}'.format(self.account_name, parsed.path or '/')
+    query = {}
+    for pair in parsed.query.split('&') if parsed.query else []:
+      name, _, value = pair.partition('=')
+      query.setdefault(unquote(name).lower(), []).append(unquote(value))
+    for name in sorted(query):
+      resource += '\n{0}:{1}'.format(name, ','.join(sorted(query[name])))
+    return resource
+
+  def sign(self, method, url, headers):
+    """The SharedKey Authorization header for a request."""
+    lowered = dict((name.lower(), str(value).strip()) for name, value in headers.items())
+    content_length = lowered.get('content-length', '')
+    string_to_sign = '\n'.join([
+      method,
+      lowered.get('content-encoding', ''),
+      lowered.get('content-language', ''),
+      '' if content_length == '0' else content_length,
+      lowered.get('content-md5', ''),
+      lowered.get('content-type', ''),
+      '',  # Date, x-ms-date is used instead
+      lowered.get('if-modified-since', ''),
+      lowered.get('if-match', ''),
+      lowered.get('if-none-match', ''),
+      lowered.get('if-unmodified-since', ''),
+      lowered.get('range', ''),
+    ]) + '\n'
+    string_to_sign += ''.join('{0}:{1}\n'.format(name, lowered[name]) for name in sorted(lowered) if name.startswith('x-ms-'))
+    string_to_sign += self._canonicalized_resource(url)
+    return 'SharedKey {0}:{1}'.format(self.account_name, self._hmac(string_to_sign))
+
+  def _hmac(self, string_to_sign):
+    digest = hmac.new(base64.b64decode(self.account_key), string_to_sign.encode('utf-8'), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+  def _request(self, operation, method, container=None, blob=None, query=None, headers=None, expected=(200, 201), idempotent=True):
+    url = self.url(container, blob)
+    if query:
+      url = with_query(url, '&'.join('{0}={1}'.format(name, quote(str(value), safe='')) for name, value in query))
+    if self.sas_token and not self.account_key:
+      url = with_query(url, self.sas_token)
+
+    def _headers():
+      # signed again on every attempt, a retry must not reuse a stale x-ms-date
+      request_headers = {
+        'x-ms-version': STORAGE_API_VERSION,
+        'x-ms-date': email.utils.formatdate(usegmt=True),
+      }
+      request_headers.update(headers or {})
+      if method in ('PUT', 'DELETE') and 'Content-Length' not in request_headers:
+        request_headers['Content-Length'] = '0'
+      if self.account_key:
+        request_headers['Authorization'] = self.sign(method, url, request_headers)
+      return request_headers
+
+    with span('blob ' + operation, 'storage_rest', account=self.account_name):
+      return send_request(self.session, method, url, _headers, expected, idempotent)
+
+  # Containers
+
+  def create_container(self, container):
+    response = self._request('container create', 'PUT', container, query=[('restype', 'container')], expected=(201, 409))
+    if response.status_code == 409 and response.headers.get('x-ms-error-code') != 'ContainerAlreadyExists':
+      raise CLIError('Unable to create container {0} in {1}: {2}'.format(
+        container, self.account_name, response.headers.get('x-ms-error-code')))
+    return {'created': response.status_code == 201}
+
+  def delete_container(self, container):
+    response = self._request('container delete', 'DELETE', container, query=[('restype', 'container')], expected=(202, 404))
+    return {'deleted': response.status_code == 202}
+
+  def list_containers(self, prefix=None):
+    containers = []
+    for root in self._list_pages('container list', None, [('comp', 'list')], prefix):
+      for element in root.iter('Container'):
+        containers.append({
+          'name': element.findtext('Name'),
+          'properties': {'lastModified': iso_time(element.findtext('Properties/Last-Modified'))},
+        })
+    return containers
+
+  def _list_pages(self, operation, container, query, prefix=None):
+    marker = None
+    while True:
+      page_query = list(query) + ([('prefix', prefix)] if prefix else []) + ([('marker', marker)] if marker else [])
+      root = ElementTree.fromstring(self._request(operation, 'GET', container, query=page_query).content)
+      yield root
+      marker = root.findtext('NextMarker')
+      if not marker:
+        return
+
+  # Blobs
+
+  def get_blob_properties(self, container, blob):
+    headers = self._request('blob show', 'HEAD', container, blob).headers
+    return {
+      'name': blob,
+      'snapshot': None,
+      'properties': {
+        'blobType': headers.get('x-ms-blob-type'),
+        'contentLength': int(headers.get('Content-Length', 0)),
+        'lastModified': iso_time(headers.get('Last-Modified')),
+        'copy': _copy_properties(lambda name: headers.get('x-ms-copy-' + name)),
+      },
+    }
+
+  def list_blobs(self, container, prefix=None):
+    blobs = []
+    query = [('restype', 'container'), ('comp', 'list'), ('include', 'copy')]
+    for root in self._list_pages('blob list', container, query, prefix):
+      for element in root.iter('Blob'):
+        properties = element.find('Properties')
+        get = lambda name, properties=properties: properties.findtext(''.join(word.capitalize() for word in ('copy-' + name).split('-')))
+        blobs.append({
+          'name': element.findtext('Name'),
+          'snapshot': element.findtext('Snapshot'),
+          'properties': {
+            'blobType': properties.findtext('BlobType'),
+            'contentLength': int(properties.findtext('Content-Length') or 0),
+            'lastModified': iso_time(properties.findtext('Last-Modified')),
+            'copy': _copy_properties(get),
+          },
+        })
+    return blobs
+
+  def snapshot_blob(self, container, blob):
+    # each attempt would leave a snapshot behind, so only throttled requests are retried
+    headers = self._request('blob snapshot', 'PUT', container, blob, query=[('comp', 'snapshot')], idempotent=False).headers
+    return {'snapshot': headers.get('x-ms-snapshot'), 'lastModified': iso_time(headers.get('Last-Modified'))}
+
+  def delete_blob(self, container, blob, snapshot=None):
+    self._request('blob delete', 'DELETE', container, blob, query=[('snapshot', snapshot)] if snapshot else None, expected=(202,))
+
+  def start_copy(self, container, blob, source_url):
+    headers = self._request('blob copy start', 'PUT', container, blob, headers={'x-ms-copy-source': source_url},
+                            expected=(202,), idempotent=False).headers
+    return {'id': headers.get('x-ms-copy-id'), 'status': headers.get('x-ms-copy-status')}
+
+  def generate_blob_sas(self, container, blob, permissions, expiry, snapshot=None, https_only=True):
+    """A service SAS token for one blob or blob snapshot, signed locally with the account key."""
+    if not self.account_key:
+      raise CLIError('A SAS can only be generated with the key of storage account {0}'.format(self.account_name))
+    protocol = 'https' if https_only else ''
+    resource = 'bs' if snapshot else 'b'
+    string_to_sign = '\n'.join([
+      permissions, '', expiry,
+      '/blob/{0}/{1}/{2}'.format(self.account_name, container, blob),
+      '', '', protocol, STORAGE_API_VERSION, resource, snapshot or '',
+      '', '', '', '', '',
+    ])
+    fields = [('sv', STORAGE_API_VERSION), ('se', expiry), ('sp', permissions), ('spr', protocol), ('sr', resource),
+              ('sig', self._hmac(string_to_sign))]
+    return '&'.join('{0}={1}'.format(name, quote(value, safe='')) for name, value in fields if value)
+
+class StorageClientRegistry(object):
+  """One StorageAccountClient per storage account, kept for the rest of the az process.
+
+  A client holds its account's credentials, so a copy looks up each account key once. Accounts that are used
+  without a key have it looked up by `resolve_key(account_name)`, set by the caller with `set_key_resolver`.
+  """
+
+  def __init__(self, resolve_key=None):
+    self.resolve_key = resolve_key
+    self._clients = {}
+    self._lock = threading.Lock()
+
+  def get(self, account_name, account_key=None, sas_token=None):
+    with self._lock:
+      client = self._clients.get(account_name)
+    if client is not None and (account_key is None or client.account_key == account_key) and (sas_token is None or client.sas_token):
+      return client
+
+    if account_key is None and sas_token is None:
+      if self.resolve_key is None:
+        raise CLIError('No credentials for storage account {0}'.format(account_name))
+      account_key = self.resolve_key(account_name)
+    client = StorageAccountClient(account_name, account_key, sas_token)
+    with self._lock:
+      previous = self._clients.get(account_name)
+      if previous is not None and previous.account_key == client.account_key and previous.sas_token == client.sas_token:
+        return previous
+      self._clients[account_name] = client
+    if previous is not None:
+      previous.close()
+    return client
+
+  def clear(self):
+    with self._lock:
+      clients, self._clients = list(self._clients.values()), {}
+    for client in clients:
+      client.close()
+
+blob_clients = StorageClientRegistry()
+
+def set_key_resolver(resolve_key):
+  """Set how the account key of a storage account is found, given its name."""
+  blob_clients.resolve_key = resolve_key
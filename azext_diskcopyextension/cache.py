@@ -0,0 +1,167 @@
+import functools
+import json
+import os
+import threading
+import time
+
+from knack.log import get_logger
+
+logger = get_logger(__name__)
+
+CACHE_FILE_ENV = 'AZURE_DISKCOPY_CACHE_FILE'
+CACHE_TTL_ENV = 'AZURE_DISKCOPY_CACHE_TTL'
+DEFAULT_TTL = 300
+
+def cache_ttl():
+  """The TTL in seconds set with AZURE_DISKCOPY_CACHE_TTL, or the default if it isn't a number of seconds."""
+  value = os.environ.get(CACHE_TTL_ENV)
+  if value is None:
+    return DEFAULT_TTL
+  try:
+    ttl = int(value)
+    if ttl < 0:
+      raise ValueError(value)
+    return ttl
+  except ValueError:
+    logger.warning('Ignoring %s=%s, which is not a number of seconds. Using %d', CACHE_TTL_ENV, value, DEFAULT_TTL)
+    return DEFAULT_TTL
+
+class ResourceCache(object):
+  """TTL cache for resource lookups, optionally persisted to a JSON file between runs.
+
+  Entries are grouped by namespace ('disk', 'storage_account', ...) and keyed by the lookup arguments,
+  case-insensitively. Empty results are never cached, so a resource that doesn't exist yet is looked up again.
+  Without a `ttl`, it is read from AZURE_DISKCOPY_CACHE_TTL on first use.
+  """
+
+  def __init__(self, ttl=None, persist_file=None, clock=time.time):
+    self._ttl = ttl
+    self.persist_file = persist_file
+    self.clock = clock
+    self.hits = 0
+    self.misses = 0
+    self._entries = {}
+    self._secret_namespaces = set()
+    self._lock = threading.RLock()
+    self._loaded = False
+
+  @property
+  def ttl(self):
+    if self._ttl is None:
+      self._ttl = cache_ttl()
+    return self._ttl
+
+  @staticmethod
+  def _key(key):
+    if isinstance(key, (list, tuple)):
+      key = '/'.join(str(part) for part in key)
+    return str(key).lower()
+
+  def get(self, namespace, key, count=True):
+    """Return a (hit, value) tuple.
+
+    A lookup that checks again after waiting for another thread's listing passes `count=False`, so it's counted once.
+    """
+    key = self._key(key)
+    with self._lock:
+      self._load()
+      entry = self._entries.get(namespace, {}).get(key)
+      hit = entry is not None and entry[0] > self.clock()
+      if count:
+        if hit:
+          self.hits += 1
+        else:
+          self.misses += 1
+        logger.debug('Cache %s for %s %s (hits=%d, misses=%d)', 'hit' if hit else 'miss', namespace, key, self.hits, self.misses)
+      return (True, entry[1]) if hit else (False, None)
+
+  def set(self, namespace, key, value, persist=True):
+    self.set_many(namespace, [(key, value)], persist)
+
+  def set_many(self, namespace, items, persist=True):
+    """Cache (key, value) pairs, such as every resource of a listing, writing the persisted file once."""
+    with self._lock:
+      self._load()
+      if not persist:
+        self._secret_namespaces.add(namespace)
+      expires = self.clock() + self.ttl
+      entries = self._entries.setdefault(namespace, {})
+      changed = False
+      for key, value in items:
+        if value:
+          entries[self._key(key)] = (expires, value)
+          changed = True
+      if changed:
+        self._save()
+
+  def invalidate(self, namespace, key=None):
+    with self._lock:
+      self._load()
+      if key is None:
+        self._entries.pop(namespace, None)
+      else:
+        self._entries.get(namespace, {}).pop(self._key(key), None)
+      self._save()
+
+  def clear(self):
+    with self._lock:
+      self._load()
+      self._entries = {}
+      self._save()
+
+  def invalidate_resource(self, resource_id):
+    """Drop every entry whose value is the resource with this id, e.g. after deleting it."""
+    resource_id = resource_id.lower()
+    with self._lock:
+      self._load()
+      for entries in self._entries.values():
+        for key in [k for k, (_, value) in entries.items()
+                    if isinstance(value, dict) and str(value.get('id', '')).lower() == resource_id]:
+          logger.debug('Invalidating cached %s', key)
+          entries.pop(key)
+      self._save()
+
+  def cached(self, namespace, persist=True):
+    """Decorator that caches a lookup function by its positional arguments."""
+    def decorator(func):
+      @functools.wraps(func)
+      def wrapper(*args):
+        hit, value = self.get(namespace, args)
+        if hit:
+          return value
+        value = func(*args)
+        self.set(namespace, args, value, persist=persist)
+        return value
+      return wrapper
+    return decorator
+
+  def _load(self):
+    if self._loaded:
+      return
+    self._loaded = True
+    if not self.persist_file or not os.path.exists(self.persist_file):
+      return
+    try:
+      with open(self.persist_file) as f:
+        persisted = json.load(f)
+      now = self.clock()
+      for namespace, entries in persisted.items():
+        self._entries[namespace] = dict((key, tuple(entry)) for key, entry in entries.items() if entry[0] > now)
+      logger.debug('Loaded resource cache from %s', self.persist_file)
+    except (IOError, OSError, ValueError) as ex:
+      logger.warning('Ignoring unreadable resource cache %s: %s', self.persist_file, ex)
+
+  def _save(self):
+    if not self.persist_file:
+      return
+    persisted = dict((namespace, entries) for namespace, entries in self._entries.items()
+                     if namespace not in self._secret_namespaces)
+    temp_file = '{0}.{1}.tmp'.format(self.persist_file, os.getpid())
+    try:
+      with open(temp_file, 'w') as f:
+        json.dump(persisted, f)
+      os.replace(temp_file, self.persist_file)
+    except (IOError, OSError) as ex:
+      logger.warning('Unable to write resource cache %s: %s', self.persist_file, ex)
+
+resource_cache = ResourceCache(persist_file=os.environ.get(CACHE_FILE_ENV))
@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from knack.log import get_logger
+
+logger = get_logger(__name__)
+
+class _CleanupAction(object):
+  def __init__(self, key, description, func, requires, on_success):
+    self.key = key
+    self.description = description
+    self.func = func
+    self.requires = set(requires)
+    self.on_success = on_success
+
+class CleanupStack(object):
+  """Undo actions for the temporary resources of one copy operation, registered as each resource is created.
+
+  When the copy fails, `run` removes everything still registered. Actions run concurrently, except that a
+  resource is only cleaned up after the resources built on it (`requires`), so a snapshot's SAS is revoked
+  before the snapshot is deleted. A step that cleans up a resource itself `discard`s its action.
+  """
+
+  def __init__(self):
+    self._actions = {}
+    self._lock = threading.Lock()
+
+  def push(self, key, description, func, requires=(), on_success=None):
+    with self._lock:
+      self._actions[key] = _CleanupAction(key, description, func, requires, on_success)
+
+  def discard(self, key):
+    with self._lock:
+      self._actions.pop(key, None)
+
+  def __len__(self):
+    return len(self._actions)
+
+  def run(self):
+    """Clean up every registered resource. Returns the descriptions of those that couldn't be cleaned up."""
+    with self._lock:
+      actions, self._actions = list(self._actions.values()), {}
+    if not actions:
+      return []
+
+    logger.warning('Cleaning up %d temporary resources', len(actions))
+    finished = dict((action.key, threading.Event()) for action in actions)
+    failed = []
+
+    def _run(action):
+      try:
+        for other in actions:
+          if action.key in other.requires:
+            finished[other.key].wait()
+        action.func()
+        if action.on_success:
+          action.on_success()
+      except Exception as ex:  # pylint: disable=broad-except
+        # A failed cleanup mustn't hide the error that caused it, so it's reported and the rest carry on
+        logger.warning('Unable to clean up %s: %s', action.description, str(ex).strip().splitlines()[-1] if str(ex).strip() else ex)
+        failed.append(action.description)
+      finally:
+        finished[action.key].set()
+
+    # one thread per action, since an action can wait on others
+    with ThreadPoolExecutor(max_workers=len(actions)) as executor:
+      list(executor.map(_run, actions))
+    if failed:
+      logger.warning('Run `az disk copy cleanup` to remove the remaining temporary resources')
+    return failed
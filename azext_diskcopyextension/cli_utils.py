@@ -4,23 +4,202 @@
 # --------------------------------------------------------------------------------------------
 
 import json
+import os
 import sys
+import threading
+import time
 from subprocess import STDOUT, CalledProcessError, check_output
 
 from knack.log import get_logger
 from knack.util import CLIError
 
+from .retry import NON_IDEMPOTENT_COMMANDS, call_with_retry
+from .tracing import add_span, redact_argv, span
+
 logger = get_logger(__name__)
 
+CLI_BACKEND_ENV = 'AZURE_DISKCOPY_CLI_BACKEND'
+CLI_PREFIX = [sys.executable, '-m', 'azure.cli']
+CREATED_BY_TAG = 'created_by=disk-copy-extension'
+
+# Seconds an in-process command waits for the one running before it, before it runs in a subprocess instead
+LOCK_TIMEOUT = 1.0
+
+# Environment variables that map onto a CLI argument, so in-process calls don't need to touch os.environ
+ENV_ARGUMENTS = {
+  'AZURE_STORAGE_ACCOUNT': '--account-name',
+}
+
+class SubprocessCliBackend(object):
+  """Runs each command in a fresh `python -m azure.cli` interpreter."""
+  name = 'subprocess'
+
+  def __init__(self):
+    self._startup_lock = threading.Lock()
+    self._startup_overhead = None
+
+  def invoke(self, cmd, env=None):
+    if env is not None:
+      env = dict(os.environ, **env)
+    return check_output(cmd, stderr=STDOUT, universal_newlines=True, env=env)
+
+  def startup_overhead(self):
+    """Estimated seconds each call spends starting Python and loading the CLI, measured once with a call that does nothing remote."""
+    with self._startup_lock:
+      if self._startup_overhead is None:
+        start = time.time()
+        try:
+          check_output([sys.executable, '-c', 'from azure.cli.core import get_default_cli; get_default_cli()'], stderr=STDOUT)
+          self._startup_overhead = time.time() - start
+        except (CalledProcessError, OSError) as ex:
+          logger.debug('Unable to measure CLI startup: %s', ex)
+          self._startup_overhead = 0.0
+      return self._startup_overhead
+
+class InProcessCliBackend(object):
+  """Runs each command inside the already-loaded Azure CLI, skipping interpreter startup and imports.
+
+  The CLI isn't safe to invoke from several threads at once, so one in-process command runs at a time, under a lock.
+  A command waits up to `lock_timeout` seconds for the lock, about what starting an interpreter would cost, and then
+  runs in a `fallback` subprocess instead. Commands that need environment variables other than ENV_ARGUMENTS always
+  run in the fallback, so os.environ is never changed under the other threads.
+  """
+  name = 'inprocess'
+
+  def __init__(self, fallback=None, lock_timeout=LOCK_TIMEOUT):
+    self.fallback = fallback or SubprocessCliBackend()
+    self.lock_timeout = lock_timeout
+    self._lock = threading.Lock()
+    self._local = threading.local()
+
+  def startup_overhead(self):
+    # for the command this thread just ran
+    return self.fallback.startup_overhead() if getattr(self._local, 'fell_back', False) else 0.0
+
+  def invoke(self, cmd, env=None):
+    self._local.fell_back = True
+    if any(name not in ENV_ARGUMENTS for name in env or {}):
+      logger.debug('%s needs its own environment, running it in a subprocess', command_name(cmd))
+      return self.fallback.invoke(cmd, env)
+    if not self._lock.acquire(timeout=self.lock_timeout):
+      logger.debug('Another command is running in process, running %s in a subprocess', command_name(cmd))
+      return self.fallback.invoke(cmd, env)
+    self._local.fell_back = False
+    try:
+      return self._invoke_locked(cmd, env)
+    finally:
+      self._lock.release()
+
+  def _invoke_locked(self, cmd, env):
+    from azure.cli.core import get_default_cli
+
+    args = cmd[len(CLI_PREFIX):] if cmd[:len(CLI_PREFIX)] == CLI_PREFIX else list(cmd)
+    for name, value in (env or {}).items():
+      if ENV_ARGUMENTS[name] not in args:
+        args += [ENV_ARGUMENTS[name], value]
+
+    # keep the verbosity of the outer invocation, otherwise the nested CLI resets logging
+    args += [flag for flag in ('--verbose', '--debug') if flag in sys.argv and flag not in args]
+    return self._invoke(get_default_cli(), cmd, args)
+
+  @staticmethod
+  def _invoke(cli, cmd, args):
+    from io import StringIO
+    out_file = StringIO()
+    try:
+      exit_code = cli.invoke(args, out_file=out_file)
+    except SystemExit as ex:
+      exit_code = ex.code if isinstance(ex.code, int) else 1
+    output = out_file.getvalue()
+    if exit_code:
+      # errors are logged to stderr rather than written to out_file, so keep the exception for retries to classify
+      error = getattr(getattr(cli, 'result', None), 'error', None)
+      if error is not None:
+        output += _describe_error(error)
+      raise CalledProcessError(exit_code, cmd, output)
+    return output
+
+def _describe_error(error):
+  response = getattr(error, 'response', None)
+  status_code = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+  retry_after = (getattr(response, 'headers', None) or {}).get('Retry-After')
+  return 'ERROR: {0}{1}{2}'.format(error, '\nStatus code: {0}'.format(status_code) if status_code else '',
+                                   '\nRetry-After: {0}'.format(retry_after) if retry_after else '')
+
+CLI_BACKENDS = {
+  SubprocessCliBackend.name: SubprocessCliBackend,
+  InProcessCliBackend.name: InProcessCliBackend,
+}
+
+_cli_backend = None
+
+def create_cli_backend(name):
+  if name not in CLI_BACKENDS:
+    raise CLIError('Unknown CLI backend {0}. Expected one of: {1}'.format(name, ', '.join(sorted(CLI_BACKENDS))))
+
+  if name == InProcessCliBackend.name:
+    try:
+      import azure.cli.core  # pylint: disable=unused-variable
+    except ImportError:
+      logger.debug('azure.cli.core is not importable, falling back to the subprocess CLI backend')
+      return SubprocessCliBackend()
+  return CLI_BACKENDS[name]()
+
+def get_cli_backend():
+  global _cli_backend  # pylint: disable=global-statement
+  if _cli_backend is None:
+    _cli_backend = create_cli_backend(os.environ.get(CLI_BACKEND_ENV, InProcessCliBackend.name))
+    logger.debug('Using the %s CLI backend', _cli_backend.name)
+  return _cli_backend
+
+def set_cli_backend(backend):
+  """Select the backend used by az_cli. Accepts a backend name or any object with an invoke(cmd, env) method."""
+  global _cli_backend  # pylint: disable=global-statement
+  if backend is None or isinstance(backend, str):
+    backend = create_cli_backend(backend or InProcessCliBackend.name)
+  _cli_backend = backend
+  return backend
+
 def az_cli(cmd, env=None):
   cli_cmd = prepare_cli_command(cmd)
   json_cmd_output = run_cli_command(cli_cmd, env=env)
   return json_cmd_output
 
+def command_name(cmd):
+  args = cmd[len(CLI_PREFIX):] if cmd[:len(CLI_PREFIX)] == CLI_PREFIX else cmd
+  words = []
+  for arg in args:
+    if arg.startswith('-'):
+      break
+    words.append(arg)
+  return ' '.join(['az'] + words)
+
+def invoke_traced(backend, cmd, env=None):
+  """Invoke a command, recording a span with its redacted argv and outcome when tracing is enabled."""
+  with span(command_name(cmd), 'az_cli', argv=' '.join(redact_argv(cmd[len(CLI_PREFIX):])), backend=backend.name) as call:
+    try:
+      output = backend.invoke(cmd, env=env)
+    except CalledProcessError as ex:
+      if call is not None:
+        call.set('exitCode', ex.returncode)
+      raise
+  if call is not None:
+    # Split the call into starting the CLI and the remote call, so process startup doesn't hide in Azure's latency
+    startup = min(getattr(backend, 'startup_overhead', lambda: 0.0)(), call.duration)
+    call.set('exitCode', 0)
+    call.set('startupSeconds', round(startup, 3))
+    call.set('remoteSeconds', round(call.duration - startup, 3))
+    if startup:
+      add_span('startup', 'az_cli', call.start, call.start + startup, parent=call, estimated=True)
+      add_span('remote', 'az_cli', call.start + startup, call.end, parent=call)
+  return output
+
 # pylint: disable=inconsistent-return-statements
 def run_cli_command(cmd, return_as_json=True, empty_json_as_error=False, env=None):
     try:
-        cmd_output = check_output(cmd, stderr=STDOUT, universal_newlines=True, env=env)
+        name = command_name(cmd)
+        cmd_output = call_with_retry(lambda: invoke_traced(get_cli_backend(), cmd, env=env), name,
+                                     idempotent=name not in NON_IDEMPOTENT_COMMANDS)
         logger.debug('command: %s ended with output: %s', cmd, cmd_output)
 
         if return_as_json:
@@ -43,7 +222,7 @@ def run_cli_command(cmd, return_as_json=True, empty_json_as_error=False, env=Non
 
 
 def prepare_cli_command(cmd, output_as_json=True):
-    full_cmd = [sys.executable, '-m', 'azure.cli'] + cmd
+    full_cmd = CLI_PREFIX + cmd
 
     if output_as_json:
         full_cmd += ['--output', 'json']
@@ -52,13 +231,9 @@ def prepare_cli_command(cmd, output_as_json=True):
 
     # tag newly created resources, containers don't have tags
     if 'create' in cmd and ('container' not in cmd):
-        create_tags = True
-        for idx, arg in enumerate(cmd):
-            if arg == '--tags':
-                create_tags = False
-                cmd[idx+1] = cmd[idx+1] + ' created_by=disk-copy-extension'
-        
-        if not create_tags:
-            full_cmd += ['--tags', 'created_by=disk-copy-extension']
+        if '--tags' in cmd:
+            full_cmd.insert(len(CLI_PREFIX) + cmd.index('--tags') + 2, CREATED_BY_TAG)
+        else:
+            full_cmd += ['--tags', CREATED_BY_TAG]
 
     return full_cmd
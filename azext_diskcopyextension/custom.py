@@ -1,17 +1,66 @@
+import collections
+import datetime
+import functools
+import itertools
+import json
 import random
 import re
+import threading
 import time
 
+try:
+  from urllib.parse import quote
+except ImportError:
+  from urllib import quote
+
 from knack.log import get_logger
 from knack.util import CLIError
 
+from .batch import CopyJob, ResultsWriter, load_manifest, run_batch
+from .blob_client import blob_clients, set_key_resolver, use_rest_client
+from .cache import resource_cache
 from .cli_utils import az_cli
+from .cleanup import CleanupStack
+from .events import CopyCompletionNotifier
+from .journal import (STATUS_INTERRUPTED, STATUS_RUNNING, CopyJournal, OperationPending, active_journal, blocking, continue_operation,
+                      discard_cleanup, journaled, progress_reporter, register_cleanup, resuming)
+from .monitor import CopyMonitor
+from .page_blob import copy_page_ranges, copy_page_ranges_diff
+from .pipeline import Pipeline, cancellation
+from .polling import COPY_SUCCESS, CopyPoller
+from .preflight import Preflight
+from .scheduler import ORDER_MANIFEST, CopyScheduler, copy_key
+from .storage_pool import (TEMP_TAG, TempStorageAccountPool, container_has_pending_copies, delete_container, list_lease_containers,
+                           list_temp_accounts)
+from .tracing import traced
+from .verify import CopyVerifier
 
 logger = get_logger(__name__)
 blob_regex = re.compile('https://(?P<storage_account>.*).blob.core.windows.net/(?P<container>.*)/(?P<blob>.*)')
+disk_id_regex = re.compile('(?i)/subscriptions/[^/]+/resourceGroups/(?P<resource_group>[^/]+)/providers/Microsoft.Compute/disks/(?P<disk>[^/]+)$')
 # TODO: handle blob paths with slashes in the name
 file_regex = re.compile(r'(?P<filename>.*)\.(?P<extension>.*)')
-
+temp_snapshot_regex = re.compile(r'^snapshot_(?P<operation>[^_]+)')
+time_regex = re.compile(r'(?P<time>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})')
+source_disk_missing_error = '{0} does not exist in resource group {1}.'
+COPY_STRATEGY_BLOB = 'blob'
+COPY_STRATEGY_DIRECT = 'direct'
+COPY_STRATEGIES = [COPY_STRATEGY_BLOB, COPY_STRATEGY_DIRECT]
+COPY_ENGINE_ASYNC = 'async'
+COPY_ENGINE_PAGE_RANGES = 'page-ranges'
+COPY_ENGINES = [COPY_ENGINE_ASYNC, COPY_ENGINE_PAGE_RANGES]
+INCREMENTAL_TARGET_TAG = 'disk-copy-target'
+UPLOAD_DISK_STATES = ['ReadyToUpload', 'ActiveUpload']
+target_disk_exists_error = '{0} already exists in resource group {1}. Cannot overwrite an existing disk'
+storage_account_list_lock = threading.Lock()
+
+def temp_snapshot_name(suffix=None):
+  # Snapshots of a journaled copy are named after the operation, so a resumed copy reuses its snapshot instead of orphaning it
+  journal = active_journal()
+  name = 'snapshot_{0}'.format(journal.id if journal else random.randint(0, 100000))
+  return '{0}_{1}'.format(name, suffix) if suffix else name
+
+@resource_cache.cached('resource_group')
 def assert_resource_group(resource_group_name):
   logger.info('Retrieving details for resource group %s', resource_group_name)
   resource_group = az_cli(['group', 'show',
@@ -21,15 +70,51 @@ def assert_resource_group(resource_group_name):
   
   return resource_group
 
+def find_storage_account(storage_account_name):
+  hit, storage_account = resource_cache.get('storage_account', storage_account_name)
+  if hit:
+    return storage_account
+
+  # One listing answers later lookups for every account in the subscription, so concurrent misses wait for it
+  with storage_account_list_lock:
+    hit, storage_account = resource_cache.get('storage_account', storage_account_name, count=False)
+    if hit:
+      return storage_account
+
+    logger.info('Retrieving details for storage account %s', storage_account_name)
+    storage_accounts = az_cli(['storage', 'account', 'list']) or []
+    resource_cache.set_many('storage_account', [(account['name'], account) for account in storage_accounts])
+    return next((account for account in storage_accounts if account['name'] == storage_account_name), None)
+
 def assert_storage_account(storage_account_name):
-  logger.info('Retrieving details for storage account %s', storage_account_name)
-  storage_account = az_cli(['storage', 'account', 'list',
-                            '--query', "[?name=='{0}'] | [0]".format(storage_account_name)])
+  storage_account = find_storage_account(storage_account_name)
   if not storage_account:
     raise CLIError('Storage account {0} not found'.format(storage_account_name))
   
   return storage_account
 
+def list_disks(resource_group_name):
+  logger.info('Listing disks in resource group %s', resource_group_name)
+  return az_cli(['disk', 'list',
+                  '-g', resource_group_name]) or []
+
+def get_vm(resource_group_name, vm_name):
+  logger.info('Retrieving details for VM %s', vm_name)
+  vm = az_cli(['vm', 'show',
+                '-n', vm_name,
+                '-g', resource_group_name])
+  return vm
+
+def get_vm_disks(vm):
+  """The managed disks attached to a VM, as (lun, disk id, caching) tuples. The OS disk comes first, with a LUN of None."""
+  storage_profile = vm['storageProfile']
+  attached = [(None, storage_profile['osDisk'])] + [(disk['lun'], disk) for disk in sorted(storage_profile.get('dataDisks') or [], key=lambda disk: disk['lun'])]
+  unmanaged = [disk['name'] for _, disk in attached if not disk.get('managedDisk')]
+  if unmanaged:
+    raise CLIError('{0} has unmanaged disks ({1}). Copy their VHDs with `az storage blob copy-to-vhd`'.format(vm['name'], ', '.join(unmanaged)))
+  return [(lun, disk['managedDisk']['id'], disk.get('caching')) for lun, disk in attached]
+
+@resource_cache.cached('disk')
 def get_disk(resource_group_name, disk_name):
   logger.info('Retrieving details for disk %s', disk_name)
   disk = az_cli(['disk', 'show',
@@ -39,7 +124,9 @@ def get_disk(resource_group_name, disk_name):
 
 def create_blob_container(storage_account_name, container_name):
   logger.info('Creating container %s in storage account %s', container_name, storage_account_name)
-  
+  if use_rest_client():
+    return blob_clients.get(storage_account_name).create_container(container_name)
+
   env = {}
   env['AZURE_STORAGE_ACCOUNT'] = storage_account_name
   blob_container = az_cli(['storage', 'container', 'create',
@@ -53,6 +140,8 @@ def create_blob_snapshot(blob_uri):
   storage_account_name = blob_match.group('storage_account')
   storage_container = blob_match.group('container')
   blob_name = blob_match.group('blob')
+  if use_rest_client():
+    return blob_clients.get(storage_account_name).snapshot_blob(storage_container, blob_name)
 
   env = {}
   env['AZURE_STORAGE_ACCOUNT'] = storage_account_name
@@ -70,15 +159,28 @@ def create_snapshot_from_blob(snapshot_name, resource_group_name, blob_uri):
                       '--source', blob_uri])
   return snapshot
 
-def create_snapshot_from_disk(snapshot_name, resource_group_name, disk_name):
-  logger.info('Creating snapshot for %s', disk_name)
-  snapshot = az_cli(['snapshot', 'create',
-                      '-n', snapshot_name,
-                      '-g', resource_group_name,
-                      '--tags', 'disk-copy-temp',
-                      '--source', disk_name])
+def create_snapshot_from_disk(snapshot_name, resource_group_name, disk_name, incremental=False, extra_tags=None):
+  logger.info('Creating %ssnapshot for %s', 'incremental ' if incremental else '', disk_name)
+  cmd = ['snapshot', 'create',
+          '-n', snapshot_name,
+          '-g', resource_group_name,
+          '--tags', 'disk-copy-temp'] + (extra_tags or []) + [
+          '--source', disk_name]
+  if incremental:
+    cmd += ['--incremental', 'true']
+  snapshot = az_cli(cmd)
   return snapshot
 
+def find_incremental_base_snapshot(resource_group_name, source_disk_id, target_disk_id):
+  """Find the newest snapshot of the source disk that was last copied into the target disk."""
+  logger.info('Looking for the last snapshot copied to %s', target_disk_id)
+  snapshots = az_cli(['snapshot', 'list',
+                      '-g', resource_group_name,
+                      '--query', "[?tags.\"{0}\"=='{1}']".format(INCREMENTAL_TARGET_TAG, target_disk_id)]) or []
+  snapshots = [snapshot for snapshot in snapshots
+               if (snapshot.get('creationData') or {}).get('sourceResourceId', '').lower() == source_disk_id.lower()]
+  return max(snapshots, key=lambda snapshot: snapshot['timeCreated']) if snapshots else None
+
 def create_disk_from_snapshot(snapshot_id, resource_group_name, disk_name, disk_sku):
   logger.info('Creating Managed Disk from snapshot %s', snapshot_id)
   disk = az_cli(['disk', 'create',
@@ -86,6 +188,7 @@ def create_disk_from_snapshot(snapshot_id, resource_group_name, disk_name, disk_
                   '-g', resource_group_name,
                   '--sku', disk_sku,
                   '--source', snapshot_id])
+  resource_cache.set('disk', (resource_group_name, disk_name), disk)
   return disk
 
 def create_disk_from_blob(blob_uri, resource_group_name, disk_name, disk_sku):
@@ -95,12 +198,32 @@ def create_disk_from_blob(blob_uri, resource_group_name, disk_name, disk_sku):
                   '-g', resource_group_name,
                   '--sku', disk_sku,
                   '--source', blob_uri])
+  resource_cache.set('disk', (resource_group_name, disk_name), disk)
   return disk
 
-def create_or_use_storage_account(storage_account_name, resource_group_name):
-  logger.info('Retrieving details for storage account %s', storage_account_name)
-  storage_account = az_cli(['storage', 'account', 'list',
-                            '--query', "[?name=='{0}'] | [0]".format(storage_account_name)])
+def create_disk_for_upload(resource_group_name, disk_name, disk_sku, upload_size_bytes, os_type=None, hyper_v_generation=None):
+  logger.info('Creating empty Managed Disk %s for upload', disk_name)
+  cmd = ['disk', 'create',
+          '-n', disk_name,
+          '-g', resource_group_name,
+          '--sku', disk_sku,
+          '--for-upload',
+          '--upload-size-bytes', str(upload_size_bytes)]
+  if os_type:
+    cmd += ['--os-type', os_type]
+  if hyper_v_generation:
+    cmd += ['--hyper-v-generation', hyper_v_generation]
+  disk = az_cli(cmd)
+  resource_cache.set('disk', (resource_group_name, disk_name), disk)
+  return disk
+
+def get_upload_size_bytes(disk):
+  # Managed disks are exported as fixed VHDs: the disk contents plus a 512 byte footer
+  disk_size_bytes = disk.get('diskSizeBytes') or disk['diskSizeGb'] * 1024 ** 3
+  return disk_size_bytes + 512
+
+def create_or_use_storage_account(storage_account_name, resource_group_name, extra_tags=None):
+  storage_account = find_storage_account(storage_account_name)
   if storage_account:
     return storage_account
 
@@ -110,8 +233,9 @@ def create_or_use_storage_account(storage_account_name, resource_group_name):
                             '-g', resource_group_name,
                             '--sku', 'Standard_LRS',
                             '--https-only', 'true',
-                            '--tags', 'disk-copy-temp',
+                            '--tags', TEMP_TAG] + (extra_tags or []) + [
                             '--encryption-services', 'blob'])
+  resource_cache.set('storage_account', storage_account_name, storage_account)
   return storage_account
 
 def start_blob_copy(source_resource_group, source_storage_account_name, source_container, source_blob, source_snapshot, 
@@ -126,18 +250,27 @@ def start_blob_copy(source_resource_group, source_storage_account_name, source_c
   if destination_blob is None:
     destination_blob = source_blob
 
-  env = {}
-  env['AZURE_STORAGE_ACCOUNT'] = target_storage_account_name
-  blob_copy = az_cli(['storage', 'blob', 'copy', 'start',
-                        '--source-account-name', source_storage_account_name,
-                        '--source-account-key', source_storage_account_key,
-                        '--source-container', source_container,
-                        '--source-blob', source_blob,
-                        '--source-snapshot', source_snapshot,
-                        '--destination-container', destination_container,
-                        '--destination-blob', destination_blob], env=env)
-  return blob_copy
-
+  # Copies of a batch take turns on accounts that are at their copy or bandwidth cap
+  with copy_scheduler.starting(copy_key(target_storage_account_name, destination_container, destination_blob),
+                               source_storage_account_name, target_storage_account_name):
+    if use_rest_client():
+      # Copy Blob reads a private source through a SAS, signed here with the source key instead of passing the key on
+      source_sas_url = get_sas_for_blob(source_storage_account_name, source_storage_account_key, source_container, source_blob, 'r', source_snapshot)
+      return blob_clients.get(target_storage_account_name).start_copy(destination_container, destination_blob, source_sas_url)
+
+    env = {}
+    env['AZURE_STORAGE_ACCOUNT'] = target_storage_account_name
+    blob_copy = az_cli(['storage', 'blob', 'copy', 'start',
+                          '--source-account-name', source_storage_account_name,
+                          '--source-account-key', source_storage_account_key,
+                          '--source-container', source_container,
+                          '--source-blob', source_blob,
+                          '--source-snapshot', source_snapshot,
+                          '--destination-container', destination_container,
+                          '--destination-blob', destination_blob], env=env)
+    return blob_copy
+
+@resource_cache.cached('storage_account_key', persist=False)
 def get_storage_account_key(storage_account_rg, storage_account_name):
   logger.info('Retrieving storage account key for %s in resource group %s', storage_account_name, storage_account_rg)
   key = az_cli(['storage', 'account', 'keys', 'list',
@@ -145,21 +278,38 @@ def get_storage_account_key(storage_account_rg, storage_account_name):
                   '-n', storage_account_name])
   return key[0]['value']
 
-def start_blob_copy_with_sas(snapshot_blob_sas, blob_name, target_storage_account_name, target_storage_account_key, target_storage_container_name):
+def lookup_storage_account_key(storage_account_name):
+  storage_account = assert_storage_account(storage_account_name)
+  return get_storage_account_key(storage_account['resourceGroup'], storage_account_name)
+
+set_key_resolver(lookup_storage_account_key)
+
+def start_blob_copy_with_sas(snapshot_blob_sas, blob_name, target_storage_account_name, target_storage_account_key, target_storage_container_name,
+                             source_region=None):
+  """`source_region` is the region of a snapshot SAS, whose storage account isn't one of the subscription's."""
   logger.info('Copying snapshot to %s in %s', blob_name, target_storage_account_name)
-  blob_copy = az_cli(['storage', 'blob', 'copy', 'start',
-                        '--source-uri', snapshot_blob_sas,
-                        '-b', blob_name,
-                        '--account-name', target_storage_account_name,
-                        '--account-key', target_storage_account_key,
-                        '-c', target_storage_container_name])
-  return blob_copy
+  source_match = blob_regex.match(snapshot_blob_sas.split('?')[0])
+  with copy_scheduler.starting(copy_key(target_storage_account_name, target_storage_container_name, blob_name),
+                               source_match.group('storage_account') if source_match else None, target_storage_account_name, source_region):
+    if use_rest_client():
+      return blob_clients.get(target_storage_account_name, target_storage_account_key).start_copy(
+        target_storage_container_name, blob_name, snapshot_blob_sas)
+
+    blob_copy = az_cli(['storage', 'blob', 'copy', 'start',
+                          '--source-uri', snapshot_blob_sas,
+                          '-b', blob_name,
+                          '--account-name', target_storage_account_name,
+                          '--account-key', target_storage_account_key,
+                          '-c', target_storage_container_name])
+    return blob_copy
 
 def get_storage_blob(blob_uri):
   blob_match = blob_regex.match(blob_uri)
-  storage_account_name = blob_match.group('storage_account')
-  storage_container = blob_match.group('container')
-  blob_name = blob_match.group('blob')
+  return show_storage_blob(blob_match.group('storage_account'), blob_match.group('container'), blob_match.group('blob'))
+
+def show_storage_blob(storage_account_name, storage_container, blob_name):
+  if use_rest_client():
+    return blob_clients.get(storage_account_name).get_blob_properties(storage_container, blob_name)
 
   env = {}
   env['AZURE_STORAGE_ACCOUNT'] = storage_account_name
@@ -168,12 +318,116 @@ def get_storage_blob(blob_uri):
                   '-n', blob_name], env=env)
   return blob
 
+def list_storage_blobs(storage_account_name, storage_container, prefix=None):
+  if use_rest_client():
+    return blob_clients.get(storage_account_name).list_blobs(storage_container, prefix)
+
+  env = {}
+  env['AZURE_STORAGE_ACCOUNT'] = storage_account_name
+  cmd = ['storage', 'blob', 'list',
+          '-c', storage_container,
+          '--include', 'c']
+  if prefix:
+    cmd += ['--prefix', prefix]
+  return az_cli(cmd, env=env) or []
+
+def locate_storage_account(storage_account_name):
+  return (find_storage_account(storage_account_name) or {}).get('location')
+
+copy_completion = CopyCompletionNotifier()
+copy_scheduler = CopyScheduler(locate_storage_account)
+copy_monitor = CopyMonitor(show_storage_blob, list_storage_blobs, notifier=copy_completion, scheduler=copy_scheduler)
+temp_storage_pool = TempStorageAccountPool(create_or_use_storage_account)
+
+def get_sas_for_blob(storage_account_name, storage_account_key, container, blob_name, permissions, snapshot=None):
+  logger.info('Generating a SAS for %s in %s', blob_name, storage_account_name)
+  if use_rest_client():
+    client = blob_clients.get(storage_account_name, storage_account_key)
+    expiry = (datetime.datetime.utcnow() + datetime.timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    sas_url = '{0}?{1}'.format(client.blob_url(container, blob_name), client.generate_blob_sas(container, blob_name, permissions, expiry, snapshot))
+    return sas_url + ('&snapshot={0}'.format(quote(snapshot)) if snapshot else '')
+
+  expiry = (datetime.datetime.utcnow() + datetime.timedelta(days=1)).strftime('%Y-%m-%dT%H:%MZ')
+  sas = az_cli(['storage', 'blob', 'generate-sas',
+                '--account-name', storage_account_name,
+                '--account-key', storage_account_key,
+                '-c', container,
+                '-n', blob_name,
+                '--permissions', permissions,
+                '--expiry', expiry,
+                '--https-only'])
+  sas_url = 'https://{0}.blob.core.windows.net/{1}/{2}?{3}'.format(storage_account_name, container, blob_name, sas.lstrip('?'))
+  if snapshot:
+    sas_url += '&snapshot={0}'.format(quote(snapshot))
+  return sas_url
+
+def copy_blob_page_ranges(source_sas_url, target_storage_acct, target_container, target_blob_name, target_storage_acct_key=None):
+  """Copy a page blob with the page-range engine into a new blob, and return the new blob."""
+  if target_storage_acct_key is None:
+    target_storage_acct_key = get_storage_account_key(target_storage_acct['resourceGroup'], target_storage_acct['name'])
+  target_sas_url = get_sas_for_blob(target_storage_acct['name'], target_storage_acct_key, target_container, target_blob_name, 'rcw')
+  # Put Page From URL loads the target account like Copy Blob does, so the copy takes a slot within its caps
+  key = copy_key(target_storage_acct['name'], target_container, target_blob_name)
+  source_match = blob_regex.match(source_sas_url.split('?')[0])
+  copy_scheduler.admit(key, source_match.group('storage_account') if source_match else None, target_storage_acct['name'])
+  try:
+    stats = copy_page_ranges(source_sas_url, target_sas_url, create_target=True, progress=progress_reporter(target_blob_name))
+  finally:
+    copy_scheduler.finish(key)
+  logger.info('Copied %s bytes to %s, skipped %s empty bytes', stats['bytesCopied'], target_blob_name, stats['bytesSkipped'])
+  return show_storage_blob(target_storage_acct['name'], target_container, target_blob_name)
+
+def target_disk_name_for_blob(source_vhd_uri, target_disk_name=None):
+  """The disk to copy a VHD blob to: `target_disk_name`, or else the blob's file name without its extension."""
+  blob_match = blob_regex.match(source_vhd_uri or '')
+  if not blob_match:
+    raise CLIError('--source-uri did not match format of a blob URI')
+  if target_disk_name:
+    return target_disk_name
+  file_match = file_regex.match(blob_match.group('blob'))
+  return file_match.group('filename') if file_match else blob_match.group('blob')
+
+def copy_verifier(verify, repair, verify_manifest):
+  """The CopyVerifier for a command's --verify, --repair and --verify-manifest, or None without --verify."""
+  if not verify:
+    if repair or verify_manifest:
+      raise CLIError('--repair and --verify-manifest require --verify')
+    return None
+  return CopyVerifier(repair, verify_manifest)
+
+def verify_blob_copy(verifier, source_sas_url, storage_account_name, storage_account_key, container, blob_name, copied, source_id=None):
+  """Check a finished copy into a blob against its source when verifying, and return what the copy step returned."""
+  if verifier is not None:
+    target_sas_url = get_sas_for_blob(storage_account_name, storage_account_key or lookup_storage_account_key(storage_account_name), container,
+                                      blob_name, 'rw' if verifier.repair else 'r')
+    verifier.verify(target_sas_url.split('?')[0], source_sas_url, target_sas_url, source_id)
+  return copied
+
+def warn_nothing_to_verify(verifier, target_disk_name):
+  if verifier is not None:
+    logger.warning('Azure creates %s from a source in the same region, so there is no copy to verify', target_disk_name)
+
 def get_sas_for_snapshot(snapshot_id):
   logger.info('Granting access to snapshot %s', snapshot_id)
   sas = az_cli(['snapshot', 'grant-access', '--duration-in-seconds', '86400',
                 '--ids', snapshot_id])
   return sas['accessSas']
 
+def get_write_sas_for_disk(resource_group_name, disk_name):
+  logger.info('Granting write access to disk %s', disk_name)
+  sas = az_cli(['disk', 'grant-access', '--access-level', 'Write', '--duration-in-seconds', '86400',
+                '-n', disk_name,
+                '-g', resource_group_name])
+  return sas['accessSas']
+
+def revoke_sas_for_disk(resource_group_name, disk_name):
+  logger.info('Revoking access to disk %s', disk_name)
+  az_cli(['disk', 'revoke-access',
+          '-n', disk_name,
+          '-g', resource_group_name])
+  # Revoking write access finishes an upload and changes the disk state
+  resource_cache.invalidate('disk', (resource_group_name, disk_name))
+
 def revoke_sas_for_snapshot(snapshot_id):
   logger.info('Revoking access to snapshot %s', snapshot_id)
   az_cli(['snapshot', 'revoke-access',
@@ -187,24 +441,52 @@ def get_matching_disk_sku(source_storage_acct):
     disk_sku = 'Standard_LRS'
   return disk_sku
 
-def wait_for_blob_success(blob_uri):
-  # TODO: for very long running copies, it might be better to register a function + event grid listener, but this works to start
-  while True:
-    blob = get_storage_blob(blob_uri)
-    copy_status = blob['properties']['copy']['status']
-    copy_progress = blob['properties']['copy']['progress']
-    logger.info('%s: Waiting for %s to copy. Current status is %s: %s', time.ctime(), blob['name'], copy_status, copy_progress)
-   
-    if copy_status == 'success':
-      break
-    time.sleep(5)
-  
-  return blob
+def wait_for_blob_success(blob_uri, poller=None):
+  # With AZURE_DISKCOPY_COPY_EVENTS, copy_completion wakes the monitor up as soon as Event Grid reports the copy
+  blob_match = blob_regex.match(blob_uri)
+  try:
+    if not blocking():
+      # --no-wait and `az disk copy status` look at the copy once, and leave it running if it isn't done
+      poller = poller or CopyPoller()
+      blob = get_storage_blob(blob_uri)
+      if poller.observe(blob) != COPY_SUCCESS:
+        percent = poller.percent_complete
+        raise OperationPending('Copy to {0} is {1}'.format(blob_uri, '{0:.1f}% complete'.format(percent) if percent is not None else 'pending'),
+                               {'blob': blob_uri, 'status': poller.status, 'bytesCopied': poller.copied, 'totalBytes': poller.total,
+                                'percentComplete': round(percent, 1) if percent is not None else None})
+      return blob
+    return copy_monitor.wait(blob_match.group('storage_account'), blob_match.group('container'), blob_match.group('blob'), poller,
+                             progress_reporter(blob_match.group('blob')), cancellation())
+  finally:
+    # The copy no longer counts against its accounts' caps once it's done, or this process stops waiting for it
+    copy_scheduler.finish(copy_key(blob_match.group('storage_account'), blob_match.group('container'), blob_match.group('blob')))
+
+def assert_server_side_copy(client_side, description):
+  """Page-range and incremental copies move the data from this process, so they can't be left running with --no-wait."""
+  if not client_side or blocking():
+    return
+  if resuming():
+    raise OperationPending('{0} copies run in the az process. Use `az disk copy wait` to continue it'.format(description))
+  raise CLIError('--no-wait is not supported for {0} copies'.format(description))
+
+def delete_snapshot(snapshot_id):
+  # Nothing after the delete needs the snapshot to be gone, so it isn't waited for
+  logger.info('Deleting snapshot %s', snapshot_id)
+  az_cli(['snapshot', 'delete', '--no-wait',
+          '--ids', snapshot_id])
+  resource_cache.invalidate_resource(snapshot_id)
 
-def delete_resource(resource_id):
-  logger.info('Deleting resource %s', resource_id)
-  az_cli(['resource', 'delete',
-          '--ids', resource_id])
+def delete_disk(resource_group_name, disk_name):
+  logger.info('Deleting disk %s', disk_name)
+  az_cli(['disk', 'delete', '--yes', '--no-wait',
+          '-n', disk_name,
+          '-g', resource_group_name])
+  resource_cache.invalidate('disk', (resource_group_name, disk_name))
+
+def delete_unfinished_upload(resource_group_name, disk_name):
+  # A disk can't be deleted while it's open for upload, and revoking write access closes it
+  revoke_sas_for_disk(resource_group_name, disk_name)
+  delete_disk(resource_group_name, disk_name)
 
 def delete_blob_snapshot(blob_uri, snapshot):
   logger.info('Deleting blob snapshot %s - %s', blob_uri, snapshot)
@@ -212,6 +494,9 @@ def delete_blob_snapshot(blob_uri, snapshot):
   storage_account_name = blob_match.group('storage_account')
   storage_container = blob_match.group('container')
   blob_name = blob_match.group('blob')
+  if use_rest_client():
+    blob_clients.get(storage_account_name).delete_blob(storage_container, blob_name, snapshot)
+    return
 
   env = {}
   env['AZURE_STORAGE_ACCOUNT'] = storage_account_name
@@ -224,241 +509,878 @@ def sameregion_copy_vhd_to_disk(source_vhd_uri, source_storage_acct, target_reso
   logger.info('Copying within the same region (%s)', source_storage_acct['location'])
 
   # Create a disk from a snapshot
-  snapshot_name = 'snapshot_{0}'.format(random.randint(0, 100000))
-  snapshot = create_snapshot_from_blob(snapshot_name, source_storage_acct['resourceGroup'], source_vhd_uri)
-  disk = create_disk_from_snapshot(snapshot['id'], target_resource_group_name, target_disk_name, target_disk_sku)
+  pipeline = Pipeline('sameregion_copy_vhd_to_disk')
+  snapshot_name = temp_snapshot_name()
+  pipeline.step('snapshot', lambda r: create_snapshot_from_blob(snapshot_name, source_storage_acct['resourceGroup'], source_vhd_uri),
+                cleanup=lambda r: delete_snapshot(r['snapshot']['id']))
+  pipeline.step('disk', lambda r: create_disk_from_snapshot(r['snapshot']['id'], target_resource_group_name, target_disk_name, target_disk_sku),
+                depends_on=['snapshot'])
 
   # Clean up snapshot
-  delete_resource(snapshot['id'])
+  pipeline.step('delete_snapshot', lambda r: delete_snapshot(r['snapshot']['id']), depends_on=['disk'], cleans_up=['snapshot'])
 
-  return disk
+  return pipeline.run()['disk']
 
 def crossregion_copy_vhd_to_disk(source_vhd_uri, blob_match, source_storage_acct, 
                                   target_rg, target_disk_name, target_disk_sku,
-                                  temp_storage_account_name=None):
+                                  temp_storage_account_name=None, verifier=None):
   logger.info('Performing a cross-region copy (%s to %s)', source_storage_acct['location'], target_rg['location'])
 
-  # Create a blob snapshot
-  blob_snapshot = create_blob_snapshot(source_vhd_uri)
-
-  # Use a temporary storage account to copy the snapshot
-  temp_storage_created = False
-  if temp_storage_account_name is None:
-    # TODO: reuse a temp storage account if one isn't specified & one already exists in the target RG. Use tags
-    temp_storage_account_name = 'diskcopytemp{0}'.format(random.randint(0, 100000))
-    temp_storage_created = True
-  temp_storage_acct = create_or_use_storage_account(temp_storage_account_name, target_rg['name'])
-  create_blob_container(temp_storage_account_name, blob_match.group('container'))
+  # The blob snapshot and the temp storage account don't depend on each other, so they're provisioned concurrently
+  pipeline = Pipeline('crossregion_copy_vhd_to_disk')
+  pipeline.step('blob_snapshot', lambda r: create_blob_snapshot(source_vhd_uri),
+                cleanup=lambda r: delete_blob_snapshot(source_vhd_uri, r['blob_snapshot']['snapshot']))
+  # Use a temporary storage account to copy the snapshot. Pooled accounts are shared, each copy gets its own container
+  pipeline.step('temp_storage', lambda r: temp_storage_pool.lease(target_rg['name'], target_rg['location'], temp_storage_account_name),
+                restore=temp_storage_pool.restore, cleanup=lambda r: r['temp_storage'].release())
+  pipeline.step('container', lambda r: create_blob_container(r['temp_storage'].account_name, r['temp_storage'].container),
+                depends_on=['temp_storage'])
 
   # Copy the blob across regions
-  start_blob_copy(source_storage_acct['resourceGroup'], source_storage_acct['name'], blob_match.group('container'), blob_match.group('blob'), blob_snapshot['snapshot'], temp_storage_account_name)
-  temp_blob_uri ='https://{0}.blob.core.windows.net/{1}/{2}'.format(temp_storage_account_name, blob_match.group('container'), blob_match.group('blob'))
-
-  # TODO: for very long running copies, it might be better to register a function + event grid listener, but this works to start
-  while True:
-    temp_blob = get_storage_blob(temp_blob_uri)
-    copy_status = temp_blob['properties']['copy']['status']
-    copy_progress = temp_blob['properties']['copy']['progress']
-    logger.info('%s: Waiting for %s to copy. Current status is %s: %s', time.ctime(), temp_blob['name'], copy_status, copy_progress)
-    if copy_status == 'success':
-      break
-    time.sleep(5)
-  # TODO: Cleanup storage accounts and snapshots
-  # Create a disk from the temporary blob
-  disk = create_disk_from_blob(temp_blob_uri, target_rg['name'], target_disk_name, target_disk_sku)
-
-  # Clean up blob snapshot
-  delete_blob_snapshot(source_vhd_uri, blob_snapshot['snapshot'])
-
-  # Clean up temp storage account if auto-created
-  if temp_storage_created:
-    delete_resource(temp_storage_acct['id'])
-
-  return disk
-
-def copy_vhd_to_vhd(source_vhd_uri, target_storage_account_name, target_storage_container_name, target_vhd_name):
+  pipeline.step('copy', lambda r: start_blob_copy(source_storage_acct['resourceGroup'], source_storage_acct['name'], blob_match.group('container'), blob_match.group('blob'), r['blob_snapshot']['snapshot'], r['temp_storage'].account_name, r['temp_storage'].container),
+                depends_on=['blob_snapshot', 'container'])
+  if verifier is None:
+    pipeline.step('wait', lambda r: wait_for_blob_success(r['temp_storage'].blob_uri(blob_match.group('blob'))), depends_on=['copy'])
+  else:
+    # Check the temp blob before the disk is created from it, while the ranges that differ can still be copied again
+    pipeline.step('source_sas', lambda r: get_sas_for_blob(source_storage_acct['name'], get_storage_account_key(source_storage_acct['resourceGroup'], source_storage_acct['name']),
+                                                           blob_match.group('container'), blob_match.group('blob'), 'r', r['blob_snapshot']['snapshot']),
+                  depends_on=['blob_snapshot'], persist=False)
+    pipeline.step('wait', lambda r: verify_blob_copy(verifier, r['source_sas'], r['temp_storage'].account_name, None, r['temp_storage'].container,
+                                                     blob_match.group('blob'), wait_for_blob_success(r['temp_storage'].blob_uri(blob_match.group('blob')))),
+                  depends_on=['copy', 'source_sas'])
+
+  # Create a disk from the temporary blob, and clean up the blob snapshot at the same time
+  pipeline.step('disk', lambda r: create_disk_from_blob(r['temp_storage'].blob_uri(blob_match.group('blob')), target_rg['name'], target_disk_name, target_disk_sku),
+                depends_on=['wait'])
+  pipeline.step('delete_blob_snapshot', lambda r: delete_blob_snapshot(source_vhd_uri, r['blob_snapshot']['snapshot']),
+                depends_on=['wait'], cleans_up=['blob_snapshot'])
+
+  # Hand the temp storage back once the disk no longer needs the blob
+  pipeline.step('release_temp_storage', lambda r: r['temp_storage'].release(), depends_on=['disk'], cleans_up=['temp_storage'])
+
+  return pipeline.run()['disk']
+
+@traced
+@journaled('storage blob copy-to-vhd')
+def copy_vhd_to_vhd(source_vhd_uri, target_storage_account_name, target_storage_container_name, target_vhd_name,
+                    copy_engine=COPY_ENGINE_ASYNC, verify=False, repair=False, verify_manifest=None, resume=None, no_wait=False,
+                    progress_format=None, trace_file=None, trace_format=None):
   blob_match = blob_regex.match(source_vhd_uri)
   if not blob_match:
     raise CLIError('--source-uri did not match format of a blob URI')
+  assert_server_side_copy(copy_engine == COPY_ENGINE_PAGE_RANGES, 'page-ranges')
+  verifier = copy_verifier(verify, repair, verify_manifest)
 
-  blob_snapshot = create_blob_snapshot(source_vhd_uri)
   # Ensure that the source storage account exists
   source_storage_acct_name = blob_match.group('storage_account')
   source_storage_acct = assert_storage_account(source_storage_acct_name)
 
-  start_blob_copy(source_storage_acct['resourceGroup'], source_storage_acct_name, blob_match.group('container'), blob_match.group('blob'), blob_snapshot['snapshot'], target_storage_account_name, target_storage_container_name, target_vhd_name)
-  blob_uri ='https://{0}.blob.core.windows.net/{1}/{2}'.format(target_storage_account_name, target_storage_container_name, target_vhd_name)
-  blob = wait_for_blob_success(blob_uri)
+  pipeline = Pipeline('copy_vhd_to_vhd')
+  pipeline.step('blob_snapshot', lambda r: create_blob_snapshot(source_vhd_uri),
+                cleanup=lambda r: delete_blob_snapshot(source_vhd_uri, r['blob_snapshot']['snapshot']))
+
+  # The SAS is only looked up when verifying, since a resumed run doesn't get it again otherwise
+  verified = lambda r, copied: copied if verifier is None else verify_blob_copy(verifier, r['source_sas'], target_storage_account_name, None,
+                                                                                target_storage_container_name, target_vhd_name, copied)
+  if copy_engine == COPY_ENGINE_PAGE_RANGES or verifier is not None:
+    pipeline.step('source_sas', lambda r: get_sas_for_blob(source_storage_acct_name, get_storage_account_key(source_storage_acct['resourceGroup'], source_storage_acct_name),
+                                                           blob_match.group('container'), blob_match.group('blob'), 'r', r['blob_snapshot']['snapshot']),
+                  depends_on=['blob_snapshot'], persist=False)
+  if copy_engine == COPY_ENGINE_PAGE_RANGES:
+    pipeline.step('wait', lambda r: verified(r, copy_blob_page_ranges(r['source_sas'], assert_storage_account(target_storage_account_name), target_storage_container_name, target_vhd_name)),
+                  depends_on=['source_sas'])
+  else:
+    pipeline.step('copy', lambda r: start_blob_copy(source_storage_acct['resourceGroup'], source_storage_acct_name, blob_match.group('container'), blob_match.group('blob'), r['blob_snapshot']['snapshot'], target_storage_account_name, target_storage_container_name, target_vhd_name),
+                  depends_on=['blob_snapshot'])
+    blob_uri ='https://{0}.blob.core.windows.net/{1}/{2}'.format(target_storage_account_name, target_storage_container_name, target_vhd_name)
+    if verifier is None:
+      pipeline.step('wait', lambda r: wait_for_blob_success(blob_uri), depends_on=['copy'])
+    else:
+      pipeline.step('wait', lambda r: verified(r, wait_for_blob_success(blob_uri)), depends_on=['copy', 'source_sas'])
   
   # Clean up blob snapshot
-  delete_blob_snapshot(source_vhd_uri, blob_snapshot['snapshot'])
-  return blob
+  pipeline.step('delete_blob_snapshot', lambda r: delete_blob_snapshot(source_vhd_uri, r['blob_snapshot']['snapshot']), depends_on=['wait'],
+                cleans_up=['blob_snapshot'])
+  return pipeline.run()['wait']
   
+@traced
+@journaled('storage blob copy-to-disk')
 def copy_vhd_to_disk(source_vhd_uri, target_resource_group_name, 
-                      target_disk_name=None, target_disk_sku=None, temp_storage_account_name=None):
-  #TODO: Write map of (blob uri):(managed disk resource id) to output file if specified
-  #TODO: move validation to a dedicated validator
-
-  # Ensure source blob uri is valid
+                      target_disk_name=None, target_disk_sku=None, temp_storage_account_name=None, results_file=None,
+                      verify=False, repair=False, verify_manifest=None, resume=None, no_wait=False, progress_format=None,
+                      trace_file=None, trace_format=None):
+  # validate_copy_vhd_to_disk has checked this for the command line already, but not for a batch
+  verifier = copy_verifier(verify, repair, verify_manifest)
+  target_disk_name = target_disk_name_for_blob(source_vhd_uri, target_disk_name)
   blob_match = blob_regex.match(source_vhd_uri)
-  if not blob_match:
-    raise CLIError('--source-uri did not match format of a blob URI')
-
-  # Use blob file name if target disk name wasn't specified
-  if target_disk_name is None:
-    file_match = file_regex.match(blob_match.group('blob'))
-    target_disk_name = file_match.group('filename')
-
-  # Ensure target disk does not already exist
-  target_disk = get_disk(target_resource_group_name, target_disk_name)
-  if target_disk:
-    raise CLIError('{0} already exists in resource group {1}. Cannot overwrite an existing disk'.format(target_disk_name, target_resource_group_name))
 
-  # Ensure that the target resource group does exist
-  target_rg = assert_resource_group(target_resource_group_name)
-  
-  # Ensure that the source storage account exists
-  source_storage_acct_name = blob_match.group('storage_account')
-  source_storage_acct = assert_storage_account(source_storage_acct_name)
+  # Ensure that the target resource group and source storage account exist, and that the target disk does not
+  # (unless this copy created it before it was interrupted)
+  resumed = resuming()
+  preflight = Preflight()
+  preflight.add('target_rg', assert_resource_group, target_resource_group_name)
+  preflight.add('source_storage_acct', assert_storage_account, blob_match.group('storage_account'))
+  preflight.add('target_disk', get_disk, target_resource_group_name, target_disk_name,
+                validate=lambda disk: disk and not resumed and target_disk_exists_error.format(target_disk_name, target_resource_group_name))
+  # Ensure that a temp storage account exists if it was specified
+  if temp_storage_account_name is not None:
+    preflight.add('temp_storage_acct', assert_storage_account, temp_storage_account_name)
+  preflight_results = preflight.run()
+  target_rg = preflight_results['target_rg']
+  source_storage_acct = preflight_results['source_storage_acct']
 
   # Use storage acct sku if disk sku wasn't specified
   if target_disk_sku is None:
     target_disk_sku = get_matching_disk_sku(source_storage_acct)
-  
-  # Ensure that a temp storage account exists if it was specified
-  if temp_storage_account_name is not None:
-    assert_storage_account(temp_storage_account_name)
 
   if source_storage_acct['location'].lower() == target_rg['location'].lower():
+    warn_nothing_to_verify(verifier, target_disk_name)
     disk = sameregion_copy_vhd_to_disk(source_vhd_uri, source_storage_acct, target_resource_group_name, target_disk_name, target_disk_sku)
   else:
-    disk = crossregion_copy_vhd_to_disk(source_vhd_uri, blob_match, source_storage_acct, target_rg, target_disk_name, target_disk_sku, temp_storage_account_name)
+    disk = crossregion_copy_vhd_to_disk(source_vhd_uri, blob_match, source_storage_acct, target_rg, target_disk_name, target_disk_sku, temp_storage_account_name,
+                                        verifier)
 
+  ResultsWriter(results_file).write({'source': source_vhd_uri, 'target': disk['id'], 'status': 'succeeded'})
   return disk
 
 def sameregion_copy_disk_to_disk(source_rg, source_disk_name, target_resource_group_name, target_disk_name, target_disk_sku):
   logger.info('Copying within the same region (%s)', source_rg['location'])
-  source_snapshot_name = 'snapshot_{0}'.format(random.randint(0, 100000))
-  source_snapshot = create_snapshot_from_disk(source_snapshot_name, source_rg['name'], source_disk_name)
-  disk = create_disk_from_snapshot(source_snapshot['id'], target_resource_group_name, target_disk_name, target_disk_sku)
+  pipeline = Pipeline('sameregion_copy_disk_to_disk')
+  source_snapshot_name = temp_snapshot_name()
+  pipeline.step('snapshot', lambda r: create_snapshot_from_disk(source_snapshot_name, source_rg['name'], source_disk_name),
+                cleanup=lambda r: delete_snapshot(r['snapshot']['id']))
+  pipeline.step('disk', lambda r: create_disk_from_snapshot(r['snapshot']['id'], target_resource_group_name, target_disk_name, target_disk_sku),
+                depends_on=['snapshot'])
   
   # Clean up snapshot
-  delete_resource(source_snapshot['id'])
+  pipeline.step('delete_snapshot', lambda r: delete_snapshot(r['snapshot']['id']), depends_on=['disk'], cleans_up=['snapshot'])
+
+  return pipeline.run()['disk']
+
+def add_temp_blob_copy_steps(pipeline, target_rg, temp_blob_name, source_sas_step, temp_storage_account_name=None,
+                             copy_engine=COPY_ENGINE_ASYNC, suffix='', source_region=None, verifier=None):
+  """Add steps copying the blob at the SAS url returned by `source_sas_step` into temp storage in `target_rg`'s region.
+
+  The step names end with `suffix`, so one pipeline can copy into several regions.
+  """
+  add_temp_storage_steps(pipeline, target_rg, temp_storage_account_name, suffix)
+  add_blob_copy_steps(pipeline, temp_blob_name, source_sas_step, copy_engine, suffix, suffix, source_region, verifier)
+
+def add_temp_storage_steps(pipeline, target_rg, temp_storage_account_name=None, suffix=''):
+  temp_storage, container, key = ['{0}{1}'.format(step, suffix) for step in ('temp_storage', 'container', 'temp_storage_acct_key')]
+
+  # Use a temporary storage account to copy the snapshot. Pooled accounts are shared, each copy gets its own container
+  pipeline.step(temp_storage, lambda r: temp_storage_pool.lease(target_rg['name'], target_rg['location'], temp_storage_account_name),
+                restore=temp_storage_pool.restore, cleanup=lambda r: r[temp_storage].release())
+  pipeline.step(container, lambda r: create_blob_container(r[temp_storage].account_name, r[temp_storage].container),
+                depends_on=[temp_storage])
+  pipeline.step(key, lambda r: get_storage_account_key(r[temp_storage].account['resourceGroup'], r[temp_storage].account_name),
+                depends_on=[temp_storage], persist=False)
+
+def add_blob_copy_steps(pipeline, temp_blob_name, source_sas_step, copy_engine=COPY_ENGINE_ASYNC, storage_suffix='', suffix='',
+                        source_region=None, verifier=None):
+  """Add steps copying the blob at the SAS url returned by `source_sas_step` into the temp storage of `storage_suffix`.
+
+  With a `verifier`, the wait step also checks the temp blob against the source, before any disk is created from it.
+  """
+  temp_storage, container, key = ['{0}{1}'.format(step, storage_suffix) for step in ('temp_storage', 'container', 'temp_storage_acct_key')]
+  copy, wait = 'copy' + suffix, 'wait' + suffix
+  # The SAS and key steps aren't journaled, and a resumed run only gets them again for the steps that depend on them
+  verified = lambda r, copied: copied if verifier is None else verify_blob_copy(verifier, r[source_sas_step], r[temp_storage].account_name, r[key],
+                                                                                r[temp_storage].container, temp_blob_name, copied)
+  readers = [source_sas_step, key] if verifier is not None else []
 
-  return disk
+  # Copy the blob across regions
+  if copy_engine == COPY_ENGINE_PAGE_RANGES:
+    pipeline.step(copy, lambda r: copy_blob_page_ranges(r[source_sas_step], r[temp_storage].account, r[temp_storage].container, temp_blob_name, r[key]),
+                  depends_on=[source_sas_step, container, key])
+    pipeline.step(wait, lambda r: verified(r, r[copy]), depends_on=[copy] + readers)
+  else:
+    pipeline.step(copy, lambda r: start_blob_copy_with_sas(r[source_sas_step], temp_blob_name, r[temp_storage].account_name, r[key], r[temp_storage].container,
+                                                           source_region),
+                  depends_on=[source_sas_step, container, key])
+    pipeline.step(wait, lambda r: verified(r, wait_for_blob_success(r[temp_storage].blob_uri(temp_blob_name))), depends_on=[copy] + readers)
 
 def crossregion_copy_disk_to_disk(source_rg, source_disk_name, 
                                   target_rg, target_disk_name, target_disk_sku, 
-                                  temp_storage_account_name=None):
+                                  temp_storage_account_name=None, copy_engine=COPY_ENGINE_ASYNC, verifier=None):
   logger.info('Performing a cross-region copy (%s to %s)', source_rg['location'], target_rg['location'])
+  temp_blob_name = '{0}.vhd'.format(source_disk_name)
 
-  # Create a snapshot
-  source_snapshot_name = 'snapshot_{0}'.format(random.randint(0, 100000))
-  source_snapshot = create_snapshot_from_disk(source_snapshot_name, source_rg['name'], source_disk_name)
-
-
-  # Use a temporary storage account to copy the snapshot
-  temp_storage_created = False
-  if temp_storage_account_name is None:
-    # TODO: reuse a temp storage account if one isn't specified & one already exists in the target RG. Use tags
-    temp_storage_account_name = 'diskcopytemp{0}'.format(random.randint(0, 100000))
-    temp_storage_created = True
-  temp_storage_acct = create_or_use_storage_account(temp_storage_account_name, target_rg['name'])
-  temp_blob_container_name = 'disks'
-  create_blob_container(temp_storage_account_name, temp_blob_container_name)
-
+  # The snapshot + SAS and the temp storage account + container + key don't depend on each other
+  pipeline = Pipeline('crossregion_copy_disk_to_disk')
+  source_snapshot_name = temp_snapshot_name()
+  pipeline.step('snapshot', lambda r: create_snapshot_from_disk(source_snapshot_name, source_rg['name'], source_disk_name),
+                cleanup=lambda r: delete_snapshot(r['snapshot']['id']))
   # Generate a limited-time SAS url to access the source snapshot
-  sas_url = get_sas_for_snapshot(source_snapshot['id'])
-  
-  # Copy the blob across regions
-  temp_storage_acct_key = get_storage_account_key(temp_storage_acct['resourceGroup'], temp_storage_acct['name'])
-  temp_blob_name = '{0}.vhd'.format(source_disk_name)
-  start_blob_copy_with_sas(sas_url, temp_blob_name, temp_storage_account_name, temp_storage_acct_key, temp_blob_container_name)
-  temp_blob_uri ='https://{0}.blob.core.windows.net/{1}/{2}'.format(temp_storage_account_name, temp_blob_container_name, temp_blob_name)
+  pipeline.step('sas', lambda r: get_sas_for_snapshot(r['snapshot']['id']), depends_on=['snapshot'], persist=False,
+                cleanup=lambda r: revoke_sas_for_snapshot(r['snapshot']['id']))
 
-  # TODO: for very long running copies, it might be better to register a function + event grid listener, but this works to start
-  wait_for_blob_success(temp_blob_uri)
+  add_temp_blob_copy_steps(pipeline, target_rg, temp_blob_name, 'sas', temp_storage_account_name, copy_engine, source_region=source_rg['location'],
+                           verifier=verifier)
 
-  # Create a disk from the temporary blob
-  disk = create_disk_from_blob(temp_blob_uri, target_rg['name'], target_disk_name, target_disk_sku)
+  # Create a disk from the temporary blob. The snapshot is no longer needed once the copy is done
+  pipeline.step('disk', lambda r: create_disk_from_blob(r['temp_storage'].blob_uri(temp_blob_name), target_rg['name'], target_disk_name, target_disk_sku),
+                depends_on=['wait'])
+  pipeline.step('revoke_sas', lambda r: revoke_sas_for_snapshot(r['snapshot']['id']), depends_on=['wait'], cleans_up=['sas'])
+  pipeline.step('delete_snapshot', lambda r: delete_snapshot(r['snapshot']['id']), depends_on=['revoke_sas'], cleans_up=['snapshot'])
 
-  # Revoke SAS after copy
-  revoke_sas_for_snapshot(source_snapshot['id'])
+  # Hand the temp storage back once the disk no longer needs the blob
+  pipeline.step('release_temp_storage', lambda r: r['temp_storage'].release(), depends_on=['disk'], cleans_up=['temp_storage'])
 
-  # Clean up snapshot
-  delete_resource(source_snapshot['id'])
+  return pipeline.run()['disk']
 
-  # Clean up temp storage account if auto-created
-  if temp_storage_created:
-    delete_resource(temp_storage_acct['id'])
+def fanout_copy_disk_to_disk(source_rg, source_disk_name, target_rgs, target_disk_name, target_disk_sku,
+                             temp_storage_account_name=None, copy_engine=COPY_ENGINE_ASYNC, chain=False, verifier=None):
+  """Copy a disk into several resource groups from a single snapshot and SAS.
 
-  return disk
+  Every target region gets one copy of the snapshot, into temp storage of the first target resource group in that
+  region, and all targets in the region create their disk from it. Targets in the source region create their disk
+  straight from the snapshot. With `chain`, each region is seeded from the blob of the region before it, in the order
+  given, so the data leaves the source region only once.
+  """
+  logger.info('Copying to %d resource groups', len(target_rgs))
+  temp_blob_name = '{0}.vhd'.format(source_disk_name)
+  regions = collections.OrderedDict()
+  for target_rg in target_rgs:
+    regions.setdefault(target_rg['location'].lower(), []).append(target_rg)
+  source_region = source_rg['location'].lower()
+
+  pipeline = Pipeline('fanout_copy_disk_to_disk', max_workers=4 * len(regions))
+  source_snapshot_name = temp_snapshot_name()
+  pipeline.step('snapshot', lambda r: create_snapshot_from_disk(source_snapshot_name, source_rg['name'], source_disk_name),
+                cleanup=lambda r: delete_snapshot(r['snapshot']['id']))
+  snapshot_readers, sas_readers, releases = [], [], collections.OrderedDict()
+
+  # The disks in the source region don't need the data copied, and are created while the other regions copy
+  for target_rg in regions.pop(source_region, []):
+    warn_nothing_to_verify(verifier, '{0}/{1}'.format(target_rg['name'], target_disk_name))
+    add_disk_from_snapshot_step(pipeline, 'disk:' + target_rg['name'], 'snapshot', target_rg['name'], target_disk_name, target_disk_sku)
+    snapshot_readers.append('disk:' + target_rg['name'])
+
+  if regions:
+    pipeline.step('sas', lambda r: get_sas_for_snapshot(r['snapshot']['id']), depends_on=['snapshot'], persist=False,
+                  cleanup=lambda r: revoke_sas_for_snapshot(r['snapshot']['id']))
+  seed, seed_region = None, None
+  for region, region_rgs in regions.items():
+    suffix = ':' + region_rgs[0]['name']
+    if chain and seed:
+      source_sas_step = add_seed_sas_step(pipeline, seed, temp_blob_name)
+      releases[seed].append('wait' + suffix)
+    else:
+      source_sas_step, seed_region = 'sas', source_region
+      sas_readers.append('wait' + suffix)
+    add_temp_blob_copy_steps(pipeline, region_rgs[0], temp_blob_name, source_sas_step, temp_storage_account_name, copy_engine, suffix,
+                             seed_region, verifier)
+    releases[suffix] = []
+    for target_rg in region_rgs:
+      add_disk_from_temp_blob_step(pipeline, 'disk:' + target_rg['name'], suffix, suffix, temp_blob_name, target_rg['name'], target_disk_name,
+                                   target_disk_sku)
+      releases[suffix].append('disk:' + target_rg['name'])
+    seed, seed_region = suffix, region
+
+  # The snapshot is no longer needed once every copy from it is done
+  if sas_readers:
+    pipeline.step('revoke_sas', lambda r: revoke_sas_for_snapshot(r['snapshot']['id']), depends_on=sas_readers, cleans_up=['sas'])
+    snapshot_readers.append('revoke_sas')
+  pipeline.step('delete_snapshot', lambda r: delete_snapshot(r['snapshot']['id']), depends_on=snapshot_readers, cleans_up=['snapshot'])
+
+  # Hand each region's temp storage back once its disks, and the region it seeds, no longer need the blob
+  for suffix, readers in releases.items():
+    add_release_temp_storage_step(pipeline, suffix, readers)
+
+  results = pipeline.run()
+  return [results['disk:' + target_rg['name']] for target_rg in target_rgs]
+
+def add_disk_from_snapshot_step(pipeline, name, snapshot_step, target_resource_group_name, target_disk_name, target_disk_sku):
+  pipeline.step(name, lambda r: create_disk_from_snapshot(r[snapshot_step]['id'], target_resource_group_name, target_disk_name, target_disk_sku),
+                depends_on=[snapshot_step])
+
+def add_disk_from_temp_blob_step(pipeline, name, storage_suffix, copy_suffix, temp_blob_name, target_resource_group_name, target_disk_name,
+                                 target_disk_sku):
+  pipeline.step(name, lambda r: create_disk_from_blob(r['temp_storage' + storage_suffix].blob_uri(temp_blob_name), target_resource_group_name,
+                                                      target_disk_name, target_disk_sku),
+                depends_on=['wait' + copy_suffix])
+
+def add_seed_sas_step(pipeline, suffix, temp_blob_name):
+  """Add a step returning a read SAS for the temp blob copied into the region of `suffix`, and return its name."""
+  name = 'seed_sas' + suffix
+  pipeline.step(name, lambda r: get_sas_for_blob(r['temp_storage' + suffix].account_name, r['temp_storage_acct_key' + suffix],
+                                                 r['temp_storage' + suffix].container, temp_blob_name, 'r'),
+                depends_on=['wait' + suffix, 'temp_storage_acct_key' + suffix], persist=False)
+  return name
+
+def add_release_temp_storage_step(pipeline, suffix, readers):
+  pipeline.step('release_temp_storage' + suffix, lambda r: r['temp_storage' + suffix].release(), depends_on=readers,
+                cleans_up=['temp_storage' + suffix])
+
+def consistent_copy_disks(source_rg, source_disks, target_rg, target_disk_names, target_disk_skus,
+                          temp_storage_account_name=None, copy_engine=COPY_ENGINE_ASYNC, verifier=None):
+  """Copy a group of disks, such as a VM's, from snapshots taken at the same moment.
+
+  `source_disks` maps a step suffix to a disk. All of the snapshots are started at once, so they're as close to
+  crash-consistent as separate snapshots get, and then the disks are copied concurrently. Across regions, the copies
+  share one temp storage lease, with a blob per disk. Returns the new disks by suffix, and the seconds between the
+  first snapshot starting and the last one finishing (None if the snapshots were taken by an earlier run).
+  """
+  crossregion = source_rg['location'].lower() != target_rg['location'].lower()
+  pipeline = Pipeline('consistent_copy_disks', max_workers=4 * len(source_disks) + 3)
+  for suffix, source_disk in source_disks.items():
+    add_snapshot_step(pipeline, 'snapshot' + suffix, temp_snapshot_name(suffix.lstrip(':')), source_disk)
+  if crossregion:
+    add_temp_storage_steps(pipeline, target_rg, temp_storage_account_name)
+
+  disk_steps = []
+  for suffix, source_disk in source_disks.items():
+    snapshot_step = 'snapshot' + suffix
+    if crossregion:
+      temp_blob_name = '{0}-{1}.vhd'.format(suffix.lstrip(':'), source_disk['name'])
+      pipeline.step('sas' + suffix, lambda r, snapshot_step=snapshot_step: get_sas_for_snapshot(r[snapshot_step]['id']),
+                    depends_on=[snapshot_step], persist=False,
+                    cleanup=lambda r, snapshot_step=snapshot_step: revoke_sas_for_snapshot(r[snapshot_step]['id']))
+      add_blob_copy_steps(pipeline, temp_blob_name, 'sas' + suffix, copy_engine, suffix=suffix, source_region=source_rg['location'], verifier=verifier)
+      add_disk_from_temp_blob_step(pipeline, 'disk' + suffix, '', suffix, temp_blob_name, target_rg['name'],
+                                   target_disk_names[suffix], target_disk_skus[suffix])
+      pipeline.step('revoke_sas' + suffix, lambda r, snapshot_step=snapshot_step: revoke_sas_for_snapshot(r[snapshot_step]['id']),
+                    depends_on=['wait' + suffix], cleans_up=['sas' + suffix])
+      snapshot_readers = ['revoke_sas' + suffix]
+    else:
+      warn_nothing_to_verify(verifier, target_disk_names[suffix])
+      add_disk_from_snapshot_step(pipeline, 'disk' + suffix, snapshot_step, target_rg['name'], target_disk_names[suffix], target_disk_skus[suffix])
+      snapshot_readers = ['disk' + suffix]
+    pipeline.step('delete_snapshot' + suffix, lambda r, snapshot_step=snapshot_step: delete_snapshot(r[snapshot_step]['id']),
+                  depends_on=snapshot_readers, cleans_up=[snapshot_step])
+    disk_steps.append('disk' + suffix)
+  if crossregion:
+    add_release_temp_storage_step(pipeline, '', disk_steps)
+
+  results = pipeline.run()
+  snapshot_timings = [pipeline.timings['snapshot' + suffix] for suffix in source_disks if 'snapshot' + suffix in pipeline.timings]
+  window = max(timing.end for timing in snapshot_timings) - min(timing.start for timing in snapshot_timings) \
+    if len(snapshot_timings) == len(source_disks) else None
+  return dict((suffix, results['disk' + suffix]) for suffix in source_disks), window
+
+def add_snapshot_step(pipeline, name, snapshot_name, source_disk):
+  pipeline.step(name, lambda r: create_snapshot_from_disk(snapshot_name, source_disk['resourceGroup'], source_disk['name']),
+                cleanup=lambda r: delete_snapshot(r[name]['id']))
+
+def crossregion_copy_disk_to_disk_direct(source_rg, source_disk, target_rg, target_disk_name, target_disk_sku, verifier=None):
+  logger.info('Performing a direct cross-region copy (%s to %s)', source_rg['location'], target_rg['location'])
+
+  # Snapshot the source and create an empty target disk at the same time
+  pipeline = Pipeline('crossregion_copy_disk_to_disk_direct')
+  source_snapshot_name = temp_snapshot_name()
+  pipeline.step('snapshot', lambda r: create_snapshot_from_disk(source_snapshot_name, source_rg['name'], source_disk['name']),
+                cleanup=lambda r: delete_snapshot(r['snapshot']['id']))
+  pipeline.step('sas', lambda r: get_sas_for_snapshot(r['snapshot']['id']), depends_on=['snapshot'], persist=False,
+                cleanup=lambda r: revoke_sas_for_snapshot(r['snapshot']['id']))
+  pipeline.step('upload_disk', lambda r: create_disk_for_upload(target_rg['name'], target_disk_name, target_disk_sku, get_upload_size_bytes(source_disk),
+                                                                source_disk.get('osType'), source_disk.get('hyperVGeneration')),
+                cleanup=lambda r: delete_unfinished_upload(target_rg['name'], target_disk_name))
+  pipeline.step('upload_sas', lambda r: get_write_sas_for_disk(target_rg['name'], target_disk_name), depends_on=['upload_disk'], persist=False)
+
+  # Copy the snapshot's pages straight into the new disk, then revoke write access to finish the upload. Both ends
+  # are managed disk SAS URLs rather than storage accounts of the subscription, so copy_scheduler has no caps to apply
+  pipeline.step('copy', lambda r: copy_page_ranges(r['sas'], r['upload_sas'], progress=progress_reporter(target_disk_name)), depends_on=['sas', 'upload_sas'])
+  copied = 'copy'
+  if verifier is not None:
+    # The disk can still be written until the upload is finished, so this is when ranges that differ can be copied again
+    pipeline.step('verify', lambda r: verifier.verify(r['upload_disk']['id'], r['sas'], r['upload_sas'], r['snapshot']['id']),
+                  depends_on=['copy', 'sas', 'upload_sas'])
+    copied = 'verify'
+  pipeline.step('revoke_upload_sas', lambda r: revoke_sas_for_disk(target_rg['name'], target_disk_name), depends_on=[copied], cleans_up=['upload_disk'])
+  pipeline.step('disk', lambda r: get_disk(target_rg['name'], target_disk_name), depends_on=['revoke_upload_sas'])
+
+  # Revoke SAS and clean up the snapshot after copy
+  pipeline.step('revoke_sas', lambda r: revoke_sas_for_snapshot(r['snapshot']['id']), depends_on=[copied], cleans_up=['sas'])
+  pipeline.step('delete_snapshot', lambda r: delete_snapshot(r['snapshot']['id']), depends_on=['revoke_sas'], cleans_up=['snapshot'])
+
+  return pipeline.run()['disk']
+
+def incremental_copy_disk_to_disk(source_rg, source_disk, target_rg, target_disk, target_disk_name, target_disk_sku,
+                                  delta_threshold_bytes, max_passes, finalize=True, verifier=None):
+  logger.info('Performing an incremental copy (%s to %s)', source_rg['location'], target_rg['location'])
+
+  # Start a new target disk, or continue into one left open for upload by a previous run
+  base_snapshot = None
+  if target_disk is None:
+    target_disk = create_disk_for_upload(target_rg['name'], target_disk_name, target_disk_sku, get_upload_size_bytes(source_disk),
+                                         source_disk.get('osType'), source_disk.get('hyperVGeneration'))
+    # Until the first pass is done, there is nothing in the new disk for a later run to continue from
+    register_cleanup(('disk', target_disk['id']), 'disk {0}'.format(target_disk_name),
+                     functools.partial(delete_unfinished_upload, target_rg['name'], target_disk_name))
+  else:
+    if target_disk.get('diskState') not in UPLOAD_DISK_STATES:
+      raise CLIError('{0} has already been finalized. An incremental copy can only continue into a disk that is still open for upload'.format(target_disk_name))
+    if (target_disk.get('creationData') or {}).get('uploadSizeBytes') != get_upload_size_bytes(source_disk):
+      raise CLIError('{0} has been resized since the last copy into {1}'.format(source_disk['name'], target_disk_name))
+    base_snapshot = find_incremental_base_snapshot(source_rg['name'], source_disk['id'], target_disk['id'])
+    if base_snapshot is None:
+      raise CLIError('No snapshot of {0} recorded as copied into {1}. Delete {1} to start over'.format(source_disk['name'], target_disk_name))
+
+  upload_sas = get_write_sas_for_disk(target_rg['name'], target_disk_name)
+  # What the passes change since the previous run's last snapshot, so its verification only has to be redone there
+  previous_snapshot_id, touched = (base_snapshot['id'], []) if base_snapshot else (None, None)
+  base_sas = None
+  if base_snapshot:
+    base_sas = get_sas_for_snapshot(base_snapshot['id'])
+    register_cleanup(('sas', base_snapshot['id']), 'access to snapshot {0}'.format(base_snapshot['name']),
+                     functools.partial(revoke_sas_for_snapshot, base_snapshot['id']))
+
+  # Each pass copies what changed since the previous snapshot, until the change is small enough to cut over
+  pass_numbers = itertools.count(1)
+  for copy_pass in range(1, max_passes + 1):
+    # A resumed run continues from the last pass of the operation, whose snapshot keeps its name
+    snapshot_name = temp_snapshot_name('pass{0}'.format(next(pass_numbers)))
+    while base_snapshot is not None and snapshot_name == base_snapshot['name']:
+      snapshot_name = temp_snapshot_name('pass{0}'.format(next(pass_numbers)))
+    snapshot = create_snapshot_from_disk(snapshot_name, source_rg['name'], source_disk['name'], incremental=True,
+                                         extra_tags=['{0}={1}'.format(INCREMENTAL_TARGET_TAG, target_disk['id'])])
+    register_cleanup(('snapshot', snapshot['id']), 'snapshot {0}'.format(snapshot_name), functools.partial(delete_snapshot, snapshot['id']))
+    sas = get_sas_for_snapshot(snapshot['id'])
+    register_cleanup(('sas', snapshot['id']), 'access to snapshot {0}'.format(snapshot_name),
+                     functools.partial(revoke_sas_for_snapshot, snapshot['id']), requires=[('snapshot', snapshot['id'])])
+    if base_snapshot is None:
+      stats = copy_page_ranges(sas, upload_sas, progress=progress_reporter(target_disk_name))
+    else:
+      stats = copy_page_ranges_diff(sas, base_sas, upload_sas, progress=progress_reporter(target_disk_name), touched=touched)
+      revoke_sas_for_snapshot(base_snapshot['id'])
+      discard_cleanup(('sas', base_snapshot['id']))
+      delete_snapshot(base_snapshot['id'])
+    # The pass is done, so a failed run continues from this snapshot next time instead of deleting it
+    discard_cleanup(('snapshot', snapshot['id']))
+    discard_cleanup(('disk', target_disk['id']))
+    base_snapshot, base_sas = snapshot, sas
+
+    delta_bytes = stats['bytesCopied'] + stats['bytesCleared']
+    logger.warning('Pass %d copied %d changed bytes', copy_pass, delta_bytes)
+    if delta_bytes <= delta_threshold_bytes:
+      break
 
-def copy_disk_to_vhd(source_resource_group_name, source_disk_name, target_storage_account_name, target_storage_container_name, target_vhd_name):
+  if verifier is not None:
+    verifier.verify(target_disk['id'], base_sas, upload_sas, base_snapshot['id'], previous_snapshot_id, touched)
+  revoke_sas_for_snapshot(base_snapshot['id'])
+  discard_cleanup(('sas', base_snapshot['id']))
+  if finalize:
+    # Revoking write access finishes the upload, after which the snapshot is no longer needed
+    revoke_sas_for_disk(target_rg['name'], target_disk_name)
+    delete_snapshot(base_snapshot['id'])
+  else:
+    logger.warning('%s is still open for upload. Run the same command again to copy the changes made since snapshot %s',
+                   target_disk_name, base_snapshot['name'])
+  return get_disk(target_rg['name'], target_disk_name)
+
+@traced
+@journaled('disk copy-to-vhd')
+def copy_disk_to_vhd(source_resource_group_name, source_disk_name, target_storage_account_name, target_storage_container_name, target_vhd_name,
+                     copy_engine=COPY_ENGINE_ASYNC, verify=False, repair=False, verify_manifest=None, resume=None, no_wait=False,
+                     progress_format=None, trace_file=None, trace_format=None):
   # TODO: Move to validator
-  source_rg = assert_resource_group(source_resource_group_name)
-  storage_acct = assert_storage_account(target_storage_account_name)
-
-  source_disk = get_disk(source_resource_group_name, source_disk_name)
-  if not source_disk:
-    raise CLIError('{0} does not exist in resource group {1}.'.format(source_disk_name, source_resource_group_name))
+  assert_server_side_copy(copy_engine == COPY_ENGINE_PAGE_RANGES, 'page-ranges')
+  verifier = copy_verifier(verify, repair, verify_manifest)
+  preflight = Preflight()
+  preflight.add('source_rg', assert_resource_group, source_resource_group_name)
+  preflight.add('storage_acct', assert_storage_account, target_storage_account_name)
+  preflight.add('source_disk', get_disk, source_resource_group_name, source_disk_name,
+                validate=lambda disk: not disk and source_disk_missing_error.format(source_disk_name, source_resource_group_name))
+  storage_acct = preflight.run()['storage_acct']
 
   # Create a snapshot
-  source_snapshot_name = 'snapshot_{0}'.format(random.randint(0, 100000))
-  source_snapshot = create_snapshot_from_disk(source_snapshot_name, source_resource_group_name, source_disk_name)
+  pipeline = Pipeline('copy_disk_to_vhd')
+  source_snapshot_name = temp_snapshot_name()
+  pipeline.step('snapshot', lambda r: create_snapshot_from_disk(source_snapshot_name, source_resource_group_name, source_disk_name),
+                cleanup=lambda r: delete_snapshot(r['snapshot']['id']))
 
   # Generate a limited-time SAS url to access the source snapshot 
-  blob_sas = get_sas_for_snapshot(source_snapshot['id'])
+  pipeline.step('sas', lambda r: get_sas_for_snapshot(r['snapshot']['id']), depends_on=['snapshot'], persist=False,
+                cleanup=lambda r: revoke_sas_for_snapshot(r['snapshot']['id']))
 
   # Copy to blob to target storage account
-  storage_acct_key = get_storage_account_key(storage_acct['resourceGroup'], storage_acct['name'])
-  start_blob_copy_with_sas(blob_sas, target_vhd_name, target_storage_account_name, storage_acct_key, target_storage_container_name)
-  blob_uri ='https://{0}.blob.core.windows.net/{1}/{2}'.format(target_storage_account_name, target_storage_container_name, target_vhd_name)
-  blob = wait_for_blob_success(blob_uri)
+  pipeline.step('storage_acct_key', lambda r: get_storage_account_key(storage_acct['resourceGroup'], storage_acct['name']), persist=False)
+  # The SAS and key aren't journaled, and a resumed run only gets them again for the steps that depend on them
+  verified = lambda r, copied: copied if verifier is None else verify_blob_copy(verifier, r['sas'], target_storage_account_name, r['storage_acct_key'],
+                                                                                target_storage_container_name, target_vhd_name, copied, r['snapshot']['id'])
+  if copy_engine == COPY_ENGINE_PAGE_RANGES:
+    pipeline.step('wait', lambda r: verified(r, copy_blob_page_ranges(r['sas'], storage_acct, target_storage_container_name, target_vhd_name, r['storage_acct_key'])),
+                  depends_on=['sas', 'storage_acct_key'])
+  else:
+    pipeline.step('copy', lambda r: start_blob_copy_with_sas(r['sas'], target_vhd_name, target_storage_account_name, r['storage_acct_key'], target_storage_container_name,
+                                                             r['snapshot']['location']),
+                  depends_on=['sas', 'storage_acct_key'])
+    blob_uri ='https://{0}.blob.core.windows.net/{1}/{2}'.format(target_storage_account_name, target_storage_container_name, target_vhd_name)
+    pipeline.step('wait', lambda r: verified(r, wait_for_blob_success(blob_uri)),
+                  depends_on=['copy'] + (['sas', 'storage_acct_key'] if verifier is not None else []))
   
   # Revoke SAS after copy
-  revoke_sas_for_snapshot(source_snapshot['id'])
+  pipeline.step('revoke_sas', lambda r: revoke_sas_for_snapshot(r['snapshot']['id']), depends_on=['wait'], cleans_up=['sas'])
 
   # Clean up snapshot
-  delete_resource(source_snapshot['id'])
-  return blob
-
-def copy_disk_to_disk(source_resource_group_name, source_disk_name, target_resource_group_name, 
-                      target_disk_name=None, target_disk_sku=None, temp_storage_account_name=None):
-  #TODO: Write map of (source managed disk resource id):(target managed disk resource id) to output file if specified
+  pipeline.step('delete_snapshot', lambda r: delete_snapshot(r['snapshot']['id']), depends_on=['revoke_sas'], cleans_up=['snapshot'])
+  return pipeline.run()['wait']
+
+@traced
+@journaled('disk copy-to-disk')
+def copy_disk_to_disk(source_resource_group_name, source_disk_name, target_resource_group_name=None, 
+                      target_disk_name=None, target_disk_sku=None, temp_storage_account_name=None, results_file=None,
+                      strategy=COPY_STRATEGY_BLOB, copy_engine=COPY_ENGINE_ASYNC,
+                      incremental=False, delta_threshold_mb=512, max_passes=3, no_finalize=False,
+                      target_resource_group_names=None, chain=False, verify=False, repair=False, verify_manifest=None,
+                      resume=None, no_wait=False, progress_format=None, trace_file=None, trace_format=None):
   #TODO: move validation to a dedicated validator
-
-  # Check that source and destination resource groups exist
-  target_rg = assert_resource_group(target_resource_group_name)
-  source_rg = assert_resource_group(source_resource_group_name)
-
-  # Ensure source disk exists
-  source_disk = get_disk(source_resource_group_name, source_disk_name)
-  if not source_disk:
-    raise CLIError('{0} does not exist in resource group {1}.'.format(source_disk_name, source_resource_group_name))
+  if bool(target_resource_group_name) == bool(target_resource_group_names):
+    raise CLIError('Specify exactly one of --target-resource-group or --target-resource-groups')
+  verifier = copy_verifier(verify, repair, verify_manifest)
 
   # Use source disk name if target disk name wasn't specified
   if target_disk_name is None:
     target_disk_name = source_disk_name
 
-  # Ensure target disk does not already exist
-  target_disk = get_disk(target_resource_group_name, target_disk_name)
-  if target_disk:
-    raise CLIError('{0} already exists in resource group {1}. Cannot overwrite an existing disk'.format(target_disk_name, target_resource_group_name))
+  if target_resource_group_names:
+    return copy_disk_to_resource_groups(source_resource_group_name, source_disk_name, target_resource_group_names, target_disk_name,
+                                        target_disk_sku, temp_storage_account_name, results_file, strategy, copy_engine, incremental, chain,
+                                        verifier)
+  if chain:
+    raise CLIError('--chain requires --target-resource-groups')
+
+  # Check that source and destination resource groups and the source disk exist, and that the target disk does not
+  # (unless this copy created it before it was interrupted)
+  resumed = resuming()
+  preflight = Preflight()
+  preflight.add('target_rg', assert_resource_group, target_resource_group_name)
+  preflight.add('source_rg', assert_resource_group, source_resource_group_name)
+  preflight.add('source_disk', get_disk, source_resource_group_name, source_disk_name,
+                validate=lambda disk: not disk and source_disk_missing_error.format(source_disk_name, source_resource_group_name))
+  # An incremental copy may continue into a target disk left open by a previous run
+  preflight.add('target_disk', get_disk, target_resource_group_name, target_disk_name,
+                validate=lambda disk: disk and not (incremental or resumed) and target_disk_exists_error.format(target_disk_name, target_resource_group_name))
+  # Ensure that a temp storage account exists if it was specified
+  if temp_storage_account_name is not None:
+    preflight.add('temp_storage_acct', assert_storage_account, temp_storage_account_name)
+  preflight_results = preflight.run()
+  target_rg = preflight_results['target_rg']
+  source_rg = preflight_results['source_rg']
+  source_disk = preflight_results['source_disk']
 
   # Use source disk sku if target disk sku wasn't specified
   if target_disk_sku is None:
     target_disk_sku = source_disk['sku']['name']
 
-  # Ensure that a temp storage account exists if it was specified
-  if temp_storage_account_name is not None:
-    assert_storage_account(temp_storage_account_name)
-    
-  if source_rg['location'].lower() == target_rg['location'].lower():
+  crossregion = source_rg['location'].lower() != target_rg['location'].lower()
+  assert_server_side_copy(incremental, 'incremental')
+  assert_server_side_copy(crossregion and strategy == COPY_STRATEGY_DIRECT, 'direct')
+  assert_server_side_copy(crossregion and copy_engine == COPY_ENGINE_PAGE_RANGES, 'page-ranges')
+
+  if incremental:
+    disk = incremental_copy_disk_to_disk(source_rg, source_disk, target_rg, preflight_results['target_disk'], target_disk_name, target_disk_sku,
+                                         delta_threshold_mb * 1024 * 1024, max_passes, not no_finalize, verifier)
+  elif not crossregion:
+    warn_nothing_to_verify(verifier, target_disk_name)
     disk = sameregion_copy_disk_to_disk(source_rg, source_disk_name, target_resource_group_name, target_disk_name, target_disk_sku)
+  elif strategy == COPY_STRATEGY_DIRECT:
+    disk = crossregion_copy_disk_to_disk_direct(source_rg, source_disk, target_rg, target_disk_name, target_disk_sku, verifier)
   else:
+    disk = crossregion_copy_disk_to_disk(source_rg, source_disk_name, target_rg, target_disk_name, target_disk_sku, temp_storage_account_name, copy_engine,
+                                         verifier)
 
-    disk = crossregion_copy_disk_to_disk(source_rg, source_disk_name, target_rg, target_disk_name, target_disk_sku, temp_storage_account_name)
-
+  ResultsWriter(results_file).write({'source': source_disk['id'], 'target': disk['id'], 'status': 'succeeded'})
   return disk
 
+def copy_disk_to_resource_groups(source_resource_group_name, source_disk_name, target_resource_group_names, target_disk_name,
+                                 target_disk_sku, temp_storage_account_name, results_file, strategy, copy_engine, incremental, chain, verifier=None):
+  if incremental or strategy == COPY_STRATEGY_DIRECT:
+    raise CLIError('--target-resource-groups does not support {0}'.format('--incremental' if incremental else '--strategy direct'))
+  if len(set(name.lower() for name in target_resource_group_names)) != len(target_resource_group_names):
+    raise CLIError('--target-resource-groups lists a resource group more than once')
+
+  # Check every resource group at once, and that none of them has the target disk yet (unless this copy created it)
+  resumed = resuming()
+  preflight = Preflight()
+  preflight.add('source_rg', assert_resource_group, source_resource_group_name)
+  preflight.add('source_disk', get_disk, source_resource_group_name, source_disk_name,
+                validate=lambda disk: not disk and source_disk_missing_error.format(source_disk_name, source_resource_group_name))
+  for name in target_resource_group_names:
+    preflight.add('target_rg:' + name, assert_resource_group, name)
+    preflight.add('target_disk:' + name, get_disk, name, target_disk_name,
+                  validate=lambda disk, name=name: disk and not resumed and target_disk_exists_error.format(target_disk_name, name))
+  if temp_storage_account_name is not None:
+    preflight.add('temp_storage_acct', assert_storage_account, temp_storage_account_name)
+  preflight_results = preflight.run()
+  source_rg = preflight_results['source_rg']
+  source_disk = preflight_results['source_disk']
+  target_rgs = [preflight_results['target_rg:' + name] for name in target_resource_group_names]
+
+  if target_disk_sku is None:
+    target_disk_sku = source_disk['sku']['name']
+
+  target_regions = set(target_rg['location'].lower() for target_rg in target_rgs) - set([source_rg['location'].lower()])
+  if temp_storage_account_name is not None and len(target_regions) > 1:
+    raise CLIError('--temp-storage-account can only be used when the target resource groups outside the source region are in one region')
+  assert_server_side_copy(target_regions and copy_engine == COPY_ENGINE_PAGE_RANGES, 'page-ranges')
+
+  disks = fanout_copy_disk_to_disk(source_rg, source_disk_name, target_rgs, target_disk_name, target_disk_sku,
+                                   temp_storage_account_name, copy_engine, chain, verifier)
+  results = ResultsWriter(results_file)
+  for disk in disks:
+    results.write({'source': source_disk['id'], 'target': disk['id'], 'status': 'succeeded'})
+  return disks
+
+@traced
+@journaled('vm copy-disks')
+def copy_vm_disks(resource_group_name, vm_name, target_resource_group_name, target_disk_name_prefix=None, target_disk_sku=None,
+                  temp_storage_account_name=None, manifest_file=None, copy_engine=COPY_ENGINE_ASYNC, verify=False, repair=False,
+                  verify_manifest=None, resume=None, no_wait=False, progress_format=None, trace_file=None, trace_format=None):
+  verifier = copy_verifier(verify, repair, verify_manifest)
+  preflight = Preflight()
+  preflight.add('target_rg', assert_resource_group, target_resource_group_name)
+  preflight.add('vm', get_vm, resource_group_name, vm_name,
+                validate=lambda vm: not vm and 'VM {0} does not exist in resource group {1}.'.format(vm_name, resource_group_name))
+  if temp_storage_account_name is not None:
+    preflight.add('temp_storage_acct', assert_storage_account, temp_storage_account_name)
+  preflight_results = preflight.run()
+  target_rg = preflight_results['target_rg']
+  vm = preflight_results['vm']
+  attached = get_vm_disks(vm)
+
+  # Look up every attached disk, and check that none of the copies exists (unless this copy created it)
+  resumed = resuming()
+  preflight = Preflight()
+  for lun, disk_id, _ in attached:
+    disk_match = disk_id_regex.match(disk_id)
+    target_disk_name = (target_disk_name_prefix or '') + disk_match.group('disk')
+    preflight.add(disk_id, get_disk, disk_match.group('resource_group'), disk_match.group('disk'),
+                  validate=lambda disk, disk_id=disk_id: not disk and '{0} does not exist'.format(disk_id))
+    preflight.add('target:' + disk_id, get_disk, target_resource_group_name, target_disk_name,
+                  validate=lambda disk, name=target_disk_name: disk and not resumed and target_disk_exists_error.format(name, target_resource_group_name))
+  disks = preflight.run()
+
+  source_rg = {'name': resource_group_name, 'location': vm['location']}
+  assert_server_side_copy(vm['location'].lower() != target_rg['location'].lower() and copy_engine == COPY_ENGINE_PAGE_RANGES, 'page-ranges')
+
+  # Steps are named after the LUN, which is unique in a VM, unlike disk names
+  suffixes = [':os' if lun is None else ':lun{0}'.format(lun) for lun, _, _ in attached]
+  source_disks = collections.OrderedDict((suffix, disks[disk_id]) for suffix, (_, disk_id, _) in zip(suffixes, attached))
+  new_disks, window = consistent_copy_disks(
+    source_rg, source_disks, target_rg,
+    dict((suffix, (target_disk_name_prefix or '') + disk['name']) for suffix, disk in source_disks.items()),
+    dict((suffix, target_disk_sku or disk['sku']['name']) for suffix, disk in source_disks.items()),
+    temp_storage_account_name, copy_engine, verifier)
+  if window is not None:
+    logger.warning('Snapshots of %d disks were taken within %.1fs', len(source_disks), window)
+
+  # Everything needed to recreate the VM from the copies, with each data disk at its original LUN
+  os_disk = source_disks[':os']
+  manifest = {
+    'sourceVm': vm['id'],
+    'vmSize': vm['hardwareProfile']['vmSize'],
+    'resourceGroup': target_rg['name'],
+    'location': target_rg['location'],
+    'osType': os_disk.get('osType') or vm['storageProfile']['osDisk'].get('osType'),
+    'hyperVGeneration': os_disk.get('hyperVGeneration'),
+    'osDisk': {'id': new_disks[':os']['id'], 'name': new_disks[':os']['name'], 'caching': attached[0][2]},
+    'dataDisks': [{'lun': lun, 'id': new_disks[suffix]['id'], 'name': new_disks[suffix]['name'], 'caching': caching}
+                  for suffix, (lun, _, caching) in zip(suffixes, attached) if lun is not None],
+    'snapshotWindowSeconds': round(window, 1) if window is not None else None,
+  }
+  if manifest_file:
+    with open(manifest_file, 'w') as f:
+      json.dump(manifest, f, indent=2)
+  return manifest
+
+def measure_disk_copy(source_resource_group_name, source_disk_name, target_resource_group_name):
+  """The bytes a disk copy moves between regions, and its (source region, target region) route."""
+  disk = get_disk(source_resource_group_name, source_disk_name)
+  source_region = disk['location'].lower()
+  target_region = assert_resource_group(target_resource_group_name)['location'].lower()
+  if source_region == target_region:
+    # a copy within the region is made from a snapshot, without copying the data
+    return 0, (source_region, target_region)
+  return disk.get('diskSizeBytes') or disk['diskSizeGb'] * 1024 ** 3, (source_region, target_region)
+
+def measure_vhd_copy(source_uri, target_resource_group_name):
+  """The bytes a VHD copy moves between regions, and its (source region, target region) route."""
+  source_region = (locate_storage_account(blob_regex.match(source_uri).group('storage_account')) or '').lower() or None
+  target_region = assert_resource_group(target_resource_group_name)['location'].lower()
+  if source_region == target_region:
+    return 0, (source_region, target_region)
+  return get_storage_blob(source_uri)['properties']['contentLength'], (source_region, target_region)
+
+def run_scheduled_batch(jobs, max_workers, results_file, order, max_copies_per_account, max_account_throughput_mb):
+  """Run a batch whose copies share the per-account caps, in the given order."""
+  with copy_scheduler.limits(max_copies_per_account, max_account_throughput_mb * 1024 * 1024 if max_account_throughput_mb else None):
+    results = run_batch(jobs, max_workers, results_file, order, copy_scheduler.estimate_seconds)
+  logger.info('Copy throughput by route: %s', copy_scheduler.stats()['routes'])
+  return results
+
+@traced
+def copy_disk_to_disk_batch(target_resource_group_name, manifest_file=None, source_resource_group_name=None,
+                            target_disk_sku=None, temp_storage_account_name=None, max_workers=4, results_file=None,
+                            strategy=COPY_STRATEGY_BLOB, copy_engine=COPY_ENGINE_ASYNC, progress_format=None,
+                            order=ORDER_MANIFEST, max_copies_per_account=None, max_account_throughput_mb=None,
+                            trace_file=None, trace_format=None):
+  if bool(manifest_file) == bool(source_resource_group_name):
+    raise CLIError('Specify exactly one of --manifest or --source-resource-group')
+
+  if manifest_file:
+    entries = load_manifest(manifest_file)
+  else:
+    entries = [{'source_disk_id': disk['id']} for disk in list_disks(source_resource_group_name)]
+
+  jobs = []
+  for entry in entries:
+    if entry.get('source_disk_id'):
+      disk_match = disk_id_regex.match(entry['source_disk_id'])
+      if not disk_match:
+        raise CLIError('{0} is not a Managed Disk resource id'.format(entry['source_disk_id']))
+      source_rg_name, source_name = disk_match.group('resource_group'), disk_match.group('disk')
+      source = entry['source_disk_id']
+    elif entry.get('source_resource_group') and entry.get('source_disk_name'):
+      source_rg_name, source_name = entry['source_resource_group'], entry['source_disk_name']
+      source = '{0}/{1}'.format(source_rg_name, source_name)
+    else:
+      raise CLIError('Manifest entry {0} needs source_disk_id or source_resource_group and source_disk_name'.format(entry))
+
+    target_rg_name = entry.get('target_resource_group', target_resource_group_name)
+    target_name = entry.get('target_disk_name', source_name)
+    jobs.append(CopyJob(source, '{0}/{1}'.format(target_rg_name, target_name),
+                        functools.partial(copy_disk_to_disk, source_rg_name, source_name, target_rg_name, target_name,
+                                          entry.get('sku', target_disk_sku),
+                                          entry.get('temp_storage_account', temp_storage_account_name),
+                                          strategy=entry.get('strategy', strategy),
+                                          copy_engine=entry.get('copy_engine', copy_engine),
+                                          progress_format=progress_format),
+                        functools.partial(measure_disk_copy, source_rg_name, source_name, target_rg_name)))
+
+  return run_scheduled_batch(jobs, max_workers, results_file, order, max_copies_per_account, max_account_throughput_mb)
+
+@traced
+def copy_vhd_to_disk_batch(manifest_file, target_resource_group_name=None, target_disk_sku=None,
+                           temp_storage_account_name=None, max_workers=4, results_file=None, progress_format=None,
+                           order=ORDER_MANIFEST, max_copies_per_account=None, max_account_throughput_mb=None,
+                           trace_file=None, trace_format=None):
+  jobs = []
+  for entry in load_manifest(manifest_file):
+    if not entry.get('source_uri'):
+      raise CLIError('Manifest entry {0} needs a source_uri'.format(entry))
+    target_rg_name = entry.get('target_resource_group', target_resource_group_name)
+    if not target_rg_name:
+      raise CLIError('Manifest entry {0} needs a target_resource_group, or specify --resource-group'.format(entry))
+
+    jobs.append(CopyJob(entry['source_uri'], '{0}/{1}'.format(target_rg_name, entry.get('target_disk_name', '')).rstrip('/'),
+                        functools.partial(copy_vhd_to_disk, entry['source_uri'], target_rg_name,
+                                          entry.get('target_disk_name'), entry.get('sku', target_disk_sku),
+                                          entry.get('temp_storage_account', temp_storage_account_name),
+                                          progress_format=progress_format),
+                        functools.partial(measure_vhd_copy, entry['source_uri'], target_rg_name)))
+
+  return run_scheduled_batch(jobs, max_workers, results_file, order, max_copies_per_account, max_account_throughput_mb)
+
+def prune_temp_storage_accounts(resource_group_name=None, idle_hours=24, dry_run=False):
+  return temp_storage_pool.prune(resource_group_name, idle_hours, dry_run)
+
+def parse_time(value):
+  """Seconds since the epoch of a time in az output, which is always UTC."""
+  match = time_regex.search(value or '')
+  if not match:
+    return None
+  return (datetime.datetime.strptime(match.group('time'), '%Y-%m-%dT%H:%M:%S') - datetime.datetime(1970, 1, 1)).total_seconds()
+
+def resources_of_resumable_operations():
+  """The ids of copy operations that can still be resumed, and the (account, container) leases they rely on."""
+  operations, containers = set(), set()
+  for journal in CopyJournal.list():
+    if journal.status not in (STATUS_RUNNING, STATUS_INTERRUPTED):
+      continue
+    operations.add(journal.id)
+    for steps in journal.steps.values():
+      for result in steps.values():
+        if isinstance(result, dict) and 'container' in result and 'pooled' in result:
+          containers.add((result['account']['name'], result['container']))
+  return operations, containers
+
+def is_incremental_base(snapshot):
+  # The last snapshot copied into a disk that is still open for upload is what the next incremental copy starts from
+  target_disk_id = (snapshot.get('tags') or {}).get(INCREMENTAL_TARGET_TAG)
+  match = disk_id_regex.match(target_disk_id or '')
+  if not match:
+    return False
+  target_disk = get_disk(match.group('resource_group'), match.group('disk'))
+  return bool(target_disk) and target_disk.get('diskState') in UPLOAD_DISK_STATES
+
+def cleanup_temp_resources(resource_group_name=None, min_age_hours=1, dry_run=False, force=False):
+  """Delete temp snapshots and temp storage containers left behind by copies that failed or were abandoned.
+
+  Snapshots that are being read and containers with a copy in progress are kept, unless `force` is set.
+  """
+  cutoff = time.time() - min_age_hours * 3600
+  resumable_operations, resumable_containers = resources_of_resumable_operations()
+  stack = CleanupStack()
+  found = []
+
+  cmd = ['snapshot', 'list',
+          '--query', "[?tags.\"{0}\" != null]".format(TEMP_TAG)]
+  if resource_group_name:
+    cmd += ['-g', resource_group_name]
+  for snapshot in az_cli(cmd) or []:
+    snapshot_match = temp_snapshot_regex.match(snapshot['name'])
+    if (snapshot_match and snapshot_match.group('operation') in resumable_operations) or (parse_time(snapshot.get('timeCreated')) or 0) > cutoff:
+      continue
+    if is_incremental_base(snapshot):
+      continue
+    description = 'snapshot {0}'.format(snapshot['name'])
+    if snapshot.get('diskState') == 'ActiveSAS' and not force:
+      logger.warning('Keeping temp snapshot %s, it is still being read. Use --force to delete it anyway', snapshot['name'])
+      continue
+    found.append((description, {'type': 'snapshot', 'name': snapshot['name'], 'id': snapshot['id']}))
+    if snapshot.get('diskState') == 'ActiveSAS':
+      # A snapshot can't be deleted while it's being read, so stop the copy that is reading it
+      stack.push(('sas', snapshot['id']), 'access to ' + description,
+                 functools.partial(revoke_sas_for_snapshot, snapshot['id']), requires=[('snapshot', snapshot['id'])])
+    stack.push(('snapshot', snapshot['id']), description, functools.partial(delete_snapshot, snapshot['id']))
+
+  for account in list_temp_accounts(resource_group_name):
+    for container in list_lease_containers(account['name']):
+      if (account['name'], container['name']) in resumable_containers:
+        continue
+      if (parse_time((container.get('properties') or {}).get('lastModified')) or 0) > cutoff:
+        continue
+      if not force and container_has_pending_copies(account['name'], container['name']):
+        logger.warning('Keeping temp storage container %s in %s, it still has a copy in progress. Use --force to delete it anyway',
+                       container['name'], account['name'])
+        continue
+      description = 'container {0} in {1}'.format(container['name'], account['name'])
+      found.append((description, {'type': 'container', 'name': container['name'], 'storageAccount': account['name']}))
+      stack.push(('container', account['name'], container['name']), description,
+                 functools.partial(delete_container, account['name'], container['name']))
+
+  if dry_run:
+    for description, _ in found:
+      logger.warning('Would delete temp %s', description)
+    return [resource for _, resource in found]
+
+  failed = stack.run()
+  for description, resource in found:
+    resource['status'] = 'failed' if description in failed else 'deleted'
+  return [resource for _, resource in found]
+
+@traced
+def show_copy_operation_status(operation_id=None, trace_file=None, trace_format=None):
+  if operation_id is None:
+    # Listing doesn't call Azure, so an orchestrator can check on many operations cheaply
+    return [journal.to_status() for journal in CopyJournal.list()]
+
+  journal = CopyJournal.load(operation_id)
+  if journal.status != STATUS_RUNNING or journal.running_elsewhere():
+    return journal.to_status()
+
+  # Check the server-side copy once, and finish the remaining steps if it's done
+  try:
+    return continue_operation(operation_id, blocking=False)
+  except Exception as ex:  # pylint: disable=broad-except
+    # The failure is recorded in the journal and shows up in the status
+    logger.debug('Copy operation %s: %s', operation_id, ex)
+    return CopyJournal.load(operation_id).to_status()
+
+@traced
+def wait_for_copy_operation(operation_id, progress_format=None, trace_file=None, trace_format=None):
+  return continue_operation(operation_id, progress_format=progress_format)
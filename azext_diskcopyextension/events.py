@@ -0,0 +1,301 @@
+import base64
+import json
+import os
+import re
+import threading
+import xml.etree.ElementTree as ElementTree
+
+try:
+  from urllib.parse import parse_qs, unquote, urlparse
+except ImportError:
+  from urllib import unquote
+  from urlparse import parse_qs, urlparse
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .blob_client import StorageAccountClient, blob_clients
+
+logger = get_logger(__name__)
+
+COPY_EVENTS_ENV = 'AZURE_DISKCOPY_COPY_EVENTS'
+COPY_EVENTS_KEY_ENV = 'AZURE_DISKCOPY_COPY_EVENTS_KEY'
+BLOB_CREATED_EVENT = 'Microsoft.Storage.BlobCreated'
+SUBSCRIPTION_VALIDATION_EVENT = 'Microsoft.EventGrid.SubscriptionValidationEvent'
+QUEUE_ENDPOINT = 'https://{account}.queue.core.windows.net'
+# Events can be lost, and an account may have no event subscription, so copies are still polled this often
+DEFAULT_FALLBACK_INTERVAL = 300.0
+DEFAULT_QUEUE_POLL_INTERVAL = 2.0
+
+event_blob_url_regex = re.compile(r'^https?://(?P<account>[^./]+)\.blob\.core\.windows\.net/(?P<container>[^/]+)/(?P<blob>[^?]+)')
+
+class CopyCompletedEvent(object):
+  """A blob was written in full, which for the target of an async copy means the copy has finished."""
+
+  def __init__(self, account, container, blob, api=None):
+    self.account = account
+    self.container = container
+    self.blob = blob
+    self.api = api
+
+  @property
+  def key(self):
+    return (self.account.lower(), self.container, self.blob)
+
+def parse_events(payload):
+  """The blob created events in an Event Grid or CloudEvents delivery, a list of events or a single one."""
+  events = []
+  for event in payload if isinstance(payload, list) else [payload]:
+    if (event.get('eventType') or event.get('type')) != BLOB_CREATED_EVENT:
+      continue
+    data = event.get('data') or {}
+    match = event_blob_url_regex.match(data.get('url') or '')
+    if match:
+      events.append(CopyCompletedEvent(match.group('account'), match.group('container'), unquote(match.group('blob')), data.get('api')))
+  return events
+
+class PollingTransport(object):
+  """No events, copies are only polled. The default."""
+  name = 'poll'
+  fallback_interval = None
+
+  def start(self, publish):
+    pass
+
+  def stop(self):
+    pass
+
+class HttpListenerTransport(object):
+  """Receives Event Grid webhook deliveries on a local HTTP listener.
+
+  The listener answers the subscription validation handshake of both the Event Grid and the CloudEvents schema.
+  Event Grid has to reach it, through a public address or a relay in front of it. With a `key`, deliveries must
+  carry it as the `code` query parameter of the subscription's endpoint URL.
+  """
+  name = 'listen'
+
+  def __init__(self, host='localhost', port=0, key=None, fallback_interval=DEFAULT_FALLBACK_INTERVAL):
+    self.host = host
+    self.port = port
+    self.key = key
+    self.fallback_interval = fallback_interval
+    self._server = None
+
+  @property
+  def url(self):
+    return 'http://{0}:{1}/'.format(self.host, self._server.server_address[1]) if self._server is not None else None
+
+  def start(self, publish):
+    try:
+      from http.server import BaseHTTPRequestHandler, HTTPServer
+      from socketserver import ThreadingMixIn
+    except ImportError:
+      from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+      from SocketServer import ThreadingMixIn
+
+    transport = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.debug('Event listener: ' + format, *args)
+
+      def _respond(self, status, body=None, headers=None):
+        content = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+          self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+      def _authorized(self):
+        return not transport.key or parse_qs(urlparse(self.path).query).get('code') == [transport.key]
+
+      def do_OPTIONS(self):
+        # CloudEvents webhook validation
+        if not self._authorized():
+          return self._respond(401)
+        return self._respond(200, headers={'WebHook-Allowed-Origin': self.headers.get('WebHook-Request-Origin', '*')})
+
+      def do_POST(self):
+        if not self._authorized():
+          return self._respond(401)
+        try:
+          payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8'))
+        except ValueError:
+          return self._respond(400)
+        for event in payload if isinstance(payload, list) else [payload]:
+          if event.get('eventType') == SUBSCRIPTION_VALIDATION_EVENT:
+            logger.warning('Validated the event subscription %s', event.get('topic'))
+            return self._respond(200, {'validationResponse': (event.get('data') or {}).get('validationCode')})
+        for event in parse_events(payload):
+          publish(event)
+        return self._respond(200)
+
+    class Server(ThreadingMixIn, HTTPServer):
+      daemon_threads = True
+
+    self._server = Server((self.host, self.port), Handler)
+    thread = threading.Thread(target=self._server.serve_forever, name='diskcopy-event-listener')
+    thread.daemon = True
+    thread.start()
+    logger.warning('Listening for blob copy events on %s', self.url)
+
+  def stop(self):
+    if self._server is not None:
+      self._server.shutdown()
+      self._server.server_close()
+      self._server = None
+
+class StorageQueue(StorageAccountClient):
+  """The storage queue an Event Grid subscription delivers to, read with the account key."""
+
+  def __init__(self, account_name, queue_name, account_key=None):
+    super(StorageQueue, self).__init__(account_name, account_key or blob_clients.get(account_name).account_key,
+                                       endpoint=QUEUE_ENDPOINT.format(account=account_name))
+    self.queue_name = queue_name
+
+  def receive(self, max_messages=32, visibility_timeout=30):
+    """Up to `max_messages` messages, as (decoded text, receipt) pairs. They reappear unless deleted in time."""
+    response = self._request('queue receive', 'GET', self.queue_name, 'messages',
+                             query=[('numofmessages', max_messages), ('visibilitytimeout', visibility_timeout)])
+    messages = []
+    for message in ElementTree.fromstring(response.content).iter('QueueMessage'):
+      text = message.findtext('MessageText') or ''
+      try:
+        # Event Grid base64 encodes the events it puts on a queue
+        text = base64.b64decode(text).decode('utf-8')
+      except (TypeError, ValueError):
+        pass
+      messages.append((text, (message.findtext('MessageId'), message.findtext('PopReceipt'))))
+    return messages
+
+  def delete(self, receipt):
+    message_id, pop_receipt = receipt
+    self._request('queue delete', 'DELETE', self.queue_name, 'messages/' + message_id,
+                  query=[('popreceipt', pop_receipt)], expected=(204, 404))
+
+class QueueTransport(object):
+  """Reads Event Grid events from a queue with `receive(max_messages)` and `delete(receipt)`, like StorageQueue.
+
+  One receive every `interval` seconds covers every copy in the process, however many there are. Received
+  messages are deleted, so the queue should only be read by one copy command at a time; copies of any other
+  command still finish through the fallback poll.
+  """
+  name = 'queue'
+
+  def __init__(self, queue, interval=DEFAULT_QUEUE_POLL_INTERVAL, fallback_interval=DEFAULT_FALLBACK_INTERVAL):
+    self.queue = queue
+    self.interval = interval
+    self.fallback_interval = fallback_interval
+    self._stopped = threading.Event()
+    self._thread = None
+
+  def start(self, publish):
+    self._stopped.clear()
+    self._thread = threading.Thread(target=self._run, args=(publish,), name='diskcopy-event-queue')
+    self._thread.daemon = True
+    self._thread.start()
+
+  def stop(self):
+    self._stopped.set()
+
+  def _run(self, publish):
+    while not self._stopped.is_set():
+      try:
+        messages = self.queue.receive()
+        for text, receipt in messages:
+          try:
+            events = parse_events(json.loads(text))
+          except ValueError:
+            logger.debug('Ignoring a queue message that is not an event: %s', text[:200])
+            events = []
+          for event in events:
+            publish(event)
+          self.queue.delete(receipt)
+      except Exception as ex:  # pylint: disable=broad-except
+        # the fallback poll still finds the copies, so a broken queue only costs latency
+        logger.warning('Unable to read blob copy events: %s', ex)
+        messages = []
+      if not messages:
+        self._stopped.wait(self.interval)
+
+def create_event_transport(spec=None):
+  """A transport from a COPY_EVENTS_ENV value: `poll`, `listen[:[host:]port]` or `queue:<account>/<queue>`."""
+  spec = spec if spec is not None else os.environ.get(COPY_EVENTS_ENV, PollingTransport.name)
+  kind, _, argument = spec.partition(':')
+  if kind == PollingTransport.name:
+    return PollingTransport()
+  if kind == HttpListenerTransport.name:
+    host, _, port = argument.rpartition(':')
+    try:
+      return HttpListenerTransport(host or 'localhost', int(port or 0), os.environ.get(COPY_EVENTS_KEY_ENV))
+    except ValueError:
+      raise CLIError('Invalid {0} {1}. Expected listen:[host:]port'.format(COPY_EVENTS_ENV, spec))
+  if kind == QueueTransport.name and '/' in argument:
+    account_name, queue_name = argument.split('/', 1)
+    return QueueTransport(StorageQueue(account_name, queue_name))
+  raise CLIError('Invalid {0} {1}. Expected poll, listen:[host:]port or queue:<account>/<queue>'.format(COPY_EVENTS_ENV, spec))
+
+class CopyCompletionNotifier(object):
+  """Calls back the waiters on blob copies when a transport delivers a completion event for their blob.
+
+  The transport is built by `transport_factory` and started with the first subscription. If it can't be
+  started, copies fall back to polling alone. `fallback_interval` is how often copies are still polled while
+  events are delivered, or None when they aren't.
+  """
+
+  def __init__(self, transport_factory=create_event_transport):
+    self.transport_factory = transport_factory
+    self.transport = None
+    self._subscribers = {}
+    self._lock = threading.Lock()
+
+  @property
+  def fallback_interval(self):
+    return getattr(self.transport, 'fallback_interval', None)
+
+  def set_transport(self, transport):
+    with self._lock:
+      previous, self.transport = self.transport, transport
+    if previous is not None:
+      previous.stop()
+    if transport is not None:
+      transport.start(self.publish)
+
+  def _ensure_started(self):
+    with self._lock:
+      if self.transport is not None:
+        return
+      try:
+        transport = self.transport_factory()
+        transport.start(self.publish)
+      except Exception as ex:  # pylint: disable=broad-except
+        logger.warning('Unable to receive blob copy events, polling instead: %s', ex)
+        transport = PollingTransport()
+      self.transport = transport
+
+  def subscribe(self, account, container, blob, callback):
+    """Call `callback(event)` when the copy into the blob completes. Returns a key for `unsubscribe`."""
+    self._ensure_started()
+    key = (account.lower(), container, blob)
+    with self._lock:
+      self._subscribers.setdefault(key, []).append(callback)
+    return key, callback
+
+  def unsubscribe(self, subscription):
+    key, callback = subscription
+    with self._lock:
+      callbacks = self._subscribers.get(key, [])
+      if callback in callbacks:
+        callbacks.remove(callback)
+      if not callbacks:
+        self._subscribers.pop(key, None)
+
+  def publish(self, event):
+    with self._lock:
+      callbacks = list(self._subscribers.get(event.key, []))
+    if callbacks:
+      logger.info('Copy into %s/%s completed', event.container, event.blob)
+    for callback in callbacks:
+      callback(event)
@@ -0,0 +1,396 @@
+import contextlib
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .cleanup import CleanupStack
+from .progress import PROGRESS_NONE, PROGRESS_TEXT, ProgressReporter, report_summary
+
+logger = get_logger(__name__)
+
+JOURNAL_DIR_ENV = 'AZURE_DISKCOPY_JOURNAL_DIR'
+# Finished operations are kept for a while so they can still be inspected
+JOURNAL_RETENTION_SECONDS = 7 * 24 * 3600
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+STATUS_INTERRUPTED = 'interrupted'
+sas_signature_regex = re.compile(r'(?i)([?&]sig=)[^&"\s]+')
+
+_context = threading.local()
+# Journaled copy commands by name, so `az disk copy wait` and `status` can continue an operation
+_operations = {}
+
+class OperationPending(Exception):
+  """Raised by a step that would have to wait for a server-side copy when the operation isn't blocking."""
+
+  def __init__(self, message, progress=None):
+    super(OperationPending, self).__init__(message)
+    self.progress = progress
+
+def get_journal_dir():
+  config_dir = os.environ.get('AZURE_CONFIG_DIR') or os.path.expanduser(os.path.join('~', '.azure'))
+  return os.environ.get(JOURNAL_DIR_ENV) or os.path.join(config_dir, 'diskcopy', 'operations')
+
+def redact(value):
+  """Strip SAS signatures from everything written to the journal."""
+  if isinstance(value, dict):
+    return dict((key, redact(item)) for key, item in value.items())
+  if isinstance(value, (list, tuple)):
+    return [redact(item) for item in value]
+  if isinstance(value, str):
+    return sas_signature_regex.sub(r'\1REDACTED', value)
+  return value
+
+def process_alive(pid):
+  if os.name == 'nt':
+    import ctypes
+    # os.kill() can't probe a process on Windows without signalling it
+    handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not handle:
+      return False
+    exit_code = ctypes.c_ulong()
+    ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+    ctypes.windll.kernel32.CloseHandle(handle)
+    return exit_code.value == 259  # STILL_ACTIVE
+  try:
+    os.kill(pid, 0)
+  except OSError as ex:
+    return ex.errno == 1  # EPERM: the process exists but belongs to someone else
+  return True
+
+class CopyJournal(object):
+  """Local record of a copy operation, written after every completed pipeline step.
+
+  Step results are stored with the resource ids they created, so a copy interrupted by Ctrl-C, a reboot
+  or an expired token can pick up where it stopped. Results that hold secrets (SAS urls, account keys)
+  are never recorded: they are requested again when a remaining step needs them.
+
+  `owner` is the process running the operation, so two processes never continue it at the same time.
+  A journal that isn't `blocking` stops at the first step that would wait for a server-side copy.
+  Progress reporters and pipeline timings of the current run are collected for its final summary, and the
+  temporary resources it creates are registered on its `cleanup` stack, to be removed if it fails.
+  """
+
+  def __init__(self, operation_id, command, parameters, path, status=STATUS_RUNNING, steps=None, created=None,
+               result=None, error=None, owner=None, progress=None, summary=None):
+    self.id = operation_id
+    self.command = command
+    self.parameters = parameters
+    self.path = path
+    self.status = status
+    self.steps = steps or {}
+    self.created = created or time.time()
+    self.result = result
+    self.error = error
+    self.owner = owner
+    self.progress = progress
+    self.summary = summary
+    self.resumed = False
+    self.blocking = True
+    self.progress_format = PROGRESS_TEXT
+    self.reporters = []
+    self.timings = []
+    self.critical_path = []
+    self.cleanup = CleanupStack()
+    self._lock = threading.Lock()
+
+  @classmethod
+  def create(cls, command, parameters, journal_dir=None):
+    journal_dir = journal_dir or get_journal_dir()
+    prune_journals(journal_dir)
+    operation_id = uuid.uuid4().hex[:12]
+    journal = cls(operation_id, command, parameters, os.path.join(journal_dir, '{0}.json'.format(operation_id)))
+    journal.save()
+    return journal
+
+  @classmethod
+  def load(cls, operation_id, journal_dir=None):
+    path = os.path.join(journal_dir or get_journal_dir(), '{0}.json'.format(operation_id))
+    try:
+      with open(path) as f:
+        state = json.load(f)
+    except (IOError, OSError, ValueError):
+      raise CLIError('Copy operation {0} was not found in {1}'.format(operation_id, os.path.dirname(path)))
+    return cls(state['id'], state['command'], state['parameters'], path, state['status'], state.get('steps'),
+               state.get('created'), state.get('result'), state.get('error'), state.get('owner'), state.get('progress'),
+               state.get('summary'))
+
+  @classmethod
+  def list(cls, journal_dir=None):
+    journal_dir = journal_dir or get_journal_dir()
+    if not os.path.isdir(journal_dir):
+      return []
+    journals = []
+    for name in os.listdir(journal_dir):
+      if name.endswith('.json'):
+        try:
+          journals.append(cls.load(name[:-len('.json')], journal_dir))
+        except CLIError:
+          continue
+    return sorted(journals, key=lambda journal: journal.created)
+
+  def running_elsewhere(self):
+    return self.owner is not None and self.owner != os.getpid() and process_alive(self.owner)
+
+  def claim(self):
+    with self._lock:
+      self.owner = os.getpid()
+      self._save()
+
+  def completed(self, pipeline, step):
+    """Return a (done, result) tuple for a step of a pipeline."""
+    with self._lock:
+      steps = self.steps.get(pipeline, {})
+      return step in steps, steps.get(step)
+
+  def record(self, pipeline, step, result):
+    if hasattr(result, 'to_dict'):
+      result = result.to_dict()
+    with self._lock:
+      self.steps.setdefault(pipeline, {})[step] = redact(result)
+      self._save()
+
+  def forget(self, pipeline, steps):
+    """Drop recorded steps whose resources were cleaned up, so a resumed run does them again."""
+    with self._lock:
+      for step in steps:
+        self.steps.get(pipeline, {}).pop(step, None)
+      self._save()
+
+  def progress_reporter(self, name):
+    """A ProgressReporter for one copy of this operation, counted in its summary."""
+    reporter = ProgressReporter(name, self.progress_format)
+    with self._lock:
+      self.reporters.append(reporter)
+    return reporter
+
+  def record_timings(self, pipeline, timings, critical_path=None):
+    with self._lock:
+      self.timings += [(pipeline, timing) for timing in timings.values()]
+      if critical_path and (not self.critical_path or critical_path[-1].end > self.critical_path[-1].end):
+        self.critical_path = critical_path
+
+  def summarize(self, started):
+    duration = time.time() - started
+    copied = sum(reporter.copied for reporter in self.reporters)
+    phases = sorted(self.timings, key=lambda timing: timing[1].start)
+    return {
+      'id': self.id,
+      'bytesCopied': copied,
+      'durationSeconds': round(duration, 1),
+      'averageBytesPerSecond': int(copied / duration) if copied and duration > 0 else None,
+      'phases': dict((timing.name, round(timing.duration, 1)) for _, timing in phases),
+      'criticalPath': [timing.name for timing in self.critical_path],
+      'criticalPathSeconds': round(sum(timing.duration for timing in self.critical_path), 1),
+    }
+
+  def finish(self, status, result=None, error=None):
+    with self._lock:
+      self.status = status
+      self.result = redact(result)
+      self.error = error
+      self.owner = None
+      self._save()
+
+  def pause(self, progress=None):
+    """Leave the operation running on the server side, for `az disk copy wait` or `status` to continue."""
+    with self._lock:
+      self.progress = redact(progress)
+      self.owner = None
+      self._save()
+
+  def save(self):
+    with self._lock:
+      self._save()
+
+  def to_dict(self):
+    return {
+      'id': self.id,
+      'command': self.command,
+      'parameters': self.parameters,
+      'status': self.status,
+      'created': self.created,
+      'updated': time.time(),
+      'steps': self.steps,
+      'result': self.result,
+      'error': self.error,
+      'owner': self.owner,
+      'progress': self.progress,
+      'summary': self.summary,
+    }
+
+  def to_status(self):
+    """The summary shown by `az disk copy status`."""
+    return {
+      'id': self.id,
+      'command': self.command,
+      'status': self.status,
+      'created': self.created,
+      'completedSteps': sum(len(steps) for steps in self.steps.values()),
+      'progress': self.progress if self.status == STATUS_RUNNING else None,
+      'summary': self.summary,
+      'result': self.result,
+      'error': self.error,
+    }
+
+  def _save(self):
+    directory = os.path.dirname(self.path)
+    temp_file = '{0}.{1}.tmp'.format(self.path, os.getpid())
+    try:
+      if not os.path.isdir(directory):
+        os.makedirs(directory)
+      with open(temp_file, 'w') as f:
+        json.dump(self.to_dict(), f, indent=2, default=str)
+      os.replace(temp_file, self.path)
+    except (IOError, OSError) as ex:
+      logger.warning('Unable to write copy journal %s: %s', self.path, ex)
+
+def prune_journals(journal_dir, max_age=JOURNAL_RETENTION_SECONDS):
+  if not os.path.isdir(journal_dir):
+    return
+  cutoff = time.time() - max_age
+  for name in os.listdir(journal_dir):
+    path = os.path.join(journal_dir, name)
+    try:
+      if name.endswith('.json') and os.path.getmtime(path) < cutoff:
+        with open(path) as f:
+          status = json.load(f).get('status')
+        if status == STATUS_SUCCEEDED:
+          os.remove(path)
+    except (IOError, OSError, ValueError):
+      continue
+
+def active_journal():
+  """The journal of the copy operation running on this thread, if any."""
+  return getattr(_context, 'journal', None)
+
+@contextlib.contextmanager
+def activate(journal):
+  """Make `journal` the active journal of this thread, e.g. in a worker thread of the operation."""
+  previous = active_journal()
+  _context.journal = journal
+  try:
+    yield journal
+  finally:
+    _context.journal = previous
+
+def resume_journal(operation_id, command, parameters, defaults):
+  journal = CopyJournal.load(operation_id)
+  if journal.command != command:
+    raise CLIError('Copy operation {0} is a `az {1}` operation, not `az {2}`'.format(operation_id, journal.command, command))
+  if journal.running_elsewhere():
+    raise CLIError('Copy operation {0} is still running in process {1}'.format(operation_id, journal.owner))
+  # Arguments left at their defaults are taken from the journal, anything else has to match it
+  conflicts = [name for name, value in parameters.items()
+               if value != defaults.get(name) and journal.parameters.get(name) != value]
+  if conflicts:
+    raise CLIError('Copy operation {0} was started with different arguments ({1}). Rerun it with the original arguments'.format(
+      operation_id, ', '.join(sorted(conflicts))))
+  journal.resumed = True
+  return journal
+
+def journaled(command):
+  """Decorator for copy commands that records the operation in a journal.
+
+  The command takes `resume=None`, `no_wait=False` and `progress_format=None` parameters, which are handled
+  here. Passing the id of an unfinished operation continues it, with the arguments it was started with. With
+  `no_wait`, the operation returns its status as soon as it would have to wait for a server-side copy. If the
+  command fails, the temporary resources registered with the journal's cleanup stack are removed. An interrupted
+  or paused operation keeps them, since it can still be resumed.
+  """
+  def decorator(func):
+    defaults = dict((name, parameter.default) for name, parameter in inspect.signature(func).parameters.items()
+                    if parameter.default is not inspect.Parameter.empty)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      parameters = inspect.getcallargs(func, *args, **kwargs)
+      resume = parameters.pop('resume', None)
+      no_wait = parameters.pop('no_wait', False)
+      # Tracing is handled by its own decorator and isn't part of the operation
+      parameters.pop('trace_file', None)
+      parameters.pop('trace_format', None)
+      progress_format = parameters.pop('progress_format', None) or PROGRESS_TEXT
+      if resume:
+        journal = resume_journal(resume, command, parameters, defaults)
+        if journal.status == STATUS_SUCCEEDED:
+          logger.warning('Copy operation %s has already finished', journal.id)
+          return journal.to_status() if no_wait else journal.result
+        parameters = journal.parameters
+        logger.info('Resuming copy operation %s', journal.id)
+      else:
+        journal = CopyJournal.create(command, parameters)
+        logger.warning('Started copy operation %s. If it is interrupted, rerun the command with --resume %s', journal.id, journal.id)
+
+      journal.blocking = not no_wait
+      journal.progress_format = progress_format
+      journal.claim()
+      started = time.time()
+      try:
+        with activate(journal):
+          result = func(**parameters)
+      except OperationPending as ex:
+        journal.pause(ex.progress)
+        if not journal.resumed:
+          logger.warning('%s. Check on copy operation %s with `az disk copy status --id %s`', ex, journal.id, journal.id)
+        return journal.to_status()
+      except KeyboardInterrupt:
+        journal.finish(STATUS_INTERRUPTED)
+        logger.warning('Copy operation %s was interrupted. Rerun the command with --resume %s to continue it', journal.id, journal.id)
+        raise
+      except Exception as ex:
+        with activate(journal):
+          journal.cleanup.run()
+        journal.finish(STATUS_FAILED, error=redact(str(ex)))
+        # Nothing to resume if the copy failed validation, before any step completed
+        if journal.steps:
+          logger.warning('Copy operation %s failed. Rerun the command with --resume %s to continue it', journal.id, journal.id)
+        raise
+      journal.summary = journal.summarize(started)
+      journal.finish(STATUS_SUCCEEDED, result)
+      if progress_format != PROGRESS_NONE:
+        report_summary(journal.summary, progress_format)
+      return journal.to_status() if no_wait else result
+
+    _operations[command] = wrapper
+    return wrapper
+  return decorator
+
+def continue_operation(operation_id, blocking=True, progress_format=None):
+  """Continue a journaled operation with the arguments it was started with, and return the command's result."""
+  journal = CopyJournal.load(operation_id)
+  if journal.command not in _operations:
+    raise CLIError('Copy operation {0} was started by an unknown command `az {1}`'.format(operation_id, journal.command))
+  return _operations[journal.command](resume=operation_id, no_wait=not blocking, progress_format=progress_format, **journal.parameters)
+
+def resuming():
+  journal = active_journal()
+  return bool(journal and journal.resumed)
+
+def blocking():
+  journal = active_journal()
+  return journal is None or journal.blocking
+
+def progress_reporter(name):
+  journal = active_journal()
+  return journal.progress_reporter(name) if journal else ProgressReporter(name)
+
+def register_cleanup(key, description, func, requires=()):
+  """Register the removal of a temporary resource, run if the active copy operation fails."""
+  journal = active_journal()
+  if journal:
+    journal.cleanup.push(key, description, func, requires)
+
+def discard_cleanup(key):
+  journal = active_journal()
+  if journal:
+    journal.cleanup.discard(key)
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .polling import COPY_SUCCESS, CopyPoller, get_copy_properties
+from .scheduler import copy_key
+
+logger = get_logger(__name__)
+
+# How soon a waiting thread notices Ctrl-C or its cancel event
+CANCEL_CHECK_INTERVAL = 0.5
+
+class _Waiter(object):
+  def __init__(self, account, container, blob_name, poller, progress):
+    self.account = account
+    self.container = container
+    self.blob_name = blob_name
+    self.poller = poller
+    self.progress = progress
+    self.due = 0
+    # while copy events are delivered, how often the copy is still polled in case its event is lost
+    self.fallback_interval = None
+    self.done = threading.Event()
+    self.blob = None
+    self.error = None
+
+class CopyMonitor(object):
+  """Polls every in-flight blob copy from one background thread.
+
+  Waiters are grouped by (storage account, container). When any waiter in a group is due, the whole group is
+  refreshed with a single `storage blob list --include c` call (or `storage blob show` if it has one waiter),
+  and the copy state is routed to each waiter. Control-plane calls per tick scale with containers, not copies.
+
+  With a `notifier` (a CopyCompletionNotifier) that delivers copy events, a waiter is polled once for the size of
+  the copy and then only at the notifier's fallback interval, until the event for its blob wakes it up. With a
+  `scheduler` (a CopyScheduler), the throughput measured by every poll is reported to it.
+  """
+
+  def __init__(self, show_blob, list_blobs, clock=time.time, notifier=None, scheduler=None):
+    self.show_blob = show_blob
+    self.list_blobs = list_blobs
+    self.clock = clock
+    self.notifier = notifier
+    self.scheduler = scheduler
+    self._cond = threading.Condition()
+    self._waiters = []
+    self._thread = None
+
+  def wait(self, account, container, blob_name, poller=None, progress=None, cancel=None):
+    """Block until the copy into account/container/blob_name succeeds and return the blob. Raises if it fails.
+
+    Every observation of the copy's progress is passed on to `progress`, a ProgressReporter. When the `cancel`
+    event is set, such as by Ctrl-C in another thread, the wait raises KeyboardInterrupt and the copy is left running.
+    """
+    waiter = _Waiter(account, container, blob_name, poller or CopyPoller(), progress)
+    subscription = None
+    if self.notifier is not None:
+      subscription = self.notifier.subscribe(account, container, blob_name, lambda event: self._wake(waiter))
+      waiter.fallback_interval = self.notifier.fallback_interval
+    with self._cond:
+      self._waiters.append(waiter)
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, name='diskcopy-monitor')
+        self._thread.daemon = True
+        self._thread.start()
+      self._cond.notify()
+
+    # wake up periodically so Ctrl-C is delivered to the waiting thread
+    try:
+      while not waiter.done.wait(CANCEL_CHECK_INTERVAL):
+        if cancel is not None and cancel.is_set():
+          raise KeyboardInterrupt()
+    finally:
+      if not waiter.done.is_set():
+        self._forget(waiter)
+      if subscription is not None:
+        self.notifier.unsubscribe(subscription)
+    if progress is not None:
+      progress.finish()
+    if waiter.error is not None:
+      raise waiter.error
+    return waiter.blob
+
+  def _forget(self, waiter):
+    with self._cond:
+      if waiter in self._waiters:
+        self._waiters.remove(waiter)
+
+  def _wake(self, waiter):
+    """The copy has completed, refresh it now. If it still looks pending, go back to regular polling."""
+    with self._cond:
+      waiter.due = 0
+      waiter.fallback_interval = None
+      self._cond.notify()
+
+  def _run(self):
+    while True:
+      with self._cond:
+        if not self._waiters:
+          self._thread = None
+          return
+        now = self.clock()
+        next_due = min(waiter.due for waiter in self._waiters)
+        if next_due > now:
+          self._cond.wait(next_due - now)
+          continue
+        due_groups = set((w.account, w.container) for w in self._waiters if w.due <= now)
+        groups = dict((key, [w for w in self._waiters if (w.account, w.container) == key]) for key in due_groups)
+
+      for (account, container), waiters in groups.items():
+        self._refresh(account, container, waiters)
+
+      with self._cond:
+        self._waiters = [waiter for waiter in self._waiters if not waiter.done.is_set()]
+
+  def _refresh(self, account, container, waiters):
+    try:
+      if len(waiters) == 1:
+        blobs = [self.show_blob(account, container, waiters[0].blob_name)]
+      else:
+        prefix = os.path.commonprefix([waiter.blob_name for waiter in waiters])
+        logger.debug('Refreshing %d copies in %s/%s with one listing', len(waiters), account, container)
+        blobs = self.list_blobs(account, container, prefix)
+    except Exception as ex:  # pylint: disable=broad-except
+      for waiter in waiters:
+        waiter.error = ex
+        waiter.done.set()
+      return
+
+    blobs_by_name = dict((blob['name'], blob) for blob in blobs if blob)
+    now = self.clock()
+    for waiter in waiters:
+      blob = blobs_by_name.get(waiter.blob_name)
+      try:
+        if blob is None and len(waiters) > 1:
+          # not in the listing, look it up on its own before giving up on it
+          blob = self.show_blob(account, container, waiter.blob_name)
+        if not blob:
+          raise CLIError('Blob {0} was not found in {1}/{2}, so its copy cannot be waited for'.format(waiter.blob_name, account, container))
+        copy_status = waiter.poller.observe(blob)
+      except Exception as ex:  # pylint: disable=broad-except
+        waiter.error = ex
+        waiter.done.set()
+        continue
+
+      if self.scheduler is not None:
+        self.scheduler.observe(copy_key(account, container, waiter.blob_name), waiter.poller)
+      eta = waiter.poller.eta
+      if waiter.progress is not None:
+        waiter.progress.update(waiter.poller.copied, waiter.poller.total)
+      logger.info('%s: Waiting for %s to copy. Current status is %s: %s%s', time.ctime(), waiter.blob_name, copy_status,
+                  get_copy_properties(blob).get('progress'), '' if eta is None else ' (about {0:.0f}s left)'.format(eta))
+      if copy_status == COPY_SUCCESS:
+        waiter.blob = blob
+        waiter.done.set()
+      else:
+        waiter.due = now + max(waiter.poller.next_interval(), waiter.fallback_interval or 0)
@@ -0,0 +1,253 @@
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+
+from knack.log import get_logger
+
+from .blob_client import STORAGE_API_VERSION, new_session, send_request, with_query
+from .pipeline import cancellation
+from .tracing import span
+
+logger = get_logger(__name__)
+
+PAGE_SIZE = 512
+MAX_PUT_PAGE_BYTES = 4 * 1024 * 1024
+# Ranges are read in requests of at most this size, and streamed from the response in chunks
+MAX_GET_RANGE_BYTES = 4 * 1024 * 1024
+READ_CHUNK_BYTES = 1024 * 1024
+# Listing the pages of a large, fragmented blob in one call can time out, so it is done in windows
+PAGE_LIST_WINDOW_BYTES = 8 * 1024 ** 3
+DEFAULT_MAX_WORKERS = 16
+
+_local = threading.local()
+
+def _session():
+  # one session per thread keeps connections alive between range requests
+  if getattr(_local, 'session', None) is None:
+    _local.session = new_session()
+  return _local.session
+
+def _byte_range(offset, length):
+  return 'bytes={0}-{1}'.format(offset, offset + length - 1)
+
+class PageBlobClient(object):
+  """Minimal REST client for a page blob addressed by a SAS URL (a blob, snapshot or managed disk SAS)."""
+
+  def __init__(self, sas_url):
+    self.sas_url = sas_url
+
+  def _request(self, method, query=None, headers=None, expected=(200, 201), stream=False):
+    request_headers = {'x-ms-version': STORAGE_API_VERSION}
+    request_headers.update(headers or {})
+    url = with_query(self.sas_url, query) if query else self.sas_url
+    # every page request can be repeated, so throttled and transient failures are retried
+    return send_request(_session(), method, url, request_headers, expected, stream=stream)
+
+  def get_size(self):
+    return int(self._request('HEAD').headers['Content-Length'])
+
+  def create(self, size):
+    """Create (or replace) the blob as an empty page blob of `size` bytes."""
+    self._request('PUT', headers={
+      'x-ms-blob-type': 'PageBlob',
+      'x-ms-blob-content-length': str(size),
+      'Content-Length': '0',
+    })
+
+  def get_page_ranges(self, offset=None, length=None):
+    """Return the populated ranges as a list of (start, end) byte offsets, end inclusive."""
+    headers = {'x-ms-range': _byte_range(offset, length)} if length else None
+    response = self._request('GET', 'comp=pagelist', headers)
+    root = ElementTree.fromstring(response.content)
+    return [(int(page_range.find('Start').text), int(page_range.find('End').text))
+            for page_range in root.findall('PageRange')]
+
+  def get_page_ranges_diff(self, previous_snapshot_url, offset=None, length=None):
+    """Return (changed, cleared) ranges since a previous incremental snapshot of the same managed disk."""
+    headers = {'x-ms-previous-snapshot-url': previous_snapshot_url}
+    if length:
+      headers['x-ms-range'] = _byte_range(offset, length)
+    root = ElementTree.fromstring(self._request('GET', 'comp=pagelist', headers).content)
+    ranges = lambda tag: [(int(r.find('Start').text), int(r.find('End').text)) for r in root.findall(tag)]
+    return ranges('PageRange'), ranges('ClearRange')
+
+  def read(self, offset, length, chunk_size=READ_CHUNK_BYTES):
+    """Yield the bytes of a range in chunks of up to `chunk_size`, without holding the whole range in memory."""
+    response = self._request('GET', headers={'x-ms-range': _byte_range(offset, length)}, expected=(200, 206), stream=True)
+    try:
+      for chunk in response.iter_content(chunk_size):
+        yield chunk
+    finally:
+      response.close()
+
+  def put_page_from_url(self, source_url, source_offset, offset, length):
+    self._request('PUT', 'comp=page', {
+      'x-ms-page-write': 'update',
+      'x-ms-range': _byte_range(offset, length),
+      'x-ms-source-range': _byte_range(source_offset, length),
+      'x-ms-copy-source': source_url,
+      'Content-Length': '0',
+    })
+
+  def clear_pages(self, offset, length):
+    self._request('PUT', 'comp=page', {
+      'x-ms-page-write': 'clear',
+      'x-ms-range': _byte_range(offset, length),
+      'Content-Length': '0',
+    })
+
+def list_page_ranges(client, size, window=PAGE_LIST_WINDOW_BYTES):
+  ranges = []
+  for offset in range(0, size, window):
+    ranges += client.get_page_ranges(offset, min(window, size - offset))
+  return ranges
+
+def list_page_ranges_diff(client, size, previous_snapshot_url, window=PAGE_LIST_WINDOW_BYTES):
+  changed, cleared = [], []
+  for offset in range(0, size, window):
+    window_changed, window_cleared = client.get_page_ranges_diff(previous_snapshot_url, offset, min(window, size - offset))
+    changed += window_changed
+    cleared += window_cleared
+  return changed, cleared
+
+def split_ranges(ranges, chunk_size=MAX_PUT_PAGE_BYTES):
+  """Split (start, end) ranges into (offset, length) chunks no larger than a single Put Page request."""
+  for start, end in ranges:
+    offset = start
+    while offset <= end:
+      length = min(chunk_size, end - offset + 1)
+      yield offset, length
+      offset += length
+
+def subtract_ranges(ranges, covered):
+  """Return the parts of `ranges` that aren't in `covered`. Both are sorted lists of inclusive (start, end) tuples."""
+  result = []
+  covered = list(covered)
+  for start, end in ranges:
+    for covered_start, covered_end in covered:
+      if covered_end < start or covered_start > end:
+        continue
+      if covered_start > start:
+        result.append((start, covered_start - 1))
+      start = max(start, covered_end + 1)
+      if start > end:
+        break
+    if start <= end:
+      result.append((start, end))
+  return result
+
+def run_bounded(func, items, max_workers):
+  """Call func on every item with at most `max_workers` calls in flight, without queueing every item up front.
+
+  If the pipeline running the caller is interrupted, the calls in flight finish and no more are made.
+  """
+  semaphore = threading.BoundedSemaphore(max_workers * 2)
+  cancelled = cancellation()
+  futures = []
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    for item in items:
+      semaphore.acquire()
+      if cancelled.is_set():
+        raise KeyboardInterrupt()
+      future = executor.submit(func, item)
+      future.add_done_callback(lambda f: semaphore.release())
+      futures.append(future)
+      # surface the first failure without waiting for the rest of the blob
+      running = []
+      for f in futures:
+        if not f.done():
+          running.append(f)
+        elif f.exception() is not None:
+          raise f.exception()
+      futures = running
+  for future in futures:
+    future.result()
+
+class PageRangeCopier(object):
+  """Copies a page blob by its populated ranges only, using server-side Put Page From URL requests.
+
+  Unallocated pages of the source are skipped. Pages that are populated on an existing target but empty on
+  the source are cleared, so the target ends up identical. `client_factory` builds a client for a SAS URL and
+  can be replaced with an in-process fake.
+  """
+
+  def __init__(self, max_workers=DEFAULT_MAX_WORKERS, chunk_size=MAX_PUT_PAGE_BYTES, client_factory=PageBlobClient):
+    self.max_workers = max_workers
+    self.chunk_size = chunk_size
+    self.client_factory = client_factory
+
+  def copy(self, source_sas_url, target_sas_url, create_target=False, source_ranges=None, clear_ranges=None, progress=None):
+    """Copy source into target and return a dict of statistics.
+
+    `source_ranges` limits the copy to those ranges, and `clear_ranges` are then cleared on the target,
+    as when applying the difference between two snapshots. Copied bytes are counted on `progress`.
+    """
+    start = time.time()
+    source = self.client_factory(source_sas_url)
+    target = self.client_factory(target_sas_url)
+    size = source.get_size()
+
+    if create_target:
+      target.create(size)
+      stale_ranges = []
+    elif source_ranges is None:
+      stale_ranges = list_page_ranges(target, size)
+
+    if source_ranges is None:
+      with span('list page ranges', 'page_ranges'):
+        source_ranges = list_page_ranges(source, size)
+      stale_ranges = subtract_ranges(stale_ranges, source_ranges)
+    else:
+      stale_ranges = clear_ranges or []
+
+    chunks = list(split_ranges(source_ranges, self.chunk_size))
+    populated = sum(length for _, length in chunks)
+    logger.info('Copying %d of %d bytes in %d requests', populated, size, len(chunks))
+
+    def _put(chunk):
+      target.put_page_from_url(source_sas_url, chunk[0], chunk[0], chunk[1])
+      if progress is not None:
+        progress.add(chunk[1])
+
+    if progress is not None:
+      progress.update(0, populated)
+    try:
+      with span('put pages', 'page_ranges', bytes=populated, requests=len(chunks)):
+        run_bounded(_put, chunks, self.max_workers)
+    finally:
+      if progress is not None:
+        progress.finish()
+
+    cleared = list(split_ranges(stale_ranges, self.chunk_size))
+    if cleared:
+      logger.info('Clearing %d stale ranges on the target', len(cleared))
+      with span('clear pages', 'page_ranges', requests=len(cleared)):
+        run_bounded(lambda chunk: target.clear_pages(chunk[0], chunk[1]), cleared, self.max_workers)
+
+    return {
+      'size': size,
+      'bytesCopied': populated,
+      'bytesSkipped': size - populated,
+      'bytesCleared': sum(length for _, length in cleared),
+      'requests': len(chunks) + len(cleared),
+      'durationSeconds': round(time.time() - start, 1),
+    }
+
+def copy_page_ranges(source_sas_url, target_sas_url, create_target=False, max_workers=DEFAULT_MAX_WORKERS, progress=None,
+                     client_factory=PageBlobClient):
+  """Copy the populated pages of the source into the target, server side, and return copy statistics."""
+  return PageRangeCopier(max_workers, client_factory=client_factory).copy(source_sas_url, target_sas_url, create_target, progress=progress)
+
+def copy_page_ranges_diff(source_sas_url, previous_snapshot_sas_url, target_sas_url, max_workers=DEFAULT_MAX_WORKERS, progress=None,
+                          touched=None, client_factory=PageBlobClient):
+  """Apply the pages changed between a previous incremental snapshot and the source snapshot to the target.
+
+  The changed and cleared ranges are added to the `touched` list, if one is given.
+  """
+  copier = PageRangeCopier(max_workers, client_factory=client_factory)
+  source = copier.client_factory(source_sas_url)
+  changed, cleared = list_page_ranges_diff(source, source.get_size(), previous_snapshot_sas_url)
+  if touched is not None:
+    touched.extend(changed + cleared)
+  return copier.copy(source_sas_url, target_sas_url, source_ranges=changed, clear_ranges=cleared, progress=progress)
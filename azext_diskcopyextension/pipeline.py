@@ -0,0 +1,230 @@
+import contextlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .journal import OperationPending, activate, active_journal
+from .tracing import span
+
+logger = get_logger(__name__)
+
+_step_context = threading.local()
+
+def cancellation():
+  """The event set when the pipeline running the current step is interrupted. Long waits in a step give up when it's set.
+
+  Pipelines run by a step share the event of the pipeline they run in.
+  """
+  event = getattr(_step_context, 'cancellation', None)
+  return event if event is not None else threading.Event()
+
+@contextlib.contextmanager
+def cancelled_by(event):
+  """Make `event` the cancellation() of the block, for a thread that runs pipelines on behalf of an interruptible one."""
+  previous, _step_context.cancellation = getattr(_step_context, 'cancellation', None), event
+  try:
+    yield event
+  finally:
+    _step_context.cancellation = previous
+
+class StepTiming(object):
+  def __init__(self, name, start, end):
+    self.name = name
+    self.start = start
+    self.end = end
+
+  @property
+  def duration(self):
+    return self.end - self.start
+
+class Pipeline(object):
+  """A small dependency graph of copy steps. Steps whose dependencies are done run concurrently.
+
+  Each step function receives the dict of results of the steps completed so far. After the run, the
+  duration of every step and the critical path through the graph are logged.
+
+  When a copy journal is active, every completed step is recorded in it, and the steps it already has
+  are skipped. Steps with `persist=False` return secrets and are never recorded, so they only run again
+  if a remaining step needs them. `restore` turns a recorded result back into the step's result.
+
+  A step that creates a temporary resource passes a `cleanup` function, which receives the results like the
+  step itself and is registered on the journal's cleanup stack to run if the operation fails. The step that
+  removes the resource on the happy path names it in `cleans_up`. A cleaned up step, the steps that depend
+  on it and the resources they need are dropped from the journal, so a resumed run does them again.
+
+  Ctrl-C stops the run without waiting for the running steps, which are told to give up through `cancellation()`.
+  The journal keeps the steps completed so far, and the resumed run picks up from there.
+  """
+
+  def __init__(self, name, max_workers=4, journal=None):
+    self.name = name
+    self.max_workers = max_workers
+    self.journal = journal or active_journal()
+    self.timings = {}
+    self._steps = []
+    self._dependencies = {}
+    self._persist = {}
+    self._restore = {}
+    self._cleanup = {}
+    self._cleans_up = {}
+
+  def step(self, name, func, depends_on=(), persist=True, restore=None, cleanup=None, cleans_up=()):
+    unknown = [dependency for dependency in depends_on if dependency not in self._dependencies]
+    if unknown:
+      raise CLIError('Step {0} depends on unknown steps {1}'.format(name, ', '.join(unknown)))
+    self._steps.append((name, func))
+    self._dependencies[name] = tuple(depends_on)
+    self._persist[name] = persist
+    self._restore[name] = restore
+    self._cleanup[name] = cleanup
+    self._cleans_up[name] = tuple(cleans_up)
+    return self
+
+  def _upstream(self, name):
+    """Every step that `name` depends on, directly or not."""
+    upstream = set()
+    pending = list(self._dependencies[name])
+    while pending:
+      dependency = pending.pop()
+      if dependency not in upstream:
+        upstream.add(dependency)
+        pending.extend(self._dependencies[dependency])
+    return upstream
+
+  def _redo_after_cleanup(self, name):
+    """The steps a resumed run has to do again once the resource of step `name` is cleaned up.
+
+    That's the step and everything downstream of it, plus any resource those steps need that another step
+    has already cleaned up, such as a snapshot deleted after the copy that now has to be redone.
+    """
+    redo = set([name])
+    while True:
+      before = len(redo)
+      redo.update(step for step, _ in self._steps if redo & self._upstream(step))
+      needed = set().union(*[self._upstream(step) for step in redo])
+      redo.update(cleaned for step, _ in self._steps for cleaned in self._cleans_up[step] if cleaned in needed)
+      if len(redo) == before:
+        return [step for step, _ in self._steps if step in redo]
+
+  def _register_cleanup(self, name, results, result):
+    cleanup = self._cleanup[name]
+    if cleanup is None or self.journal is None:
+      return
+    self.journal.cleanup.push((self.name, name), '{0} of {1}'.format(name, self.name),
+                              lambda: cleanup(dict(results, **{name: result})),
+                              requires=[(self.name, step) for step in self._upstream(name)],
+                              on_success=lambda: self.journal.forget(self.name, self._redo_after_cleanup(name)))
+
+  def _replay(self, results):
+    """Fill in the results recorded by the journal, and return the steps that still have to run."""
+    for name, _ in self._steps:
+      done, result = self.journal.completed(self.name, name) if self.journal else (False, None)
+      if done:
+        logger.info('%s: step %s already completed', self.name, name)
+        results[name] = self._restore[name](result) if self._restore[name] else result
+        self._register_cleanup(name, results, results[name])
+    if self.journal:
+      for name in [name for name, _ in self._steps if name in results]:
+        for cleaned in self._cleans_up[name]:
+          self.journal.cleanup.discard((self.name, cleaned))
+
+    dependents = set(d for dependencies in self._dependencies.values() for d in dependencies)
+    needed = set(name for name, _ in self._steps
+                 if name not in results and (self._persist[name] or name not in dependents))
+    for name, _ in reversed(self._steps):
+      if name in needed:
+        needed.update(d for d in self._dependencies[name] if d not in results)
+    return [(name, func) for name, func in self._steps if name in needed]
+
+  def run(self):
+    with span(self.name, 'pipeline') as pipeline_span:
+      return self._run(pipeline_span)
+
+  def _run(self, pipeline_span):
+    results = {}
+    pending = self._replay(results)
+    running = {}
+    error = None
+    origin = time.time()
+
+    cancelled = getattr(_step_context, 'cancellation', None) or threading.Event()
+
+    def _timed(name, func):
+      start = time.time()
+      try:
+        with cancelled_by(cancelled), activate(self.journal), span(name, 'step', parent=pipeline_span, pipeline=self.name):
+          result = func(results)
+        self._register_cleanup(name, results, result)
+        if self.journal:
+          for cleaned in self._cleans_up[name]:
+            self.journal.cleanup.discard((self.name, cleaned))
+          if self._persist[name]:
+            self.journal.record(self.name, name, result)
+        return result
+      finally:
+        self.timings[name] = StepTiming(name, start - origin, time.time() - origin)
+        logger.info('%s: step %s took %.1fs', self.name, name, self.timings[name].duration)
+
+    executor = ThreadPoolExecutor(max_workers=self.max_workers)
+    try:
+      while pending or running:
+        if error is None and not cancelled.is_set():
+          for name, func in [(n, f) for n, f in pending if all(d in results for d in self._dependencies[n])]:
+            pending.remove((name, func))
+            running[executor.submit(_timed, name, func)] = name
+        if not running:
+          break
+
+        done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+        for future in done:
+          name = running.pop(future)
+          try:
+            results[name] = future.result()
+          except OperationPending as ex:
+            logger.info('%s: step %s is still in progress', self.name, name)
+            error = error or ex
+          except Exception as ex:  # pylint: disable=broad-except
+            logger.error('%s: step %s failed', self.name, name)
+            error = error or ex
+    except KeyboardInterrupt:
+      # Waiting for the running steps would wait for the server-side copies to finish
+      cancelled.set()
+      # the steps still queued never start, the running ones see `cancelled`
+      for future in running:
+        future.cancel()
+      executor.shutdown(wait=False)
+      raise
+    executor.shutdown()
+    # A pipeline run by a step of an interrupted one stops too, and is left to resume rather than cleaned up
+    if cancelled.is_set():
+      raise KeyboardInterrupt()
+    if error is not None:
+      raise error
+    if self.journal:
+      # Whatever the steps didn't clean up themselves, such as the target disk, is the result of the copy
+      for name, _ in self._steps:
+        self.journal.cleanup.discard((self.name, name))
+      self.journal.record_timings(self.name, self.timings, self.critical_path())
+    self.log_critical_path()
+    return results
+
+  def critical_path(self):
+    """The chain of steps, ending with the last one to finish, that determined the total duration."""
+    if not self.timings:
+      return []
+    path = [max(self.timings.values(), key=lambda timing: timing.end)]
+    while True:
+      dependencies = [self.timings[d] for d in self._dependencies[path[0].name] if d in self.timings]
+      if not dependencies:
+        break
+      path.insert(0, max(dependencies, key=lambda timing: timing.end))
+    return path
+
+  def log_critical_path(self):
+    path = self.critical_path()
+    if path:
+      logger.info('%s: finished in %.1fs. Critical path: %s', self.name, path[-1].end,
+                  ' -> '.join('{0} ({1:.1f}s)'.format(timing.name, timing.duration) for timing in path))
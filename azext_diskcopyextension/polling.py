@@ -0,0 +1,107 @@
+import random
+import time
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+logger = get_logger(__name__)
+
+COPY_PENDING = 'pending'
+COPY_SUCCESS = 'success'
+COPY_FAILED_STATES = ('failed', 'aborted')
+
+def parse_copy_progress(progress):
+  """Parse a blob `copy.progress` value ("<bytes copied>/<total bytes>") into a (copied, total) tuple."""
+  try:
+    copied, total = progress.split('/')
+    return int(copied), int(total)
+  except (AttributeError, ValueError):
+    return None, None
+
+def get_copy_properties(blob):
+  return ((blob or {}).get('properties') or {}).get('copy') or {}
+
+class CopyPoller(object):
+  """Decides how long to wait between polls of a server-side blob copy.
+
+  Until the copy has made measurable progress, the interval doubles from `min_interval`. After that, the
+  next poll is scheduled at half of the estimated time remaining, so long copies are polled rarely and
+  short copies are picked up soon after they finish. `clock`, `sleep` and `rand` can be replaced to drive
+  the poller from a recorded progress sequence.
+  """
+
+  def __init__(self, min_interval=1.0, max_interval=60.0, jitter=0.1, smoothing=0.3,
+               clock=time.time, sleep=time.sleep, rand=random.random):
+    self.min_interval = min_interval
+    self.max_interval = max_interval
+    self.jitter = jitter
+    self.smoothing = smoothing
+    self.clock = clock
+    self.sleep = sleep
+    self.rand = rand
+
+    self.status = None
+    self.copied = None
+    self.total = None
+    self.throughput = None
+    self.polls = 0
+    self._last_sample = None
+    self._backoff = min_interval
+
+  def observe(self, blob):
+    """Record a `storage blob show` result and return its copy status. Raises if the copy failed or was aborted."""
+    copy = get_copy_properties(blob)
+    self.polls += 1
+    self.status = copy.get('status') or COPY_PENDING
+    if self.status in COPY_FAILED_STATES:
+      raise CLIError('Copy of {0} {1}: {2}'.format((blob or {}).get('name'), self.status,
+                                                   copy.get('statusDescription') or 'no description'))
+
+    copied, total = parse_copy_progress(copy.get('progress'))
+    if copied is None:
+      return self.status
+
+    now = self.clock()
+    if self._last_sample is not None:
+      elapsed = now - self._last_sample[0]
+      if elapsed > 0 and copied >= self._last_sample[1]:
+        rate = (copied - self._last_sample[1]) / float(elapsed)
+        if self.throughput is None:
+          self.throughput = rate
+        else:
+          self.throughput = self.smoothing * rate + (1 - self.smoothing) * self.throughput
+    self._last_sample = (now, copied)
+    self.copied, self.total = copied, total
+    return self.status
+
+  @property
+  def eta(self):
+    """Estimated seconds until the copy completes, or None if there isn't enough data yet."""
+    if not self.throughput or self.copied is None or not self.total:
+      return None
+    return max(self.total - self.copied, 0) / self.throughput
+
+  @property
+  def percent_complete(self):
+    if self.copied is None or not self.total:
+      return None
+    return 100.0 * self.copied / self.total
+
+  def next_interval(self):
+    eta = self.eta
+    if eta is None:
+      interval = self._backoff
+      self._backoff = min(self._backoff * 2, self.max_interval)
+    else:
+      interval = eta / 2
+
+    interval = min(max(interval, self.min_interval), self.max_interval)
+    if self.jitter:
+      interval *= 1 + self.jitter * (2 * self.rand() - 1)
+    return max(interval, 0)
+
+  def wait(self):
+    interval = self.next_interval()
+    logger.debug('Next copy poll in %.1fs', interval)
+    self.sleep(interval)
+    return interval
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import CalledProcessError
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .tracing import span
+
+logger = get_logger(__name__)
+
+def describe_error(ex):
+  if isinstance(ex, CalledProcessError) and ex.output:
+    lines = [line for line in ex.output.strip().splitlines() if line.strip()]
+    return lines[-1] if lines else str(ex)
+  return str(ex)
+
+class Preflight(object):
+  """Runs independent validation lookups concurrently and reports every failure at once.
+
+  Each check is a lookup function plus an optional `validate(result)` callback that returns an error
+  message, or None if the result is acceptable.
+  """
+
+  def __init__(self, max_workers=8):
+    self.max_workers = max_workers
+    self._checks = []
+
+  def add(self, name, func, *args, **kwargs):
+    self._checks.append((name, func, args, kwargs.pop('validate', None)))
+    return self
+
+  @staticmethod
+  def _traced(parent, name, func, args):
+    with span(name, 'check', parent=parent):
+      return func(*args)
+
+  def run(self):
+    """Return a dict of check name to lookup result. Raises a CLIError listing every failed check."""
+    results = {}
+    errors = []
+    with span('preflight', 'preflight') as preflight_span, \
+         ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(self._checks)))) as executor:
+      futures = [(name, executor.submit(self._traced, preflight_span, name, func, args), validate)
+                 for name, func, args, validate in self._checks]
+      for name, future, validate in futures:
+        try:
+          results[name] = future.result()
+        except Exception as ex:  # pylint: disable=broad-except
+          logger.debug('Pre-flight check %s failed: %s', name, ex)
+          errors.append(describe_error(ex))
+          continue
+        message = validate(results[name]) if validate else None
+        if message:
+          errors.append(message)
+
+    if len(errors) == 1:
+      raise CLIError(errors[0])
+    if errors:
+      raise CLIError('Pre-flight validation failed:\n' + '\n'.join('  - {0}'.format(error) for error in errors))
+    return results
@@ -0,0 +1,196 @@
+import collections
+import json
+import sys
+import threading
+import time
+
+from knack.log import get_logger
+
+logger = get_logger(__name__)
+
+PROGRESS_TEXT = 'text'
+PROGRESS_JSON = 'json'
+PROGRESS_NONE = 'none'
+PROGRESS_FORMATS = [PROGRESS_TEXT, PROGRESS_JSON, PROGRESS_NONE]
+# Window of the moving average throughput, used for the ETA
+MOVING_AVERAGE_SECONDS = 60
+# Page-range copies report after every request, so output is limited to one update per interval
+MIN_EMIT_INTERVAL = 1.0
+BAR_WIDTH = 24
+
+def format_bytes(size):
+  size = float(size or 0)
+  for unit in ['B', 'KB', 'MB', 'GB']:
+    if size < 1024:
+      return '{0:.1f} {1}'.format(size, unit)
+    size /= 1024
+  return '{0:.1f} TB'.format(size)
+
+def format_duration(seconds):
+  seconds = int(round(seconds or 0))
+  if seconds >= 3600:
+    return '{0}h {1:02d}m'.format(seconds // 3600, seconds % 3600 // 60)
+  if seconds >= 60:
+    return '{0}m {1:02d}s'.format(seconds // 60, seconds % 60)
+  return '{0}s'.format(seconds)
+
+class _Console(object):
+  """Keeps one progress line on the terminal for every copy in flight, so concurrent copies don't garble it."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._reporters = []
+    self._width = 0
+
+  def render(self, reporter, stream):
+    with self._lock:
+      if reporter not in self._reporters:
+        self._reporters.append(reporter)
+      self._write(stream, self._line())
+
+  def remove(self, reporter, stream):
+    with self._lock:
+      if reporter not in self._reporters:
+        return
+      self._reporters.remove(reporter)
+      self._write(stream, self._line() if self._reporters else '')
+
+  def _line(self):
+    reporters = self._reporters
+    copied = sum(reporter.copied for reporter in reporters)
+    total = sum(reporter.total or 0 for reporter in reporters)
+    rate = sum(reporter.average_rate or 0 for reporter in reporters)
+    etas = [reporter.eta for reporter in reporters]
+    name = reporters[0].name if len(reporters) == 1 else '{0} copies'.format(len(reporters))
+    filled = int(BAR_WIDTH * copied / total) if total else 0
+    return '{0} [{1}{2}] {3} {4} / {5}  {6}/s  ETA {7}'.format(
+      name, '#' * filled, '-' * (BAR_WIDTH - filled),
+      '{0:.1f}%'.format(100.0 * copied / total) if total else '?', format_bytes(copied), format_bytes(total),
+      format_bytes(rate), format_duration(max(etas)) if etas and None not in etas else '?')
+
+  def _write(self, stream, line):
+    stream.write('\r{0}{1}'.format(line, ' ' * max(self._width - len(line), 0)) + ('' if line else '\r'))
+    stream.flush()
+    self._width = len(line)
+
+_console = _Console()
+
+class ProgressReporter(object):
+  """Turns successive observations of one copy's bytes copied into throughput, ETA and percent complete.
+
+  `text` output draws a progress bar when the stream is a terminal. `json` output writes one JSON line per
+  update to the stream, for dashboards. `finish` returns a summary of the copy.
+  """
+
+  def __init__(self, name, output_format=PROGRESS_TEXT, stream=None, clock=time.time, window=MOVING_AVERAGE_SECONDS):
+    self.name = name
+    self.output_format = output_format or PROGRESS_TEXT
+    self.stream = stream
+    self.clock = clock
+    self.window = window
+    self.copied = 0
+    self.total = None
+    self.rate = None
+    self.average_rate = None
+    self.started = clock()
+    # The first observation is the baseline: a copy being resumed may already be well under way
+    self._samples = collections.deque()
+    self._last_emit = None
+    self._lock = threading.Lock()
+
+  @property
+  def percent_complete(self):
+    if not self.total:
+      return None
+    return 100.0 * self.copied / self.total
+
+  @property
+  def eta(self):
+    if not self.average_rate or not self.total:
+      return None
+    return max(self.total - self.copied, 0) / self.average_rate
+
+  def update(self, copied, total=None):
+    """Record the bytes copied so far, e.g. from a blob's copy progress."""
+    if copied is None:
+      return
+    with self._lock:
+      self._observe(copied, total)
+
+  def add(self, size, total=None):
+    """Count `size` more bytes as copied."""
+    with self._lock:
+      self._observe(self.copied + size, total)
+
+  def _observe(self, copied, total):
+    now = self.clock()
+    if total:
+      self.total = total
+    last_time, last_copied = self._samples[-1] if self._samples else (now, copied)
+    if now > last_time and copied >= last_copied:
+      self.rate = (copied - last_copied) / (now - last_time)
+    self.copied = copied
+    self._samples.append((now, copied))
+    while len(self._samples) > 2 and self._samples[1][0] < now - self.window:
+      self._samples.popleft()
+    first_time, first_copied = self._samples[0]
+    if now > first_time:
+      self.average_rate = (copied - first_copied) / (now - first_time)
+
+    if self._last_emit is not None and now - self._last_emit < MIN_EMIT_INTERVAL and copied != self.total:
+      return
+    self._last_emit = now
+    self._emit('progress', self.to_dict())
+
+  def to_dict(self):
+    percent, eta = self.percent_complete, self.eta
+    return {
+      'name': self.name,
+      'bytesCopied': self.copied,
+      'totalBytes': self.total,
+      'percentComplete': None if percent is None else round(percent, 1),
+      'bytesPerSecond': None if self.rate is None else int(self.rate),
+      'averageBytesPerSecond': None if self.average_rate is None else int(self.average_rate),
+      'etaSeconds': None if eta is None else int(eta),
+    }
+
+  def finish(self):
+    duration = self.clock() - self.started
+    summary = {
+      'name': self.name,
+      'bytesCopied': self.copied,
+      'durationSeconds': round(duration, 1),
+      'averageBytesPerSecond': int(self.copied / duration) if duration > 0 else None,
+    }
+    stream = self.stream or sys.stderr
+    if self.output_format == PROGRESS_TEXT and stream.isatty():
+      _console.remove(self, stream)
+    self._emit('finished', summary)
+    logger.info('Copied %s to %s in %s', format_bytes(self.copied), self.name, format_duration(duration))
+    return summary
+
+  def _emit(self, event, data):
+    stream = self.stream or sys.stderr
+    if self.output_format == PROGRESS_JSON:
+      data = dict(data, event=event, timestamp=round(self.clock(), 3))
+      stream.write(json.dumps(data, sort_keys=True) + '\n')
+      stream.flush()
+    elif self.output_format == PROGRESS_TEXT and event == 'progress' and stream.isatty():
+      _console.render(self, stream)
+
+def report_summary(summary, output_format=PROGRESS_TEXT, stream=None):
+  """Write the final summary of an operation: bytes copied, duration, average throughput and phase timings."""
+  stream = stream or sys.stderr
+  if output_format == PROGRESS_JSON:
+    stream.write(json.dumps(dict(summary, event='summary')) + '\n')
+    stream.flush()
+    return
+
+  phases = ', '.join('{0} {1}'.format(name, format_duration(seconds)) for name, seconds in summary['phases'].items())
+  message = 'Copied {0} in {1}{2}'.format(
+    format_bytes(summary['bytesCopied']), format_duration(summary['durationSeconds']),
+    ' ({0}/s)'.format(format_bytes(summary['averageBytesPerSecond'])) if summary['averageBytesPerSecond'] else '')
+  if output_format == PROGRESS_TEXT and stream.isatty():
+    stream.write('{0}. Phases: {1}\n'.format(message, phases))
+  else:
+    logger.info('%s. Phases: %s', message, phases)
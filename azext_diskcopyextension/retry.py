@@ -0,0 +1,183 @@
+import os
+import random
+import re
+import threading
+import time
+from subprocess import CalledProcessError
+
+from knack.log import get_logger
+
+from .tracing import span
+
+logger = get_logger(__name__)
+
+MAX_RETRIES_ENV = 'AZURE_DISKCOPY_MAX_RETRIES'
+RATE_LIMIT_ENV = 'AZURE_DISKCOPY_MAX_CALLS_PER_SECOND'
+DEFAULT_MAX_RETRIES = 5
+# ARM refills a subscription's write bucket at 10 requests per second per region
+DEFAULT_RATE_LIMIT = 10
+
+ERROR_THROTTLED = 'throttled'
+ERROR_CONFLICT = 'conflict'
+ERROR_TRANSIENT = 'transient'
+ERROR_FATAL = 'fatal'
+
+# Checked in order against the CLI's error output, the first match wins
+ERROR_PATTERNS = [
+  (ERROR_THROTTLED, re.compile(r'(?i)TooManyRequests|Throttl|ServerBusy|server is busy|status code:? 429|\b429 ')),
+  (ERROR_CONFLICT, re.compile(r'(?i)\(Conflict\)|AnotherOperationInProgress|OperationPreempted|RetryableError|status code:? 409')),
+  (ERROR_TRANSIENT, re.compile(r'(?i)InternalServerError|ServiceUnavailable|GatewayTimeout|BadGateway|OperationTimedOut|'
+                               r'status code:? 50[0234]|\b50[234] |Connection (?:reset|aborted|refused)|ConnectionError|'
+                               r'RemoteDisconnected|timed out|Temporary failure in name resolution')),
+]
+retry_after_regex = re.compile(r"(?i)(?:Retry-After:?\s*|try again after '?|retry after '?)(\d+(?:\.\d+)?)")
+
+# Running these twice has a side effect, so only a throttled call (which Azure rejected without running it) is retried.
+# Creates are PUTs of a named resource and deletes are by id, so everything else can be repeated.
+NON_IDEMPOTENT_COMMANDS = [
+  'az storage blob snapshot',
+  'az storage blob copy start',
+]
+
+def classify_error(output):
+  """Classify a failed az call from its output as throttled, conflict, transient or fatal."""
+  for category, pattern in ERROR_PATTERNS:
+    if pattern.search(output or ''):
+      return category
+  return ERROR_FATAL
+
+def env_setting(name, default, convert=int):
+  """The non-negative number set with environment variable `name`, or `default` if it's unset or not a number."""
+  value = os.environ.get(name)
+  if value is None:
+    return default
+  try:
+    number = convert(value)
+    if number < 0:
+      raise ValueError(value)
+    return number
+  except ValueError:
+    logger.warning('Ignoring %s=%s, which is not a non-negative number. Using %s', name, value, default)
+    return default
+
+def parse_retry_after(output):
+  """Return the seconds to wait that Azure asked for in a failed call's output, or None."""
+  match = retry_after_regex.search(output or '')
+  return float(match.group(1)) if match else None
+
+class RetryPolicy(object):
+  """Decides whether a failed az call is retried, and after how long.
+
+  Throttled calls are always retried. Conflicts and transient failures are retried for idempotent commands.
+  Delays grow exponentially from `base_delay` up to `max_delay`, with jitter so concurrent copies don't retry in
+  lockstep. A Retry-After from Azure replaces the computed delay. Without `max_retries`, it is read from
+  AZURE_DISKCOPY_MAX_RETRIES on first use.
+  """
+
+  def __init__(self, max_retries=None, base_delay=2.0, max_delay=60.0, rand=random.random, sleep=time.sleep):
+    self._max_retries = max_retries
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.rand = rand
+    self.sleep = sleep
+
+  @property
+  def max_retries(self):
+    if self._max_retries is None:
+      self._max_retries = env_setting(MAX_RETRIES_ENV, DEFAULT_MAX_RETRIES)
+    return self._max_retries
+
+  @max_retries.setter
+  def max_retries(self, value):
+    self._max_retries = value
+
+  def should_retry(self, category, attempt, idempotent=True):
+    if attempt >= self.max_retries:
+      return False
+    if category == ERROR_THROTTLED:
+      return True
+    return idempotent and category in (ERROR_CONFLICT, ERROR_TRANSIENT)
+
+  def delay(self, attempt, retry_after=None):
+    if retry_after is not None:
+      return retry_after
+    delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+    return delay / 2 + self.rand() * delay / 2
+
+class RateLimiter(object):
+  """Token bucket shared by every az call in the process, so concurrent copies stay under the subscription's limits.
+
+  `rate` calls per second are allowed on average, in bursts of up to `burst`. A rate of 0 disables the limit.
+  `pause` holds back every caller, which is how one throttled call slows down all copies instead of just itself.
+  Without a `rate`, it is read from AZURE_DISKCOPY_MAX_CALLS_PER_SECOND on first use.
+  """
+
+  def __init__(self, rate=None, burst=None, clock=time.time, sleep=time.sleep):
+    self._rate = rate
+    self._burst = burst
+    self.clock = clock
+    self.sleep = sleep
+    self._tokens = None
+    self._updated = clock()
+    self._paused_until = 0
+    self._lock = threading.Lock()
+
+  @property
+  def rate(self):
+    if self._rate is None:
+      self._rate = env_setting(RATE_LIMIT_ENV, DEFAULT_RATE_LIMIT, float)
+    return self._rate
+
+  @property
+  def burst(self):
+    return self._burst or max(self.rate * 2, 1)
+
+  def acquire(self):
+    """Block until a call may be made. Returns the seconds spent waiting."""
+    waited = 0
+    while True:
+      with self._lock:
+        now = self.clock()
+        wait = self._paused_until - now
+        if wait <= 0:
+          if not self.rate:
+            return waited
+          # the bucket starts full
+          tokens = float(self.burst) if self._tokens is None else self._tokens
+          self._tokens = min(self.burst, tokens + (now - self._updated) * self.rate)
+          self._updated = now
+          if self._tokens >= 1:
+            self._tokens -= 1
+            return waited
+          wait = (1 - self._tokens) / self.rate
+      self.sleep(wait)
+      waited += wait
+
+  def pause(self, seconds):
+    with self._lock:
+      self._paused_until = max(self._paused_until, self.clock() + seconds)
+
+def call_with_retry(func, name, idempotent=True, policy=None, limiter=None):
+  """Call `func` (an az call that raises CalledProcessError) through the rate limiter, retrying failures the policy allows."""
+  policy = policy or retry_policy
+  limiter = limiter or rate_limiter
+  attempt = 0
+  while True:
+    limiter.acquire()
+    try:
+      return func()
+    except CalledProcessError as ex:
+      category = classify_error(ex.output)
+      if not policy.should_retry(category, attempt, idempotent):
+        raise
+      delay = policy.delay(attempt, parse_retry_after(ex.output))
+      attempt += 1
+      logger.warning('%s failed (%s), retrying in %.1fs (retry %d of %d)', name, category, delay, attempt, policy.max_retries)
+      with span('backoff', 'retry', command=name, errorCategory=category, attempt=attempt, seconds=round(delay, 3)):
+        if category == ERROR_THROTTLED:
+          # the subscription is over its limit, so every copy backs off, not just this call
+          limiter.pause(delay)
+        policy.sleep(delay)
+
+retry_policy = RetryPolicy()
+rate_limiter = RateLimiter()
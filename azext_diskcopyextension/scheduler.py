@@ -0,0 +1,195 @@
+import contextlib
+import threading
+import time
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .journal import STATUS_RUNNING, active_journal
+from .tracing import span
+
+logger = get_logger(__name__)
+
+ORDER_MANIFEST = 'manifest'
+ORDER_LARGEST_FIRST = 'largest-first'
+ORDER_SHORTEST_FIRST = 'shortest-first'
+JOB_ORDERS = [ORDER_MANIFEST, ORDER_LARGEST_FIRST, ORDER_SHORTEST_FIRST]
+# Per-copy rates assumed for a route until a copy on it has been observed, only used to rank jobs
+DEFAULT_SAME_REGION_RATE = 2 * 1024 ** 3
+DEFAULT_CROSS_REGION_RATE = 512 * 1024 ** 2
+# Measured rates are noisy, so a cap that is a multiple of a copy's rate still admits that many copies
+BANDWIDTH_TOLERANCE = 0.05
+# How often a copy waiting for a slot checks for slots left behind by operations that ended without releasing them
+ADMISSION_RECHECK_INTERVAL = 5.0
+
+def copy_key(account, container, blob_name):
+  return (account.lower(), container, blob_name)
+
+class _ActiveCopy(object):
+  def __init__(self, key, accounts, route, owner, started):
+    self.key = key
+    self.accounts = accounts
+    self.route = route
+    # the journal of the operation that started the copy, if it was journaled
+    self.owner = owner
+    self.started = started
+    self.throughput = None
+
+  def abandoned(self):
+    """The operation ended without waiting for the copy, e.g. another step failed, or it was paused with --no-wait."""
+    return self.owner is not None and (self.owner.status != STATUS_RUNNING or self.owner.owner is None)
+
+class CopyScheduler(object):
+  """Admits server-side copies into storage accounts within per-account concurrency and bandwidth caps, ranking
+  batch jobs by the throughput observed per (source region, target region) route. `locate(account)` returns a region or None."""
+
+  def __init__(self, locate=lambda account: None, smoothing=0.3, clock=time.time):
+    self.locate = locate
+    self.smoothing = smoothing
+    self.clock = clock
+    self.max_copies = None
+    self.max_bytes_per_second = None
+    self._copies = {}
+    self._waiting = []
+    self._routes = {}
+    self._peaks = {}
+    self._cond = threading.Condition()
+
+  @contextlib.contextmanager
+  def limits(self, max_copies=None, max_bytes_per_second=None):
+    """Apply the per-account caps of a batch while it runs."""
+    if max_copies is not None and max_copies < 1:
+      raise CLIError('--max-copies-per-account must be at least 1')
+    if max_bytes_per_second is not None and max_bytes_per_second <= 0:
+      raise CLIError('--max-account-throughput-mb must be greater than 0')
+    with self._cond:
+      previous = self.max_copies, self.max_bytes_per_second
+      self.max_copies, self.max_bytes_per_second = max_copies, max_bytes_per_second
+    try:
+      yield self
+    finally:
+      with self._cond:
+        self.max_copies, self.max_bytes_per_second = previous
+        self._cond.notify_all()
+
+  def route(self, source_account, target_account, source_region=None):
+    source_region = source_region or (self.locate(source_account) if source_account else None)
+    target_region = self.locate(target_account) if target_account else None
+    return ((source_region or '').lower() or None, (target_region or '').lower() or None)
+
+  def admit(self, key, source_account, target_account, source_region=None):
+    """Block until the copy into `key` fits within the caps of its accounts, and take its slots."""
+    accounts = tuple(sorted(set(account.lower() for account in (source_account, target_account) if account)))
+    route = self.route(source_account, target_account, source_region)
+    copy = _ActiveCopy(key, accounts, route, active_journal(), self.clock())
+    with self._cond:
+      blocked = self._blocked(copy)
+      if blocked:
+        started = self.clock()
+        logger.warning('Waiting to copy into %s/%s: %s', key[0], key[2], blocked)
+        self._waiting.append(copy)
+        try:
+          with span('wait for copy slot', 'scheduler', blob=key[2], reason=blocked):
+            while blocked:
+              self._cond.wait(ADMISSION_RECHECK_INTERVAL)
+              self._release_abandoned()
+              blocked = self._blocked(copy)
+        finally:
+          self._waiting.remove(copy)
+          self._cond.notify_all()
+        logger.info('Copy into %s/%s admitted after %.1fs', key[0], key[2], self.clock() - started)
+      copy.started = self.clock()
+      self._copies[key] = copy
+
+  @contextlib.contextmanager
+  def starting(self, key, source_account, target_account, source_region=None):
+    """Admit a copy for the duration of the block that starts it. If the copy can't be started, its slots are released."""
+    self.admit(key, source_account, target_account, source_region)
+    try:
+      yield
+    except BaseException:
+      self.finish(key)
+      raise
+
+  def _blocked(self, copy):
+    """Why `copy` can't start yet, or None if it can.
+
+    An account with no copies always admits one, so a cap below the rate of a single copy slows nothing down. Until
+    a route has been measured, its copies start one at a time under a bandwidth cap, so the first measurement isn't
+    throttled by other copies. Copies waiting on an account are admitted in the order they arrived.
+    """
+    expected = self._peaks.get(copy.route, 0)
+    ahead = self._waiting[:self._waiting.index(copy)] if copy in self._waiting else self._waiting
+    for account in copy.accounts:
+      if any(account in other.accounts for other in ahead):
+        return 'copies waiting for {0} before it'.format(account)
+      copies = [other for other in self._copies.values() if account in other.accounts and other.key != copy.key]
+      if not copies:
+        continue
+      if self.max_copies is not None and len(copies) >= self.max_copies:
+        return '{0} has {1} copies in progress'.format(account, len(copies))
+      if self.max_bytes_per_second is None:
+        continue
+      if not expected or any(other.throughput is None and other.route not in self._peaks for other in copies):
+        return 'the throughput of copies through {0} has not been measured yet'.format(account)
+      # a saturated account throttles all of its copies, so their measured throughput would hide the demand
+      load = sum(max(self._throughput(other), self._peaks.get(other.route, 0)) for other in copies)
+      if load + expected > self.max_bytes_per_second * (1 + BANDWIDTH_TOLERANCE):
+        return '{0} has {1:.0f} MB/s of copies in progress'.format(account, load / 1024 ** 2)
+    return None
+
+  def _throughput(self, copy):
+    # until its first progress is measured, a copy is assumed to run at the rate of its route
+    return copy.throughput if copy.throughput is not None else self.expected_rate(copy.route) or 0
+
+  def _release_abandoned(self):
+    for key, copy in list(self._copies.items()):
+      if copy.abandoned():
+        logger.debug('Releasing the slot of abandoned copy %s', key)
+        del self._copies[key]
+
+  def observe(self, key, poller):
+    """Record the throughput of a copy from a CopyPoller that has just observed it."""
+    if poller.throughput is None:
+      return
+    with self._cond:
+      copy = self._copies.get(key)
+      if copy is None:
+        return
+      copy.throughput = poller.throughput
+      average = self._routes.get(copy.route)
+      self._routes[copy.route] = poller.throughput if average is None else \
+        self.smoothing * poller.throughput + (1 - self.smoothing) * average
+      self._peaks[copy.route] = max(self._peaks.get(copy.route, 0), poller.throughput)
+      # a copy that slowed down may have made room under a bandwidth cap
+      self._cond.notify_all()
+
+  def finish(self, key):
+    with self._cond:
+      if self._copies.pop(key, None) is not None:
+        self._cond.notify_all()
+
+  def expected_rate(self, route):
+    """The average observed per-copy throughput on a route, or None before the first observation."""
+    return self._routes.get(route)
+
+  def account_throughput(self, account):
+    with self._cond:
+      return sum(self._throughput(copy) for copy in self._copies.values() if account.lower() in copy.accounts)
+
+  def estimate_seconds(self, size, route):
+    """Rough duration of copying `size` bytes on a route, for ranking jobs."""
+    rate = self.expected_rate(route)
+    if rate is None:
+      rate = DEFAULT_SAME_REGION_RATE if route[0] is not None and route[0] == route[1] else DEFAULT_CROSS_REGION_RATE
+    return size / float(rate)
+
+  def stats(self):
+    """Live throughput per account and average per-copy throughput per route, in bytes per second."""
+    with self._cond:
+      accounts = {}
+      for copy in self._copies.values():
+        for account in copy.accounts:
+          accounts[account] = accounts.get(account, 0) + self._throughput(copy)
+      routes = dict(('{0}->{1}'.format(*route), int(rate)) for route, rate in self._routes.items())
+    return {'accounts': dict((account, int(rate)) for account, rate in accounts.items()), 'routes': routes}
@@ -0,0 +1,196 @@
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from knack.log import get_logger
+
+from .blob_client import blob_clients, use_rest_client
+from .cache import resource_cache
+from .cli_utils import az_cli
+
+logger = get_logger(__name__)
+
+TEMP_TAG = 'disk-copy-temp'
+POOL_TAG = 'disk-copy-pool'
+LAST_USED_TAG = 'disk-copy-last-used'
+LEASE_CONTAINER_PREFIX = 'diskcopy-'
+
+class TempStorageLease(object):
+  """A temp storage account handed to one copy, with a container of its own for the copy's blobs."""
+
+  def __init__(self, pool, account, container, pooled):
+    self.pool = pool
+    self.account = account
+    self.container = container
+    self.pooled = pooled
+
+  @property
+  def account_name(self):
+    return self.account['name']
+
+  def blob_uri(self, blob_name):
+    return 'https://{0}.blob.core.windows.net/{1}/{2}'.format(self.account_name, self.container, blob_name)
+
+  def release(self):
+    self.pool.release(self)
+
+  def to_dict(self):
+    return {'account': self.account, 'container': self.container, 'pooled': self.pooled}
+
+class TempStorageAccountPool(object):
+  """Shares `disk-copy-temp` storage accounts between copies into the same resource group and region.
+
+  Pooled accounts are found by tag, or created on first use, and are kept after the copy. Every lease gets
+  its own container, which is deleted on release, so concurrent copies never see each other's blobs.
+  `prune` deletes pooled accounts that have been idle longer than a TTL. `create_or_use_account(name,
+  resource_group_name, extra_tags=None)` provisions accounts.
+  """
+
+  def __init__(self, create_or_use_account):
+    self.create_or_use_account = create_or_use_account
+    self._lock = threading.Lock()
+    self._leases = {}
+    # (resource group, location) -> Future of the last pooled account created there, shared with leases that
+    # listed the accounts before it existed
+    self._created = {}
+
+  def lease(self, resource_group_name, location, storage_account_name=None):
+    container = '{0}{1}'.format(LEASE_CONTAINER_PREFIX, uuid.uuid4().hex[:12])
+    if storage_account_name:
+      account = self.create_or_use_account(storage_account_name, resource_group_name)
+      return self._track(TempStorageLease(self, account, container, pooled=False))
+
+    lease = self._lease_pooled(resource_group_name, location, container)
+    touch_account(lease.account)
+    return lease
+
+  def _lease_pooled(self, resource_group_name, location, container):
+    # the lock is only held to choose and record an account, never across an az call
+    key = (resource_group_name.lower(), location.lower())
+    with self._lock:
+      seen = self._created.get(key)
+    candidates = [account for account in list_pooled_accounts(resource_group_name)
+                  if account['location'].lower() == location.lower() and account.get('provisioningState') == 'Succeeded']
+    with self._lock:
+      if candidates:
+        account = min(candidates, key=lambda a: self._leases.get(a['name'], 0))
+        logger.info('Reusing temp storage account %s', account['name'])
+        return self._track(TempStorageLease(self, account, container, pooled=True))
+      pending = self._created.get(key)
+      # an account created before the listing that isn't in it has since been deleted
+      if pending is None or (pending is seen and pending.done()):
+        pending = None
+        creating = self._created[key] = Future()
+
+    if pending is not None:
+      # another copy is creating, or has just created, the account for this location, so share it
+      account = pending.result()
+      logger.info('Reusing temp storage account %s', account['name'])
+      with self._lock:
+        return self._track(TempStorageLease(self, account, container, pooled=True))
+
+    try:
+      account = self.create_or_use_account('diskcopytemp{0}'.format(random.randint(0, 100000)), resource_group_name,
+                                           [POOL_TAG, '{0}={1}'.format(LAST_USED_TAG, int(time.time()))])
+    except BaseException as ex:
+      with self._lock:
+        del self._created[key]
+      creating.set_exception(ex)
+      raise
+    with self._lock:
+      lease = self._track(TempStorageLease(self, account, container, pooled=True))
+    creating.set_result(account)
+    return lease
+
+  def release(self, lease):
+    logger.info('Releasing temp storage container %s in %s', lease.container, lease.account_name)
+    delete_container(lease.account_name, lease.container)
+    with self._lock:
+      self._leases[lease.account_name] -= 1
+    if lease.pooled:
+      touch_account(lease.account)
+
+  def restore(self, lease):
+    """Take back a lease recorded by a copy that is being resumed."""
+    with self._lock:
+      return self._track(TempStorageLease(self, lease['account'], lease['container'], lease['pooled']))
+
+  def _track(self, lease):
+    self._leases[lease.account_name] = self._leases.get(lease.account_name, 0) + 1
+    return lease
+
+  def prune(self, resource_group_name=None, idle_hours=24, dry_run=False):
+    """Delete pooled temp accounts unused for `idle_hours` that have no copy in progress."""
+    cutoff = time.time() - idle_hours * 3600
+    pruned = []
+    for account in list_pooled_accounts(resource_group_name):
+      last_used = float((account.get('tags') or {}).get(LAST_USED_TAG) or 0)
+      if last_used > cutoff or self._leases.get(account['name']):
+        continue
+      if has_pending_copies(account['name']):
+        logger.warning('Keeping idle temp storage account %s, it still has a copy in progress', account['name'])
+        continue
+
+      pruned.append(account['name'])
+      if dry_run:
+        logger.warning('Would delete idle temp storage account %s', account['name'])
+        continue
+      logger.warning('Deleting idle temp storage account %s', account['name'])
+      az_cli(['storage', 'account', 'delete', '--yes',
+              '--ids', account['id']])
+      resource_cache.invalidate_resource(account['id'])
+    return pruned
+
+def list_tagged_accounts(tag, resource_group_name=None):
+  cmd = ['storage', 'account', 'list',
+          '--query', "[?tags.\"{0}\" != null]".format(tag)]
+  if resource_group_name:
+    cmd += ['-g', resource_group_name]
+  return az_cli(cmd) or []
+
+def list_pooled_accounts(resource_group_name=None):
+  return list_tagged_accounts(POOL_TAG, resource_group_name)
+
+def list_temp_accounts(resource_group_name=None):
+  return list_tagged_accounts(TEMP_TAG, resource_group_name)
+
+def touch_account(account):
+  az_cli(['storage', 'account', 'update',
+          '--ids', account['id'],
+          '--set', 'tags.{0}={1}'.format(LAST_USED_TAG, int(time.time()))])
+
+def list_lease_containers(storage_account_name):
+  if use_rest_client():
+    return blob_clients.get(storage_account_name).list_containers(LEASE_CONTAINER_PREFIX)
+
+  env = {}
+  env['AZURE_STORAGE_ACCOUNT'] = storage_account_name
+  return az_cli(['storage', 'container', 'list',
+                  '--prefix', LEASE_CONTAINER_PREFIX], env=env) or []
+
+def delete_container(storage_account_name, container_name):
+  if use_rest_client():
+    blob_clients.get(storage_account_name).delete_container(container_name)
+    return
+
+  env = {}
+  env['AZURE_STORAGE_ACCOUNT'] = storage_account_name
+  az_cli(['storage', 'container', 'delete',
+          '-n', container_name], env=env)
+
+def has_pending_copies(storage_account_name):
+  return any(container_has_pending_copies(storage_account_name, container['name'])
+             for container in list_lease_containers(storage_account_name))
+
+def container_has_pending_copies(storage_account_name, container_name):
+  if use_rest_client():
+    blobs = blob_clients.get(storage_account_name).list_blobs(container_name)
+  else:
+    env = {}
+    env['AZURE_STORAGE_ACCOUNT'] = storage_account_name
+    blobs = az_cli(['storage', 'blob', 'list',
+                    '-c', container_name,
+                    '--include', 'c'], env=env) or []
+  return any((((blob.get('properties') or {}).get('copy') or {}).get('status')) == 'pending' for blob in blobs)
@@ -0,0 +1,189 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .journal import redact
+
+logger = get_logger(__name__)
+
+TRACE_CHROME = 'chrome'
+TRACE_OTLP = 'otlp'
+TRACE_FORMATS = [TRACE_CHROME, TRACE_OTLP]
+SERVICE_NAME = 'azure-cli-disk-copy-extension'
+# Arguments whose value is a secret
+SECRET_ARGUMENTS = ['--account-key', '--source-account-key', '--sas-token', '--source-sas', '--connection-string']
+
+_tracer = None
+_context = threading.local()
+
+def redact_argv(argv):
+  redacted = []
+  for index, arg in enumerate(argv):
+    if index > 0 and argv[index - 1] in SECRET_ARGUMENTS:
+      arg = 'REDACTED'
+    redacted.append(redact(arg))
+  return redacted
+
+class Span(object):
+  def __init__(self, name, category, parent, attributes):
+    self.id = uuid.uuid4().hex[:16]
+    self.name = name
+    self.category = category
+    self.parent = parent
+    self.attributes = dict(attributes)
+    self.thread = threading.current_thread().name
+    self.thread_id = threading.current_thread().ident
+    self.start = time.time()
+    self.end = None
+    self.error = None
+
+  @property
+  def duration(self):
+    return (self.end or time.time()) - self.start
+
+  def set(self, key, value):
+    self.attributes[key] = value
+
+class Tracer(object):
+  """Collects spans for az calls, pipeline steps and other phases of a copy, and writes them to a trace file.
+
+  `chrome` traces open in chrome://tracing or Perfetto, with one lane per thread. `otlp` writes the
+  OpenTelemetry JSON encoding, which collectors and most tracing backends can import.
+  """
+
+  def __init__(self):
+    self.trace_id = uuid.uuid4().hex
+    self.spans = []
+    self._lock = threading.Lock()
+
+  def start(self, name, category, parent=None, attributes=None):
+    span = Span(name, category, parent or current_span(), attributes or {})
+    with self._lock:
+      self.spans.append(span)
+    return span
+
+  def to_chrome(self):
+    pid = os.getpid()
+    events = []
+    for span in self.spans:
+      args = dict(span.attributes)
+      if span.error:
+        args['error'] = span.error
+      events.append({
+        'name': span.name,
+        'cat': span.category,
+        'ph': 'X',
+        'ts': int(span.start * 1e6),
+        'dur': int(span.duration * 1e6),
+        'pid': pid,
+        'tid': span.thread_id,
+        'args': args,
+      })
+    events += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+               for tid, name in set((span.thread_id, span.thread) for span in self.spans)]
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+  def to_otlp(self):
+    def _value(value):
+      if isinstance(value, bool):
+        return {'boolValue': value}
+      if isinstance(value, int):
+        return {'intValue': str(value)}
+      if isinstance(value, float):
+        return {'doubleValue': value}
+      return {'stringValue': value if isinstance(value, str) else json.dumps(value)}
+
+    spans = []
+    for span in self.spans:
+      attributes = dict(span.attributes, **{'diskcopy.category': span.category, 'thread.name': span.thread})
+      otlp_span = {
+        'traceId': self.trace_id,
+        'spanId': span.id,
+        'name': span.name,
+        'kind': 1,
+        'startTimeUnixNano': str(int(span.start * 1e9)),
+        'endTimeUnixNano': str(int((span.end or time.time()) * 1e9)),
+        'attributes': [{'key': key, 'value': _value(value)} for key, value in sorted(attributes.items())],
+        'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+      }
+      if span.parent is not None:
+        otlp_span['parentSpanId'] = span.parent.id
+      spans.append(otlp_span)
+    return {'resourceSpans': [{
+      'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+      'scopeSpans': [{'scope': {'name': __name__.split('.')[0]}, 'spans': spans}],
+    }]}
+
+  def export(self, trace_file, trace_format=TRACE_CHROME):
+    if trace_format not in TRACE_FORMATS:
+      raise CLIError('Unknown trace format {0}. Expected one of: {1}'.format(trace_format, ', '.join(TRACE_FORMATS)))
+    with self._lock:
+      trace = self.to_otlp() if trace_format == TRACE_OTLP else self.to_chrome()
+    with open(trace_file, 'w') as f:
+      json.dump(trace, f)
+    logger.warning('Wrote a %s trace of %d spans to %s', trace_format, len(self.spans), trace_file)
+
+def get_tracer():
+  return _tracer
+
+def current_span():
+  stack = getattr(_context, 'stack', None)
+  return stack[-1] if stack else None
+
+@contextlib.contextmanager
+def span(name, category, parent=None, **attributes):
+  """Record a span while tracing is enabled. Yields the Span, or None when it isn't."""
+  tracer = _tracer
+  if tracer is None:
+    yield None
+    return
+
+  current = tracer.start(name, category, parent, attributes)
+  stack = getattr(_context, 'stack', None)
+  if stack is None:
+    stack = _context.stack = []
+  stack.append(current)
+  try:
+    yield current
+  except BaseException as ex:
+    current.error = redact(str(ex).strip().splitlines()[-1] if str(ex).strip() else type(ex).__name__)
+    raise
+  finally:
+    current.end = time.time()
+    stack.pop()
+
+def add_span(name, category, start, end, parent=None, **attributes):
+  """Record a span measured elsewhere, e.g. an estimate of part of a call."""
+  tracer = _tracer
+  if tracer is None:
+    return None
+  recorded = tracer.start(name, category, parent, attributes)
+  recorded.start, recorded.end = start, end
+  return recorded
+
+def traced(func):
+  """Decorator for commands: takes `trace_file=None` and `trace_format=None` parameters and writes a trace of the command."""
+  @functools.wraps(func)
+  def wrapper(*args, **kwargs):
+    global _tracer  # pylint: disable=global-statement
+    trace_file = kwargs.pop('trace_file', None)
+    trace_format = kwargs.pop('trace_format', None) or TRACE_CHROME
+    # A command called by another traced command (a batch) is part of its trace
+    if not trace_file or _tracer is not None:
+      return func(*args, **kwargs)
+
+    _tracer = Tracer()
+    try:
+      with span(func.__name__, 'command'):
+        return func(*args, **kwargs)
+    finally:
+      tracer, _tracer = _tracer, None
+      tracer.export(trace_file, trace_format)
+  return wrapper
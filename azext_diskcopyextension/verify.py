@@ -0,0 +1,279 @@
+import base64
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from .page_blob import (DEFAULT_MAX_WORKERS, MAX_GET_RANGE_BYTES, READ_CHUNK_BYTES, PageBlobClient, PageRangeCopier, list_page_ranges,
+                        run_bounded, split_ranges, subtract_ranges)
+from .retry import ERROR_TRANSIENT, retry_policy
+from .tracing import span
+
+logger = get_logger(__name__)
+
+MANIFEST_VERSION = 1
+HASH_ALGORITHM = 'sha256'
+# A 4 TiB disk has 65536 ranges, a manifest of a few MB, and a range that differs is cheap to copy again
+DEFAULT_VERIFY_RANGE_BYTES = 64 * 1024 * 1024
+# How many of the ranges that differ an error lists
+MAX_REPORTED_MISMATCHES = 10
+
+_ZEROS = bytes(bytearray(READ_CHUNK_BYTES))
+
+def window_ranges(ranges, range_size):
+  """Group sorted, inclusive (start, end) ranges by the fixed-size window they fall in, splitting those that cross windows."""
+  windows = {}
+  for start, end in ranges:
+    while start <= end:
+      index = start // range_size
+      window_end = min(end, (index + 1) * range_size - 1)
+      windows.setdefault(index, []).append((start, window_end))
+      start = window_end + 1
+  return windows
+
+def _feed_zeros(digest, length):
+  while length > 0:
+    chunk = min(length, len(_ZEROS))
+    digest.update(_ZEROS[:chunk] if chunk < len(_ZEROS) else _ZEROS)
+    length -= chunk
+
+def _read_into(client, digest, offset, length):
+  """Hash a range into a copy of `digest` and return the copy. A response that breaks off is read again from the start."""
+  attempt = 0
+  while True:
+    partial = digest.copy()
+    received = 0
+    try:
+      for chunk in client.read(offset, length):
+        partial.update(chunk)
+        received += len(chunk)
+      if received != length:
+        raise IOError('received {0} of {1} bytes'.format(received, length))
+      return partial
+    except IOError as ex:
+      if not retry_policy.should_retry(ERROR_TRANSIENT, attempt):
+        raise CLIError('Reading bytes {0}-{1} of {2} failed: {3}'.format(offset, offset + length - 1, client.sas_url.split('?')[0], ex))
+      delay = retry_policy.delay(attempt)
+      attempt += 1
+      logger.debug('Reading bytes %d-%d failed (%s), retrying in %.1fs', offset, offset + length - 1, ex, delay)
+      retry_policy.sleep(delay)
+
+class RangeHasher(object):
+  """Hashes a page blob in fixed-size ranges, reading only its populated pages.
+
+  The digest of a range covers its content with the unpopulated pages as zeros, so two blobs with the same data hash
+  the same whichever of their pages are allocated. A range that is all zeros has no digest (None), and one without
+  populated pages isn't read at all.
+  """
+
+  def __init__(self, range_size=DEFAULT_VERIFY_RANGE_BYTES):
+    self.range_size = range_size
+    self._zero_digests = {}
+    self._lock = threading.Lock()
+
+  def bounds(self, index, size):
+    start = index * self.range_size
+    return start, min(size, start + self.range_size) - 1
+
+  def _zero_digest(self, length):
+    with self._lock:
+      if length not in self._zero_digests:
+        digest = hashlib.new(HASH_ALGORITHM)
+        _feed_zeros(digest, length)
+        self._zero_digests[length] = digest.digest()
+      return self._zero_digests[length]
+
+  def hash_range(self, client, index, size, populated):
+    """Return the digest of range `index` of a blob of `size` bytes and the bytes read for it.
+
+    `populated` are the blob's populated (start, end) ranges within the range.
+    """
+    if not populated:
+      return None, 0
+    start, end = self.bounds(index, size)
+    digest = hashlib.new(HASH_ALGORITHM)
+    position, read = start, 0
+    for offset, length in split_ranges(populated, MAX_GET_RANGE_BYTES):
+      _feed_zeros(digest, offset - position)
+      digest = _read_into(client, digest, offset, length)
+      position, read = offset + length, read + length
+    _feed_zeros(digest, end + 1 - position)
+    value = digest.digest()
+    if value == self._zero_digest(end - start + 1):
+      return None, read
+    return base64.b64encode(value).decode('ascii'), read
+
+class HashManifest(object):
+  """A JSON file of the per-range source digests of verified copies, by target.
+
+  Each entry has the `sourceId` the digests were taken from, the blob `size` and `rangeSize`, a `digests` list
+  with one base64 digest per range (null for a range of zeros), and the indexes of the ranges left `mismatched`.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._entries = None
+    self._lock = threading.Lock()
+
+  def _load(self):
+    if self._entries is not None:
+      return self._entries
+    self._entries = {}
+    if os.path.exists(self.path):
+      try:
+        with open(self.path) as f:
+          manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION and manifest.get('algorithm') == HASH_ALGORITHM:
+          self._entries = manifest.get('copies') or {}
+        else:
+          logger.warning('Ignoring verify manifest %s, written by another version', self.path)
+      except (IOError, OSError, ValueError) as ex:
+        logger.warning('Ignoring unreadable verify manifest %s: %s', self.path, ex)
+    return self._entries
+
+  def get(self, target, size, range_size):
+    """The entry of `target`, if it was hashed at the same size and range size."""
+    with self._lock:
+      entry = self._load().get(target)
+    if not entry or entry.get('size') != size or entry.get('rangeSize') != range_size:
+      return None
+    return entry if len(entry.get('digests') or []) == (size + range_size - 1) // range_size else None
+
+  def put(self, target, entry):
+    with self._lock:
+      self._load()[target] = entry
+      temp_file = '{0}.{1}.tmp'.format(self.path, os.getpid())
+      with open(temp_file, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'algorithm': HASH_ALGORITHM, 'copies': self._entries}, f, separators=(',', ':'))
+      os.replace(temp_file, self.path)
+
+class CopyVerifier(object):
+  """Checks that the target of a finished copy holds the same data as its source, range by range.
+
+  Source and target are split into ranges of `range_size` bytes. Every range that is populated on either side is
+  hashed on both, reading only the populated pages, with at most `max_workers` ranges hashed at once. With `repair`,
+  the ranges that differ are copied again from the source and checked once more. With a `manifest_file`, the
+  source digests are recorded per target, and a later incremental copy into the same target only hashes the ranges
+  it changed. `client_factory` builds a client for a SAS URL and can be replaced with an in-process fake.
+  """
+
+  def __init__(self, repair=False, manifest_file=None, range_size=DEFAULT_VERIFY_RANGE_BYTES, max_workers=DEFAULT_MAX_WORKERS,
+               client_factory=PageBlobClient):
+    self.repair = repair
+    self.manifest = HashManifest(manifest_file) if manifest_file else None
+    self.hasher = RangeHasher(range_size)
+    self.max_workers = max_workers
+    self.client_factory = client_factory
+
+  @property
+  def range_size(self):
+    return self.hasher.range_size
+
+  def verify(self, name, source_sas_url, target_sas_url, source_id=None, previous_source_id=None, touched=None):
+    """Compare the target with its source, and return a report. Raises CLIError if they differ after any repair.
+
+    `name` identifies the target in the manifest, and `source_id` the data the source holds, such as a snapshot id.
+    If the manifest has digests of the target taken from `previous_source_id`, and `touched` lists every range
+    written since, only the ranges those touch are hashed again.
+    """
+    start = time.time()
+    source = self.client_factory(source_sas_url)
+    target = self.client_factory(target_sas_url)
+    size = source.get_size()
+    target_size = target.get_size()
+    if target_size != size:
+      raise CLIError('{0} is {1} bytes, but its source is {2} bytes'.format(name, target_size, size))
+
+    count = (size + self.range_size - 1) // self.range_size
+    digests, indexes = [None] * count, set(range(count))
+    previous = self.manifest.get(name, size, self.range_size) if self.manifest and touched is not None else None
+    if previous is not None and previous_source_id and previous.get('sourceId') == previous_source_id:
+      digests = list(previous['digests'])
+      indexes = set(window_ranges(sorted(touched), self.range_size)) | set(previous.get('mismatched') or [])
+      logger.info('Reusing the digests of %d unchanged ranges of %s', count - len(indexes), name)
+
+    with span('list page ranges', 'verify'):
+      source_ranges = list_page_ranges(source, size)
+      source_populated = window_ranges(source_ranges, self.range_size)
+      target_populated = window_ranges(list_page_ranges(target, size), self.range_size)
+    candidates, indexes = indexes, sorted(index for index in indexes if index in source_populated or index in target_populated)
+    # a range without pages on either side is all zeros on both
+    for index in candidates.difference(indexes):
+      digests[index] = None
+
+    with span('hash ranges', 'verify', ranges=len(indexes)):
+      mismatched, read = self._compare(source, target, size, indexes, source_populated, target_populated, digests)
+    differed, remaining = list(mismatched), mismatched
+    if mismatched:
+      logger.warning('%d of %d ranges of %s differ from the source', len(mismatched), count, name)
+    if mismatched and self.repair:
+      remaining, repair_read = self._repair(source_sas_url, target_sas_url, source, target, size, mismatched, source_ranges,
+                                            source_populated, digests)
+      read += repair_read
+
+    if self.manifest:
+      self.manifest.put(name, {
+        'sourceId': source_id,
+        'size': size,
+        'rangeSize': self.range_size,
+        'verified': datetime.datetime.utcnow().isoformat() + '+00:00',
+        'digests': digests,
+        'mismatched': remaining,
+      })
+    if remaining:
+      listed = ', '.join('{0}-{1}'.format(*self.hasher.bounds(index, size)) for index in remaining[:MAX_REPORTED_MISMATCHES])
+      raise CLIError('{0} does not match its source in {1} ranges of {2} bytes, at bytes {3}{4}.{5}'.format(
+        name, len(remaining), self.range_size, listed, ' and more' if len(remaining) > MAX_REPORTED_MISMATCHES else '',
+        '' if self.repair else ' Run the copy again with --repair to copy just those ranges again'))
+
+    report = {
+      'target': name,
+      'size': size,
+      'rangeSize': self.range_size,
+      'ranges': count,
+      'rangesHashed': len(indexes),
+      'rangesEmpty': len(candidates) - len(indexes),
+      'rangesReused': count - len(candidates),
+      'rangesRepaired': len(differed),
+      'bytesRead': read,
+      'durationSeconds': round(time.time() - start, 1),
+    }
+    logger.warning('Verified %s: hashed %d of %d ranges (%d bytes read), %d empty, %d unchanged since the last verification, %d repaired',
+                   name, report['rangesHashed'], count, read, report['rangesEmpty'], report['rangesReused'], len(differed))
+    return report
+
+  def _compare(self, source, target, size, indexes, source_populated, target_populated, digests):
+    """Hash `indexes` on both sides, put the source digests in `digests`, and return the ranges that differ and the bytes read."""
+    hashed = {}
+
+    def _hash(item):
+      side, index = item
+      client, populated = (source, source_populated) if side == 'source' else (target, target_populated)
+      hashed[item] = self.hasher.hash_range(client, index, size, populated.get(index))
+
+    run_bounded(_hash, ((side, index) for index in indexes for side in ('source', 'target')), self.max_workers)
+    mismatched = []
+    for index in indexes:
+      digests[index] = hashed[('source', index)][0]
+      if hashed[('source', index)][0] != hashed[('target', index)][0]:
+        mismatched.append(index)
+    return mismatched, sum(read for _, read in hashed.values())
+
+  def _repair(self, source_sas_url, target_sas_url, source, target, size, mismatched, source_ranges, source_populated, digests):
+    """Copy the ranges that differ again, and return the ones that still differ and the bytes read to check them."""
+    ranges = [self.hasher.bounds(index, size) for index in mismatched]
+    cleared = subtract_ranges(ranges, source_ranges)
+    logger.warning('Copying %d ranges of %s again', len(mismatched), target_sas_url.split('?')[0])
+    with span('repair ranges', 'verify', ranges=len(mismatched)):
+      PageRangeCopier(self.max_workers, client_factory=self.client_factory).copy(
+        source_sas_url, target_sas_url, source_ranges=subtract_ranges(ranges, cleared), clear_ranges=cleared)
+    target_populated = {}
+    for start, end in ranges:
+      target_populated.update(window_ranges(target.get_page_ranges(start, end - start + 1), self.range_size))
+    with span('hash ranges', 'verify', ranges=len(mismatched)):
+      return self._compare(source, target, size, mismatched, source_populated, target_populated, digests)
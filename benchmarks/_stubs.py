@@ -0,0 +1,123 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""Writes a stubbed `azure.cli` / `knack` tree so the extension can be exercised without the Azure CLI installed."""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+STUB_FILES = {
+  'azure/__init__.py': """
+__path__ = __import__('pkgutil').extend_path(__path__, __name__)
+""",
+  'azure/cli/__init__.py': """
+import os
+import time
+
+# stands in for the cost of importing the real azure.cli stack
+time.sleep(float(os.environ.get('STUB_AZ_IMPORT_SECONDS', '0.3')))
+""",
+  'azure/cli/__main__.py': """
+import sys
+from azure.cli.core import get_default_cli
+
+sys.exit(get_default_cli().invoke(sys.argv[1:]))
+""",
+  'azure/cli/core/__init__.py': """
+import json
+import os
+import sys
+import time
+
+class StubCli(object):
+  def invoke(self, args, out_file=None):
+    time.sleep(float(os.environ.get('STUB_AZ_CALL_SECONDS', '0.01')))
+    out_file = out_file or sys.stdout
+    # generate-sas prints the token, everything else an object
+    out_file.write(json.dumps('se=2030-01-01&sp=r&sv=2019-12-12&sr=b&sig=stub' if 'generate-sas' in args else {'args': args}))
+    return 0
+
+def get_default_cli():
+  return StubCli()
+
+class _CommandGroup(object):
+  def __init__(self, loader, group):
+    self.loader = loader
+    self.group = group
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    pass
+
+  def custom_command(self, name, operation, **kwargs):
+    self.loader.command_table['{0} {1}'.format(self.group, name)] = dict(kwargs, operation=operation)
+
+class _ArgumentContext(_CommandGroup):
+  def argument(self, dest, **kwargs):
+    self.loader.argument_registry.setdefault(self.group, {})[dest] = kwargs
+
+class AzCommandsLoader(object):
+  def __init__(self, cli_ctx=None, **kwargs):
+    self.cli_ctx = cli_ctx
+    self.command_table = {}
+    self.argument_registry = {}
+
+  def command_group(self, group, **kwargs):
+    return _CommandGroup(self, group)
+
+  def argument_context(self, scope, **kwargs):
+    return _ArgumentContext(self, scope)
+""",
+  'azure/cli/core/commands/__init__.py': """
+class CliCommandType(object):
+  def __init__(self, **kwargs):
+    self.settings = kwargs
+""",
+  'azure/cli/core/commands/parameters.py': """
+def get_enum_type(data):
+  return data
+""",
+  'knack/__init__.py': '',
+  'knack/log.py': """
+import logging
+
+def get_logger(name):
+  return logging.getLogger(name)
+""",
+  'knack/help_files.py': """
+helps = {}
+""",
+  'knack/util.py': """
+class CLIError(Exception):
+  pass
+""",
+}
+
+def install_stubs(root=None):
+  """Write the stub tree and put it (and the repo root) at the front of sys.path and PYTHONPATH.
+
+  Without a `root`, the tree goes to a temporary directory that is removed when the process exits.
+  """
+  if root is None:
+    root = tempfile.mkdtemp(prefix='diskcopy-stubs-')
+    atexit.register(shutil.rmtree, root, True)
+  for path, content in STUB_FILES.items():
+    full_path = os.path.join(root, path)
+    if not os.path.isdir(os.path.dirname(full_path)):
+      os.makedirs(os.path.dirname(full_path))
+    with open(full_path, 'w') as f:
+      f.write(content.lstrip())
+
+  repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  for path in (repo_root, root):
+    if path not in sys.path:
+      sys.path.insert(0, path)
+  os.environ['PYTHONPATH'] = os.pathsep.join([root, repo_root] + [p for p in [os.environ.get('PYTHONPATH')] if p])
+  return root
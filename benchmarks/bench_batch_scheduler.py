@@ -0,0 +1,101 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""Runs a cross-region `az disk copy-batch` with different job orders and per-account caps, against an in-memory Azure.
+
+    python benchmarks/bench_batch_scheduler.py --disk-gb 2,2,2,2,4,4,8,16 --max-workers 4 --account-bandwidth-mb 4096
+
+Every copy goes through the same pooled temp storage account, whose bandwidth the copies share. Asking an account for
+more than its bandwidth throttles it, so it delivers less in total (--oversubscription-penalty). The manifest lists
+the disks smallest first. Reports the wall time of the batch (its makespan), the mean time a copy took once started,
+and the throughput observed per route.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from _stubs import install_stubs
+from fake_azure import FakeAzure
+from fake_blob_endpoint import FakeBlobEndpoint
+
+MB = 1024 * 1024
+
+# (label, --order, --max-copies-per-account, --max-account-throughput-mb)
+def scenarios(bandwidth_mb):
+  yield 'manifest order, no caps', 'manifest', None, None
+  yield 'manifest order, 2 copies per account', 'manifest', 2, None
+  yield 'largest-first, no caps', 'largest-first', None, None
+  yield 'largest-first, 2 copies per account', 'largest-first', 2, None
+  yield 'shortest-first, 2 copies per account', 'shortest-first', 2, None
+  yield 'largest-first, {0:.0f} MB/s per account'.format(bandwidth_mb), 'largest-first', None, bandwidth_mb
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--disk-gb', default='2,2,2,2,4,4,8,16', help='sizes of the source disks, in manifest order')
+  parser.add_argument('--max-workers', type=int, default=4, help='copies the batch runs at the same time')
+  parser.add_argument('--latency', type=float, default=0.02, help='simulated seconds per az call, before LATENCY_WEIGHTS')
+  parser.add_argument('--copy-rate-mb', type=float, default=2048, help='simulated rate of a single cross-region copy, MB/s')
+  parser.add_argument('--account-bandwidth-mb', type=float, default=4096, help='simulated bandwidth of a storage account, MB/s')
+  parser.add_argument('--oversubscription-penalty', type=float, default=1.0,
+                      help='how much an oversubscribed account throttles: it delivers 1 / (1 + penalty * (demand / bandwidth - 1))')
+  parser.add_argument('--only', help='only run scenarios whose name contains this')
+  args = parser.parse_args()
+  sizes = [int(size) for size in args.disk_gb.split(',')]
+
+  journal_root = tempfile.mkdtemp(prefix='diskcopy-bench-')
+  os.environ.pop('AZURE_DISKCOPY_CACHE_FILE', None)
+  install_stubs()
+  logging.disable(logging.CRITICAL)
+
+  from azext_diskcopyextension import cli_utils, custom
+  from azext_diskcopyextension.blob_client import BLOB_CLIENT_ENV, BLOB_ENDPOINT_ENV, blob_clients
+  from azext_diskcopyextension.cache import resource_cache
+  from azext_diskcopyextension.events import PollingTransport
+  from azext_diskcopyextension.journal import JOURNAL_DIR_ENV
+  from azext_diskcopyextension.scheduler import CopyScheduler
+
+  os.environ[BLOB_CLIENT_ENV] = 'rest'
+  custom.copy_completion.set_transport(PollingTransport())
+  print('{0:<40} {1:>9} {2:>13} {3:>7} {4}'.format('scenario', 'wall (s)', 'mean copy (s)', 'failed', 'observed MB/s per copy'))
+  try:
+    for index, (name, order, max_copies, max_throughput_mb) in enumerate(scenarios(args.account_bandwidth_mb)):
+      if args.only and args.only not in name:
+        continue
+      azure = FakeAzure(args.latency, cross_region_copy_rate=args.copy_rate_mb * MB, account_bandwidth=args.account_bandwidth_mb * MB,
+                        oversubscription_penalty=args.oversubscription_penalty)
+      azure.add_resource_group('source-rg', 'eastus')
+      azure.add_resource_group('target-westus', 'westus')
+      for disk_index, size in enumerate(sizes):
+        azure.add_disk('source-rg', 'disk{0:02d}'.format(disk_index), size)
+      cli_utils.set_cli_backend(azure)
+      blob_clients.clear()
+      resource_cache.clear()
+      # every scenario starts without throughput history
+      custom.copy_scheduler = custom.copy_monitor.scheduler = CopyScheduler(custom.locate_storage_account)
+      os.environ[JOURNAL_DIR_ENV] = os.path.join(journal_root, str(index))
+
+      with FakeBlobEndpoint(azure, latency=args.latency / 10) as endpoint:
+        os.environ[BLOB_ENDPOINT_ENV] = endpoint.url
+        start = time.time()
+        results = custom.copy_disk_to_disk_batch('target-westus', source_resource_group_name='source-rg', max_workers=args.max_workers,
+                                                 progress_format='none', order=order, max_copies_per_account=max_copies,
+                                                 max_account_throughput_mb=max_throughput_mb)
+        wall = time.time() - start
+
+      routes = custom.copy_scheduler.stats()['routes']
+      print('{0:<40} {1:>9.2f} {2:>13.2f} {3:>7} {4}'.format(
+        name, wall, sum(result['durationSeconds'] for result in results) / len(results),
+        len([result for result in results if result['status'] != 'succeeded']),
+        ', '.join('{0} {1:.0f}'.format(route, rate / MB) for route, rate in sorted(routes.items()))))
+  finally:
+    custom.copy_completion.set_transport(None)
+    shutil.rmtree(journal_root, ignore_errors=True)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,93 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""Compares the latency of blob operations made with az calls and with the pooled REST client.
+
+    python benchmarks/bench_blob_client.py --calls 20 --import-seconds 0.3 --remote-seconds 0.01
+
+The subprocess and inprocess rows run the `az storage` commands against a stubbed azure.cli module. The rest
+rows send the REST requests to a local endpoint, with one pooled client per account or a new client per call.
+Every call spends --remote-seconds in the service, so the difference is the cost of making the call.
+"""
+
+import argparse
+import os
+import time
+
+from _stubs import install_stubs
+from fake_azure import FakeAzure, GB, account_key
+from fake_blob_endpoint import FakeBlobEndpoint
+
+BLOB_URI = 'https://benchaccount.blob.core.windows.net/vhds/data.vhd'
+
+def operations(custom):
+  yield 'blob show', lambda i: custom.show_storage_blob('benchaccount', 'vhds', 'data.vhd')
+  yield 'blob list', lambda i: custom.list_storage_blobs('benchaccount', 'vhds')
+  yield 'container create', lambda i: custom.create_blob_container('benchaccount', 'bench{0}'.format(i))
+  yield 'blob snapshot', lambda i: custom.create_blob_snapshot(BLOB_URI)
+  yield 'generate sas', lambda i: custom.get_sas_for_blob('benchaccount', account_key('benchaccount'), 'vhds', 'data.vhd', 'r')
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def measure(custom, calls, before_call=None):
+  """{operation: [milliseconds per call]}, after one untimed call that looks up the account and key."""
+  results = {}
+  for name, operation in operations(custom):
+    operation(-1)
+    timings = []
+    for i in range(calls):
+      if before_call is not None:
+        before_call()
+      start = time.time()
+      operation(i)
+      timings.append((time.time() - start) * 1000)
+    results[name] = timings
+  return results
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--calls', type=int, default=20, help='calls per operation and client')
+  parser.add_argument('--import-seconds', default='0.3', help='simulated azure.cli import cost of a subprocess az call')
+  parser.add_argument('--remote-seconds', type=float, default=0.01, help='simulated service latency of every call')
+  args = parser.parse_args()
+
+  os.environ['STUB_AZ_IMPORT_SECONDS'] = args.import_seconds
+  os.environ['STUB_AZ_CALL_SECONDS'] = str(args.remote_seconds)
+  os.environ.pop('AZURE_DISKCOPY_CACHE_FILE', None)
+  install_stubs()
+
+  from azext_diskcopyextension import cli_utils, custom
+  from azext_diskcopyextension.blob_client import BLOB_CLIENT_ENV, BLOB_ENDPOINT_ENV, blob_clients
+
+  # the control plane calls that find the account and its key go to the in-memory subscription
+  azure = FakeAzure(latency=0)
+  azure.add_resource_group('bench-rg', 'eastus')
+  azure.add_storage_account('benchaccount', 'bench-rg')
+  azure.add_blob('benchaccount', 'vhds', 'data.vhd', GB)
+
+  results = []
+  os.environ[BLOB_CLIENT_ENV] = 'cli'
+  for backend in ('subprocess', 'inprocess'):
+    cli_utils.set_cli_backend(backend)
+    results.append((backend, measure(custom, args.calls)))
+
+  cli_utils.set_cli_backend(azure)
+  os.environ[BLOB_CLIENT_ENV] = 'rest'
+  with FakeBlobEndpoint(azure, latency=args.remote_seconds) as endpoint:
+    os.environ[BLOB_ENDPOINT_ENV] = endpoint.url
+    blob_clients.clear()
+    results.append(('rest', measure(custom, args.calls)))
+    results.append(('rest, unpooled', measure(custom, args.calls, before_call=blob_clients.clear)))
+
+  print('{0:<16} {1:<18} {2:>10} {3:>10} {4:>10}'.format('client', 'operation', 'mean (ms)', 'p50 (ms)', 'p95 (ms)'))
+  for client, timings in results:
+    for name, values in timings.items():
+      print('{0:<16} {1:<18} {2:>10.1f} {3:>10.1f} {4:>10.1f}'.format(
+        client, name, sum(values) / len(values), percentile(values, 0.5), percentile(values, 0.95)))
+
+if __name__ == '__main__':
+  main()
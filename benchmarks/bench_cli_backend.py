@@ -0,0 +1,40 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""Compares the subprocess and in-process az_cli backends against a stubbed azure.cli module.
+
+    python benchmarks/bench_cli_backend.py --calls 20 --import-seconds 0.3
+"""
+
+import argparse
+import os
+import time
+
+from _stubs import install_stubs
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--calls', type=int, default=20, help='az_cli calls per backend')
+  parser.add_argument('--import-seconds', default='0.3', help='simulated azure.cli import cost')
+  parser.add_argument('--call-seconds', default='0.01', help='simulated remote call latency')
+  args = parser.parse_args()
+
+  os.environ['STUB_AZ_IMPORT_SECONDS'] = args.import_seconds
+  os.environ['STUB_AZ_CALL_SECONDS'] = args.call_seconds
+  install_stubs()
+
+  from azext_diskcopyextension import cli_utils
+
+  print('{0:<12} {1:>10} {2:>12}'.format('backend', 'total (s)', 'per call (ms)'))
+  for name in ('subprocess', 'inprocess'):
+    cli_utils.set_cli_backend(name)
+    start = time.time()
+    for i in range(args.calls):
+      cli_utils.az_cli(['disk', 'show', '-n', 'disk{0}'.format(i), '-g', 'rg'])
+    elapsed = time.time() - start
+    print('{0:<12} {1:>10.3f} {2:>12.1f}'.format(name, elapsed, elapsed * 1000 / args.calls))
+
+if __name__ == '__main__':
+  main()
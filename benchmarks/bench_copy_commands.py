@@ -0,0 +1,166 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""Runs the copy commands end to end against an in-memory Azure, in the same region and across regions.
+
+    python benchmarks/bench_copy_commands.py --latency 0.05 --disk-gb 4 --fail "snapshot create" --fail-code TooManyRequests
+
+Reports the az calls, wall time and critical path of each scenario. A scenario that fails because of an
+injected failure is resumed, and the resumed run is reported on its own line. Blob operations go to a local
+endpoint over REST, or with --blob-client cli through az like the rest. REST requests are counted as calls.
+With --copy-events, copies are reported complete by a fake Event Grid instead of being found by polling.
+"""
+
+import argparse
+import functools
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from _stubs import install_stubs
+from fake_azure import FAILURE_MESSAGES, FakeAzure, GB
+from fake_blob_endpoint import FakeBlobEndpoint
+from fake_event_grid import FakeEventGrid, FakeEventTransport
+
+MB = 1024 * 1024
+
+def seed(azure, disk_gb):
+  azure.add_resource_group('source-rg', 'eastus')
+  azure.add_resource_group('target-eastus', 'eastus')
+  azure.add_resource_group('target-westus', 'westus')
+  azure.add_resource_group('target-westus2', 'westus2')
+  azure.add_disk('source-rg', 'data', disk_gb)
+  # A VM with an OS disk and two data disks, copied together
+  for disk_name in ('vm-os', 'vm-data0', 'vm-data1'):
+    azure.add_disk('source-rg', disk_name, disk_gb)
+  azure.add_vm('source-rg', 'vm', 'vm-os', ['vm-data0', 'vm-data1'])
+  azure.add_storage_account('sourcevhds', 'source-rg')
+  azure.add_blob('sourcevhds', 'vhds', 'data.vhd', disk_gb * GB + 512)
+  for resource_group in ('target-eastus', 'target-westus'):
+    account = 'vhds{0}'.format(resource_group.split('-')[1])
+    azure.add_storage_account(account, resource_group)
+    azure.add_blob(account, 'vhds', '.keep', 0)
+
+def scenarios(custom):
+  source_uri = 'https://sourcevhds.blob.core.windows.net/vhds/data.vhd'
+  for region in ('eastus', 'westus'):
+    label = 'same-region' if region == 'eastus' else 'cross-region'
+    target_rg = 'target-{0}'.format(region)
+    yield 'disk copy-to-disk ' + label, functools.partial(custom.copy_disk_to_disk, 'source-rg', 'data', target_rg)
+    yield 'blob copy-to-disk ' + label, functools.partial(custom.copy_vhd_to_disk, source_uri, target_rg, 'data')
+    yield 'blob copy-to-vhd ' + label, functools.partial(custom.copy_vhd_to_vhd, source_uri, 'vhds' + region, 'vhds', 'copy.vhd')
+    yield 'disk copy-to-vhd ' + label, functools.partial(custom.copy_disk_to_vhd, 'source-rg', 'data', 'vhds' + region, 'vhds', 'data.vhd')
+    yield 'vm copy-disks ' + label, functools.partial(custom.copy_vm_disks, 'source-rg', 'vm', target_rg)
+  # One disk into three regions, from one snapshot
+  fanout_rgs = ['target-eastus', 'target-westus', 'target-westus2']
+  yield 'disk copy-to-disk fan-out', functools.partial(custom.copy_disk_to_disk, 'source-rg', 'data', target_resource_group_names=fanout_rgs)
+  yield 'disk copy-to-disk fan-out chained', functools.partial(custom.copy_disk_to_disk, 'source-rg', 'data',
+                                                               target_resource_group_names=fanout_rgs, chain=True)
+
+def run(name, command, azure, journal_dir, resume=None):
+  from azext_diskcopyextension.journal import CopyJournal
+
+  start = time.time()
+  try:
+    command(resume=resume, progress_format='none')
+    status = 'succeeded'
+  except Exception as ex:  # pylint: disable=broad-except
+    message = getattr(ex, 'output', None) or str(ex)
+    status = 'failed: {0}'.format(message.strip().splitlines()[-1])
+  wall = time.time() - start
+
+  journal = CopyJournal.list(journal_dir)[-1]
+  summary = journal.summary or {}
+  print('{0:<44} {1:>6} {2:>9.2f} {3:>9} {4}'.format(
+    name, sum(azure.calls.values()), wall, summary.get('criticalPathSeconds', '-'),
+    ' > '.join(summary.get('criticalPath') or []) or status))
+  return journal if status != 'succeeded' else None
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--latency', type=float, default=0.05, help='simulated seconds per az call, before LATENCY_WEIGHTS')
+  parser.add_argument('--copy-rate-mb', type=float, default=2048, help='simulated server-side copy rate within a region, MB/s')
+  parser.add_argument('--cross-region-copy-rate-mb', type=float, default=512, help='simulated server-side copy rate across regions, MB/s')
+  parser.add_argument('--disk-gb', type=int, default=4, help='size of the source disk and VHD')
+  parser.add_argument('--fail', action='append', default=[], metavar='COMMAND',
+                      help='fail the first call of an az command, e.g. "snapshot create". Can be repeated')
+  parser.add_argument('--fail-code', default='InternalServerError', choices=sorted(FAILURE_MESSAGES),
+                      help='error of the failed calls. Throttling, conflicts and transient errors are retried, others fail the copy')
+  parser.add_argument('--fail-copies', type=int, default=0, help='blob copies to fail half way through, per scenario')
+  parser.add_argument('--blob-client', default='rest', choices=['rest', 'cli'], help='how blob operations are made')
+  parser.add_argument('--rest-latency', type=float, default=0.005, help='simulated seconds per blob REST request')
+  parser.add_argument('--copy-events', default='poll', choices=['poll', 'fake', 'listen'],
+                      help='how copies are found complete: polling, events from an in-process transport, or events POSTed to a local listener')
+  parser.add_argument('--event-delay', type=float, default=0.05, help='simulated seconds from a copy completing to its event')
+  parser.add_argument('--event-fallback', type=float, default=5, help='seconds between polls of a copy while waiting for its event')
+  parser.add_argument('--calls', action='store_true', help='print the az calls of each scenario by command')
+  parser.add_argument('--only', help='only run scenarios whose name contains this')
+  args = parser.parse_args()
+
+  # Keep the benchmark away from the user's journals and resource cache
+  journal_root = tempfile.mkdtemp(prefix='diskcopy-bench-')
+  os.environ.pop('AZURE_DISKCOPY_CACHE_FILE', None)
+  install_stubs()
+  # The table is the output, the extension's warnings and errors about failed calls would interleave with it
+  logging.disable(logging.CRITICAL)
+
+  from azext_diskcopyextension import cli_utils, custom
+  from azext_diskcopyextension.blob_client import BLOB_CLIENT_ENV, BLOB_ENDPOINT_ENV, blob_clients
+  from azext_diskcopyextension.events import HttpListenerTransport, PollingTransport
+  from azext_diskcopyextension.cache import resource_cache
+  from azext_diskcopyextension.journal import JOURNAL_DIR_ENV
+
+  os.environ[BLOB_CLIENT_ENV] = args.blob_client
+  print('{0:<44} {1:>6} {2:>9} {3:>9} {4}'.format('scenario', 'calls', 'wall (s)', 'path (s)', 'critical path'))
+  endpoint, event_grid = None, None
+  try:
+    for index, (name, command) in enumerate(scenarios(custom)):
+      if args.only and args.only not in name:
+        continue
+      azure = FakeAzure(args.latency, copy_rate=args.copy_rate_mb * MB, cross_region_copy_rate=args.cross_region_copy_rate_mb * MB)
+      seed(azure, args.disk_gb)
+      for failed_command in args.fail:
+        azure.fail(failed_command, code=args.fail_code)
+      azure.fail_copies(args.fail_copies)
+      cli_utils.set_cli_backend(azure)
+      if endpoint is not None:
+        endpoint.stop()
+      endpoint = FakeBlobEndpoint(azure, args.rest_latency).start()
+      os.environ[BLOB_ENDPOINT_ENV] = endpoint.url
+      blob_clients.clear()
+      resource_cache.clear()
+      if event_grid is not None:
+        event_grid.close()
+      event_grid = FakeEventGrid(azure, args.event_delay)
+      if args.copy_events == 'fake':
+        custom.copy_completion.set_transport(FakeEventTransport(event_grid, args.event_fallback))
+      elif args.copy_events == 'listen':
+        listener = HttpListenerTransport(port=0, fallback_interval=args.event_fallback)
+        custom.copy_completion.set_transport(listener)
+        event_grid.webhook(listener.url)
+      else:
+        custom.copy_completion.set_transport(PollingTransport())
+      journal_dir = os.path.join(journal_root, str(index))
+      os.environ[JOURNAL_DIR_ENV] = journal_dir
+
+      failed = run(name, command, azure, journal_dir)
+      if args.calls:
+        for call, count in sorted(azure.calls.items()):
+          print('    {0:<42} {1:>6}'.format(call, count))
+      if failed is not None:
+        azure.calls.clear()
+        run(name + ' (resumed)', command, azure, journal_dir, resume=failed.id)
+  finally:
+    if endpoint is not None:
+      endpoint.stop()
+    if event_grid is not None:
+      event_grid.close()
+    custom.copy_completion.set_transport(None)
+    shutil.rmtree(journal_root, ignore_errors=True)
+
+if __name__ == '__main__':
+  main()
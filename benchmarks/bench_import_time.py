@@ -0,0 +1,121 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""Measures the startup cost the extension adds to az, with `python -X importtime`.
+
+    python benchmarks/bench_import_time.py --repeat 5 --budget-ms 20
+
+az loads the extension's command loader on every invocation that could be one of its commands, so each scenario
+loads the command table and arguments the way az does for that command line, in a fresh interpreter. The cost is
+the import time of every module that the azure.cli and knack imports alone don't load, and the time spent loading
+the extension, which includes argument registration. With --budget-ms, the script exits with an error when a
+scenario that isn't one of the extension's commands adds more import time than the budget.
+"""
+
+import argparse
+import compileall
+import json
+import os
+import re
+import subprocess
+import sys
+
+from _stubs import install_stubs
+
+# az loads the extension for commands in the groups it adds to, not only for its own commands
+SCENARIOS = [
+  ('other command in a shared group', ['disk', 'list', '-g', 'rg'], False),
+  ('help for a shared group', ['disk', '-h'], False),
+  ('extension command', ['disk', 'copy-to-disk', '-n', 'data', '-g', 'rg', '--target-resource-group', 'target'], True),
+  ('help for an extension command', ['disk', 'copy-to-disk', '-h'], True),
+]
+
+BASELINE = 'import azure.cli.core, azure.cli.core.commands, azure.cli.core.commands.parameters, knack.log, knack.util, knack.help_files'
+
+LOAD = BASELINE + """
+import sys
+import time
+args = sys.argv[1:]
+start = time.time()
+from azext_diskcopyextension import COMMAND_LOADER_CLS
+loader = COMMAND_LOADER_CLS()
+loader.load_command_table(args)
+words = []
+for arg in args:
+  if arg.startswith('-'):
+    break
+  words.append(arg)
+loader.load_arguments(' '.join(words))
+print((time.time() - start) * 1000)
+"""
+
+importtime_regex = re.compile(r'^import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\|(?P<indent>\s+)(?P<module>\S+)')
+
+def import_times(code, args=()):
+  """Run `code` in a fresh interpreter. Returns the self import time in microseconds of every module it imported, and its output."""
+  process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code] + list(args),
+                           stderr=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+  times = {}
+  for line in process.stderr.splitlines():
+    match = importtime_regex.match(line)
+    if match:
+      times[match.group('module')] = int(match.group('self'))
+  return times, process.stdout
+
+def added_import_times(args, baseline_modules, repeat):
+  """The fastest of `repeat` runs, as ({module: self microseconds} for modules beyond the baseline, loader milliseconds)."""
+  best, best_load = None, None
+  for _ in range(repeat):
+    times, output = import_times(LOAD, args)
+    times = dict((module, us) for module, us in times.items() if module not in baseline_modules)
+    if best is None or sum(times.values()) < sum(best.values()):
+      best = times
+    best_load = min(best_load, float(output)) if best_load is not None else float(output)
+  return best, best_load
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--repeat', type=int, default=5, help='runs per scenario, the fastest is reported')
+  parser.add_argument('--top', type=int, default=5, help='heaviest modules to list per scenario')
+  parser.add_argument('--budget-ms', type=float, help='fail if a scenario outside the extension\'s commands adds more import time than this')
+  parser.add_argument('--json', action='store_true', help='print the results as JSON, for tracking over time')
+  args = parser.parse_args()
+
+  # The stubbed azure.cli import would otherwise dominate every run
+  os.environ['STUB_AZ_IMPORT_SECONDS'] = '0'
+  install_stubs()
+  # Measure imports from up to date bytecode, like an installed extension, not the one-off cost of compiling
+  compileall.compile_dir(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'azext_diskcopyextension'), quiet=1)
+  baseline_modules = set(import_times(BASELINE)[0])
+
+  results = []
+  for name, command_line, extension_command in SCENARIOS:
+    times, load_ms = added_import_times(command_line, baseline_modules, args.repeat)
+    results.append({
+      'scenario': name,
+      'args': ' '.join(command_line),
+      'extensionCommand': extension_command,
+      'modules': len(times),
+      'addedMs': round(sum(times.values()) / 1000.0, 2),
+      'loadMs': round(load_ms, 2),
+      'heaviest': [{'module': module, 'ms': round(us / 1000.0, 2)}
+                   for module, us in sorted(times.items(), key=lambda item: -item[1])[:args.top]],
+    })
+
+  if args.json:
+    print(json.dumps(results, indent=2))
+  else:
+    print('{0:<32} {1:>8} {2:>11} {3:>10}  {4}'.format('scenario', 'modules', 'added (ms)', 'load (ms)', 'heaviest'))
+    for result in results:
+      print('{0:<32} {1:>8} {2:>11.2f} {3:>10.2f}  {4}'.format(
+        result['scenario'], result['modules'], result['addedMs'], result['loadMs'],
+        ', '.join('{0} {1:.1f}'.format(item['module'], item['ms']) for item in result['heaviest'])))
+
+  over = [result for result in results if args.budget_ms is not None and not result['extensionCommand'] and result['addedMs'] > args.budget_ms]
+  if over:
+    sys.exit('Over the {0}ms budget: {1}'.format(args.budget_ms, ', '.join(result['scenario'] for result in over)))
+
+if __name__ == '__main__':
+  main()
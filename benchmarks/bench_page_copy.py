@@ -0,0 +1,46 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""Compares a full-blob copy with the sparse page-range copy engine against an in-process fake page blob service.
+
+    python benchmarks/bench_page_copy.py --size-gb 2 --allocated 0.1 --latency 0.02
+"""
+
+import argparse
+import random
+
+from _stubs import install_stubs
+from fake_page_blob import FakePageBlobService
+
+MB = 1024 * 1024
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--size-gb', type=float, default=2, help='nominal size of the source page blob')
+  parser.add_argument('--allocated', type=float, default=0.1, help='fraction of the source that is allocated')
+  parser.add_argument('--latency', type=float, default=0.02, help='simulated seconds per storage request')
+  parser.add_argument('--workers', type=int, default=16, help='concurrent range requests')
+  args = parser.parse_args()
+  install_stubs()
+
+  from azext_diskcopyextension.page_blob import PageRangeCopier
+
+  size = int(args.size_gb * 1024) * MB
+  extents = sorted(random.sample(range(0, size, MB), int(size / MB * args.allocated)))
+  source_url = 'https://source.blob.core.windows.net/vhds/source.vhd?sig=x'
+
+  print('{0:<8} {1:>12} {2:>10} {3:>10}'.format('engine', 'bytes', 'requests', 'seconds'))
+  for engine in ('full', 'sparse'):
+    service = FakePageBlobService(args.latency)
+    service.add_blob(source_url, size, [(offset, MB) for offset in extents])
+    target_url = 'https://target.blob.core.windows.net/vhds/{0}.vhd?sig=y'.format(engine)
+    copier = PageRangeCopier(args.workers, client_factory=service.client)
+    stats = copier.copy(source_url, target_url, create_target=True,
+                        source_ranges=[(0, size - 1)] if engine == 'full' else None)
+    assert service.blob(target_url).pages == service.blob(source_url).pages
+    print('{0:<8} {1:>12} {2:>10} {3:>10}'.format(engine, stats['bytesCopied'], service.requests, stats['durationSeconds']))
+
+if __name__ == '__main__':
+  main()
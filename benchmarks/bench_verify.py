@@ -0,0 +1,97 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""Verifies a copied page blob against its source with --verify, against an in-process fake page blob service.
+
+    python benchmarks/bench_verify.py --size-gb 1 --allocated 0.25 --latency 0.02 --read-rate-mb 200
+
+The source is allocated in 1 MB extents spread over its first half, like a disk that isn't full, and the target
+starts as a page-range copy of it. Scenarios hash it with one and with many workers, find and repair a few corrupted
+pages, and verify an incremental pass that changed part of the source, with and without the hash manifest of the
+previous verification. Reports the bytes read from both blobs, the requests and the wall time.
+"""
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from _stubs import install_stubs
+from fake_page_blob import PAGE_SIZE, FakePageBlobService
+
+MB = 1024 * 1024
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--size-gb', type=float, default=1, help='nominal size of the source page blob')
+  parser.add_argument('--allocated', type=float, default=0.25, help='fraction of the source that is allocated')
+  parser.add_argument('--changed', type=float, default=0.02, help='fraction of the allocated extents an incremental pass rewrites')
+  parser.add_argument('--latency', type=float, default=0.02, help='simulated seconds per storage request')
+  parser.add_argument('--read-rate-mb', type=float, default=200, help='simulated read rate of one range request, MB/s')
+  parser.add_argument('--workers', type=int, default=16, help='concurrent range reads')
+  args = parser.parse_args()
+  install_stubs()
+  logging.disable(logging.CRITICAL)
+
+  from knack.util import CLIError
+  from azext_diskcopyextension.page_blob import PageRangeCopier
+  from azext_diskcopyextension.verify import CopyVerifier
+
+  random.seed(1)
+  size = int(args.size_gb * 1024) * MB
+  extents = sorted(random.sample(range(0, size // 2, MB), int(size / MB * min(args.allocated, 0.5))))
+  source_url = 'https://source.blob.core.windows.net/vhds/source.vhd?sig=x'
+  target_url = 'https://target.blob.core.windows.net/vhds/target.vhd?sig=y'
+  service = FakePageBlobService(args.latency, args.read_rate_mb * MB)
+  service.add_blob(source_url, size, [(offset, MB) for offset in extents])
+  PageRangeCopier(args.workers, client_factory=service.client).copy(source_url, target_url, create_target=True)
+  manifest_dir = tempfile.mkdtemp(prefix='diskcopy-verify-')
+  manifest_file = os.path.join(manifest_dir, 'hashes.json')
+
+  def run(name, workers, repair=False, manifest=None, touched=None, source_id='snapshot1', previous_source_id=None):
+    verifier = CopyVerifier(repair, manifest, max_workers=workers, client_factory=service.client)
+    service.requests, service.bytes_read = 0, 0
+    start = time.time()
+    try:
+      report = verifier.verify('target', source_url, target_url, source_id, previous_source_id, touched)
+      outcome = 'hashed {0}, empty {1}, reused {2}, repaired {3}'.format(report['rangesHashed'], report['rangesEmpty'], report['rangesReused'],
+                                                                       report['rangesRepaired'])
+    except CLIError as ex:
+      outcome = 'failed: {0}'.format(str(ex)[:60])
+    print('{0:<44} {1:>10.0f} {2:>9} {3:>9.2f}  {4}'.format(name, service.bytes_read / MB, service.requests, time.time() - start, outcome))
+
+  print('{0} MB blob, {1} MB allocated'.format(size // MB, len(extents)))
+  print('{0:<44} {1:>10} {2:>9} {3:>9}  {4}'.format('scenario', 'read (MB)', 'requests', 'wall (s)', 'ranges'))
+  try:
+    run('1 worker', 1)
+    run('{0} workers'.format(args.workers), args.workers, manifest=manifest_file)
+
+    # A few pages of the target lost their writes
+    target = service.blob(target_url)
+    for offset in random.sample(extents, 3):
+      target.pages.pop(offset + PAGE_SIZE * random.randint(0, MB // PAGE_SIZE - 1), None)
+    run('3 corrupted pages', args.workers)
+    run('3 corrupted pages, --repair', args.workers, repair=True)
+    assert service.blob(target_url).pages == service.blob(source_url).pages
+
+    # An incremental pass rewrites some extents of the source and copies just those
+    changed = random.sample(extents, max(1, int(len(extents) * args.changed)))
+    source = service.blob(source_url)
+    for offset in changed:
+      for page in range(offset, offset + MB, PAGE_SIZE):
+        source.pages[page] = random.getrandbits(62)
+    touched = [(offset, offset + MB - 1) for offset in sorted(changed)]
+    PageRangeCopier(args.workers, client_factory=service.client).copy(source_url, target_url, source_ranges=touched)
+    run('incremental pass, without the manifest', args.workers, source_id='snapshot2')
+    run('incremental pass, with the manifest', args.workers, manifest=manifest_file, touched=touched, source_id='snapshot2',
+        previous_source_id='snapshot1')
+  finally:
+    shutil.rmtree(manifest_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+  main()
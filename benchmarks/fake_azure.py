@@ -0,0 +1,607 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""An in-memory Azure subscription that answers the az commands the extension runs, for benchmarks and experiments."""
+
+import base64
+import collections
+import datetime
+import json
+import re
+import threading
+import time
+import uuid
+from subprocess import CalledProcessError
+
+GB = 1024 ** 3
+SUBSCRIPTION = '00000000-0000-0000-0000-000000000000'
+# Control plane calls that start a long-running ARM operation take a multiple of the base latency
+LATENCY_WEIGHTS = {
+  'storage account create': 10,
+  'snapshot create': 4,
+  'disk create': 4,
+  'storage account delete': 3,
+  'snapshot grant-access': 2,
+  'disk grant-access': 2,
+  'snapshot revoke-access': 2,
+  'disk revoke-access': 2,
+}
+
+# Error messages as ARM and storage word them, so the extension's error classification sees realistic output
+FAILURE_MESSAGES = {
+  'InternalServerError': 'The server encountered an internal error. Please retry the request.',
+  'TooManyRequests': "Number of 'write' requests for subscription exceeded the limit. Please try again after '1' seconds.",
+  'ServerBusy': 'The server is busy.',
+  'Conflict': 'Operation is not allowed since the resource is being updated.',
+  'AuthorizationFailed': 'The client does not have authorization to perform this action.',
+}
+
+blob_uri_regex = re.compile(r'https://(?P<account>[^.]+)\.blob\.core\.windows\.net/(?P<container>[^/]+)/(?P<blob>[^?]+)')
+tag_not_null_regex = re.compile(r'^\[\?tags\."(?P<tag>[^"]+)" != null\]$')
+tag_equals_regex = re.compile(r'^\[\?tags\."(?P<tag>[^"]+)"==\'(?P<value>[^\']*)\'\]$')
+
+def _parse_args(args):
+  """Split az arguments into the command words and a dict of option -> list of values."""
+  words, options, option = [], {}, None
+  for arg in args:
+    if arg.startswith('-'):
+      option = arg
+      options.setdefault(option, [])
+    elif option is None:
+      words.append(arg)
+    else:
+      options[option].append(arg)
+  return ' '.join(words), options
+
+def _parse_tags(values):
+  return dict((tag.split('=', 1) + [''])[:2] for tag in values)
+
+def account_key(account_name):
+  # keys are base64, like real ones, so requests can be signed with them
+  return base64.b64encode('simulated-key-for-{0}'.format(account_name).encode('utf-8')).decode('utf-8')
+
+def _now():
+  return datetime.datetime.utcnow().isoformat() + '+00:00'
+
+class AzureError(Exception):
+  """Raised by a command handler, and turned into a failed az call like the CLI's error output."""
+
+  def __init__(self, code, message, exit_code=1):
+    super(AzureError, self).__init__(message)
+    self.code = code
+    self.exit_code = exit_code
+
+class FakeAzure(object):
+  """A CLI backend for `cli_utils.set_cli_backend` that models resource groups, disks, snapshots, storage accounts and blob copies.
+
+  Every call sleeps for `latency` seconds, scaled by LATENCY_WEIGHTS or overridden per command in `latencies`.
+  Server-side blob copies progress at `copy_rate` bytes per second, or `cross_region_copy_rate` when the source
+  is in another region. With `account_bandwidth`, the copies reading from or writing to a storage account share
+  that many bytes per second, and an account asked for more than it has throttles, delivering
+  1 / (1 + `oversubscription_penalty` * (demand / bandwidth - 1)) of its bandwidth.
+  `fail` injects failed calls and `fail_copies` makes blob copies fail part way through.
+  Call counts are kept per command in `calls`, and `copy_listeners` are told about every blob copy that starts.
+  """
+
+  name = 'simulator'
+
+  def __init__(self, latency=0.05, latencies=None, copy_rate=2 * GB, cross_region_copy_rate=512 * 1024 ** 2,
+               account_bandwidth=None, oversubscription_penalty=0.0, clock=time.time, sleep=time.sleep):
+    self.latency = latency
+    self.latencies = latencies or {}
+    self.copy_rate = copy_rate
+    self.cross_region_copy_rate = cross_region_copy_rate
+    self.account_bandwidth = account_bandwidth
+    self.oversubscription_penalty = oversubscription_penalty
+    self.clock = clock
+    self.sleep = sleep
+    self.calls = collections.Counter()
+    self.resource_groups = {}
+    self.storage_accounts = {}
+    self.disks = {}
+    self.snapshots = {}
+    self.vms = {}
+    # (account, container) -> {blob name: blob}
+    self.containers = {}
+    self.container_created = {}
+    self._sas_sources = {}
+    self._failures = {}
+    self._failed_copies = 0
+    # copies sharing account bandwidth, and the time their progress was simulated up to
+    self._shared_copies = []
+    self._simulated_until = None
+    # called with (account, container, blob name, size, seconds to complete, fails) as each blob copy starts
+    self.copy_listeners = []
+    self._lock = threading.RLock()
+
+  # Seeding the subscription
+
+  def add_resource_group(self, name, location):
+    self.resource_groups[name.lower()] = {
+      'id': '/subscriptions/{0}/resourceGroups/{1}'.format(SUBSCRIPTION, name),
+      'name': name,
+      'location': location,
+      'properties': {'provisioningState': 'Succeeded'},
+    }
+    return self.resource_groups[name.lower()]
+
+  def add_storage_account(self, name, resource_group_name, tier='Standard', tags=None):
+    resource_group = self._resource_group(resource_group_name)
+    self.storage_accounts[name] = {
+      'id': '/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.Storage/storageAccounts/{2}'.format(SUBSCRIPTION, resource_group['name'], name),
+      'name': name,
+      'resourceGroup': resource_group['name'],
+      'location': resource_group['location'],
+      'provisioningState': 'Succeeded',
+      'sku': {'name': '{0}_LRS'.format(tier), 'tier': tier},
+      'tags': dict(tags or {}),
+    }
+    return self.storage_accounts[name]
+
+  def add_disk(self, resource_group_name, name, size_gb, sku='Premium_LRS'):
+    resource_group = self._resource_group(resource_group_name)
+    return self._put_disk(resource_group, name, sku, size_gb * GB, {'createOption': 'Empty'}, 'Unattached')
+
+  def add_vm(self, resource_group_name, name, os_disk, data_disks=(), size='Standard_D4s_v3'):
+    """Add a VM with existing disks attached: the OS disk's name and a list of data disk names, at LUNs 0, 1, ..."""
+    resource_group = self._resource_group(resource_group_name)
+
+    def _attached(disk_name):
+      disk = self._by_id(self.disks, '{0}/providers/Microsoft.Compute/disks/{1}'.format(resource_group['id'], disk_name))
+      disk['diskState'] = 'Attached'
+      return {'name': disk_name, 'caching': 'ReadWrite', 'managedDisk': {'id': disk['id']}}
+
+    vm = {
+      'id': '{0}/providers/Microsoft.Compute/virtualMachines/{1}'.format(resource_group['id'], name),
+      'name': name,
+      'resourceGroup': resource_group['name'],
+      'location': resource_group['location'],
+      'hardwareProfile': {'vmSize': size},
+      'storageProfile': {
+        'osDisk': dict(_attached(os_disk), osType='Linux'),
+        'dataDisks': [dict(_attached(disk_name), lun=lun, caching='ReadOnly') for lun, disk_name in enumerate(data_disks)],
+      },
+    }
+    self.vms[vm['id'].lower()] = vm
+    return vm
+
+  def add_blob(self, account, container, name, size):
+    with self._lock:
+      self.containers.setdefault((account, container), {})[name] = {'name': name, 'size': size, 'snapshots': {}, 'copy': None}
+
+  # Failure injection
+
+  def fail(self, command, times=1, code='InternalServerError', message=None):
+    """Make the next `times` calls of a command (e.g. 'snapshot create') fail with the given error code."""
+    message = message or FAILURE_MESSAGES.get(code, 'The operation failed.')
+    with self._lock:
+      self._failures[command] = (times, code, message)
+
+  def fail_copies(self, times=1):
+    """Make the next `times` blob copies fail half way through."""
+    with self._lock:
+      self._failed_copies = times
+
+  # CLI backend
+
+  def invoke(self, cmd, env=None):
+    from azext_diskcopyextension.cli_utils import CLI_PREFIX
+
+    args = cmd[len(CLI_PREFIX):] if cmd[:len(CLI_PREFIX)] == CLI_PREFIX else list(cmd)
+    command, options = _parse_args(args)
+    try:
+      result = self.call(command, options, env)
+    except AzureError as ex:
+      raise CalledProcessError(ex.exit_code, cmd, 'ERROR: ({0}) {1}\n'.format(ex.code, ex))
+    return '' if result is None else json.dumps(result)
+
+  def call(self, command, options, env=None, counted_as=None, latency=None):
+    """Run a command's handler and return its result, or raise AzureError. The blob endpoint calls this for REST requests."""
+    with self._lock:
+      self.calls[counted_as or command] += 1
+    self.sleep(latency if latency is not None else self.latencies.get(command, self.latency * LATENCY_WEIGHTS.get(command, 1)))
+
+    handler = getattr(self, '_' + command.replace(' ', '_').replace('-', '_'), None)
+    with self._lock:
+      self._maybe_fail(command)
+      if handler is None:
+        raise AzureError('CommandNotFound', "'{0}' is not simulated".format(command), 2)
+      return handler(options, env or {})
+
+  def _maybe_fail(self, command):
+    times, code, message = self._failures.get(command, (0, None, None))
+    if times:
+      self._failures[command] = (times - 1, code, message)
+      raise AzureError(code, message)
+
+  # Lookups
+
+  @staticmethod
+  def _option(options, *names):
+    for name in names:
+      if options.get(name):
+        return options[name][0]
+    return None
+
+  def _resource_group(self, name):
+    resource_group = self.resource_groups.get((name or '').lower())
+    if resource_group is None:
+      raise AzureError('ResourceGroupNotFound', "Resource group '{0}' could not be found.".format(name), 3)
+    return resource_group
+
+  def _storage_account(self, name):
+    if name not in self.storage_accounts:
+      raise AzureError('StorageAccountNotFound', 'The storage account {0} was not found.'.format(name), 3)
+    return self.storage_accounts[name]
+
+  def _account_name(self, options, env):
+    return self._option(options, '--account-name') or env.get('AZURE_STORAGE_ACCOUNT')
+
+  def _container(self, account, container):
+    self._storage_account(account)
+    if (account, container) not in self.containers:
+      raise AzureError('ContainerNotFound', 'The specified container does not exist.', 3)
+    return self.containers[(account, container)]
+
+  def _blob(self, account, container, name):
+    blob = self._container(account, container).get(name)
+    if blob is None:
+      raise AzureError('BlobNotFound', 'The specified blob does not exist.', 3)
+    return blob
+
+  def _by_id(self, resources, resource_id):
+    resource = resources.get(resource_id.lower())
+    if resource is None:
+      raise AzureError('ResourceNotFound', "The Resource '{0}' was not found.".format(resource_id), 3)
+    return resource
+
+  def _source_size(self, uri):
+    """Size and region of a blob, blob snapshot or SAS URL used as a copy source."""
+    base = uri.split('?')[0]
+    if base in self._sas_sources:
+      return self._sas_sources[base]
+    match = blob_uri_regex.match(uri)
+    if not match:
+      raise AzureError('InvalidUri', 'Unable to parse {0}'.format(uri))
+    blob = self._blob(match.group('account'), match.group('container'), match.group('blob'))
+    if not self._copy_state(blob)[0] == 'success':
+      raise AzureError('BlobCopyPending', 'The copy into {0} has not completed.'.format(base), 1)
+    return blob['size'], self.storage_accounts[match.group('account')]['location']
+
+  def _copy_state(self, blob):
+    """Return (status, copied) for a blob, advancing a pending copy with the clock."""
+    copy = blob['copy']
+    if copy is None:
+      return 'success', blob['size']
+    if 'copied' in copy:
+      self._advance_shared_copies()
+      copied = int(copy['copied'])
+    else:
+      copied = min(blob['size'], int((self.clock() - copy['started']) * copy['rate']))
+    if copy['fails'] and copied >= blob['size'] // 2:
+      return 'failed', blob['size'] // 2
+    return ('success' if copied >= blob['size'] else 'pending'), copied
+
+  def _shared_rates(self):
+    demand = collections.Counter()
+    for copy in self._shared_copies:
+      for account in copy['accounts']:
+        demand[account] += copy['rate']
+    rates = []
+    for copy in self._shared_copies:
+      rate = copy['rate']
+      for account in copy['accounts']:
+        if demand[account] > self.account_bandwidth:
+          oversubscription = demand[account] / float(self.account_bandwidth)
+          delivered = self.account_bandwidth / (1 + self.oversubscription_penalty * (oversubscription - 1))
+          rate = min(rate, copy['rate'] * delivered / demand[account])
+      rates.append(rate)
+    return rates
+
+  def _advance_shared_copies(self):
+    """Simulate the shared copies up to now, one completion at a time, since each one changes the others' rates."""
+    now = self.clock()
+    if not self._shared_copies:
+      self._simulated_until = now
+    while self._shared_copies and self._simulated_until < now:
+      rates = self._shared_rates()
+      step = min([now - self._simulated_until] +
+                 [(copy['end'] - copy['copied']) / rate for copy, rate in zip(self._shared_copies, rates) if rate > 0])
+      for copy, rate in zip(self._shared_copies, rates):
+        copy['copied'] = min(copy['end'], copy['copied'] + rate * step)
+      self._simulated_until += step
+      # a copy that is done, or has reached the point where it fails, no longer uses bandwidth
+      self._shared_copies = [copy for copy in self._shared_copies if copy['end'] - copy['copied'] > 1e-6]
+    self._simulated_until = now
+
+  def _blob_to_dict(self, blob):
+    properties = {'blobType': 'PageBlob', 'contentLength': blob['size'], 'copy': None}
+    if blob['copy'] is not None:
+      status, copied = self._copy_state(blob)
+      properties['copy'] = {
+        'id': blob['copy']['id'],
+        'source': blob['copy']['source'],
+        'status': status,
+        'progress': '{0}/{1}'.format(copied, blob['size']),
+        'statusDescription': '500 InternalError "Copy failed."' if status == 'failed' else None,
+      }
+    return {'name': blob['name'], 'snapshot': None, 'properties': properties}
+
+  def _put_disk(self, resource_group, name, sku, size, creation_data, state):
+    disk = {
+      'id': '/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.Compute/disks/{2}'.format(SUBSCRIPTION, resource_group['name'], name),
+      'name': name,
+      'resourceGroup': resource_group['name'],
+      'location': resource_group['location'],
+      'sku': {'name': sku},
+      'diskSizeGb': size // GB,
+      'diskSizeBytes': size,
+      'diskState': state,
+      'creationData': creation_data,
+      'provisioningState': 'Succeeded',
+      'timeCreated': _now(),
+    }
+    self.disks[disk['id'].lower()] = disk
+    return disk
+
+  def _grant(self, resource):
+    # Managed disk and snapshot SAS URLs point into a storage account that belongs to the platform
+    sas_url = 'https://md-{0}.blob.core.windows.net/{1}/abcd'.format(uuid.uuid4().hex[:12], uuid.uuid4().hex[:12])
+    self._sas_sources[sas_url] = (resource['diskSizeBytes'], resource['location'])
+    return {'accessSas': '{0}?sv=2018-03-28&sr=b&si={1}&sig=simulated'.format(sas_url, uuid.uuid4())}
+
+  # Resource groups
+
+  def _group_show(self, options, env):
+    return self._resource_group(self._option(options, '-n', '--name'))
+
+  # Storage accounts
+
+  def _storage_account_list(self, options, env):
+    resource_group_name = self._option(options, '-g', '--resource-group')
+    accounts = [account for account in self.storage_accounts.values()
+                if not resource_group_name or account['resourceGroup'].lower() == resource_group_name.lower()]
+    query = self._option(options, '--query')
+    if query:
+      tag = tag_not_null_regex.match(query).group('tag')
+      accounts = [account for account in accounts if tag in account['tags']]
+    return accounts
+
+  def _storage_account_create(self, options, env):
+    name = self._option(options, '-n', '--name')
+    if name in self.storage_accounts:
+      return self.storage_accounts[name]
+    tier = 'Premium' if (self._option(options, '--sku') or '').startswith('Premium') else 'Standard'
+    return self.add_storage_account(name, self._option(options, '-g', '--resource-group'), tier, _parse_tags(options.get('--tags', [])))
+
+  def _storage_account_update(self, options, env):
+    account = next((a for a in self.storage_accounts.values() if a['id'].lower() == self._option(options, '--ids').lower()), None)
+    if account is None:
+      raise AzureError('ResourceNotFound', 'The storage account was not found.', 3)
+    for setting in options.get('--set', []):
+      key, value = setting.split('=', 1)
+      if key.startswith('tags.'):
+        account['tags'][key[len('tags.'):]] = value
+    return account
+
+  def _storage_account_delete(self, options, env):
+    resource_id = self._option(options, '--ids').lower()
+    for name, account in list(self.storage_accounts.items()):
+      if account['id'].lower() == resource_id:
+        del self.storage_accounts[name]
+        for key in [key for key in self.containers if key[0] == name]:
+          del self.containers[key]
+    return None
+
+  def _storage_account_keys_list(self, options, env):
+    name = self._option(options, '-n', '--account-name')
+    self._storage_account(name)
+    return [{'keyName': 'key1', 'permissions': 'FULL', 'value': account_key(name)}]
+
+  # Containers and blobs
+
+  def _storage_container_create(self, options, env):
+    account = self._account_name(options, env)
+    self._storage_account(account)
+    created = (account, self._option(options, '-n', '--name')) not in self.containers
+    self.containers.setdefault((account, self._option(options, '-n', '--name')), {})
+    self.container_created.setdefault((account, self._option(options, '-n', '--name')), _now())
+    return {'created': created}
+
+  def _storage_container_delete(self, options, env):
+    deleted = self.containers.pop((self._account_name(options, env), self._option(options, '-n', '--name')), None)
+    return {'deleted': deleted is not None}
+
+  def _storage_container_list(self, options, env):
+    account = self._account_name(options, env)
+    prefix = self._option(options, '--prefix') or ''
+    return [{'name': container, 'properties': {'lastModified': self.container_created.get((name, container), _now())}}
+            for (name, container) in self.containers if name == account and container.startswith(prefix)]
+
+  def _storage_blob_snapshot(self, options, env):
+    blob = self._blob(self._account_name(options, env), self._option(options, '-c', '--container-name'), self._option(options, '-n', '--name'))
+    snapshot = _now()
+    blob['snapshots'][snapshot] = blob['size']
+    return {'snapshot': snapshot, 'lastModified': snapshot}
+
+  def _storage_blob_show(self, options, env):
+    blob = self._blob(self._account_name(options, env), self._option(options, '-c', '--container-name'), self._option(options, '-n', '--name'))
+    return self._blob_to_dict(blob)
+
+  def _storage_blob_list(self, options, env):
+    container = self._container(self._account_name(options, env), self._option(options, '-c', '--container-name'))
+    prefix = self._option(options, '--prefix') or ''
+    return [self._blob_to_dict(blob) for name, blob in sorted(container.items()) if name.startswith(prefix)]
+
+  def _storage_blob_delete(self, options, env):
+    blob = self._blob(self._account_name(options, env), self._option(options, '-c', '--container-name'), self._option(options, '-n', '--name'))
+    snapshot = self._option(options, '--snapshot')
+    if snapshot:
+      if blob['snapshots'].pop(snapshot, None) is None:
+        raise AzureError('BlobNotFound', 'The specified blob snapshot does not exist.', 3)
+    else:
+      del self.containers[(self._account_name(options, env), self._option(options, '-c', '--container-name'))][blob['name']]
+    return None
+
+  def _storage_blob_generate_sas(self, options, env):
+    self._storage_account(self._account_name(options, env))
+    return 'se={0}&sp={1}&sv=2018-11-09&sr=b&sig=simulated'.format(self._option(options, '--expiry'), self._option(options, '--permissions'))
+
+  def _storage_blob_copy_start(self, options, env):
+    account = self._account_name(options, env)
+    target = self._container(account, self._option(options, '-c', '--destination-container'))
+    source_uri = self._option(options, '--source-uri', '-u')
+    if source_uri:
+      size, location = self._source_size(source_uri)
+    else:
+      source_account = self._option(options, '--source-account-name')
+      source = self._blob(source_account, self._option(options, '--source-container'), self._option(options, '--source-blob'))
+      snapshot = self._option(options, '--source-snapshot')
+      if snapshot and snapshot not in source['snapshots']:
+        raise AzureError('BlobNotFound', 'The specified blob snapshot does not exist.', 3)
+      size, location = source['size'], self._storage_account(source_account)['location']
+      source_uri = 'https://{0}.blob.core.windows.net/{1}/{2}'.format(source_account, self._option(options, '--source-container'), source['name'])
+
+    name = self._option(options, '-b', '--destination-blob')
+    copy_id = str(uuid.uuid4())
+    same_region = location.lower() == self.storage_accounts[account]['location'].lower()
+    target[name] = {'name': name, 'size': size, 'snapshots': {}, 'copy': {
+      'id': copy_id,
+      'source': source_uri.split('?')[0],
+      'started': self.clock(),
+      'rate': self.copy_rate if same_region else self.cross_region_copy_rate,
+      'fails': self._failed_copies > 0,
+    }}
+    self._failed_copies = max(self._failed_copies - 1, 0)
+    copy = target[name]['copy']
+    if self.account_bandwidth:
+      # snapshot SAS sources are served by the platform, not by an account of the subscription
+      source_match = blob_uri_regex.match(source_uri)
+      source_account = source_match.group('account') if source_match else None
+      self._advance_shared_copies()
+      copy.update({'copied': 0.0, 'end': size // 2 if copy['fails'] else size,
+                   'accounts': [account] + ([source_account] if source_account in self.storage_accounts else [])})
+      self._shared_copies.append(copy)
+    for listener in self.copy_listeners:
+      listener(account, self._option(options, '-c', '--destination-container'), name, size, size / float(copy['rate']), copy['fails'])
+    return {'id': copy_id, 'status': 'pending'}
+
+  # Snapshots and disks
+
+  def _snapshot_create(self, options, env):
+    resource_group = self._resource_group(self._option(options, '-g', '--resource-group'))
+    name = self._option(options, '-n', '--name')
+    source = self._option(options, '--source')
+    if source.startswith('https://'):
+      size, _ = self._source_size(source)
+      creation_data = {'createOption': 'Import', 'sourceUri': source}
+    else:
+      disk_id = source if source.startswith('/') else '{0}/providers/Microsoft.Compute/disks/{1}'.format(resource_group['id'], source)
+      disk = self._by_id(self.disks, disk_id)
+      size = disk['diskSizeBytes']
+      creation_data = {'createOption': 'Copy', 'sourceResourceId': disk['id']}
+
+    snapshot = {
+      'id': '{0}/providers/Microsoft.Compute/snapshots/{1}'.format(resource_group['id'], name),
+      'name': name,
+      'resourceGroup': resource_group['name'],
+      'location': resource_group['location'],
+      'diskSizeGb': size // GB,
+      'diskSizeBytes': size,
+      'incremental': self._option(options, '--incremental') == 'true',
+      'creationData': creation_data,
+      'tags': _parse_tags(options.get('--tags', [])),
+      'diskState': 'Unattached',
+      'provisioningState': 'Succeeded',
+      'timeCreated': _now(),
+    }
+    self.snapshots[snapshot['id'].lower()] = snapshot
+    return snapshot
+
+  def _snapshot_list(self, options, env):
+    resource_group_name = self._option(options, '-g', '--resource-group')
+    snapshots = [snapshot for snapshot in self.snapshots.values()
+                 if not resource_group_name or snapshot['resourceGroup'].lower() == resource_group_name.lower()]
+    query = self._option(options, '--query') or ''
+    match = tag_equals_regex.match(query)
+    if match:
+      snapshots = [snapshot for snapshot in snapshots if snapshot['tags'].get(match.group('tag')) == match.group('value')]
+    match = tag_not_null_regex.match(query)
+    if match:
+      snapshots = [snapshot for snapshot in snapshots if match.group('tag') in snapshot['tags']]
+    return snapshots
+
+  def _snapshot_grant_access(self, options, env):
+    snapshot = self._by_id(self.snapshots, self._option(options, '--ids'))
+    snapshot['diskState'] = 'ActiveSAS'
+    return self._grant(snapshot)
+
+  def _snapshot_revoke_access(self, options, env):
+    self._by_id(self.snapshots, self._option(options, '--ids'))['diskState'] = 'Unattached'
+    return None
+
+  def _snapshot_delete(self, options, env):
+    snapshot = self.snapshots.get(self._option(options, '--ids').lower())
+    if snapshot is None:
+      return None
+    if snapshot['diskState'] == 'ActiveSAS':
+      raise AzureError('OperationNotAllowed', 'Snapshot {0} is currently being exported. Revoke access before deleting it.'.format(snapshot['name']))
+    del self.snapshots[snapshot['id'].lower()]
+    return None
+
+  def _vm_show(self, options, env):
+    resource_group = self._resource_group(self._option(options, '-g', '--resource-group'))
+    return self.vms.get('{0}/providers/Microsoft.Compute/virtualMachines/{1}'.format(resource_group['id'], self._option(options, '-n', '--name')).lower())
+
+  def _disk_show(self, options, env):
+    resource_group = self._resource_group(self._option(options, '-g', '--resource-group'))
+    # A disk that doesn't exist shows as empty output, which is what the extension checks for
+    return self.disks.get('{0}/providers/Microsoft.Compute/disks/{1}'.format(resource_group['id'], self._option(options, '-n', '--name')).lower())
+
+  def _disk_list(self, options, env):
+    resource_group = self._resource_group(self._option(options, '-g', '--resource-group'))
+    return [disk for disk in self.disks.values() if disk['resourceGroup'].lower() == resource_group['name'].lower()]
+
+  def _disk_create(self, options, env):
+    resource_group = self._resource_group(self._option(options, '-g', '--resource-group'))
+    name = self._option(options, '-n', '--name')
+    sku = self._option(options, '--sku') or 'Premium_LRS'
+    if '--for-upload' in options:
+      upload_size = int(self._option(options, '--upload-size-bytes'))
+      return self._put_disk(resource_group, name, sku, upload_size - 512, {'createOption': 'Upload', 'uploadSizeBytes': upload_size}, 'ReadyToUpload')
+
+    source = self._option(options, '--source')
+    if source.startswith('https://'):
+      size, _ = self._source_size(source)
+      creation_data = {'createOption': 'Import', 'sourceUri': source}
+    else:
+      snapshot = self._by_id(self.snapshots, source)
+      size = snapshot['diskSizeBytes']
+      creation_data = {'createOption': 'Copy', 'sourceResourceId': snapshot['id']}
+    return self._put_disk(resource_group, name, sku, size, creation_data, 'Unattached')
+
+  def _disk_grant_access(self, options, env):
+    resource_group = self._resource_group(self._option(options, '-g', '--resource-group'))
+    disk = self._by_id(self.disks, '{0}/providers/Microsoft.Compute/disks/{1}'.format(resource_group['id'], self._option(options, '-n', '--name')))
+    if self._option(options, '--access-level') == 'Write':
+      disk['diskState'] = 'ActiveUpload'
+    return self._grant(disk)
+
+  def _disk_revoke_access(self, options, env):
+    resource_group = self._resource_group(self._option(options, '-g', '--resource-group'))
+    disk = self._by_id(self.disks, '{0}/providers/Microsoft.Compute/disks/{1}'.format(resource_group['id'], self._option(options, '-n', '--name')))
+    if disk['diskState'] in ('ReadyToUpload', 'ActiveUpload'):
+      disk['diskState'] = 'Unattached'
+    return None
+
+  def _disk_delete(self, options, env):
+    resource_group = self._resource_group(self._option(options, '-g', '--resource-group'))
+    disk = self.disks.get('{0}/providers/Microsoft.Compute/disks/{1}'.format(resource_group['id'], self._option(options, '-n', '--name')).lower())
+    if disk is None:
+      return None
+    if disk['diskState'] == 'ActiveUpload':
+      raise AzureError('OperationNotAllowed', 'Disk {0} is currently open for upload. Revoke access before deleting it.'.format(disk['name']))
+    del self.disks[disk['id'].lower()]
+    return None
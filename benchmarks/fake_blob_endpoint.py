@@ -0,0 +1,314 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""A local blob service endpoint for azext_diskcopyextension.blob_client, backed by the storage accounts of a FakeAzure."""
+
+import base64
+import calendar
+import datetime
+import email.utils
+import hashlib
+import hmac
+import re
+import socket
+import threading
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import parse_qs, unquote, urlparse
+
+try:
+  from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+except ImportError:
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+  from socketserver import ThreadingMixIn
+
+  class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+from fake_azure import AzureError, account_key
+
+# Storage answers throttling with 503 ServerBusy, and the rest of FakeAzure's error codes with these statuses
+ERROR_STATUS = {
+  'BlobNotFound': 404,
+  'ContainerNotFound': 404,
+  'StorageAccountNotFound': 404,
+  'ResourceNotFound': 404,
+  'ContainerAlreadyExists': 409,
+  'BlobCopyPending': 409,
+  'Conflict': 409,
+  'AuthorizationFailed': 403,
+  'AuthenticationFailed': 403,
+  'TooManyRequests': 503,
+  'ServerBusy': 503,
+  'InternalServerError': 500,
+}
+
+# Request headers in the order the Shared Key string-to-sign lists them
+SHARED_KEY_HEADERS = ['Content-Encoding', 'Content-Language', 'Content-Length', 'Content-MD5', 'Content-Type', 'Date',
+                      'If-Modified-Since', 'If-Match', 'If-None-Match', 'If-Unmodified-Since', 'Range']
+# Query parameters in the order the string-to-sign of a blob service SAS lists them, for versions 2018-11-09 to
+# 2020-10-02. The canonicalized resource goes after `se`, and `snapshot` is the time of a snapshot's SAS.
+SAS_FIELDS = ['sp', 'st', 'se', 'si', 'sip', 'spr', 'sv', 'sr', 'snapshot', 'rscc', 'rscd', 'rsce', 'rscl', 'rsct']
+SAS_VERSIONS = ('2018-11-09', '2020-10-02')
+
+# The service's side of authorization is written here from the REST reference, independently of blob_client, so
+# that a signing mistake in the client fails against the endpoint instead of being reproduced by it.
+
+def _signature(account, string_to_sign):
+  digest = hmac.new(base64.b64decode(account_key(account)), string_to_sign.encode('utf-8'), hashlib.sha256).digest()
+  return base64.b64encode(digest).decode('utf-8')
+
+def shared_key_string_to_sign(method, account, raw_path, headers):
+  """The string a Shared Key request for `account` is signed over, from its request line path and headers."""
+  path, _, raw_query = raw_path.partition('?')
+  values = [method]
+  for name in SHARED_KEY_HEADERS:
+    value = (headers.get(name) or '').strip()
+    # since version 2015-02-21, a zero length is signed as empty
+    values.append('' if name == 'Content-Length' and value == '0' else value)
+  canonicalized_headers = sorted((name.lower(), value.strip()) for name, value in headers.items() if name.lower().startswith('x-ms-'))
+
+  parameters = {}
+  for pair in raw_query.split('&') if raw_query else []:
+    name, _, value = pair.partition('=')
+    parameters.setdefault(unquote(name).lower(), []).append(unquote(value))
+  resource = '/{0}{1}'.format(account, path)
+  resource += ''.join('\n{0}:{1}'.format(name, ','.join(sorted(parameters[name]))) for name in sorted(parameters))
+  return '\n'.join(values) + '\n' + ''.join('{0}:{1}\n'.format(name, value) for name, value in canonicalized_headers) + resource
+
+def blob_sas_string_to_sign(account, container, blob, query):
+  """The string a blob or blob snapshot SAS was signed over, from the (decoded) query parameters of the request."""
+  values = [query.get(field, '') for field in SAS_FIELDS]
+  values.insert(SAS_FIELDS.index('se') + 1, '/blob/{0}/{1}/{2}'.format(account, container, blob))
+  return '\n'.join(values)
+
+def _http_date(iso_time):
+  timestamp = calendar.timegm(datetime.datetime.strptime(iso_time[:19], '%Y-%m-%dT%H:%M:%S').timetuple())
+  return email.utils.formatdate(timestamp, usegmt=True)
+
+def _element(parent, tag, text=None):
+  element = ElementTree.SubElement(parent, tag)
+  if text is not None:
+    element.text = str(text)
+  return element
+
+class FakeBlobEndpoint(object):
+  """Serves the blob service of every storage account in `azure`, path style, at http://127.0.0.1:<port>/<account>.
+
+  Each REST request is checked for a valid SharedKey signature or blob SAS, answered by the FakeAzure handler of the
+  `az storage` command it replaces, and counted in `azure.calls` as e.g. 'rest blob show'. Requests take `latency`
+  seconds instead of the latency of an az call. Listings return at most `page_size` items per response, continued
+  with NextMarker like Azure Storage's. Set BLOB_ENDPOINT_ENV to `url` to use it.
+  """
+
+  def __init__(self, azure, latency=0.005, page_size=5000):
+    self.azure = azure
+    self.latency = latency
+    self.page_size = page_size
+    self._server = None
+    self._thread = None
+
+  @property
+  def url(self):
+    return 'http://127.0.0.1:{0}/{{account}}'.format(self._server.server_address[1])
+
+  def start(self):
+    endpoint = self
+
+    class Handler(_BlobRequestHandler):
+      pass
+    Handler.endpoint = endpoint
+
+    self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    self._server.daemon_threads = True
+    self._thread = threading.Thread(target=self._server.serve_forever, name='fake-blob-endpoint')
+    self._thread.daemon = True
+    self._thread.start()
+    return self
+
+  def stop(self):
+    if self._server is not None:
+      self._server.shutdown()
+      self._server.server_close()
+      self._server = None
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *args):
+    self.stop()
+
+  def call(self, operation, command, options, account):
+    return self.azure.call(command, options, {'AZURE_STORAGE_ACCOUNT': account}, counted_as='rest ' + operation, latency=self.latency)
+
+  def copy_source_options(self, source_url):
+    """Options of `storage blob copy start` for a copy source, which is a URL of this endpoint or of Azure."""
+    parsed = urlparse(source_url)
+    base = 'http://{0}'.format(parsed.netloc)
+    if base.rstrip('/') != self.url.split('/{account}')[0]:
+      return {'--source-uri': [source_url]}
+    account, container, blob = [unquote(part) for part in parsed.path.lstrip('/').split('/', 2)]
+    snapshot = parse_qs(parsed.query).get('snapshot')
+    if snapshot:
+      return {'--source-account-name': [account], '--source-container': [container], '--source-blob': [blob], '--source-snapshot': snapshot}
+    return {'--source-uri': ['https://{0}.blob.core.windows.net/{1}/{2}?{3}'.format(account, container, blob, parsed.query)]}
+
+class _BlobRequestHandler(BaseHTTPRequestHandler):
+  # keep-alive, so the client's pooled connections are reused like they are with Azure Storage
+  protocol_version = 'HTTP/1.1'
+  endpoint = None
+
+  def log_message(self, *args):  # pylint: disable=arguments-differ
+    pass
+
+  def setup(self):
+    BaseHTTPRequestHandler.setup(self)
+    # headers and body are written separately, which Nagle's algorithm would hold back on a kept-alive connection
+    self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+  def do_GET(self):
+    self._handle('GET')
+
+  def do_HEAD(self):
+    self._handle('HEAD')
+
+  def do_PUT(self):
+    self._handle('PUT')
+
+  def do_DELETE(self):
+    self._handle('DELETE')
+
+  def _handle(self, method):
+    parsed = urlparse(self.path)
+    parts = [unquote(part) for part in parsed.path.lstrip('/').split('/', 2)]
+    account, container, blob = (parts + [None, None])[:3]
+    query = dict((name, values[0]) for name, values in parse_qs(parsed.query, keep_blank_values=True).items())
+    try:
+      self._authorize(method, account, container, blob, query)
+      status, headers, body = self._route(method, account, container, blob, query)
+    except AzureError as ex:
+      status = ERROR_STATUS.get(ex.code, 400)
+      error = ElementTree.Element('Error')
+      _element(error, 'Code', ex.code)
+      _element(error, 'Message', str(ex))
+      headers, body = {'x-ms-error-code': ex.code}, ElementTree.tostring(error)
+      if ex.code == 'TooManyRequests':
+        headers['Retry-After'] = '1'
+
+    # a body length is always sent, or the connection couldn't be kept alive
+    body = body or b''
+    self.send_response(status)
+    for name, value in headers.items():
+      self.send_header(name, str(value))
+    if 'Content-Length' not in headers:
+      self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    if method != 'HEAD':
+      self.wfile.write(body)
+
+  def _authorize(self, method, account, container, blob, query):
+    if account not in self.endpoint.azure.storage_accounts:
+      raise AzureError('StorageAccountNotFound', 'The storage account {0} was not found.'.format(account))
+    if 'sig' in query:
+      # FakeAzure's `az storage blob generate-sas` signs with 'simulated', blob SAS tokens signed with the key are checked
+      if query['sig'] == 'simulated' or query.get('sr') not in ('b', 'bs'):
+        return
+      if not SAS_VERSIONS[0] <= query.get('sv', '') <= SAS_VERSIONS[1]:
+        raise AzureError('AuthenticationFailed', 'Signed version {0} is not supported here.'.format(query.get('sv')))
+      if query.get('se', '') < datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M'):
+        raise AzureError('AuthenticationFailed', 'Signed expiry time {0} has passed.'.format(query.get('se')))
+      if query['sr'] == 'b':
+        query = dict(query, snapshot='')
+      if not hmac.compare_digest(_signature(account, blob_sas_string_to_sign(account, container, blob, query)), query['sig']):
+        raise AzureError('AuthenticationFailed', 'Signature did not match.')
+      return
+    authorization = self.headers.get('Authorization') or ''
+    expected = 'SharedKey {0}:{1}'.format(account, _signature(account, shared_key_string_to_sign(method, account, self.path, self.headers)))
+    if not hmac.compare_digest(authorization, expected):
+      raise AzureError('AuthenticationFailed', 'Server failed to authenticate the request. Make sure the value of '
+                                               'Authorization header is formed correctly including the signature.')
+
+  def _route(self, method, account, container, blob, query):
+    call = self.endpoint.call
+    if container is None and method == 'GET' and query.get('comp') == 'list':
+      containers = call('container list', 'storage container list', {'--prefix': [query.get('prefix', '')]}, account)
+      return 200, {}, self._container_list(*self._page(containers, query.get('marker')))
+
+    if blob is None and query.get('restype') == 'container':
+      options = {'-n': [container]}
+      if method == 'PUT':
+        if not call('container create', 'storage container create', options, account)['created']:
+          raise AzureError('ContainerAlreadyExists', 'The specified container already exists.')
+        return 201, {}, None
+      if method == 'DELETE':
+        if not call('container delete', 'storage container delete', options, account)['deleted']:
+          raise AzureError('ContainerNotFound', 'The specified container does not exist.')
+        return 202, {}, None
+      if method == 'GET' and query.get('comp') == 'list':
+        blobs = call('blob list', 'storage blob list', {'-c': [container], '--prefix': [query.get('prefix', '')]}, account)
+        return 200, {}, self._blob_list(container, *self._page(blobs, query.get('marker')))
+
+    options = {'-c': [container], '-n': [blob]}
+    if method == 'HEAD':
+      return 200, self._blob_headers(call('blob show', 'storage blob show', options, account)), None
+    if method == 'PUT' and query.get('comp') == 'snapshot':
+      snapshot = call('blob snapshot', 'storage blob snapshot', options, account)
+      return 201, {'x-ms-snapshot': snapshot['snapshot'], 'Last-Modified': _http_date(snapshot['lastModified'])}, None
+    if method == 'DELETE':
+      if query.get('snapshot'):
+        options['--snapshot'] = [query['snapshot']]
+      call('blob delete', 'storage blob delete', options, account)
+      return 202, {}, None
+    if method == 'PUT' and self.headers.get('x-ms-copy-source'):
+      options = dict(self.endpoint.copy_source_options(self.headers['x-ms-copy-source']),
+                     **{'-c': [container], '-b': [blob]})
+      copy = call('blob copy start', 'storage blob copy start', options, account)
+      return 202, {'x-ms-copy-id': copy['id'], 'x-ms-copy-status': copy['status']}, None
+    raise AzureError('UnsupportedHttpVerb', '{0} {1} is not simulated'.format(method, self.path))
+
+  def _page(self, items, marker):
+    """The items of one listing response, from the one named by `marker`, and the marker of the next response."""
+    items = sorted(items, key=lambda item: item['name'])
+    start = next((index for index, item in enumerate(items) if item['name'] >= marker), len(items)) if marker else 0
+    end = start + self.endpoint.page_size
+    return items[start:end], items[end]['name'] if end < len(items) else None
+
+  @staticmethod
+  def _copy_fields(blob):
+    copy = blob['properties'].get('copy') or {}
+    return [(name, copy.get(key)) for name, key in (('Id', 'id'), ('Source', 'source'), ('Status', 'status'),
+                                                    ('Progress', 'progress'), ('StatusDescription', 'statusDescription'))]
+
+  def _blob_headers(self, blob):
+    headers = {'Content-Length': blob['properties']['contentLength'], 'x-ms-blob-type': blob['properties']['blobType']}
+    for name, value in self._copy_fields(blob):
+      if value is not None:
+        headers['x-ms-copy-' + re.sub(r'(?<!^)([A-Z])', r'-\1', name).lower()] = value
+    return headers
+
+  def _blob_list(self, container, blobs, next_marker):
+    root = ElementTree.Element('EnumerationResults', ContainerName=container)
+    elements = _element(root, 'Blobs')
+    for blob in blobs:
+      element = _element(elements, 'Blob')
+      _element(element, 'Name', blob['name'])
+      properties = _element(element, 'Properties')
+      _element(properties, 'Content-Length', blob['properties']['contentLength'])
+      _element(properties, 'BlobType', blob['properties']['blobType'])
+      for name, value in self._copy_fields(blob):
+        if value is not None:
+          _element(properties, 'Copy' + name, value)
+    _element(root, 'NextMarker', next_marker)
+    return ElementTree.tostring(root)
+
+  @staticmethod
+  def _container_list(containers, next_marker):
+    root = ElementTree.Element('EnumerationResults')
+    elements = _element(root, 'Containers')
+    for container in containers:
+      element = _element(elements, 'Container')
+      _element(element, 'Name', container['name'])
+      _element(_element(element, 'Properties'), 'Last-Modified', _http_date(container['properties']['lastModified']))
+    _element(root, 'NextMarker', next_marker)
+    return ElementTree.tostring(root)
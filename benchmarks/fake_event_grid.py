@@ -0,0 +1,118 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""An in-process Event Grid that reports the blob copies of a FakeAzure as they complete."""
+
+import datetime
+import json
+import threading
+import uuid
+from urllib.request import Request, urlopen
+
+from fake_azure import SUBSCRIPTION
+
+class FakeEventGrid(object):
+  """Publishes a Microsoft.Storage.BlobCreated event `delay` seconds after each blob copy of `azure` completes.
+
+  Copies that fail get no event, like with Event Grid. Events go to the in-process `transport()`, which
+  implements the extension's event transport interface, or are POSTed to a webhook, e.g. the URL of an
+  HttpListenerTransport.
+  """
+
+  def __init__(self, azure, delay=0.05):
+    self.delay = delay
+    self.delivered = 0
+    self._deliveries = []
+    self._timers = []
+    self._lock = threading.Lock()
+    azure.copy_listeners.append(self._copy_started)
+
+  def transport(self):
+    return FakeEventTransport(self)
+
+  def webhook(self, url):
+    """Subscribe a webhook, after the validation handshake Event Grid does with a new endpoint."""
+    code = str(uuid.uuid4())
+    response = json.loads(self._post(url, [{
+      'id': str(uuid.uuid4()),
+      'eventType': 'Microsoft.EventGrid.SubscriptionValidationEvent',
+      'subject': '',
+      'data': {'validationCode': code},
+    }]) or 'null')
+    if (response or {}).get('validationResponse') != code:
+      raise ValueError('{0} did not validate the event subscription: {1}'.format(url, response))
+    self.subscribe(lambda events: self._post(url, events))
+
+  def subscribe(self, deliver):
+    with self._lock:
+      self._deliveries.append(deliver)
+
+  def unsubscribe(self, deliver):
+    with self._lock:
+      if deliver in self._deliveries:
+        self._deliveries.remove(deliver)
+
+  def close(self):
+    with self._lock:
+      timers, self._timers, self._deliveries = self._timers, [], []
+    for timer in timers:
+      timer.cancel()
+
+  @staticmethod
+  def _post(url, events):
+    request = Request(url, json.dumps(events).encode('utf-8'), {'Content-Type': 'application/json'})
+    return urlopen(request).read().decode('utf-8')
+
+  def _copy_started(self, account, container, blob, size, seconds, fails):
+    if fails:
+      return
+    event = {
+      'id': str(uuid.uuid4()),
+      'topic': '/subscriptions/{0}/resourceGroups/rg/providers/Microsoft.Storage/storageAccounts/{1}'.format(SUBSCRIPTION, account),
+      'subject': '/blobServices/default/containers/{0}/blobs/{1}'.format(container, blob),
+      'eventType': 'Microsoft.Storage.BlobCreated',
+      'eventTime': datetime.datetime.utcnow().isoformat() + 'Z',
+      'data': {
+        'api': 'CopyBlob',
+        'blobType': 'PageBlob',
+        'contentLength': size,
+        'url': 'https://{0}.blob.core.windows.net/{1}/{2}'.format(account, container, blob),
+      },
+      'dataVersion': '',
+      'metadataVersion': '1',
+    }
+    timer = threading.Timer(seconds + self.delay, self._deliver, args=([event],))
+    timer.daemon = True
+    with self._lock:
+      self._timers = [t for t in self._timers if t.is_alive()] + [timer]
+    timer.start()
+
+  def _deliver(self, events):
+    with self._lock:
+      deliveries = list(self._deliveries)
+      self.delivered += len(events)
+    for deliver in deliveries:
+      deliver(events)
+
+class FakeEventTransport(object):
+  """The extension's event transport interface, fed directly by a FakeEventGrid."""
+  name = 'fake'
+
+  def __init__(self, grid, fallback_interval=300.0):
+    self.grid = grid
+    self.fallback_interval = fallback_interval
+    self._deliver = None
+
+  def start(self, publish):
+    from azext_diskcopyextension.events import parse_events
+
+    def _deliver(events):
+      for event in parse_events(events):
+        publish(event)
+    self._deliver = _deliver
+    self.grid.subscribe(_deliver)
+
+  def stop(self):
+    self.grid.unsubscribe(self._deliver)
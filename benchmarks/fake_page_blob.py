@@ -0,0 +1,129 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""In-process stand-in for the page blob REST operations used by azext_diskcopyextension.page_blob."""
+
+import struct
+import threading
+import time
+
+PAGE_SIZE = 512
+ZERO_PAGE = bytes(bytearray(PAGE_SIZE))
+
+def _merge(pages):
+  """Merge page offsets into sorted, inclusive (start, end) byte ranges."""
+  ranges = []
+  for page in sorted(pages):
+    if ranges and ranges[-1][1] + 1 == page:
+      ranges[-1] = (ranges[-1][0], page + PAGE_SIZE - 1)
+    else:
+      ranges.append((page, page + PAGE_SIZE - 1))
+  return ranges
+
+class FakePageBlob(object):
+  def __init__(self, size):
+    self.size = size
+    # page offset -> content token; unallocated pages are absent
+    self.pages = {}
+
+def page_content(token):
+  return ZERO_PAGE if token is None else struct.pack('<q', token) * (PAGE_SIZE // 8)
+
+class FakePageBlobService(object):
+  """Holds page blobs by URL (the SAS query is ignored) and counts requests. `latency` is added to every call.
+
+  A page's content is derived from its token, and reads take `read_rate` bytes per second per request, if given.
+  """
+
+  def __init__(self, latency=0.0, read_rate=None):
+    self.latency = latency
+    self.read_rate = read_rate
+    self.blobs = {}
+    self.requests = 0
+    self.bytes_read = 0
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def _key(url):
+    return url.split('?')[0]
+
+  def add_blob(self, url, size, extents=()):
+    """Create a blob whose (offset, length) extents are populated with content derived from the offset."""
+    blob = FakePageBlob(size)
+    for offset, length in extents:
+      for page in range(offset, offset + length, PAGE_SIZE):
+        blob.pages[page] = hash((url, page))
+    self.blobs[self._key(url)] = blob
+    return blob
+
+  def blob(self, url):
+    return self.blobs[self._key(url)]
+
+  def client(self, sas_url):
+    return FakePageBlobClient(self, sas_url)
+
+  def _call(self):
+    with self._lock:
+      self.requests += 1
+    if self.latency:
+      time.sleep(self.latency)
+
+class FakePageBlobClient(object):
+  def __init__(self, service, sas_url):
+    self.service = service
+    self.sas_url = sas_url
+
+  def get_size(self):
+    self.service._call()
+    return self.service.blob(self.sas_url).size
+
+  def create(self, size):
+    self.service._call()
+    self.service.blobs[self.service._key(self.sas_url)] = FakePageBlob(size)
+
+  def get_page_ranges(self, offset=None, length=None):
+    self.service._call()
+    blob = self.service.blob(self.sas_url)
+    start = offset or 0
+    end = start + (length or blob.size) - 1
+    return _merge(p for p in blob.pages if start <= p <= end)
+
+  def get_page_ranges_diff(self, previous_snapshot_url, offset=None, length=None):
+    self.service._call()
+    blob = self.service.blob(self.sas_url)
+    previous = self.service.blob(previous_snapshot_url)
+    start = offset or 0
+    end = start + (length or blob.size) - 1
+    changed = [p for p in blob.pages if start <= p <= end and previous.pages.get(p) != blob.pages[p]]
+    cleared = [p for p in previous.pages if start <= p <= end and p not in blob.pages]
+    return _merge(changed), _merge(cleared)
+
+  def read(self, offset, length, chunk_size=1024 * 1024):
+    self.service._call()
+    blob = self.service.blob(self.sas_url)
+    with self.service._lock:
+      self.service.bytes_read += length
+    if self.service.read_rate:
+      time.sleep(length / float(self.service.read_rate))
+    for chunk_offset in range(offset, offset + length, chunk_size):
+      end = min(offset + length, chunk_offset + chunk_size)
+      yield b''.join(page_content(blob.pages.get(page)) for page in range(chunk_offset, end, PAGE_SIZE))
+
+  def put_page_from_url(self, source_url, source_offset, offset, length):
+    self.service._call()
+    source = self.service.blob(source_url)
+    target = self.service.blob(self.sas_url)
+    for delta in range(0, length, PAGE_SIZE):
+      token = source.pages.get(source_offset + delta)
+      if token is None:
+        target.pages.pop(offset + delta, None)
+      else:
+        target.pages[offset + delta] = token
+
+  def clear_pages(self, offset, length):
+    self.service._call()
+    target = self.service.blob(self.sas_url)
+    for page in range(offset, offset + length, PAGE_SIZE):
+      target.pages.pop(page, None)
@@ -0,0 +1,54 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from bench_copy_commands import seed
+from fake_azure import GB, FakeAzure
+from fake_blob_endpoint import FakeBlobEndpoint
+
+from azext_diskcopyextension import cli_utils, custom
+from azext_diskcopyextension.blob_client import BLOB_ENDPOINT_ENV, blob_clients
+from azext_diskcopyextension.cache import resource_cache
+from azext_diskcopyextension.events import PollingTransport
+from azext_diskcopyextension.journal import JOURNAL_DIR_ENV
+
+class CopyTestCase(unittest.TestCase):
+  """Runs the copy commands against a FakeAzure seeded like the copy benchmarks, with 1 GB disks.
+
+  source-rg (eastus) holds the disk `data` and the VM `vm` with disks vm-os, vm-data0 and vm-data1. The target
+  resource groups are target-eastus, target-westus and target-westus2.
+  """
+
+  def setUp(self):
+    logging.disable(logging.CRITICAL)
+    self.work_dir = tempfile.mkdtemp(prefix='diskcopy-test-')
+    self.environ = dict(os.environ)
+    os.environ[JOURNAL_DIR_ENV] = self.work_dir
+    os.environ.pop('AZURE_DISKCOPY_CACHE_FILE', None)
+    self.azure = FakeAzure(0, copy_rate=64 * GB, cross_region_copy_rate=16 * GB)
+    seed(self.azure, 1)
+    cli_utils.set_cli_backend(self.azure)
+    self.endpoint = FakeBlobEndpoint(self.azure, 0).start()
+    os.environ[BLOB_ENDPOINT_ENV] = self.endpoint.url
+    blob_clients.clear()
+    resource_cache.clear()
+    custom.copy_completion.set_transport(PollingTransport())
+
+  def tearDown(self):
+    custom.copy_completion.set_transport(None)
+    self.endpoint.stop()
+    cli_utils.set_cli_backend(None)
+    os.environ.clear()
+    os.environ.update(self.environ)
+    shutil.rmtree(self.work_dir, ignore_errors=True)
+    logging.disable(logging.NOTSET)
+
+  def disks(self, resource_group_name):
+    return sorted(disk['name'] for disk in self.azure.disks.values() if disk['resourceGroup'] == resource_group_name)
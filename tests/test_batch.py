@@ -0,0 +1,74 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import unittest
+
+from copy_test_case import CopyTestCase
+from fake_azure import SUBSCRIPTION
+from knack.util import CLIError
+
+from azext_diskcopyextension import custom
+from azext_diskcopyextension.batch import CopyJob, load_manifest, run_batch
+
+class ManifestBatchTest(CopyTestCase):
+  def write(self, name, content):
+    path = os.path.join(self.work_dir, name)
+    with open(path, 'w') as f:
+      f.write(content)
+    return path
+
+  def results(self, path):
+    with open(path) as f:
+      return [json.loads(line) for line in f]
+
+  def test_csv_manifest(self):
+    manifest = self.write('disks.csv', 'source_resource_group, source_disk_name, target_disk_name\n'
+                                       'source-rg, data, data-copy\n'
+                                       'source-rg, vm-data0,\n')
+    self.assertEqual(load_manifest(manifest), [{'source_resource_group': 'source-rg', 'source_disk_name': 'data', 'target_disk_name': 'data-copy'},
+                                               {'source_resource_group': 'source-rg', 'source_disk_name': 'vm-data0'}])
+    results_file = os.path.join(self.work_dir, 'results.jsonl')
+    results = custom.copy_disk_to_disk_batch('target-eastus', manifest_file=manifest, results_file=results_file, progress_format='none')
+    self.assertEqual(sorted((result['source'], result['status']) for result in results),
+                     [('source-rg/data', 'succeeded'), ('source-rg/vm-data0', 'succeeded')])
+    self.assertEqual(self.disks('target-eastus'), ['data-copy', 'vm-data0'])
+    self.assertEqual(sorted(result['source'] for result in self.results(results_file)), ['source-rg/data', 'source-rg/vm-data0'])
+
+  def test_json_manifest_with_a_failing_entry(self):
+    disk_id = '/subscriptions/{0}/resourceGroups/source-rg/providers/Microsoft.Compute/disks/data'.format(SUBSCRIPTION)
+    manifest = self.write('disks.json', json.dumps([{'source_disk_id': disk_id, 'target_resource_group': 'target-westus'},
+                                                    {'source_resource_group': 'source-rg', 'source_disk_name': 'missing'}]))
+    results = custom.copy_disk_to_disk_batch('target-eastus', manifest_file=manifest, progress_format='none')
+    # one failed copy doesn't stop the others
+    self.assertEqual(sorted((result['source'], result['status']) for result in results),
+                     [(disk_id, 'succeeded'), ('source-rg/missing', 'failed')])
+    self.assertEqual(self.disks('target-westus'), ['data'])
+
+  def test_manifest_must_be_a_list_of_entries(self):
+    with self.assertRaises(CLIError):
+      load_manifest(self.write('disks.json', '{"source_disk_id": "x"}'))
+    with self.assertRaises(CLIError):
+      custom.copy_vhd_to_disk_batch(self.write('vhds.json', '[{"target_disk_name": "data"}]'), 'target-eastus')
+
+  def test_results_are_written_as_each_copy_finishes(self):
+    results_file = os.path.join(self.work_dir, 'results.jsonl')
+    written = []
+
+    def _last():
+      # the earlier copies' results are in the file while this one is still running
+      written.extend(self.results(results_file))
+      return {'id': 'last-copy'}
+
+    jobs = [CopyJob('first', 'first-target', lambda: {'id': 'first-copy'}), CopyJob('failing', 'failing-target', lambda: 1 / 0),
+            CopyJob('last', 'last-target', _last)]
+    results = run_batch(jobs, max_workers=1, results_file=results_file)
+    self.assertEqual([(result['source'], result['status']) for result in written], [('first', 'succeeded'), ('failing', 'failed')])
+    self.assertEqual([result['target'] for result in results], ['first-copy', 'failing-target', 'last-copy'])
+    self.assertEqual(self.results(results_file), results)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,172 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import base64
+import datetime
+import unittest
+from unittest import mock
+
+from fake_azure import FakeAzure, account_key
+from fake_blob_endpoint import FakeBlobEndpoint
+
+from knack.util import CLIError
+
+from azext_diskcopyextension.blob_client import StorageAccountClient
+from azext_diskcopyextension.retry import ERROR_FATAL, ERROR_THROTTLED, RetryPolicy, classify_error, retry_policy
+
+EXPIRY = (datetime.datetime.utcnow() + datetime.timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+# Signatures made with azure-storage-blob 12.4.0, the release for storage API version 2019-12-12: SharedKeyCredentialPolicy
+# for the Authorization headers and generate_blob_sas for the SAS tokens, all with this key for account 'myaccount'
+KNOWN_ANSWER_KEY = 'a25vd24tYW5zd2VyLXRlc3Qta2V5LWZvci1teWFjY291bnQ='
+KNOWN_ANSWER_DATE = 'Sun, 18 Oct 2026 12:00:00 GMT'
+
+class SigningKnownAnswerTest(unittest.TestCase):
+  """The client's signatures against ones made by the Azure Storage SDK, so they don't only agree with the fake endpoint."""
+
+  def setUp(self):
+    self.client = StorageAccountClient('myaccount', KNOWN_ANSWER_KEY)
+
+  def headers(self, **kwargs):
+    return dict({'x-ms-date': KNOWN_ANSWER_DATE, 'x-ms-version': '2019-12-12'}, **kwargs)
+
+  def test_list_containers(self):
+    self.assertEqual(self.client.sign('GET', 'https://myaccount.blob.core.windows.net/?comp=list&prefix=diskcopy-&marker=2%21104', self.headers()),
+                     'SharedKey myaccount:IAF5nNRRBB9DnIfaRMGI1eEOCul5O8SqOPMFsA+vVwE=')
+
+  def test_copy_blob(self):
+    headers = self.headers(**{'Content-Length': '0', 'x-ms-copy-source': 'https://src.blob.core.windows.net/c/os.vhd?sv=2019-12-12&sig=abc'})
+    self.assertEqual(self.client.sign('PUT', 'https://myaccount.blob.core.windows.net/vhds/os%20disk.vhd', headers),
+                     'SharedKey myaccount:fvBfrWVSS6K5i7ZE3aWo6p6JzMQ18pkSRT7NxxZb6BA=')
+
+  def test_put_page(self):
+    headers = self.headers(**{'Content-Length': '512', 'Content-Type': 'application/octet-stream', 'x-ms-range': 'bytes=0-511',
+                              'x-ms-page-write': 'update'})
+    self.assertEqual(self.client.sign('PUT', 'https://myaccount.blob.core.windows.net/vhds/os.vhd?comp=page', headers),
+                     'SharedKey myaccount:l+PyWYRez7U/lQ86y9UbvgRNQlYkpHo4GsTEyW8ClIw=')
+
+  def test_blob_sas(self):
+    token = self.client.generate_blob_sas('vhds', 'os.vhd', 'r', '2030-01-01T00:00Z')
+    self.assertIn('sig=pTsvNKSqHcCsWjQxnMsP8knB1qE10FZDgG5NLhDciTA%3D', token.split('&'))
+    token = self.client.generate_blob_sas('vhds', 'os.vhd', 'rcw', '2030-01-01T00:00Z', https_only=False)
+    self.assertIn('sig=SEZZ3myYlDaPCGLp9zS2pdC3bmMsgqoaJLB9YVLkf5s%3D', token.split('&'))
+
+  def test_snapshot_sas(self):
+    token = self.client.generate_blob_sas('vhds', 'os.vhd', 'rw', '2030-01-01T00:00Z', snapshot='2026-10-18T12:00:00.0000000Z')
+    self.assertIn('sig=y8yNfhs6B7q5lq1bCBjLB6QNAJa5e2hyPxWeKkA9sZI%3D', token.split('&'))
+
+class StorageAccountClientTest(unittest.TestCase):
+  """The REST client against the fake blob endpoint, which checks requests like Azure Storage does."""
+
+  def setUp(self):
+    self.azure = FakeAzure(0)
+    self.azure.add_resource_group('rg', 'eastus')
+    self.azure.add_storage_account('vhds', 'rg')
+    for index in range(5):
+      self.azure.add_blob('vhds', 'disks', 'disk{0}.vhd'.format(index), 1024)
+    self.endpoint = FakeBlobEndpoint(self.azure, 0, page_size=2).start()
+    self.sleep = mock.patch.object(retry_policy, 'sleep').start()
+    self.addCleanup(mock.patch.stopall)
+    self.addCleanup(self.endpoint.stop)
+
+  def client(self, account_key=None, sas_token=None):
+    client = StorageAccountClient('vhds', account_key, sas_token, endpoint=self.endpoint.url.format(account='vhds'))
+    self.addCleanup(client.close)
+    return client
+
+  def test_shared_key_signature(self):
+    client = self.client(account_key('vhds'))
+    self.assertEqual(client.get_blob_properties('disks', 'disk0.vhd')['properties']['contentLength'], 1024)
+    self.assertEqual(client.create_container('new'), {'created': True})
+    self.assertEqual(client.create_container('new'), {'created': False})
+
+  def test_shared_key_signature_covers_headers_and_resource(self):
+    client = self.client(account_key('vhds'))
+    url = client.blob_url('disks', 'disk0.vhd')
+    headers = {'x-ms-date': 'Mon, 01 Jan 2024 00:00:00 GMT', 'x-ms-version': '2019-12-12'}
+    signature = client.sign('HEAD', url, headers)
+    self.assertTrue(signature.startswith('SharedKey vhds:'))
+    self.assertEqual(signature, client.sign('HEAD', url, dict(headers)))
+    self.assertNotEqual(signature, client.sign('GET', url, headers))
+    self.assertNotEqual(signature, client.sign('HEAD', client.blob_url('disks', 'disk1.vhd'), headers))
+    self.assertNotEqual(signature, client.sign('HEAD', url, dict(headers, **{'x-ms-date': 'Tue, 02 Jan 2024 00:00:00 GMT'})))
+
+  def test_wrong_key_is_rejected(self):
+    wrong_key = base64.b64encode(b'not the account key').decode('ascii')
+    with self.assertRaises(CLIError) as raised:
+      self.client(wrong_key).get_blob_properties('disks', 'disk0.vhd')
+    self.assertIn('403 AuthenticationFailed', str(raised.exception))
+
+  def test_blob_sas(self):
+    token = self.client(account_key('vhds')).generate_blob_sas('disks', 'disk0.vhd', 'r', EXPIRY)
+    fields = dict(field.split('=', 1) for field in token.split('&'))
+    self.assertEqual((fields['sp'], fields['sr'], fields['spr']), ('r', 'b', 'https'))
+    self.assertEqual(self.client(sas_token=token).get_blob_properties('disks', 'disk0.vhd')['name'], 'disk0.vhd')
+
+  def test_blob_sas_is_signed_for_one_blob(self):
+    token = self.client(account_key('vhds')).generate_blob_sas('disks', 'disk0.vhd', 'r', EXPIRY)
+    with self.assertRaises(CLIError) as raised:
+      self.client(sas_token=token).get_blob_properties('disks', 'disk1.vhd')
+    self.assertIn('403 AuthenticationFailed', str(raised.exception))
+    with self.assertRaises(CLIError):
+      self.client(sas_token=token.replace('sp=r', 'sp=rw')).get_blob_properties('disks', 'disk0.vhd')
+
+  def test_expired_blob_sas_is_rejected(self):
+    token = self.client(account_key('vhds')).generate_blob_sas('disks', 'disk0.vhd', 'r', '2020-01-01T00:00Z')
+    with self.assertRaises(CLIError) as raised:
+      self.client(sas_token=token).get_blob_properties('disks', 'disk0.vhd')
+    self.assertIn('403 AuthenticationFailed', str(raised.exception))
+
+  def test_snapshot_sas(self):
+    client = self.client(account_key('vhds'))
+    token = client.generate_blob_sas('disks', 'disk0.vhd', 'r', EXPIRY, snapshot='2024-01-01T00:00:00.0000000Z')
+    self.assertIn('sr=bs', token)
+    self.assertNotEqual(token, client.generate_blob_sas('disks', 'disk0.vhd', 'r', EXPIRY))
+
+  def test_sas_needs_the_account_key(self):
+    with self.assertRaises(CLIError):
+      self.client(sas_token='sig=x').generate_blob_sas('disks', 'disk0.vhd', 'r', EXPIRY)
+
+  def test_list_follows_the_continuation_marker(self):
+    blobs = self.client(account_key('vhds')).list_blobs('disks')
+    self.assertEqual([blob['name'] for blob in blobs], ['disk{0}.vhd'.format(index) for index in range(5)])
+    self.assertEqual(self.azure.calls['rest blob list'], 3)
+
+  def test_list_with_prefix(self):
+    self.azure.add_blob('vhds', 'disks', 'other.vhd', 1024)
+    blobs = self.client(account_key('vhds')).list_blobs('disks', prefix='disk')
+    self.assertEqual(len(blobs), 5)
+
+  def test_list_containers_follows_the_continuation_marker(self):
+    for index in range(4):
+      self.azure.add_blob('vhds', 'container{0}'.format(index), '.keep', 0)
+    containers = self.client(account_key('vhds')).list_containers()
+    self.assertEqual(sorted(container['name'] for container in containers), ['container0', 'container1', 'container2', 'container3', 'disks'])
+    self.assertEqual(self.azure.calls['rest container list'], 3)
+
+  def test_missing_blob_fails_like_the_cli(self):
+    with self.assertRaises(CLIError) as raised:
+      self.client(account_key('vhds')).get_blob_properties('disks', 'missing.vhd')
+    self.assertIn('404 BlobNotFound', str(raised.exception))
+    self.assertEqual(classify_error(str(raised.exception)), ERROR_FATAL)
+    self.sleep.assert_not_called()
+
+  def test_throttled_request_is_retried_after_retry_after(self):
+    self.azure.fail('storage blob show', times=2, code='TooManyRequests')
+    blob = self.client(account_key('vhds')).get_blob_properties('disks', 'disk0.vhd')
+    self.assertEqual(blob['name'], 'disk0.vhd')
+    self.assertEqual(self.sleep.call_args_list, [mock.call(1.0), mock.call(1.0)])
+
+  def test_throttling_that_persists_fails_as_throttled(self):
+    self.azure.fail('storage blob show', times=100, code='ServerBusy')
+    policy = RetryPolicy(max_retries=2, sleep=mock.Mock())
+    with mock.patch('azext_diskcopyextension.blob_client.retry_policy', policy), self.assertRaises(CLIError) as raised:
+      self.client(account_key('vhds')).get_blob_properties('disks', 'disk0.vhd')
+    self.assertIn('503 ServerBusy', str(raised.exception))
+    self.assertEqual(classify_error(str(raised.exception)), ERROR_THROTTLED)
+    self.assertEqual(policy.sleep.call_count, 2)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,82 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from azext_diskcopyextension.cache import CACHE_TTL_ENV, DEFAULT_TTL, ResourceCache, cache_ttl
+
+class FakeClock(object):
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+class ResourceCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = FakeClock()
+    self.cache_dir = tempfile.mkdtemp(prefix='diskcopy-cache-')
+    self.addCleanup(shutil.rmtree, self.cache_dir, True)
+    self.persist_file = os.path.join(self.cache_dir, 'cache.json')
+
+  def test_hits_and_misses_are_counted_once_per_lookup(self):
+    cache = ResourceCache(ttl=60, clock=self.clock)
+    self.assertEqual(cache.get('disk', 'a'), (False, None))
+    # checking again after waiting for a listing is the same lookup
+    self.assertEqual(cache.get('disk', 'a', count=False), (False, None))
+    cache.set('disk', 'a', {'name': 'a'})
+    self.assertEqual(cache.get('disk', 'A'), (True, {'name': 'a'}))
+    self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+  def test_entries_expire(self):
+    cache = ResourceCache(ttl=60, clock=self.clock)
+    cache.set('disk', ('rg', 'a'), {'name': 'a'})
+    self.clock.now += 61
+    self.assertEqual(cache.get('disk', ('rg', 'a')), (False, None))
+
+  def test_set_many_writes_the_persisted_file_once(self):
+    cache = ResourceCache(ttl=60, persist_file=self.persist_file, clock=self.clock)
+    accounts = [('account{0}'.format(index), {'name': 'account{0}'.format(index)}) for index in range(100)] + [('empty', None)]
+    with mock.patch('azext_diskcopyextension.cache.os.replace', wraps=os.replace) as replace:
+      cache.set_many('storage_account', accounts)
+    self.assertEqual(replace.call_count, 1)
+    with open(self.persist_file) as f:
+      self.assertEqual(len(json.load(f)['storage_account']), 100)
+    reloaded = ResourceCache(ttl=60, persist_file=self.persist_file, clock=self.clock)
+    self.assertEqual(reloaded.get('storage_account', 'account42'), (True, {'name': 'account42'}))
+    self.assertEqual(reloaded.get('storage_account', 'empty'), (False, None))
+
+  def test_secrets_are_not_persisted(self):
+    cache = ResourceCache(ttl=60, persist_file=self.persist_file, clock=self.clock)
+    cache.set('storage_account_key', 'a', 'secret', persist=False)
+    cache.set('disk', 'a', {'name': 'a'})
+    with open(self.persist_file) as f:
+      self.assertEqual(list(json.load(f)), ['disk'])
+
+  def test_ttl_is_read_from_the_environment_when_used(self):
+    with mock.patch.dict(os.environ, {CACHE_TTL_ENV: '42'}):
+      cache = ResourceCache(clock=self.clock)
+      cache.set('disk', 'a', {'name': 'a'})
+    self.clock.now += 43
+    self.assertEqual(cache.ttl, 42)
+    self.assertEqual(cache.get('disk', 'a'), (False, None))
+
+  def test_invalid_ttl_falls_back_to_the_default(self):
+    for value in ('5m', '-1', ''):
+      with mock.patch.dict(os.environ, {CACHE_TTL_ENV: value}):
+        with mock.patch('azext_diskcopyextension.cache.logger') as logger:
+          self.assertEqual(cache_ttl(), DEFAULT_TTL)
+        logger.warning.assert_called_once()
+    with mock.patch.dict(os.environ):
+      os.environ.pop(CACHE_TTL_ENV, None)
+      self.assertEqual(cache_ttl(), DEFAULT_TTL)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,62 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from fake_azure import FakeAzure
+
+from azext_diskcopyextension import cli_utils, custom
+from azext_diskcopyextension.cache import resource_cache
+from azext_diskcopyextension.cli_utils import az_cli
+from azext_diskcopyextension.journal import JOURNAL_DIR_ENV
+from azext_diskcopyextension.storage_pool import TEMP_TAG
+
+class CleanupTempResourcesTest(unittest.TestCase):
+  def setUp(self):
+    logging.disable(logging.CRITICAL)
+    self.journal_dir = tempfile.mkdtemp(prefix='diskcopy-test-')
+    self.environ = dict(os.environ)
+    os.environ[JOURNAL_DIR_ENV] = self.journal_dir
+    self.azure = FakeAzure(0)
+    self.azure.add_resource_group('rg', 'westus')
+    self.azure.add_disk('rg', 'data', 1)
+    cli_utils.set_cli_backend(self.azure)
+    resource_cache.clear()
+
+    self.idle = self.create_temp_snapshot('snapshot_idle_data')
+    self.exporting = self.create_temp_snapshot('snapshot_exporting_data')
+    az_cli(['snapshot', 'grant-access', '--ids', self.exporting['id'], '--duration-in-seconds', '3600'])
+
+  def tearDown(self):
+    cli_utils.set_cli_backend(None)
+    os.environ.clear()
+    os.environ.update(self.environ)
+    shutil.rmtree(self.journal_dir, ignore_errors=True)
+    logging.disable(logging.NOTSET)
+
+  def create_temp_snapshot(self, name):
+    return az_cli(['snapshot', 'create', '-g', 'rg', '-n', name, '--source', 'data', '--tags', TEMP_TAG])
+
+  def remaining_snapshots(self):
+    return sorted(snapshot['name'] for snapshot in self.azure.snapshots.values())
+
+  def test_snapshots_being_read_are_kept(self):
+    deleted = custom.cleanup_temp_resources('rg', min_age_hours=0)
+    self.assertEqual([(resource['name'], resource['status']) for resource in deleted], [('snapshot_idle_data', 'deleted')])
+    self.assertEqual(self.remaining_snapshots(), ['snapshot_exporting_data'])
+    self.assertEqual(self.azure.calls['snapshot revoke-access'], 0)
+
+  def test_force_revokes_access_and_deletes(self):
+    deleted = custom.cleanup_temp_resources('rg', min_age_hours=0, force=True)
+    self.assertEqual(sorted(resource['name'] for resource in deleted), ['snapshot_exporting_data', 'snapshot_idle_data'])
+    self.assertEqual(self.remaining_snapshots(), [])
+    self.assertEqual(self.azure.calls['snapshot revoke-access'], 1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,100 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from azext_diskcopyextension.cli_utils import CLI_PREFIX, InProcessCliBackend
+
+class RecordingCli(object):
+  """Stands in for get_default_cli(), recording how many commands run in it at once and the environment they see."""
+
+  def __init__(self, seconds=0.05):
+    self.seconds = seconds
+    self.running = 0
+    self.max_running = 0
+    self.invoked = []
+    self._lock = threading.Lock()
+
+  def invoke(self, args, out_file=None):
+    with self._lock:
+      self.running += 1
+      self.max_running = max(self.max_running, self.running)
+      self.invoked.append((list(args), os.environ.get('AZURE_DISKCOPY_TEST_VALUE')))
+    time.sleep(self.seconds)
+    out_file.write('{}')
+    with self._lock:
+      self.running -= 1
+    return 0
+
+class RecordingBackend(object):
+  def __init__(self):
+    self.invoked = []
+
+  def invoke(self, cmd, env=None):
+    self.invoked.append((cmd, env))
+    return '{}'
+
+  def startup_overhead(self):
+    return 1.5
+
+class InProcessCliBackendTest(unittest.TestCase):
+  def setUp(self):
+    self.cli = RecordingCli()
+    patcher = mock.patch('azure.cli.core.get_default_cli', lambda: self.cli)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    self.fallback = RecordingBackend()
+    self.backend = InProcessCliBackend(self.fallback)
+
+  def test_one_command_runs_in_process_at_a_time(self):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+      outputs = list(executor.map(lambda index: self.backend.invoke(CLI_PREFIX + ['disk', 'show', '-n', str(index)]), range(8)))
+    self.assertEqual(outputs, ['{}'] * 8)
+    self.assertEqual(self.cli.max_running, 1)
+    # short commands queue behind each other rather than starting subprocesses
+    self.assertEqual(len(self.cli.invoked), 8)
+    self.assertEqual(self.fallback.invoked, [])
+
+  def test_commands_that_wait_too_long_run_in_a_subprocess(self):
+    self.cli.seconds = 0.3
+    backend = InProcessCliBackend(self.fallback, lock_timeout=0.05)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+      outputs = list(executor.map(lambda index: backend.invoke(CLI_PREFIX + ['disk', 'show', '-n', str(index)]), range(4)))
+    self.assertEqual(outputs, ['{}'] * 4)
+    self.assertEqual(self.cli.max_running, 1)
+    self.assertEqual(len(self.cli.invoked) + len(self.fallback.invoked), 4)
+    self.assertTrue(self.fallback.invoked)
+    self.assertTrue(all(cmd[:len(CLI_PREFIX)] == CLI_PREFIX for cmd, _ in self.fallback.invoked))
+
+  def test_environment_variables_become_arguments(self):
+    self.backend.invoke(CLI_PREFIX + ['storage', 'blob', 'show'], env={'AZURE_STORAGE_ACCOUNT': 'vhds'})
+    self.assertEqual(self.cli.invoked, [(['storage', 'blob', 'show', '--account-name', 'vhds'], None)])
+    self.assertEqual(self.fallback.invoked, [])
+
+  def test_other_environment_variables_run_in_a_subprocess(self):
+    env = {'AZURE_STORAGE_ACCOUNT': 'vhds', 'AZURE_DISKCOPY_TEST_VALUE': 'x'}
+    with mock.patch.dict(os.environ):
+      self.backend.invoke(CLI_PREFIX + ['storage', 'blob', 'show'], env=env)
+      # os.environ is shared with every other thread, so it is never changed
+      self.assertNotIn('AZURE_DISKCOPY_TEST_VALUE', os.environ)
+    self.assertEqual(self.cli.invoked, [])
+    self.assertEqual(self.fallback.invoked, [(CLI_PREFIX + ['storage', 'blob', 'show'], env)])
+    self.assertEqual(self.backend.startup_overhead(), 1.5)
+
+  def test_startup_overhead_is_that_of_the_backend_used(self):
+    self.backend.invoke(CLI_PREFIX + ['disk', 'show'])
+    self.assertEqual(self.backend.startup_overhead(), 0.0)
+    self.backend.lock_timeout = 0.01
+    with self.backend._lock:  # pylint: disable=protected-access
+      self.backend.invoke(CLI_PREFIX + ['disk', 'show'])
+      self.assertEqual(self.backend.startup_overhead(), 1.5)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,70 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from azext_diskcopyextension import COMMAND_NAMES, needs_help
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loads the command table and arguments the way az does for a command line, and prints the extension's modules it imported
+LOAD = """
+import json
+import sys
+sys.path.insert(0, 'benchmarks')
+from _stubs import install_stubs
+install_stubs()
+args = sys.argv[1:]
+from azext_diskcopyextension import COMMAND_LOADER_CLS
+loader = COMMAND_LOADER_CLS()
+loader.load_command_table(args)
+words = []
+for arg in args:
+  if arg.startswith('-'):
+    break
+  words.append(arg)
+loader.load_arguments(' '.join(words))
+print(json.dumps(sorted(name for name in sys.modules if name.startswith('azext_diskcopyextension.')), sort_keys=True))
+print(json.dumps(sorted(loader.command_table)))
+"""
+
+class CommandLoaderTest(unittest.TestCase):
+  def load(self, *args):
+    env = dict(os.environ, STUB_AZ_IMPORT_SECONDS='0')
+    output = subprocess.check_output([sys.executable, '-c', LOAD] + list(args), cwd=ROOT, env=env, universal_newlines=True)
+    modules, commands = [json.loads(line) for line in output.strip().splitlines()[-2:]]
+    return [name.split('.', 1)[1] for name in modules], commands
+
+  def test_other_commands_in_a_shared_group_import_nothing_else(self):
+    modules, commands = self.load('disk', 'list', '-g', 'rg')
+    self.assertEqual(modules, [])
+    self.assertEqual(commands, sorted(COMMAND_NAMES))
+
+  def test_extension_command_loads_its_arguments_but_not_help(self):
+    modules, _ = self.load('disk', 'copy-to-disk', '-n', 'data', '-g', 'rg', '--target-resource-group', 'target')
+    self.assertIn('_params', modules)
+    self.assertNotIn('_help', modules)
+    self.assertNotIn('custom', modules)
+
+  def test_help_is_loaded_for_help_on_the_extension(self):
+    modules, _ = self.load('disk', 'copy-to-disk', '-h')
+    self.assertIn('_help', modules)
+
+  def test_needs_help(self):
+    self.assertTrue(needs_help([]))
+    self.assertTrue(needs_help(['disk', '-h']))
+    self.assertTrue(needs_help(['disk', 'copy', '--help']))
+    self.assertTrue(needs_help(['storage', 'blob', 'copy-to-disk', '-h']))
+    self.assertFalse(needs_help(['disk', 'list', '-h']))
+    self.assertFalse(needs_help(['disk', 'copy-to-disk', '-n', 'data']))
+    # a command that only starts like one of the extension's
+    self.assertFalse(needs_help(['disk', 'copy-to', '-h']))
+
+if __name__ == '__main__':
+  unittest.main()
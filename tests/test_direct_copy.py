@@ -0,0 +1,47 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+
+from copy_test_case import CopyTestCase
+
+from azext_diskcopyextension import custom
+
+class DirectCopyTest(CopyTestCase):
+  """A direct cross-region copy writes the snapshot's pages into a disk opened for upload, without a temp blob."""
+
+  def setUp(self):
+    super(DirectCopyTest, self).setUp()
+    self.copies = []
+    patcher = mock.patch.object(custom, 'copy_page_ranges', self.copy_page_ranges)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def copy_page_ranges(self, source_url, target_url, **kwargs):
+    # the target disk is open for upload while its pages are written
+    states = [disk['diskState'] for disk in self.azure.disks.values() if (disk['resourceGroup'], disk['name']) == ('target-westus', 'data')]
+    self.copies.append((source_url, target_url, states))
+    return {'bytesCopied': 0, 'bytesSkipped': 0, 'bytesCleared': 0}
+
+  def test_direct_copy_skips_the_temp_blob(self):
+    disk = custom.copy_disk_to_disk('source-rg', 'data', 'target-westus', strategy='direct', progress_format='none')
+    self.assertEqual(disk['name'], 'data')
+    self.assertEqual(len(self.copies), 1)
+    self.assertEqual(self.copies[0][2], ['ActiveUpload'])
+    self.assertEqual(self.azure.calls['storage account create'] + self.azure.calls['storage blob copy start'], 0)
+    # finishing the upload leaves an ordinary disk, and the snapshot is gone
+    self.assertEqual(self.azure.calls['disk revoke-access'], 1)
+    self.assertEqual(self.azure.snapshots, {})
+
+  def test_failed_direct_copy_deletes_the_unfinished_disk(self):
+    with mock.patch.object(custom, 'copy_page_ranges', mock.Mock(side_effect=IOError('connection reset'))):
+      with self.assertRaises(IOError):
+        custom.copy_disk_to_disk('source-rg', 'data', 'target-westus', strategy='direct', progress_format='none')
+    self.assertEqual(self.disks('target-westus'), [])
+    self.assertEqual(self.azure.snapshots, {})
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,191 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import logging
+import threading
+import time
+import unittest
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from fake_azure import GB, FakeAzure
+from fake_event_grid import FakeEventGrid, FakeEventTransport
+
+from azext_diskcopyextension import cli_utils
+from azext_diskcopyextension.cli_utils import az_cli
+from azext_diskcopyextension.events import (CopyCompletedEvent, CopyCompletionNotifier, HttpListenerTransport, PollingTransport,
+                                            QueueTransport, parse_events)
+from azext_diskcopyextension.monitor import CopyMonitor
+from azext_diskcopyextension.polling import CopyPoller
+
+def blob_created(account, container, blob, event_type='Microsoft.Storage.BlobCreated'):
+  return {'eventType': event_type, 'data': {'api': 'CopyBlob', 'url': 'https://{0}.blob.core.windows.net/{1}/{2}'.format(account, container, blob)}}
+
+class Recorder(object):
+  """Callbacks for notifier subscriptions, recording the blobs they were called for."""
+
+  def __init__(self):
+    self.events = []
+    self.received = threading.Event()
+
+  def callback(self, name):
+    def _callback(event):
+      self.events.append((name, event.blob))
+      self.received.set()
+    return _callback
+
+class FakeQueue(object):
+  """A storage queue holding decoded message texts, with the receive/delete interface of StorageQueue."""
+
+  def __init__(self):
+    self.messages = {}
+    self.deleted = []
+    self._ids = iter(range(1000000))
+    self._lock = threading.Lock()
+
+  def put(self, text):
+    with self._lock:
+      self.messages[str(next(self._ids))] = text
+
+  def receive(self, max_messages=32, visibility_timeout=30):
+    with self._lock:
+      return [(text, (message_id, 'receipt')) for message_id, text in list(self.messages.items())[:max_messages]]
+
+  def delete(self, receipt):
+    with self._lock:
+      self.messages.pop(receipt[0], None)
+      self.deleted.append(receipt[0])
+
+class EventTransportTest(unittest.TestCase):
+  """Blob copies of a FakeAzure, reported by a FakeEventGrid through each transport."""
+
+  def setUp(self):
+    logging.disable(logging.CRITICAL)
+    self.azure = FakeAzure(0, copy_rate=64 * GB)
+    self.azure.add_resource_group('rg', 'eastus')
+    self.azure.add_storage_account('vhds', 'rg')
+    self.azure.add_blob('vhds', 'images', 'source.vhd', GB)
+    self.azure.add_blob('vhds', 'disks', '.keep', 0)
+    cli_utils.set_cli_backend(self.azure)
+    self.grid = FakeEventGrid(self.azure, delay=0.01)
+    self.recorder = Recorder()
+
+  def tearDown(self):
+    self.grid.close()
+    cli_utils.set_cli_backend(None)
+    logging.disable(logging.NOTSET)
+
+  def notifier(self, transport):
+    notifier = CopyCompletionNotifier(lambda: transport)
+    self.addCleanup(notifier.set_transport, None)
+    notifier.subscribe('vhds', 'disks', 'copy0.vhd', self.recorder.callback('copy0'))
+    notifier.subscribe('VHDS', 'disks', 'copy1.vhd', self.recorder.callback('copy1'))
+    return notifier
+
+  def copy(self, blob):
+    az_cli(['storage', 'blob', 'copy', 'start', '--source-uri', 'https://vhds.blob.core.windows.net/images/source.vhd',
+            '-c', 'disks', '-b', blob], env={'AZURE_STORAGE_ACCOUNT': 'vhds'})
+
+  def assertDelivered(self, events):
+    self.assertTrue(self.recorder.received.wait(5))
+    time.sleep(0.1)
+    self.assertEqual(self.recorder.events, events)
+
+  def test_in_process_event_reaches_the_waiter_of_its_blob(self):
+    self.notifier(self.grid.transport())
+    self.copy('unrelated.vhd')
+    self.copy('copy1.vhd')
+    self.assertDelivered([('copy1', 'copy1.vhd')])
+
+  def test_webhook_delivery(self):
+    transport = HttpListenerTransport(port=0, key='secret')
+    self.notifier(transport)
+    with self.assertRaises(HTTPError) as raised:
+      self.grid.webhook(transport.url)
+    self.assertEqual(raised.exception.code, 401)
+    self.grid.webhook(transport.url + '?code=secret')
+    self.copy('copy0.vhd')
+    self.assertDelivered([('copy0', 'copy0.vhd')])
+
+  def test_webhook_answers_cloud_events_validation(self):
+    transport = HttpListenerTransport(port=0)
+    self.notifier(transport)
+    request = Request(transport.url, method='OPTIONS', headers={'WebHook-Request-Origin': 'eventgrid.azure.net'})
+    self.assertEqual(urlopen(request).headers['WebHook-Allowed-Origin'], 'eventgrid.azure.net')
+
+  def test_queue_messages_are_published_and_deleted(self):
+    queue = FakeQueue()
+    queue.put('not an event')
+    self.grid.subscribe(lambda events: queue.put(json.dumps(events)))
+    self.notifier(QueueTransport(queue, interval=0.01))
+    self.copy('copy0.vhd')
+    self.copy('unrelated.vhd')
+    self.assertDelivered([('copy0', 'copy0.vhd')])
+    deadline = time.time() + 5
+    while len(queue.deleted) < 3 and time.time() < deadline:
+      time.sleep(0.01)
+    # every message is deleted, including ones that aren't events or are for blobs nobody waits on
+    self.assertEqual((len(queue.deleted), queue.messages), (3, {}))
+
+  def test_broken_transport_falls_back_to_polling(self):
+    def broken():
+      raise IOError('address in use')
+    notifier = CopyCompletionNotifier(broken)
+    notifier.subscribe('vhds', 'disks', 'copy0.vhd', self.recorder.callback('copy0'))
+    self.assertIsInstance(notifier.transport, PollingTransport)
+    self.assertIsNone(notifier.fallback_interval)
+
+class ParseEventsTest(unittest.TestCase):
+  def test_only_blob_created_events_are_parsed(self):
+    events = parse_events([blob_created('vhds', 'disks', 'os%20disk.vhd'), blob_created('vhds', 'disks', 'a.vhd', 'Microsoft.Storage.BlobDeleted'),
+                           {'type': 'Microsoft.Storage.BlobCreated', 'data': {'url': 'https://vhds.blob.core.windows.net/disks/b.vhd'}},
+                           {'eventType': 'Microsoft.Storage.BlobCreated', 'data': {'url': 'not a blob url'}}])
+    self.assertEqual([event.key for event in events], [('vhds', 'disks', 'os disk.vhd'), ('vhds', 'disks', 'b.vhd')])
+
+class CopyMonitorEventsTest(unittest.TestCase):
+  """The monitor waits on events, polling only at the transport's fallback interval."""
+
+  def setUp(self):
+    self.done = threading.Event()
+    self.shows = 0
+
+  def show(self, account, container, name):
+    self.shows += 1
+    status = 'success' if self.done.is_set() else 'pending'
+    return {'name': name, 'properties': {'copy': {'status': status, 'progress': '10/10' if self.done.is_set() else '5/10'}}}
+
+  def monitor(self, fallback_interval):
+    grid = FakeEventGrid(FakeAzure(0))
+    self.addCleanup(grid.close)
+    notifier = CopyCompletionNotifier(lambda: FakeEventTransport(grid, fallback_interval))
+    self.addCleanup(notifier.set_transport, None)
+    return CopyMonitor(self.show, lambda account, container, prefix: [], notifier=notifier), notifier
+
+  def wait(self, monitor):
+    # a wait that is never woken fails the test instead of hanging it
+    cancel = threading.Event()
+    timer = threading.Timer(10, cancel.set)
+    timer.start()
+    self.addCleanup(timer.cancel)
+    return monitor.wait('vhds', 'disks', 'copy0.vhd', CopyPoller(min_interval=0.01, max_interval=0.02, jitter=0), cancel=cancel)
+
+  def test_event_wakes_the_wait(self):
+    monitor, notifier = self.monitor(fallback_interval=60)
+    threading.Timer(0.2, lambda: (self.done.set(), notifier.publish(CopyCompletedEvent('vhds', 'disks', 'copy0.vhd')))).start()
+    start = time.time()
+    self.assertEqual(self.wait(monitor)['name'], 'copy0.vhd')
+    self.assertLess(time.time() - start, 5)
+    # polled for the size of the copy, and again after the event, rather than every 10ms
+    self.assertLessEqual(self.shows, 3)
+
+  def test_wait_falls_back_to_polling_without_an_event(self):
+    monitor, _ = self.monitor(fallback_interval=0.1)
+    threading.Timer(0.2, self.done.set).start()
+    self.assertEqual(self.wait(monitor)['name'], 'copy0.vhd')
+    self.assertGreaterEqual(self.shows, 2)
+
+if __name__ == '__main__':
+  unittest.main()
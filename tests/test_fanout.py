@@ -0,0 +1,51 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+
+from copy_test_case import CopyTestCase
+from knack.util import CLIError
+
+from azext_diskcopyextension import custom
+
+TARGETS = ['target-eastus', 'target-westus', 'target-westus2']
+
+class FanoutCopyTest(CopyTestCase):
+  """One source disk copied into several regions from a single snapshot."""
+
+  def setUp(self):
+    super(FanoutCopyTest, self).setUp()
+    self.blob_copies = []
+    self.azure.copy_listeners.append(lambda account, container, blob, *args: self.blob_copies.append(account))
+
+  def assertCopiedEverywhere(self, disks):
+    self.assertEqual(sorted(disk['resourceGroup'] for disk in disks), TARGETS)
+    for resource_group_name in TARGETS:
+      self.assertEqual(self.disks(resource_group_name), ['data'])
+    # the one snapshot is the only one, exported once, and it is gone
+    self.assertEqual(self.azure.calls['snapshot create'], 1)
+    self.assertEqual(self.azure.calls['snapshot grant-access'], 1)
+    self.assertEqual(self.azure.snapshots, {})
+
+  def test_fanout_shares_one_snapshot(self):
+    self.assertCopiedEverywhere(custom.copy_disk_to_disk('source-rg', 'data', target_resource_group_names=TARGETS, progress_format='none'))
+    # the source region's disk is made from the snapshot, and each other region gets its own temp blob
+    self.assertEqual(len(self.blob_copies), 2)
+    self.assertEqual(len(set(self.blob_copies)), 2)
+
+  def test_chained_fanout_seeds_regions_from_each_other(self):
+    self.assertCopiedEverywhere(custom.copy_disk_to_disk('source-rg', 'data', target_resource_group_names=TARGETS, chain=True,
+                                                         progress_format='none'))
+
+  def test_target_resource_groups_are_checked(self):
+    with self.assertRaisesRegex(CLIError, 'more than once'):
+      custom.copy_disk_to_disk('source-rg', 'data', target_resource_group_names=['target-westus', 'TARGET-WESTUS'])
+    self.azure.add_disk('target-westus2', 'data', 1)
+    with self.assertRaisesRegex(CLIError, 'already exists'):
+      custom.copy_disk_to_disk('source-rg', 'data', target_resource_group_names=TARGETS, progress_format='none')
+    self.assertEqual(self.azure.calls['snapshot create'], 0)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,83 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+
+from copy_test_case import CopyTestCase
+from knack.util import CLIError
+
+from azext_diskcopyextension import custom
+from azext_diskcopyextension.cli_utils import az_cli
+
+MB = 1024 * 1024
+
+class IncrementalCopyTest(CopyTestCase):
+  """Incremental copies into a disk left open for upload, continued from the last snapshot copied into it.
+
+  The fakes can't serve pages for managed disk SAS URLs, so the page copies are replaced by ones that report how
+  much changed.
+  """
+
+  def setUp(self):
+    super(IncrementalCopyTest, self).setUp()
+    self.full_copies, self.diff_copies = [], []
+    self.changed = [0]
+    for name, replacement in [('copy_page_ranges', self.copy_page_ranges), ('copy_page_ranges_diff', self.copy_page_ranges_diff)]:
+      patcher = mock.patch.object(custom, name, replacement)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  def copy_page_ranges(self, source_url, target_url, **kwargs):
+    self.full_copies.append(source_url)
+    return {'bytesCopied': 64 * MB, 'bytesCleared': 0}
+
+  def copy_page_ranges_diff(self, source_url, previous_url, target_url, **kwargs):
+    self.diff_copies.append((source_url, previous_url))
+    return {'bytesCopied': self.changed.pop(0) if self.changed else 0, 'bytesCleared': 0}
+
+  def copy(self, **kwargs):
+    return custom.copy_disk_to_disk('source-rg', 'data', 'target-westus', incremental=True, progress_format='none', **kwargs)
+
+  def source_disk_id(self):
+    return az_cli(['disk', 'show', '-g', 'source-rg', '-n', 'data'])['id']
+
+  def test_open_copy_is_continued_from_its_last_snapshot(self):
+    disk = self.copy(no_finalize=True)
+    self.assertEqual(disk['diskState'], 'ReadyToUpload')
+    self.assertEqual(len(self.full_copies), 1)
+    # the snapshot copied into the disk is kept, tagged with the disk it was copied into
+    base = custom.find_incremental_base_snapshot('source-rg', self.source_disk_id(), disk['id'])
+    self.assertEqual(list(self.azure.snapshots.values()), [base])
+
+    self.changed = [600 * MB, MB]
+    disk = self.copy()
+    self.assertEqual(disk['diskState'], 'Unattached')
+    self.assertEqual(len(self.full_copies), 1)
+    # passes continue until the change is under the threshold, each from the snapshot of the pass before
+    self.assertEqual(len(self.diff_copies), 2)
+    self.assertEqual(self.diff_copies[1][1], self.diff_copies[0][0])
+    self.assertEqual(self.azure.snapshots, {})
+
+  def test_base_snapshot_is_the_newest_of_the_source_copied_into_the_target(self):
+    target_id = '/subscriptions/0/resourceGroups/target-westus/providers/Microsoft.Compute/disks/data'
+    tag = '{0}={1}'.format(custom.INCREMENTAL_TARGET_TAG, target_id)
+    for name, source, tags, created in [('old', 'data', [tag], '2026-01-01T00:00:00'), ('new', 'data', [tag], '2026-01-02T00:00:00'),
+                                        ('other-disk', 'vm-data0', [tag], '2026-01-03T00:00:00'),
+                                        ('other-target', 'data', ['disk-copy-temp'], '2026-01-04T00:00:00')]:
+      snapshot = az_cli(['snapshot', 'create', '-n', name, '-g', 'source-rg', '--tags'] + tags + ['--source', source])
+      self.azure.snapshots[snapshot['id'].lower()]['timeCreated'] = created
+    self.assertEqual(custom.find_incremental_base_snapshot('source-rg', self.source_disk_id(), target_id)['name'], 'new')
+    self.assertIsNone(custom.find_incremental_base_snapshot('source-rg', self.source_disk_id(), target_id + '2'))
+
+  def test_finalized_target_is_not_continued(self):
+    self.copy()
+    with self.assertRaisesRegex(CLIError, 'already been finalized'):
+      self.copy()
+    self.assertEqual(len(self.full_copies), 1)
+    self.assertEqual(self.azure.calls['snapshot create'], 1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,95 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from knack.util import CLIError
+
+from azext_diskcopyextension.monitor import CopyMonitor
+from azext_diskcopyextension.polling import CopyPoller
+
+def blob(name, status='success', progress='10/10'):
+  return {'name': name, 'properties': {'copy': {'status': status, 'progress': progress}}}
+
+class FakeContainer(object):
+  """Blobs of one container, whose copies finish after a number of polls. `listed` are the names a listing returns."""
+
+  def __init__(self, polls_to_finish=2):
+    self.blobs = {}
+    self.listed = None
+    self.polls_to_finish = polls_to_finish
+    self.polls = {}
+    self.calls = []
+    self._lock = threading.Lock()
+
+  def _state(self, name):
+    if name not in self.blobs:
+      return None
+    self.polls[name] = self.polls.get(name, 0) + 1
+    return blob(name) if self.polls[name] >= self.polls_to_finish else blob(name, 'pending', '5/10')
+
+  def show(self, account, container, name):
+    with self._lock:
+      self.calls.append(('show', name))
+      return self._state(name)
+
+  def list(self, account, container, prefix):
+    with self._lock:
+      self.calls.append(('list', prefix))
+      names = self.listed if self.listed is not None else self.blobs
+      return [self._state(name) for name in sorted(names) if name in self.blobs and name.startswith(prefix)]
+
+class CopyMonitorTest(unittest.TestCase):
+  def setUp(self):
+    self.container = FakeContainer()
+    self.monitor = CopyMonitor(self.container.show, self.container.list)
+
+  def wait_all(self, names):
+    def _wait(name):
+      try:
+        return self.monitor.wait('account', 'vhds', name, CopyPoller(min_interval=0.01, max_interval=0.02, jitter=0))
+      except CLIError as ex:
+        return ex
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+      return list(executor.map(_wait, names))
+
+  def test_waiters_in_one_container_share_a_listing(self):
+    for name in ('disk0.vhd', 'disk1.vhd', 'disk2.vhd'):
+      self.container.blobs[name] = True
+    results = self.wait_all(['disk0.vhd', 'disk1.vhd', 'disk2.vhd'])
+    self.assertEqual([result['name'] for result in results], ['disk0.vhd', 'disk1.vhd', 'disk2.vhd'])
+    self.assertIn(('list', 'disk'), self.container.calls)
+
+  def test_blob_missing_from_the_listing_is_shown_on_its_own(self):
+    for name in ('disk0.vhd', 'disk1.vhd'):
+      self.container.blobs[name] = True
+    self.container.listed = ['disk0.vhd']
+    results = self.wait_all(['disk0.vhd', 'disk1.vhd'])
+    self.assertEqual([result['name'] for result in results], ['disk0.vhd', 'disk1.vhd'])
+    self.assertIn(('show', 'disk1.vhd'), self.container.calls)
+
+  def test_blob_that_does_not_exist_fails_its_wait(self):
+    self.container.blobs['disk0.vhd'] = True
+    results = self.wait_all(['disk0.vhd', 'deleted.vhd'])
+    self.assertEqual(results[0]['name'], 'disk0.vhd')
+    self.assertIsInstance(results[1], CLIError)
+    self.assertIn('deleted.vhd was not found', str(results[1]))
+
+  def test_single_waiter_for_a_missing_blob_fails(self):
+    result = self.wait_all(['deleted.vhd'])[0]
+    self.assertIsInstance(result, CLIError)
+
+  def test_cancel_stops_the_wait(self):
+    self.container.blobs['disk0.vhd'] = True
+    self.container.polls_to_finish = 10 ** 6
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    with self.assertRaises(KeyboardInterrupt):
+      self.monitor.wait('account', 'vhds', 'disk0.vhd', CopyPoller(min_interval=0.01, max_interval=0.02), cancel=cancel)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,132 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+
+from fake_page_blob import PAGE_SIZE, FakePageBlobService
+
+from azext_diskcopyextension.page_blob import (MAX_PUT_PAGE_BYTES, PAGE_LIST_WINDOW_BYTES, PageRangeCopier, copy_page_ranges,
+                                               copy_page_ranges_diff, list_page_ranges, list_page_ranges_diff, split_ranges,
+                                               subtract_ranges)
+
+MB = 1024 * 1024
+GB = 1024 * MB
+SOURCE = 'https://md-source.blob.core.windows.net/disk/abcd?sv=2019-12-12&sig=source'
+PREVIOUS = 'https://md-previous.blob.core.windows.net/disk/abcd?sv=2019-12-12&sig=previous'
+TARGET = 'https://md-target.blob.core.windows.net/disk/efgh?sv=2019-12-12&sig=target'
+
+class RecordingClient(object):
+  """Wraps a FakePageBlobClient, recording the windows its pages were listed in."""
+
+  def __init__(self, client):
+    self.client = client
+    self.windows = []
+
+  def get_page_ranges(self, offset=None, length=None):
+    self.windows.append((offset, length))
+    return self.client.get_page_ranges(offset, length)
+
+  def get_page_ranges_diff(self, previous_snapshot_url, offset=None, length=None):
+    self.windows.append((offset, length))
+    return self.client.get_page_ranges_diff(previous_snapshot_url, offset, length)
+
+class RangeArithmeticTest(unittest.TestCase):
+  def test_split_ranges_at_the_put_page_limit(self):
+    self.assertEqual(list(split_ranges([(0, MAX_PUT_PAGE_BYTES - 1)])), [(0, MAX_PUT_PAGE_BYTES)])
+    self.assertEqual(list(split_ranges([(0, MAX_PUT_PAGE_BYTES + PAGE_SIZE - 1)])),
+                     [(0, MAX_PUT_PAGE_BYTES), (MAX_PUT_PAGE_BYTES, PAGE_SIZE)])
+    self.assertEqual(list(split_ranges([(PAGE_SIZE, 2 * MAX_PUT_PAGE_BYTES + PAGE_SIZE - 1), (10 * MB, 10 * MB + PAGE_SIZE - 1)])),
+                     [(PAGE_SIZE, MAX_PUT_PAGE_BYTES), (MAX_PUT_PAGE_BYTES + PAGE_SIZE, MAX_PUT_PAGE_BYTES), (10 * MB, PAGE_SIZE)])
+
+  def test_subtract_overlapping_ranges(self):
+    self.assertEqual(subtract_ranges([(0, 1023)], [(512, 2047)]), [(0, 511)])
+    self.assertEqual(subtract_ranges([(0, 4095)], [(512, 1023), (2048, 2559)]), [(0, 511), (1024, 2047), (2560, 4095)])
+    self.assertEqual(subtract_ranges([(512, 1023)], [(0, 4095)]), [])
+
+  def test_subtract_adjacent_ranges(self):
+    self.assertEqual(subtract_ranges([(0, 511), (1024, 1535)], [(512, 1023)]), [(0, 511), (1024, 1535)])
+    self.assertEqual(subtract_ranges([(0, 1535)], [(0, 511), (512, 1023)]), [(1024, 1535)])
+
+class PageListingTest(unittest.TestCase):
+  def setUp(self):
+    self.service = FakePageBlobService()
+
+  def test_pages_are_listed_in_8_gib_windows(self):
+    size = 2 * PAGE_LIST_WINDOW_BYTES + GB
+    # one extent straddles the first window boundary
+    self.service.add_blob(SOURCE, size, [(0, MB), (PAGE_LIST_WINDOW_BYTES - PAGE_SIZE, 2 * PAGE_SIZE), (size - MB, MB)])
+    client = RecordingClient(self.service.client(SOURCE))
+    ranges = list_page_ranges(client, size)
+    self.assertEqual(client.windows, [(0, PAGE_LIST_WINDOW_BYTES), (PAGE_LIST_WINDOW_BYTES, PAGE_LIST_WINDOW_BYTES),
+                                      (2 * PAGE_LIST_WINDOW_BYTES, GB)])
+    self.assertEqual(ranges, [(0, MB - 1), (PAGE_LIST_WINDOW_BYTES - PAGE_SIZE, PAGE_LIST_WINDOW_BYTES - 1),
+                              (PAGE_LIST_WINDOW_BYTES, PAGE_LIST_WINDOW_BYTES + PAGE_SIZE - 1), (size - MB, size - 1)])
+
+  def test_diff_lists_changed_and_cleared_ranges(self):
+    size = PAGE_LIST_WINDOW_BYTES + MB
+    previous = self.service.add_blob(PREVIOUS, size, [(0, 4 * PAGE_SIZE), (PAGE_LIST_WINDOW_BYTES, PAGE_SIZE)])
+    source = self.service.add_blob(SOURCE, size)
+    source.pages = dict(previous.pages)
+    source.pages[PAGE_SIZE] = -1
+    del source.pages[2 * PAGE_SIZE]
+    del source.pages[PAGE_LIST_WINDOW_BYTES]
+    client = RecordingClient(self.service.client(SOURCE))
+    changed, cleared = list_page_ranges_diff(client, size, PREVIOUS)
+    self.assertEqual(len(client.windows), 2)
+    self.assertEqual(changed, [(PAGE_SIZE, 2 * PAGE_SIZE - 1)])
+    self.assertEqual(cleared, [(2 * PAGE_SIZE, 3 * PAGE_SIZE - 1), (PAGE_LIST_WINDOW_BYTES, PAGE_LIST_WINDOW_BYTES + PAGE_SIZE - 1)])
+
+class PageRangeCopyTest(unittest.TestCase):
+  def setUp(self):
+    self.service = FakePageBlobService()
+
+  def assertSameContent(self, source_url, target_url):
+    source, target = self.service.client(source_url), self.service.client(target_url)
+    size = source.get_size()
+    self.assertEqual(target.get_size(), size)
+    self.assertEqual(self.service.blob(target_url).pages, self.service.blob(source_url).pages)
+    self.assertEqual(b''.join(target.read(0, size)), b''.join(source.read(0, size)))
+
+  def test_full_copy_skips_empty_pages_and_clears_stale_ones(self):
+    size = 12 * MB
+    self.service.add_blob(SOURCE, size, [(0, 5 * MB), (8 * MB, PAGE_SIZE)])
+    # the target has pages the source doesn't, which have to be cleared
+    self.service.add_blob(TARGET, size, [(6 * MB, MB)])
+    stats = PageRangeCopier(max_workers=4, client_factory=self.service.client).copy(SOURCE, TARGET)
+    self.assertSameContent(SOURCE, TARGET)
+    self.assertEqual(stats['bytesCopied'], 5 * MB + PAGE_SIZE)
+    self.assertEqual(stats['bytesSkipped'], size - 5 * MB - PAGE_SIZE)
+    self.assertEqual(stats['bytesCleared'], MB)
+
+  def test_full_copy_creates_the_target(self):
+    self.service.add_blob(SOURCE, 6 * MB, [(MB, 4 * MB + PAGE_SIZE)])
+    stats = copy_page_ranges(SOURCE, TARGET, create_target=True, client_factory=self.service.client)
+    self.assertSameContent(SOURCE, TARGET)
+    # split at the Put Page limit
+    self.assertEqual(stats['requests'], 2)
+
+  def test_diff_copy_applies_changes_since_the_previous_snapshot(self):
+    size = 8 * MB
+    previous = self.service.add_blob(PREVIOUS, size, [(0, 2 * MB), (4 * MB, MB)])
+    self.service.add_blob(TARGET, size)
+    copy_page_ranges(PREVIOUS, TARGET, client_factory=self.service.client)
+
+    source = self.service.add_blob(SOURCE, size, [(6 * MB, PAGE_SIZE)])
+    source.pages.update(dict((page, token) for page, token in previous.pages.items() if page < 4 * MB))
+    source.pages[PAGE_SIZE] = -1
+    touched = []
+    requests = self.service.requests
+    stats = copy_page_ranges_diff(SOURCE, PREVIOUS, TARGET, touched=touched, client_factory=self.service.client)
+    requests = self.service.requests - requests
+
+    self.assertSameContent(SOURCE, TARGET)
+    self.assertEqual(stats['bytesCopied'], 2 * PAGE_SIZE)
+    self.assertEqual(stats['bytesCleared'], MB)
+    self.assertEqual(sorted(touched), [(PAGE_SIZE, 2 * PAGE_SIZE - 1), (4 * MB, 5 * MB - 1), (6 * MB, 6 * MB + PAGE_SIZE - 1)])
+    # only the difference was listed and written, not the whole disk
+    self.assertLess(requests, 10)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,44 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import os
+import signal
+import threading
+import time
+import unittest
+
+from azext_diskcopyextension.pipeline import Pipeline, cancellation
+
+class PipelineInterruptTest(unittest.TestCase):
+  @unittest.skipIf(os.name == 'nt', 'Ctrl-C is sent as SIGINT')
+  def test_ctrl_c_cancels_running_steps_without_waiting_for_them(self):
+    seen = {}
+
+    def _long_wait(results):
+      seen['cancelled'] = cancellation().wait(60)
+      raise KeyboardInterrupt()
+
+    def _nested(results):
+      inner = Pipeline('inner')
+      inner.step('wait', _long_wait)
+      return inner.run()
+
+    pipeline = Pipeline('outer')
+    pipeline.step('first', lambda r: 'done')
+    pipeline.step('nested', _nested, depends_on=['first'])
+    pipeline.step('after', lambda r: self.fail('ran after Ctrl-C'), depends_on=['nested'])
+    threading.Timer(0.2, os.kill, (os.getpid(), signal.SIGINT)).start()
+    start = time.time()
+    with self.assertRaises(KeyboardInterrupt):
+      pipeline.run()
+    self.assertLess(time.time() - start, 5)
+    time.sleep(0.2)
+    self.assertTrue(seen['cancelled'])
+
+  def test_cancellation_outside_a_pipeline_is_never_set(self):
+    self.assertFalse(cancellation().is_set())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,104 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+
+from knack.util import CLIError
+
+from azext_diskcopyextension.polling import COPY_PENDING, COPY_SUCCESS, CopyPoller, parse_copy_progress
+
+GB = 1024 ** 3
+
+def blob(status, progress=None, description=None):
+  return {'name': 'disk.vhd', 'properties': {'copy': {'status': status, 'progress': progress, 'statusDescription': description}}}
+
+class FakeClock(object):
+  def __init__(self):
+    self.now = 0.0
+    self.sleeps = []
+
+  def time(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.sleeps.append(seconds)
+    self.now += seconds
+
+def replay(poller, clock, sequence):
+  """Observe a recorded sequence of blobs, waiting between polls like wait_for_blob_success, until it succeeds."""
+  for recorded in sequence:
+    if poller.observe(recorded) == COPY_SUCCESS:
+      return True
+    poller.wait()
+  return False
+
+class CopyPollerTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = FakeClock()
+
+  def poller(self, **kwargs):
+    kwargs.setdefault('jitter', 0)
+    return CopyPoller(clock=self.clock.time, sleep=self.clock.sleep, rand=lambda: 0.5, **kwargs)
+
+  def test_parse_copy_progress(self):
+    self.assertEqual(parse_copy_progress('512/1024'), (512, 1024))
+    self.assertEqual(parse_copy_progress(None), (None, None))
+    self.assertEqual(parse_copy_progress('garbage'), (None, None))
+
+  def test_recorded_sequence_succeeds(self):
+    poller = self.poller()
+    sequence = [blob('pending')] + [blob('pending', '{0}/{1}'.format(i * GB, 10 * GB)) for i in range(10)] + \
+               [blob('success', '{0}/{0}'.format(10 * GB))]
+    self.assertTrue(replay(poller, self.clock, sequence))
+    self.assertEqual(poller.status, COPY_SUCCESS)
+    self.assertEqual(poller.copied, 10 * GB)
+    self.assertEqual(poller.percent_complete, 100.0)
+    self.assertEqual(poller.polls, 12)
+
+  def test_backoff_doubles_until_progress_is_measured(self):
+    poller = self.poller(min_interval=1, max_interval=60)
+    replay(poller, self.clock, [blob('pending')] * 8)
+    self.assertEqual(self.clock.sleeps, [1, 2, 4, 8, 16, 32, 60, 60])
+
+  def test_interval_is_half_the_estimated_time_remaining(self):
+    poller = self.poller(min_interval=1, max_interval=600, smoothing=1)
+    poller.observe(blob('pending', '0/{0}'.format(100 * GB)))
+    self.clock.now += 10
+    poller.observe(blob('pending', '{0}/{1}'.format(GB, 100 * GB)))
+    self.assertAlmostEqual(poller.throughput, GB / 10.0)
+    self.assertAlmostEqual(poller.eta, 990)
+    self.assertAlmostEqual(poller.next_interval(), 495)
+
+  def test_interval_stays_within_bounds(self):
+    poller = self.poller(min_interval=2, max_interval=30, smoothing=1)
+    # a slow copy would wait hours, a nearly done one not at all
+    poller.observe(blob('pending', '0/{0}'.format(100 * GB)))
+    self.clock.now += 100
+    poller.observe(blob('pending', '1/{0}'.format(100 * GB)))
+    self.assertEqual(poller.next_interval(), 30)
+    poller.observe(blob('pending', '{0}/{0}'.format(100 * GB)))
+    self.assertEqual(poller.next_interval(), 2)
+
+  def test_jitter_stays_within_bounds(self):
+    for rand in (0.0, 1.0):
+      poller = CopyPoller(min_interval=10, max_interval=10, jitter=0.1, rand=lambda rand=rand: rand)
+      self.assertAlmostEqual(poller.next_interval(), 9 if rand == 0.0 else 11)
+
+  def test_failed_and_aborted_copies_raise(self):
+    for status in ('failed', 'aborted'):
+      poller = self.poller()
+      with self.assertRaises(CLIError) as raised:
+        replay(poller, self.clock, [blob('pending', '0/10'), blob(status, '5/10', 'Connection reset')])
+      self.assertIn(status, str(raised.exception))
+      self.assertIn('Connection reset', str(raised.exception))
+
+  def test_missing_copy_properties_are_pending(self):
+    poller = self.poller()
+    self.assertEqual(poller.observe({'name': 'disk.vhd', 'properties': {}}), COPY_PENDING)
+    self.assertIsNone(poller.eta)
+    self.assertIsNone(poller.percent_complete)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,57 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import threading
+import unittest
+
+from copy_test_case import CopyTestCase
+from knack.util import CLIError
+
+from azext_diskcopyextension import custom
+from azext_diskcopyextension.preflight import Preflight
+
+class PreflightTest(unittest.TestCase):
+  def test_checks_run_concurrently(self):
+    # each check waits for the other, so run one after the other they would time out
+    barrier = threading.Barrier(2, timeout=5)
+
+    def _check(name):
+      barrier.wait()
+      return name
+
+    results = Preflight().add('a', _check, 'a').add('b', _check, 'b').run()
+    self.assertEqual(results, {'a': 'a', 'b': 'b'})
+
+  def test_every_failure_is_reported(self):
+    def _missing():
+      raise IOError('not found')
+    with self.assertRaises(CLIError) as raised:
+      Preflight().add('missing', _missing).add('invalid', lambda: 0, validate=lambda result: 'result is 0').add('valid', lambda: 1).run()
+    self.assertEqual(str(raised.exception), 'Pre-flight validation failed:\n  - not found\n  - result is 0')
+
+class CopyPreflightTest(CopyTestCase):
+  """Pre-flight failures stop a copy before it creates anything."""
+
+  def assertNothingCreated(self):
+    created = [command for command in self.azure.calls if command.endswith(' create') or command.endswith(' grant-access')]
+    self.assertEqual(created, [])
+
+  def test_disk_copy_reports_every_failure_before_creating_anything(self):
+    self.azure.add_disk('target-westus', 'data', 1)
+    with self.assertRaises(CLIError) as raised:
+      custom.copy_disk_to_disk('source-rg', 'data', 'missing-rg', temp_storage_account_name='missingacct', progress_format='none')
+    self.assertIn('missing-rg', str(raised.exception))
+    self.assertIn('missingacct', str(raised.exception))
+    with self.assertRaisesRegex(CLIError, 'already exists'):
+      custom.copy_disk_to_disk('source-rg', 'data', 'target-westus', progress_format='none')
+    self.assertNothingCreated()
+
+  def test_vhd_copy_with_a_missing_source_account(self):
+    with self.assertRaises(CLIError):
+      custom.copy_vhd_to_disk('https://missingacct.blob.core.windows.net/vhds/data.vhd', 'target-westus', progress_format='none')
+    self.assertNothingCreated()
+
+if __name__ == '__main__':
+  unittest.main()
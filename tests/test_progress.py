@@ -0,0 +1,80 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import json
+import unittest
+from unittest import mock
+
+from copy_test_case import CopyTestCase
+
+from azext_diskcopyextension import custom
+from azext_diskcopyextension.progress import PROGRESS_JSON, ProgressReporter, format_bytes, format_duration
+
+MB = 1024 * 1024
+
+class Clock(object):
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+class ProgressReporterTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = Clock()
+    self.stream = io.StringIO()
+    self.reporter = ProgressReporter('data', PROGRESS_JSON, self.stream, clock=self.clock, window=10)
+
+  def lines(self):
+    return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+  def advance(self, seconds, copied):
+    self.clock.now += seconds
+    self.reporter.update(copied, 100 * MB)
+
+  def test_throughput_and_eta(self):
+    # a resumed copy starts part way through, which doesn't count towards its throughput
+    self.advance(0, 20 * MB)
+    self.advance(2, 30 * MB)
+    self.assertEqual(self.reporter.to_dict(), {'name': 'data', 'bytesCopied': 30 * MB, 'totalBytes': 100 * MB, 'percentComplete': 30.0,
+                                               'bytesPerSecond': 5 * MB, 'averageBytesPerSecond': 5 * MB, 'etaSeconds': 14})
+    self.advance(2, 50 * MB)
+    self.assertEqual((self.reporter.rate, self.reporter.average_rate, int(self.reporter.eta)), (10 * MB, 7.5 * MB, 6))
+
+  def test_average_is_over_the_window(self):
+    self.advance(0, 0)
+    self.advance(10, 10 * MB)
+    self.advance(10, 50 * MB)
+    self.advance(1, 54 * MB)
+    # the first 10 seconds at 1 MB/s have left the window
+    self.assertEqual(self.reporter.average_rate, 4 * MB)
+
+  def test_json_lines_are_limited_to_one_a_second(self):
+    for _ in range(4):
+      self.advance(0.5, self.reporter.copied + MB)
+    self.advance(0.5, 100 * MB)
+    summary = self.reporter.finish()
+    events = [(line['event'], line['bytesCopied']) for line in self.lines()]
+    # the first update, one a second after, and always the last one
+    self.assertEqual(events, [('progress', MB), ('progress', 3 * MB), ('progress', 100 * MB), ('finished', 100 * MB)])
+    self.assertEqual(summary['durationSeconds'], 2.5)
+
+  def test_formatting(self):
+    self.assertEqual([format_bytes(512), format_bytes(3 * MB / 2), format_bytes(2048 * 1024 * MB)], ['512.0 B', '1.5 MB', '2.0 TB'])
+    self.assertEqual([format_duration(5), format_duration(125), format_duration(7260)], ['5s', '2m 05s', '2h 01m'])
+
+class CopyProgressTest(CopyTestCase):
+  def test_cross_region_copy_reports_json_progress(self):
+    with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+      custom.copy_disk_to_disk('source-rg', 'data', 'target-westus', progress_format='json')
+    lines = [json.loads(line) for line in stderr.getvalue().splitlines()]
+    self.assertEqual(lines[-1]['event'], 'summary')
+    progress = [line for line in lines if line['event'] == 'progress']
+    self.assertTrue(progress)
+    self.assertEqual(progress[-1]['percentComplete'], 100.0)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,123 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from fake_azure import GB, FakeAzure
+from fake_blob_endpoint import FakeBlobEndpoint
+
+from azext_diskcopyextension import cli_utils, custom
+from azext_diskcopyextension.blob_client import BLOB_ENDPOINT_ENV, blob_clients
+from azext_diskcopyextension.cache import resource_cache
+from azext_diskcopyextension.events import PollingTransport
+from azext_diskcopyextension.journal import JOURNAL_DIR_ENV, STATUS_INTERRUPTED, STATUS_RUNNING, STATUS_SUCCEEDED, CopyJournal
+
+MB = 1024 * 1024
+
+class CopyResumeTest(unittest.TestCase):
+  """A copy left running, by --no-wait or Ctrl-C, is finished by a later run from its journal."""
+
+  def setUp(self):
+    logging.disable(logging.CRITICAL)
+    self.journal_dir = tempfile.mkdtemp(prefix='diskcopy-test-')
+    self.environ = dict(os.environ)
+    os.environ[JOURNAL_DIR_ENV] = self.journal_dir
+    os.environ.pop('AZURE_DISKCOPY_CACHE_FILE', None)
+    # Copies across regions take about a second, so the first run finds them pending
+    self.azure = FakeAzure(0, copy_rate=64 * GB, cross_region_copy_rate=GB)
+    self.azure.add_resource_group('source-rg', 'eastus')
+    self.azure.add_resource_group('target-westus', 'westus')
+    self.azure.add_disk('source-rg', 'data', 1)
+    self.azure.add_storage_account('vhdswestus', 'target-westus')
+    self.azure.add_blob('vhdswestus', 'vhds', '.keep', 0)
+    cli_utils.set_cli_backend(self.azure)
+    self.endpoint = FakeBlobEndpoint(self.azure, 0).start()
+    os.environ[BLOB_ENDPOINT_ENV] = self.endpoint.url
+    blob_clients.clear()
+    resource_cache.clear()
+    custom.copy_completion.set_transport(PollingTransport())
+
+  def tearDown(self):
+    custom.copy_completion.set_transport(None)
+    self.endpoint.stop()
+    cli_utils.set_cli_backend(None)
+    os.environ.clear()
+    os.environ.update(self.environ)
+    shutil.rmtree(self.journal_dir, ignore_errors=True)
+    logging.disable(logging.NOTSET)
+
+  def start(self, command, *args):
+    status = command(*args, no_wait=True, progress_format='none')
+    self.assertEqual(status['status'], STATUS_RUNNING, status)
+    self.assertIsNotNone(status['progress'])
+    return status['id']
+
+  def assert_finished(self, operation_id):
+    journal = CopyJournal.load(operation_id)
+    self.assertEqual(journal.status, STATUS_SUCCEEDED, journal.error)
+    return journal
+
+  def test_disk_copy_to_disk_finished_by_status(self):
+    operation_id = self.start(custom.copy_disk_to_disk, 'source-rg', 'data', 'target-westus')
+    time.sleep(1.5)
+    status = custom.show_copy_operation_status(operation_id)
+    self.assertEqual(status['status'], STATUS_SUCCEEDED, status)
+    self.assert_finished(operation_id)
+    self.assertIn(('target-westus', 'data'), [(disk['resourceGroup'], disk['name']) for disk in self.azure.disks.values()])
+
+  def test_disk_copy_to_vhd_finished_by_wait(self):
+    operation_id = self.start(custom.copy_disk_to_vhd, 'source-rg', 'data', 'vhdswestus', 'vhds', 'data.vhd')
+    custom.wait_for_copy_operation(operation_id, progress_format='none')
+    self.assert_finished(operation_id)
+    self.assertIn('data.vhd', self.azure.containers[('vhdswestus', 'vhds')])
+
+  def test_verified_disk_copy_to_vhd_finished_by_wait(self):
+    # The SAS and storage key aren't journaled, and are fetched again for the verification
+    verified = []
+
+    class RecordingVerifier(object):
+      def __init__(self, repair, manifest_file):
+        self.repair = repair
+
+      def verify(self, name, source_sas_url, target_sas_url, source_id=None):
+        verified.append((name, source_sas_url, source_id))
+
+    with mock.patch.object(custom, 'CopyVerifier', RecordingVerifier):
+      operation_id = self.start(custom.copy_disk_to_vhd, 'source-rg', 'data', 'vhdswestus', 'vhds', 'data.vhd', custom.COPY_ENGINE_ASYNC, True)
+      custom.wait_for_copy_operation(operation_id, progress_format='none')
+    self.assert_finished(operation_id)
+    self.assertEqual(len(verified), 1)
+    name, source_sas_url, source_id = verified[0]
+    self.assertTrue(name.endswith('/vhds/data.vhd'), name)
+    self.assertTrue(source_sas_url)
+    self.assertIn('/snapshots/', source_id)
+
+  @unittest.skipIf(os.name == 'nt', 'Ctrl-C is sent as SIGINT')
+  def test_interrupted_disk_copy_to_disk_resumes(self):
+    self.azure.cross_region_copy_rate = GB / 60.0
+    threading.Timer(1, os.kill, (os.getpid(), signal.SIGINT)).start()
+    start = time.time()
+    with self.assertRaises(KeyboardInterrupt):
+      custom.copy_disk_to_disk('source-rg', 'data', 'target-westus', progress_format='none')
+    self.assertLess(time.time() - start, 5)
+
+    journal = CopyJournal.list()[-1]
+    self.assertEqual(journal.status, STATUS_INTERRUPTED)
+    # The server-side copy is left running, and the resumed run waits for it instead of starting over
+    self.assertIn('copy', journal.steps['crossregion_copy_disk_to_disk'])
+    self.azure.clock = lambda: time.time() + 3600
+    custom.copy_disk_to_disk('source-rg', 'data', 'target-westus', resume=journal.id, progress_format='none')
+    self.assert_finished(journal.id)
+
+if __name__ == '__main__':
+  unittest.main()
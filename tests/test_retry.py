@@ -0,0 +1,58 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import os
+import unittest
+from subprocess import CalledProcessError
+from unittest import mock
+
+from azext_diskcopyextension.retry import (DEFAULT_MAX_RETRIES, DEFAULT_RATE_LIMIT, ERROR_CONFLICT, ERROR_FATAL, ERROR_THROTTLED,
+                                           ERROR_TRANSIENT, MAX_RETRIES_ENV, RATE_LIMIT_ENV, RateLimiter, RetryPolicy, call_with_retry,
+                                           classify_error)
+
+class RetrySettingsTest(unittest.TestCase):
+  def test_settings_are_read_from_the_environment_when_used(self):
+    with mock.patch.dict(os.environ, {MAX_RETRIES_ENV: '2', RATE_LIMIT_ENV: '0.5'}):
+      policy, limiter = RetryPolicy(), RateLimiter()
+      self.assertEqual((policy.max_retries, limiter.rate, limiter.burst), (2, 0.5, 1))
+
+  def test_invalid_settings_fall_back_to_the_defaults(self):
+    with mock.patch.dict(os.environ, {MAX_RETRIES_ENV: 'five', RATE_LIMIT_ENV: '-3'}), \
+         mock.patch('azext_diskcopyextension.retry.logger') as logger:
+      self.assertEqual(RetryPolicy().max_retries, DEFAULT_MAX_RETRIES)
+      self.assertEqual(RateLimiter().rate, DEFAULT_RATE_LIMIT)
+    self.assertEqual(logger.warning.call_count, 2)
+
+class RetryTest(unittest.TestCase):
+  def test_classify_error(self):
+    self.assertEqual(classify_error('ERROR: (TooManyRequests) slow down'), ERROR_THROTTLED)
+    self.assertEqual(classify_error('ERROR: (Conflict) busy'), ERROR_CONFLICT)
+    self.assertEqual(classify_error('ERROR: (InternalServerError) oops'), ERROR_TRANSIENT)
+    self.assertEqual(classify_error('ERROR: (ResourceNotFound) gone'), ERROR_FATAL)
+
+  def test_throttled_calls_are_retried_and_pause_every_caller(self):
+    sleeps, outputs = [], ['ERROR: (TooManyRequests) Retry-After: 7', None]
+    limiter = RateLimiter(rate=0)
+
+    def _call():
+      output = outputs.pop(0)
+      if output:
+        raise CalledProcessError(1, ['az'], output)
+      return 'done'
+
+    policy = RetryPolicy(max_retries=3, sleep=sleeps.append)
+    with mock.patch.object(limiter, 'pause') as pause:
+      self.assertEqual(call_with_retry(_call, 'az disk show', policy=policy, limiter=limiter), 'done')
+    self.assertEqual(sleeps, [7.0])
+    pause.assert_called_once_with(7.0)
+
+  def test_non_idempotent_calls_are_only_retried_when_throttled(self):
+    policy = RetryPolicy(max_retries=3)
+    self.assertFalse(policy.should_retry(ERROR_TRANSIENT, 0, idempotent=False))
+    self.assertTrue(policy.should_retry(ERROR_THROTTLED, 0, idempotent=False))
+    self.assertFalse(policy.should_retry(ERROR_THROTTLED, 3))
+
+if __name__ == '__main__':
+  unittest.main()
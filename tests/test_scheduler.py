@@ -0,0 +1,54 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import threading
+import unittest
+from unittest import mock
+
+from azext_diskcopyextension import custom
+from azext_diskcopyextension.scheduler import CopyScheduler, copy_key
+
+class CopySchedulerTest(unittest.TestCase):
+  def test_copies_wait_for_a_slot_on_their_account(self):
+    scheduler = CopyScheduler()
+    admitted = []
+    with scheduler.limits(max_copies=1):
+      scheduler.admit(copy_key('vhds', 'c', 'a'), 'source', 'vhds')
+      waiting = threading.Thread(target=lambda: admitted.append(scheduler.admit(copy_key('vhds', 'c', 'b'), 'other', 'vhds')))
+      waiting.start()
+      waiting.join(0.2)
+      self.assertEqual(admitted, [])
+      scheduler.finish(copy_key('vhds', 'c', 'a'))
+      waiting.join(5)
+    self.assertEqual(admitted, [None])
+
+class PageRangeCopySchedulingTest(unittest.TestCase):
+  def setUp(self):
+    self.scheduler = CopyScheduler()
+    for target, replacement in [('copy_scheduler', self.scheduler),
+                                ('get_sas_for_blob', lambda *args: 'https://vhds.blob.core.windows.net/c/os.vhd?sig=target'),
+                                ('show_storage_blob', lambda *args: {'name': args[2]})]:
+      patcher = mock.patch.object(custom, target, replacement)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+    self.source = 'https://images.blob.core.windows.net/c/os.vhd?sig=source'
+    self.target_account = {'name': 'vhds', 'resourceGroup': 'rg'}
+
+  def test_page_range_copy_holds_a_slot_while_it_runs(self):
+    def copy_page_ranges(*args, **kwargs):
+      self.assertEqual(self.scheduler.stats()['accounts'], {'images': 0, 'vhds': 0})
+      return {'bytesCopied': 0, 'bytesSkipped': 0}
+    with mock.patch.object(custom, 'copy_page_ranges', copy_page_ranges):
+      self.assertEqual(custom.copy_blob_page_ranges(self.source, self.target_account, 'c', 'os.vhd', 'key'), {'name': 'os.vhd'})
+    self.assertEqual(self.scheduler.stats()['accounts'], {})
+
+  def test_failed_page_range_copy_releases_its_slot(self):
+    with mock.patch.object(custom, 'copy_page_ranges', mock.Mock(side_effect=IOError('reset'))):
+      with self.assertRaises(IOError):
+        custom.copy_blob_page_ranges(self.source, self.target_account, 'c', 'os.vhd', 'key')
+    self.assertEqual(self.scheduler.stats()['accounts'], {})
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,130 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import threading
+import unittest
+from unittest import mock
+
+from knack.util import CLIError
+
+from azext_diskcopyextension import storage_pool
+from azext_diskcopyextension.storage_pool import TempStorageAccountPool
+
+def account(name, location):
+  return {'name': name, 'id': '/accounts/' + name, 'location': location, 'provisioningState': 'Succeeded'}
+
+class SlowAccountCreator(object):
+  """Creates accounts, blocking until `release` is set so leases can pile up behind it.
+
+  Created accounts are added to `listed`, if given, as they would show up in later listings.
+  """
+
+  def __init__(self, listed=None):
+    self.created = []
+    self.listed = listed
+    self.started = threading.Event()
+    self.release = threading.Event()
+    self.error = None
+
+  def __call__(self, name, resource_group_name, extra_tags=None):
+    self.started.set()
+    self.release.wait(5)
+    if self.error:
+      raise self.error
+    created = account(name, 'westus')
+    self.created.append(created)
+    if self.listed is not None:
+      self.listed.append(created)
+    return created
+
+class TempStorageAccountPoolTest(unittest.TestCase):
+  def setUp(self):
+    self.pooled = []
+    for target, replacement in [('list_pooled_accounts', lambda rg=None: list(self.pooled)),
+                                ('touch_account', mock.Mock()), ('delete_container', mock.Mock())]:
+      patcher = mock.patch.object(storage_pool, target, replacement)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  def lease_in_thread(self, pool, results, location='westus'):
+    thread = threading.Thread(target=lambda: results.append(pool.lease('rg', location)))
+    thread.start()
+    return thread
+
+  def test_concurrent_leases_share_one_new_account(self):
+    # a lease that starts after the account is created finds it listed
+    creator = SlowAccountCreator(self.pooled)
+    pool = TempStorageAccountPool(creator)
+    results = []
+    threads = [self.lease_in_thread(pool, results) for _ in range(4)]
+    creator.started.wait(5)
+    creator.release.set()
+    for thread in threads:
+      thread.join(5)
+
+    self.assertEqual(len(creator.created), 1)
+    self.assertEqual({lease.account_name for lease in results}, {creator.created[0]['name']})
+    self.assertEqual(len({lease.container for lease in results}), 4)
+    self.assertEqual(pool._leases[creator.created[0]['name']], 4)
+
+  def test_creating_an_account_does_not_block_other_leases(self):
+    creator = SlowAccountCreator()
+    pool = TempStorageAccountPool(creator)
+    results = []
+    creating = self.lease_in_thread(pool, results)
+    creator.started.wait(5)
+
+    # eastus already has an account, so its lease shouldn't wait for westus's to be created
+    self.pooled.append(account('existing', 'eastus'))
+    lease = pool.lease('rg', 'eastus')
+    self.assertEqual(lease.account_name, 'existing')
+    self.assertEqual(results, [])
+
+    creator.release.set()
+    creating.join(5)
+    self.assertEqual(len(results), 1)
+
+  def test_deleted_account_is_created_again(self):
+    creator = SlowAccountCreator()
+    creator.release.set()
+    pool = TempStorageAccountPool(creator)
+    first = pool.lease('rg', 'westus')
+    # the account was never listed, and has since been cleaned up
+    second = pool.lease('rg', 'westus')
+    self.assertEqual(len(creator.created), 2)
+    self.assertNotEqual(first.account_name, second.account_name)
+
+  def test_leases_spread_over_existing_accounts(self):
+    self.pooled.extend([account('a', 'westus'), account('b', 'westus'), account('c', 'eastus')])
+    pool = TempStorageAccountPool(mock.Mock())
+    names = sorted(pool.lease('rg', 'westus').account_name for _ in range(4))
+    self.assertEqual(names, ['a', 'a', 'b', 'b'])
+    pool.create_or_use_account.assert_not_called()
+
+  def test_failed_creation_fails_waiting_leases_and_is_retried(self):
+    creator = SlowAccountCreator()
+    creator.error = CLIError('quota exceeded')
+    pool = TempStorageAccountPool(creator)
+    errors = []
+
+    def lease():
+      try:
+        pool.lease('rg', 'westus')
+      except CLIError as ex:
+        errors.append(ex)
+    threads = [threading.Thread(target=lease) for _ in range(3)]
+    for thread in threads:
+      thread.start()
+    creator.started.wait(5)
+    creator.release.set()
+    for thread in threads:
+      thread.join(5)
+    self.assertEqual(len(errors), 3)
+
+    creator.error = None
+    self.assertEqual(pool.lease('rg', 'westus').account_name, creator.created[0]['name'])
+
+if __name__ == '__main__':
+  unittest.main()
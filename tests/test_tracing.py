@@ -0,0 +1,57 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import unittest
+
+from copy_test_case import CopyTestCase
+from fake_azure import account_key
+
+from azext_diskcopyextension import custom
+from azext_diskcopyextension.tracing import redact_argv, span
+
+class TracingTest(CopyTestCase):
+  def trace(self, command, *args, **kwargs):
+    trace_file = os.path.join(self.work_dir, 'trace.json')
+    command(*args, trace_file=trace_file, progress_format='none', **kwargs)
+    with open(trace_file) as f:
+      return f.read()
+
+  def test_chrome_trace_of_a_copy(self):
+    trace = json.loads(self.trace(custom.copy_disk_to_vhd, 'source-rg', 'data', 'vhdswestus', 'vhds', 'data.vhd'))
+    spans = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    categories = set(event['cat'] for event in spans)
+    self.assertTrue(set(['command', 'step', 'az_cli']) <= categories, categories)
+    command = [event for event in spans if event['cat'] == 'command']
+    self.assertEqual([event['name'] for event in command], ['copy_disk_to_vhd'])
+    # every other span happened within the command's
+    start, end = command[0]['ts'], command[0]['ts'] + command[0]['dur']
+    self.assertTrue(all(start <= event['ts'] and event['ts'] + event['dur'] <= end + 1000 for event in spans))
+    names = [event['name'] for event in spans]
+    self.assertTrue(set(['snapshot', 'sas', 'copy', 'wait', 'az snapshot create', 'blob blob copy start']) <= set(names), names)
+
+  def test_otlp_trace_keeps_the_span_tree(self):
+    trace = json.loads(self.trace(custom.copy_disk_to_disk, 'source-rg', 'data', 'target-eastus', trace_format='otlp'))
+    spans = trace['resourceSpans'][0]['scopeSpans'][0]['spans']
+    ids = set(otlp_span['spanId'] for otlp_span in spans)
+    roots = [otlp_span for otlp_span in spans if 'parentSpanId' not in otlp_span]
+    self.assertEqual([root['name'] for root in roots], ['copy_disk_to_disk'])
+    self.assertTrue(all(otlp_span['parentSpanId'] in ids for otlp_span in spans if otlp_span not in roots))
+    self.assertEqual(set(otlp_span['traceId'] for otlp_span in spans), set([spans[0]['traceId']]))
+
+  def test_trace_has_no_secrets(self):
+    trace = self.trace(custom.copy_disk_to_disk, 'source-rg', 'data', 'target-westus')
+    self.assertNotIn('sig=simulated', trace)
+    self.assertNotIn(account_key('vhdswestus'), trace)
+    self.assertEqual(redact_argv(['storage', 'blob', 'copy', 'start', '--account-key', 'secret', '--source-uri', 'https://a/b?sv=1&sig=abc']),
+                     ['storage', 'blob', 'copy', 'start', '--account-key', 'REDACTED', '--source-uri', 'https://a/b?sv=1&sig=REDACTED'])
+
+  def test_spans_are_free_without_a_trace_file(self):
+    with span('step', 'step') as recorded:
+      self.assertIsNone(recorded)
+
+if __name__ == '__main__':
+  unittest.main()
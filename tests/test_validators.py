@@ -0,0 +1,41 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import argparse
+import unittest
+
+from knack.util import CLIError
+
+from azext_diskcopyextension._validators import validate_copy_vhd_to_disk
+
+def copy_to_disk_namespace(**kwargs):
+  arguments = dict(source_vhd_uri='https://vhds.blob.core.windows.net/images/os.vhd', target_disk_name=None, verify=False,
+                   repair=False, verify_manifest=None)
+  arguments.update(kwargs)
+  return argparse.Namespace(**arguments)
+
+class ValidateCopyVhdToDiskTest(unittest.TestCase):
+  def test_disk_is_named_after_the_blob(self):
+    namespace = copy_to_disk_namespace()
+    validate_copy_vhd_to_disk(namespace)
+    self.assertEqual(namespace.target_disk_name, 'os')
+
+    namespace = copy_to_disk_namespace(source_vhd_uri='https://vhds.blob.core.windows.net/images/os-disk')
+    validate_copy_vhd_to_disk(namespace)
+    self.assertEqual(namespace.target_disk_name, 'os-disk')
+
+  def test_disk_name_is_kept(self):
+    namespace = copy_to_disk_namespace(target_disk_name='data')
+    validate_copy_vhd_to_disk(namespace)
+    self.assertEqual(namespace.target_disk_name, 'data')
+
+  def test_invalid_arguments_are_rejected(self):
+    with self.assertRaisesRegex(CLIError, '--source-uri'):
+      validate_copy_vhd_to_disk(copy_to_disk_namespace(source_vhd_uri='/tmp/os.vhd'))
+    with self.assertRaisesRegex(CLIError, '--repair'):
+      validate_copy_vhd_to_disk(copy_to_disk_namespace(repair=True))
+
+if __name__ == '__main__':
+  unittest.main()
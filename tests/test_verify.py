@@ -0,0 +1,121 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from fake_page_blob import PAGE_SIZE, FakePageBlobService
+from knack.util import CLIError
+
+from azext_diskcopyextension.custom import copy_verifier
+from azext_diskcopyextension.page_blob import PageRangeCopier
+from azext_diskcopyextension.verify import CopyVerifier, RangeHasher
+
+KB = 1024
+RANGE_SIZE = 64 * KB
+SIZE = 16 * RANGE_SIZE
+SOURCE = 'https://md-source.blob.core.windows.net/disk/abcd?sv=2019-12-12&sig=source'
+TARGET = 'https://vhds.blob.core.windows.net/vhds/data.vhd?sv=2019-12-12&sig=target'
+
+class RangeHasherTest(unittest.TestCase):
+  def setUp(self):
+    self.service = FakePageBlobService()
+    self.hasher = RangeHasher(RANGE_SIZE)
+
+  def test_unpopulated_pages_hash_as_zeros(self):
+    sparse = self.service.add_blob(SOURCE, SIZE)
+    sparse.pages[PAGE_SIZE] = 7
+    dense = self.service.add_blob(TARGET, SIZE)
+    # the same data, with the zero pages around it allocated
+    dense.pages.update({0: 0, PAGE_SIZE: 7, 2 * PAGE_SIZE: 0})
+    sparse_digest, sparse_read = self.hasher.hash_range(self.service.client(SOURCE), 0, SIZE, [(PAGE_SIZE, 2 * PAGE_SIZE - 1)])
+    dense_digest, dense_read = self.hasher.hash_range(self.service.client(TARGET), 0, SIZE, [(0, 3 * PAGE_SIZE - 1)])
+    self.assertEqual(sparse_digest, dense_digest)
+    self.assertEqual((sparse_read, dense_read), (PAGE_SIZE, 3 * PAGE_SIZE))
+
+  def test_ranges_of_zeros_have_no_digest(self):
+    self.service.add_blob(SOURCE, SIZE).pages[RANGE_SIZE] = 0
+    requests = self.service.requests
+    self.assertEqual(self.hasher.hash_range(self.service.client(SOURCE), 0, SIZE, []), (None, 0))
+    self.assertEqual(self.service.requests, requests)
+    self.assertEqual(self.hasher.hash_range(self.service.client(SOURCE), 1, SIZE, [(RANGE_SIZE, RANGE_SIZE + PAGE_SIZE - 1)]), (None, PAGE_SIZE))
+
+class CopyVerifierTest(unittest.TestCase):
+  def setUp(self):
+    logging.disable(logging.CRITICAL)
+    self.addCleanup(logging.disable, logging.NOTSET)
+    self.service = FakePageBlobService()
+    # populated in the first four ranges only
+    self.service.add_blob(SOURCE, SIZE, [(0, 2 * RANGE_SIZE), (3 * RANGE_SIZE + 8 * PAGE_SIZE, 4 * PAGE_SIZE)])
+    PageRangeCopier(client_factory=self.service.client).copy(SOURCE, TARGET, create_target=True)
+    self.work_dir = tempfile.mkdtemp(prefix='diskcopy-test-')
+    self.addCleanup(shutil.rmtree, self.work_dir, True)
+
+  def verifier(self, **kwargs):
+    return CopyVerifier(range_size=RANGE_SIZE, max_workers=4, client_factory=self.service.client, **kwargs)
+
+  def corrupt(self):
+    target = self.service.blob(TARGET)
+    target.pages[RANGE_SIZE + PAGE_SIZE] += 1
+    # a page the source doesn't have, in a range the source has none in
+    target.pages[5 * RANGE_SIZE] = 3
+
+  def test_matching_copy(self):
+    report = self.verifier().verify('data', SOURCE, TARGET)
+    self.assertEqual((report['ranges'], report['rangesHashed'], report['rangesEmpty'], report['rangesRepaired']), (16, 3, 13, 0))
+    self.assertEqual(report['bytesRead'], 2 * (2 * RANGE_SIZE + 4 * PAGE_SIZE))
+
+  def test_corrupted_ranges_are_reported(self):
+    self.corrupt()
+    with self.assertRaises(CLIError) as raised:
+      self.verifier().verify('data', SOURCE, TARGET)
+    message = str(raised.exception)
+    self.assertIn('2 ranges', message)
+    self.assertIn('{0}-{1}'.format(RANGE_SIZE, 2 * RANGE_SIZE - 1), message)
+    self.assertIn('{0}-{1}'.format(5 * RANGE_SIZE, 6 * RANGE_SIZE - 1), message)
+    self.assertIn('--repair', message)
+
+  def test_repair_copies_only_the_ranges_that_differ(self):
+    self.corrupt()
+    requests = self.service.requests
+    report = self.verifier(repair=True).verify('data', SOURCE, TARGET)
+    self.assertEqual(report['rangesRepaired'], 2)
+    self.assertEqual(self.service.blob(TARGET).pages, self.service.blob(SOURCE).pages)
+    self.assertLess(self.service.requests - requests, 40)
+    self.verifier().verify('data', SOURCE, TARGET)
+
+  def test_size_mismatch(self):
+    self.service.blob(TARGET).size += RANGE_SIZE
+    with self.assertRaisesRegex(CLIError, 'bytes, but its source is'):
+      self.verifier().verify('data', SOURCE, TARGET)
+
+  def test_manifest_limits_a_later_verification_to_the_ranges_touched(self):
+    manifest_file = os.path.join(self.work_dir, 'hashes.json')
+    self.verifier(manifest_file=manifest_file).verify('data', SOURCE, TARGET, 'snapshot1')
+    with open(manifest_file) as f:
+      self.assertEqual(len(json.load(f)['copies']['data']['digests']), 16)
+
+    touched = [(3 * RANGE_SIZE, 3 * RANGE_SIZE + PAGE_SIZE - 1)]
+    for url in (SOURCE, TARGET):
+      self.service.blob(url).pages[3 * RANGE_SIZE] = 11
+    report = self.verifier(manifest_file=manifest_file).verify('data', SOURCE, TARGET, 'snapshot2', 'snapshot1', touched)
+    self.assertEqual((report['rangesHashed'], report['rangesReused']), (1, 15))
+
+    # digests taken from another source aren't reused
+    report = self.verifier(manifest_file=manifest_file).verify('data', SOURCE, TARGET, 'snapshot3', 'snapshot1', touched)
+    self.assertEqual(report['rangesReused'], 0)
+
+  def test_verify_options(self):
+    self.assertIsNone(copy_verifier(False, False, None))
+    self.assertTrue(copy_verifier(True, True, None).repair)
+    with self.assertRaisesRegex(CLIError, 'require --verify'):
+      copy_verifier(False, True, None)
+
+if __name__ == '__main__':
+  unittest.main()
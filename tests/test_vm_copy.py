@@ -0,0 +1,82 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import threading
+import unittest
+
+from copy_test_case import CopyTestCase
+from knack.util import CLIError
+
+from azext_diskcopyextension import custom
+
+VM_DISKS = ['vm-data0', 'vm-data1', 'vm-os']
+
+class VmCopyTest(CopyTestCase):
+  """A VM's disks are copied from snapshots that are all started before any of them is copied."""
+
+  def setUp(self):
+    super(VmCopyTest, self).setUp()
+    # snapshots take a while, so ones taken at once are all in flight together
+    self.azure.latencies['snapshot create'] = 0.2
+    self.started = []
+    self.snapshotting = 0
+    self.most_snapshotting = 0
+    lock = threading.Lock()
+    call = self.azure.call
+
+    def _recording_call(command, options, env=None, counted_as=None, latency=None):
+      with lock:
+        self.started.append(counted_as or command)
+        if command == 'snapshot create':
+          self.snapshotting += 1
+          self.most_snapshotting = max(self.most_snapshotting, self.snapshotting)
+      try:
+        return call(command, options, env, counted_as, latency)
+      finally:
+        if command == 'snapshot create':
+          with lock:
+            self.snapshotting -= 1
+    self.azure.call = _recording_call
+
+  def assertSnapshotsFirst(self):
+    snapshots = [index for index, command in enumerate(self.started) if command == 'snapshot create']
+    copies = [index for index, command in enumerate(self.started) if command in ('disk create', 'snapshot grant-access')]
+    self.assertEqual(len(snapshots), 3)
+    self.assertEqual(self.most_snapshotting, 3)
+    self.assertLess(max(snapshots), min(copies))
+
+  def copy(self, target_resource_group_name, **kwargs):
+    manifest_file = os.path.join(self.work_dir, 'vm.json')
+    custom.copy_vm_disks('source-rg', 'vm', target_resource_group_name, manifest_file=manifest_file, progress_format='none', **kwargs)
+    with open(manifest_file) as f:
+      return json.load(f)
+
+  def test_same_region_copy(self):
+    manifest = self.copy('target-eastus', target_disk_name_prefix='copy-')
+    self.assertSnapshotsFirst()
+    self.assertIsNotNone(manifest['snapshotWindowSeconds'])
+    self.assertEqual(self.disks('target-eastus'), ['copy-' + name for name in VM_DISKS])
+    self.assertEqual(manifest['osDisk']['name'], 'copy-vm-os')
+    self.assertEqual([(disk['lun'], disk['name']) for disk in manifest['dataDisks']], [(0, 'copy-vm-data0'), (1, 'copy-vm-data1')])
+    self.assertEqual(self.azure.snapshots, {})
+
+  def test_cross_region_copy_shares_one_temp_storage_lease(self):
+    manifest = self.copy('target-westus')
+    self.assertSnapshotsFirst()
+    self.assertIsNotNone(manifest['snapshotWindowSeconds'])
+    self.assertEqual(self.disks('target-westus'), VM_DISKS)
+    self.assertEqual(self.azure.calls['rest container create'], 1)
+    self.assertEqual(self.azure.snapshots, {})
+
+  def test_existing_target_disk_stops_the_copy_before_any_snapshot(self):
+    self.azure.add_disk('target-eastus', 'vm-data1', 1)
+    with self.assertRaisesRegex(CLIError, 'vm-data1'):
+      self.copy('target-eastus')
+    self.assertNotIn('snapshot create', self.started)
+
+if __name__ == '__main__':
+  unittest.main()